@@ -0,0 +1,358 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark suite for the test execution engine, with regression checks.
+
+This runs synthetic tests (no hardware or plugs with side effects) that stress
+different parts of the framework:
+  - tiny: Many phases that do nothing.
+  - measured: Phases that each set many validated measurements.
+  - multidim: Phases that each fill a large multidimensional measurement.
+  - logging: Phases that each log many messages.
+  - attachments: Phases that each attach a large blob.
+
+For each of them it reports:
+  - phases_per_s: End-to-end throughput of Test.execute().
+  - us_per_phase: End-to-end time per phase.
+  - executor_us_per_phase: Time per phase when running the phases directly
+    with a PhaseExecutor on a TestState, without the rest of the TestExecutor.
+  - peak_memory_kb: Peak memory allocated during Test.execute() (Python 3 only).
+  - convert_ms: Time to convert the phase records with
+    data.convert_to_base_types (the TestRecord caches the rest).
+  - json_bytes and json_output_ms: Size of the record serialized by the JSON
+    output callback, and the time the callback took.
+  - mfg_event_bytes and mfg_event_output_ms: The same for MfgEvent protos.
+
+Times are the best of --repeats runs, and data is generated from a fixed seed,
+so that runs are comparable.  Results can be saved as a baseline and later runs
+compared against it; metrics that got worse by more than --tolerance are
+flagged, and the exit status is then 1.  Baselines only make sense on the
+machine they were recorded on.
+
+Usage:
+  python benchmarks/engine_suite.py --save_baseline /tmp/baseline.json
+  python benchmarks/engine_suite.py --baseline /tmp/baseline.json
+  python benchmarks/engine_suite.py --scenarios tiny,logging --scale 0.1
+"""
+
+import argparse
+import collections
+import gc
+import json
+import random
+import sys
+import time
+
+import openhtf
+from openhtf.core import phase_executor
+from openhtf.core import test_state
+from openhtf.output.callbacks import json_factory
+from openhtf.output.proto import mfg_event_converter
+from openhtf.util import data
+
+try:
+  import tracemalloc  # pylint: disable=g-import-not-at-top
+except ImportError:  # Python 2.
+  tracemalloc = None
+
+_SEED = 4242
+
+# Metrics for which a higher value is better; for all others lower is better.
+_HIGHER_IS_BETTER = frozenset(['phases_per_s'])
+
+
+class _ByteCounter(object):
+  """File-like object that only counts the bytes written to it."""
+
+  def __init__(self):
+    self.size = 0
+
+  def write(self, write_data):
+    self.size += len(write_data)
+
+
+class _TimedCallback(object):
+  """Output callback that times another output callback."""
+
+  def __init__(self, callback):
+    self._callback = callback
+    self.elapsed_s = None
+
+  def __call__(self, test_record):
+    start = time.time()
+    self._callback(test_record)
+    self.elapsed_s = time.time() - start
+
+
+class _MfgEventSize(object):
+  """Output callback that converts records to MfgEvent protos."""
+
+  def __init__(self):
+    self.size = None
+
+  def __call__(self, test_record):
+    mfg_event = mfg_event_converter.mfg_event_from_test_record(test_record)
+    self.size = len(mfg_event.SerializeToString())
+
+
+def _tiny_phases(scale):
+  def tiny_phase():
+    pass
+  return [openhtf.PhaseOptions(name='tiny_%d' % i)(tiny_phase)
+          for i in range(int(500 * scale) or 1)]
+
+
+def _measured_phases(scale):
+  names = ['value_%d' % i for i in range(50)]
+  values = random.Random(_SEED).sample(range(100), len(names))
+
+  @openhtf.measures(*[
+      openhtf.Measurement(name).in_range(0, 100).with_units('V')
+      for name in names])
+  def measured_phase(test):
+    for name, value in zip(names, values):
+      test.measurements[name] = value
+
+  return [openhtf.PhaseOptions(name='measured_%d' % i)(measured_phase)
+          for i in range(int(50 * scale) or 1)]
+
+
+def _multidim_phases(scale):
+  rand = random.Random(_SEED)
+  points = [(x, y, rand.random())
+            for x in range(int(100 * scale) or 1) for y in range(100)]
+
+  @openhtf.measures(openhtf.Measurement('trace').with_dimensions('s', 'Hz'))
+  def multidim_phase(test):
+    trace = test.measurements.trace
+    for x, y, value in points:
+      trace[x, y] = value
+
+  return [openhtf.PhaseOptions(name='multidim_%d' % i)(multidim_phase)
+          for i in range(5)]
+
+
+def _logging_phases(scale):
+  def logging_phase(test):
+    for i in range(200):
+      test.logger.info('Logging message %d of a chatty phase.', i)
+
+  return [openhtf.PhaseOptions(name='logging_%d' % i)(logging_phase)
+          for i in range(int(50 * scale) or 1)]
+
+
+def _attachment_phases(scale):
+  rand = random.Random(_SEED)
+  blob = bytes(bytearray(rand.getrandbits(8) for _ in range(1 << 16))) * 16
+
+  def attachment_phase(test):
+    test.attach('blob', blob, mimetype='application/octet-stream')
+
+  return [openhtf.PhaseOptions(name='attachment_%d' % i)(attachment_phase)
+          for i in range(int(10 * scale) or 1)]
+
+
+_SCENARIOS = collections.OrderedDict([
+    ('tiny', _tiny_phases),
+    ('measured', _measured_phases),
+    ('multidim', _multidim_phases),
+    ('logging', _logging_phases),
+    ('attachments', _attachment_phases),
+])
+
+
+def _make_test(phases):
+  test = openhtf.Test(*phases)
+  test.configure(default_dut_id='benchmark')
+  return test
+
+
+def _time_execute(phases, with_memory):
+  """Execute a test of phases, returning its record and metrics."""
+  test = _make_test(phases)
+  records = []
+  test.add_output_callbacks(records.append)
+  if with_memory:
+    tracemalloc.start()
+  start = time.time()
+  test.execute()
+  elapsed_s = time.time() - start
+  metrics = {}
+  if with_memory:
+    metrics['peak_memory_kb'] = tracemalloc.get_traced_memory()[1] / 1024.0
+    tracemalloc.stop()
+  metrics['us_per_phase'] = elapsed_s / len(phases) * 1e6
+  metrics['phases_per_s'] = len(phases) / elapsed_s
+  return records[0], metrics
+
+
+def _time_phase_executor(phases):
+  """Time running the phases with a PhaseExecutor on a bare TestState."""
+  test = _make_test(phases)
+  # pylint: disable=protected-access
+  state = test_state.TestState(test.descriptor, test.make_uid(),
+                               test._test_options)
+  # pylint: enable=protected-access
+  state.test_record.dut_id = 'benchmark'
+  state.mark_test_started()
+  state.plug_manager.initialize_plugs()
+  state.set_status_running()
+  executor = phase_executor.PhaseExecutor(state)
+  start = time.time()
+  for phase in test.descriptor.phase_group.main:
+    executor.execute_phase(phase)
+  elapsed_s = time.time() - start
+  state.plug_manager.tear_down_plugs()
+  state.finalize_normally()
+  state.close()
+  return elapsed_s / len(phases) * 1e6
+
+
+def _time_outputs(record):
+  """Time conversions and output callbacks of record."""
+  metrics = {}
+  start = time.time()
+  data.convert_to_base_types(record.phases)
+  metrics['convert_ms'] = (time.time() - start) * 1e3
+
+  json_file = _ByteCounter()
+  json_callback = _TimedCallback(json_factory.OutputToJSON(json_file))
+  json_callback(record)
+  metrics['json_bytes'] = json_file.size
+  metrics['json_output_ms'] = json_callback.elapsed_s * 1e3
+
+  mfg_event_size = _MfgEventSize()
+  mfg_event_callback = _TimedCallback(mfg_event_size)
+  mfg_event_callback(record)
+  metrics['mfg_event_bytes'] = mfg_event_size.size
+  metrics['mfg_event_output_ms'] = mfg_event_callback.elapsed_s * 1e3
+  return metrics
+
+
+def _best(metrics_list):
+  """Combine the metrics of several runs, keeping the best value of each."""
+  best = {}
+  for metrics in metrics_list:
+    for name, value in metrics.items():
+      if name not in best:
+        best[name] = value
+      elif name in _HIGHER_IS_BETTER:
+        best[name] = max(best[name], value)
+      else:
+        best[name] = min(best[name], value)
+  return best
+
+
+def run_scenario(name, scale=1.0, repeats=3):
+  """Run a scenario repeats times, returning its best metrics.
+
+  Args:
+    name: Name of the scenario, a key of _SCENARIOS.
+    scale: Factor applied to the size of the scenario.
+    repeats: Number of runs to take the best metrics of.
+
+  Returns:
+    Dict mapping metric name to value.
+  """
+  phases = _SCENARIOS[name](scale)
+  _time_execute(phases, with_memory=False)  # Warm up.
+  runs = []
+  for _ in range(repeats):
+    gc.collect()
+    record, metrics = _time_execute(phases, with_memory=False)
+    metrics['executor_us_per_phase'] = _time_phase_executor(phases)
+    metrics.update(_time_outputs(record))
+    runs.append(metrics)
+  if tracemalloc is not None:
+    gc.collect()
+    runs.append(_time_execute(phases, with_memory=True)[1])
+  return _best(runs)
+
+
+def compare(results, baseline, tolerance):
+  """Return descriptions of the metrics that regressed against baseline.
+
+  Args:
+    results: Dict mapping scenario name to dict of metrics.
+    baseline: Results of a previous run, in the same format.
+    tolerance: Fraction by which a metric may get worse before it is flagged.
+
+  Returns:
+    List of strings, one per regressed metric.
+  """
+  regressions = []
+  for scenario, metrics in sorted(results.items()):
+    for name, value in sorted(metrics.items()):
+      base_value = baseline.get(scenario, {}).get(name)
+      if not base_value:
+        continue
+      if name in _HIGHER_IS_BETTER:
+        regressed = value < base_value * (1 - tolerance)
+      else:
+        regressed = value > base_value * (1 + tolerance)
+      if regressed:
+        regressions.append('%s.%s: %.1f, baseline %.1f (%+.0f%%)' % (
+            scenario, name, value, base_value,
+            (value / base_value - 1) * 100))
+  return regressions
+
+
+def _print_results(results):
+  names = sorted(set(name for metrics in results.values() for name in metrics))
+  print('%-22s' % 'metric' + ''.join('%14s' % s for s in results))
+  for name in names:
+    print('%-22s' % name + ''.join(
+        '%14.1f' % metrics[name] if name in metrics else '%14s' % '-'
+        for metrics in results.values()))
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+  parser.add_argument('--scenarios', default=','.join(_SCENARIOS),
+                      help='Comma-separated scenarios to run.')
+  parser.add_argument('--scale', type=float, default=1.0,
+                      help='Factor applied to the size of the scenarios.')
+  parser.add_argument('--repeats', type=int, default=3,
+                      help='Number of runs to take the best metrics of.')
+  parser.add_argument('--baseline',
+                      help='JSON file of a previous run to compare against.')
+  parser.add_argument('--tolerance', type=float, default=0.2,
+                      help='Fraction by which a metric may regress.')
+  parser.add_argument('--save_baseline',
+                      help='JSON file to save the results to.')
+  args, _ = parser.parse_known_args()
+
+  results = collections.OrderedDict()
+  for name in args.scenarios.split(','):
+    if name not in _SCENARIOS:
+      parser.error('Unknown scenario %s, expected one of %s.' % (
+          name, ', '.join(_SCENARIOS)))
+    results[name] = run_scenario(name, args.scale, args.repeats)
+  _print_results(results)
+
+  if args.save_baseline:
+    with open(args.save_baseline, 'w') as baseline_file:
+      json.dump(results, baseline_file, indent=2, sort_keys=True)
+  if args.baseline:
+    with open(args.baseline) as baseline_file:
+      regressions = compare(results, json.load(baseline_file), args.tolerance)
+    for regression in regressions:
+      print('REGRESSION %s' % regression)
+    if regressions:
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
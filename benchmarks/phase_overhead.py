@@ -0,0 +1,93 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark of per-phase framework overhead for repeated test executions.
+
+A station typically executes the same Test over and over, so any work the
+framework redoes for every phase of every execution adds up.  This runs a test
+made of phases that each use a plug and set a few measurements (but otherwise do
+nothing) many times, and reports:
+  - The time to create the PhaseState of such a phase, which copies the phase's
+    measurement declarations.
+  - The end-to-end framework overhead per phase, over all executions.
+
+Usage:
+  python benchmarks/phase_overhead.py --phases 100 --executions 20
+"""
+
+import argparse
+import time
+
+import openhtf
+from openhtf import plugs
+from openhtf.core import test_state
+
+
+class _NoOpPlug(plugs.BasePlug):
+
+  def do_nothing(self):
+    pass
+
+
+@openhtf.measures(
+    openhtf.Measurement('scalar').in_range(0, 10),
+    openhtf.Measurement('text').matches_regex('.*'),
+    openhtf.Measurement('trace').with_dimensions('ms'))
+@plugs.plug(no_op=_NoOpPlug)
+def _measure_phase(test, no_op):
+  no_op.do_nothing()
+  test.measurements.scalar = 5
+  test.measurements.text = 'text'
+  test.measurements.trace[0] = 1
+
+
+def _time_phase_states(count):
+  start = time.time()
+  for _ in range(count):
+    test_state.PhaseState.from_descriptor(_measure_phase, None)
+  return time.time() - start
+
+
+def _time_executions(phase_count, execution_count):
+  test = openhtf.Test(*[
+      openhtf.PhaseOptions(name='phase_%d' % i)(_measure_phase)
+      for i in range(phase_count)])
+  test.configure(default_dut_id='benchmark')
+  test.execute()  # Warm up.
+  start = time.time()
+  for _ in range(execution_count):
+    test.execute()
+  return time.time() - start
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--phases', type=int, default=100,
+                      help='Number of phases in the test.')
+  parser.add_argument('--executions', type=int, default=20,
+                      help='Number of times to execute the test.')
+  args, _ = parser.parse_known_args()
+
+  phase_state_s = _time_phase_states(args.phases * args.executions)
+  print('PhaseState creation:   %8.1f us/phase' % (
+      phase_state_s / (args.phases * args.executions) * 1e6))
+
+  execute_s = _time_executions(args.phases, args.executions)
+  print('Framework overhead:    %8.1f us/phase (%d executions of %d phases)' % (
+      execute_s / (args.phases * args.executions) * 1e6, args.executions,
+      args.phases))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,92 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark of framework overhead for tests with many short phases.
+
+Reports:
+  - How long it takes to run a trivial function on a new KillableThread (how
+    phases used to be run) versus as a KillableTask on a KillableThreadPool (how
+    phases are run now).
+  - End-to-end throughput, in phases per second, of a test with many trivial
+    phases.
+
+Usage:
+  python benchmarks/phase_throughput.py --phases 2000
+"""
+
+import argparse
+import time
+
+import openhtf
+from openhtf.util import threads
+
+
+class _NoOpThread(threads.KillableThread):
+  daemon = True
+
+
+def _time_threads(count):
+  start = time.time()
+  for _ in range(count):
+    thread = _NoOpThread()
+    thread.start()
+    thread.join()
+  return time.time() - start
+
+
+def _time_pool_tasks(count):
+  pool = threads.KillableThreadPool(name='BenchmarkPool')
+  start = time.time()
+  for _ in range(count):
+    task = threads.KillableTask(pool=pool)
+    task.start()
+    task.join()
+  return time.time() - start
+
+
+def _noop_phase():
+  pass
+
+
+def _time_test(phase_count):
+  test = openhtf.Test(*[
+      openhtf.PhaseOptions(name='phase_%d' % i)(_noop_phase)
+      for i in range(phase_count)])
+  test.configure(default_dut_id='benchmark')
+  start = time.time()
+  test.execute()
+  return time.time() - start
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--phases', type=int, default=2000,
+                      help='Number of trivial phases (and tasks) to run.')
+  args, _ = parser.parse_known_args()
+
+  thread_s = _time_threads(args.phases)
+  pool_s = _time_pool_tasks(args.phases)
+  print('Dispatch of %d no-op tasks:' % args.phases)
+  print('  new KillableThread each: %8.1f us/task' % (
+      thread_s / args.phases * 1e6))
+  print('  KillableThreadPool:      %8.1f us/task' % (
+      pool_s / args.phases * 1e6))
+
+  test_s = _time_test(args.phases)
+  print('Test with %d no-op phases: %.2f s, %.0f phases/s' % (
+      args.phases, test_s, args.phases / test_s))
+
+
+if __name__ == '__main__':
+  main()
@@ -24,10 +24,12 @@ from openhtf.core import test_record
 from openhtf.core.measurements import Dimension
 from openhtf.core.measurements import Measurement
 from openhtf.core.measurements import measures
+from openhtf.core.measurements import PerSlot
 from openhtf.core.monitors import monitors
 from openhtf.core.phase_descriptor import PhaseDescriptor
 from openhtf.core.phase_descriptor import PhaseOptions
 from openhtf.core.phase_descriptor import PhaseResult
+from openhtf.core.phase_descriptor import PhaseSweep
 from openhtf.core.phase_group import PhaseGroup
 from openhtf.core.test_descriptor import Test
 from openhtf.core.test_descriptor import TestApi
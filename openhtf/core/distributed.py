@@ -0,0 +1,405 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Run PhaseGroups on worker processes, possibly on other hosts.
+
+Large rack tests can spread their PhaseGroups over several worker processes,
+each one close to (and owning the plugs for) its part of the rack.  Each worker
+listens on an address:
+
+  python -m openhtf.core.distributed --address 0.0.0.0:5123 \\
+      --config-value=remote_group_authkey=secret
+
+and PhaseGroups with their worker option set are run there:
+
+  rack_a = htf.PhaseGroup(main=[power_on, run_bist], name='rack_a',
+                          worker='rack-a.lab:5123')
+  test = htf.Test(rack_a, rack_b)
+
+The test process sends the group to the worker, which runs it as a test of its
+own, with its own plugs, and streams the phase records (with their
+measurements and attachments) and log records back into the test record as the
+phases finish.  Setting the worker of a parallel PhaseGroup's main groups runs
+them on several workers at once.
+
+The worker sends a heartbeat at least every fifth of the
+remote_group_heartbeat_timeout_s config value.  If the connection to a worker
+fails, or it stays silent for that long, the worker is considered lost: an
+ERROR phase record named after the group is added and the test stops.
+
+Like phases run with the run_in_subprocess option, the phase functions and
+plugs of a remote group must be importable by the worker, and the group and
+its phase records must be picklable.  Messages are pickled, and unpickling a
+message can run arbitrary code, so the remote_group_authkey config value must
+be set (to the same value) for the test and its workers: workers refuse to
+start without it, and only unpickle messages from connections that
+authenticated with it.  Even so, workers should only listen on trusted
+networks, since messages are not encrypted.
+"""
+
+import argparse
+import io
+import logging
+import sys
+import threading
+import time
+import types
+
+from multiprocessing import connection
+
+import mutablerecords
+
+from openhtf import util
+from openhtf.core import phase_descriptor
+from openhtf.core import phase_executor
+from openhtf.core import test_record
+from openhtf.output import pipeline
+from openhtf.util import conf
+from six.moves import cPickle as pickle
+
+_LOG = logging.getLogger(__name__)
+
+# How often the test process checks whether the test is being aborted.
+_POLL_INTERVAL_S = 0.1
+
+
+class RemoteGroupError(Exception):
+  """Raised when a remote group ends in a terminal outcome on its worker."""
+
+
+class WorkerLostError(Exception):
+  """Raised when the connection to a group's worker fails or goes silent."""
+
+
+class MissingAuthkeyError(Exception):
+  """Raised when a worker or remote group has no authkey to authenticate."""
+
+
+def _authkey(authkey):
+  """Returns authkey as bytes, raising MissingAuthkeyError if it is unset."""
+  if not authkey:
+    raise MissingAuthkeyError(
+        'Remote PhaseGroups require an authkey, since their messages are '
+        'pickled; set the remote_group_authkey config value.')
+  return authkey if isinstance(authkey, bytes) else authkey.encode('utf-8')
+
+
+def parse_address(address):
+  """Returns the (host, port) tuple of a 'host:port' worker address."""
+  if isinstance(address, tuple):
+    return address
+  host, _, port = address.rpartition(':')
+  return host or 'localhost', int(port)
+
+
+def _persistent_id(obj):
+  """Pickles decorated phase functions by the name of their PhaseDescriptor.
+
+  Decorated phase functions can't be pickled by name as usual, since their
+  module attribute is the PhaseDescriptor wrapping them.
+  """
+  if not isinstance(obj, types.FunctionType):
+    return None
+  module = sys.modules.get(obj.__module__)
+  target = getattr(module, obj.__name__, None)
+  if (isinstance(target, phase_descriptor.PhaseDescriptor) and
+      target.func is obj):
+    return obj.__module__, obj.__name__
+  return None
+
+
+def _persistent_load(location):
+  module_name, name = location
+  __import__(module_name)
+  return getattr(sys.modules[module_name], name).func
+
+
+def _send(conn, message):
+  conn.send_bytes(pipeline.pickle_test_record(message, _persistent_id))
+
+
+def _recv(conn):
+  unpickler = pickle.Unpickler(io.BytesIO(conn.recv_bytes()))
+  unpickler.persistent_load = _persistent_load
+  return unpickler.load()
+
+
+########## Worker side ##########
+
+
+def _picklable_phase_record(phase_record):
+  """Returns phase_record, without its options if those can't be pickled."""
+  try:
+    pipeline.pickle_test_record(phase_record, _persistent_id)
+    return phase_record
+  except Exception:  # pylint: disable=broad-except
+    # Most often a lambda run_if option; the options are only informative.
+    return mutablerecords.CopyRecord(phase_record, options=None)
+
+
+class _GroupRun(object):
+  """Runs a group for a test process, streaming records back over conn."""
+
+  def __init__(self, conn, group, dut_id, test_name, heartbeat_interval_s):
+    # Imported here, since test_descriptor imports the test executor.
+    # pylint: disable=g-import-not-at-top
+    from openhtf.core import test_descriptor
+    # pylint: enable=g-import-not-at-top
+    self._conn = conn
+    self._heartbeat_interval_s = heartbeat_interval_s
+    self._test = test_descriptor.Test(
+        mutablerecords.CopyRecord(group, worker=None))
+    self._test.configure(name=test_name)
+    self._records = []
+    self._test.add_output_callbacks(self._records.append)
+
+    @phase_descriptor.PhaseOptions()
+    def remote_group_start(test):
+      test.test_record.dut_id = dut_id
+    self._trigger = remote_group_start
+    self._phase_count = 0
+    self._log_count = 0
+
+  def _send_new_records(self, record):
+    new_phase_records = record.phases[self._phase_count:]
+    self._phase_count += len(new_phase_records)
+    phase_records = [_picklable_phase_record(phase_record)
+                     for phase_record in new_phase_records
+                     if phase_record.descriptor_id != id(self._trigger)]
+    log_records = record.log_records[self._log_count:]
+    self._log_count += len(log_records)
+    if phase_records:
+      _send(self._conn, ('phases', phase_records))
+    if log_records:
+      _send(self._conn, ('logs', log_records))
+    return phase_records or log_records
+
+  def run(self):
+    thread = threading.Thread(
+        target=self._test.execute, kwargs={'test_start': self._trigger},
+        name='<RemoteGroupRun: %s>' % self._test.descriptor.uid)
+    thread.daemon = True
+    thread.start()
+    try:
+      while thread.is_alive():
+        if self._conn.poll(self._heartbeat_interval_s):
+          if _recv(self._conn)[0] == 'abort':
+            _LOG.info('Aborting remote group as asked by the test process.')
+            self._test.abort_from_sig_int()
+        state = self._test.state
+        if not (state and self._send_new_records(state.test_record)):
+          _send(self._conn, ('heartbeat',))
+        thread.join(0)
+    except (EOFError, IOError, OSError):
+      # Nobody is left to report to, so don't keep the plugs busy.
+      self._test.abort_from_sig_int()
+      thread.join()
+      raise
+    record = self._records[0]
+    self._send_new_records(record)
+    _send(self._conn, ('done', record.outcome, record.outcome_details))
+
+
+class GroupWorker(object):
+  """Serves test processes, running the PhaseGroups they send.
+
+  Each connection runs one group, with the worker's own plugs; groups sent by
+  different connections run concurrently.
+  """
+
+  def __init__(self, address=('localhost', 0), authkey=None):
+    """Initializer for GroupWorker.
+
+    Args:
+      address: (host, port) tuple or 'host:port' string to listen on; port 0
+          picks a free port (see the address attribute).
+      authkey: Key that connecting test processes must have; defaults to the
+          remote_group_authkey config value.
+
+    Raises:
+      MissingAuthkeyError: If there is no authkey.
+    """
+    self._listener = connection.Listener(
+        parse_address(address),
+        authkey=_authkey(authkey if authkey is not None
+                         else conf.remote_group_authkey))
+    self._closed = threading.Event()
+
+  @property
+  def address(self):
+    """The 'host:port' address the worker listens on."""
+    return '%s:%s' % self._listener.address
+
+  def serve_forever(self):
+    """Accept and serve connections until close() is called."""
+    while not self._closed.is_set():
+      try:
+        conn = self._listener.accept()
+      except Exception:  # pylint: disable=broad-except
+        if self._closed.is_set():
+          return
+        _LOG.warning('Rejected a connection to the group worker.',
+                     exc_info=True)
+        continue
+      thread = threading.Thread(target=self._serve, args=(conn,),
+                                name='<GroupWorkerConnection>')
+      thread.daemon = True
+      thread.start()
+
+  def _serve(self, conn):
+    try:
+      request = _recv(conn)
+      _LOG.info('Running remote group %s for DUT %s.', request[1].name,
+                request[2])
+      _GroupRun(conn, *request[1:]).run()
+    except (EOFError, IOError, OSError):
+      _LOG.warning('Lost the connection to the test process.', exc_info=True)
+    except Exception as exc:  # pylint: disable=broad-except
+      _LOG.exception('Could not run a remote group.')
+      try:
+        _send(conn, ('error', '%s: %s' % (type(exc).__name__, exc)))
+      except (IOError, OSError):
+        pass
+    finally:
+      conn.close()
+
+  def close(self):
+    self._closed.set()
+    self._listener.close()
+
+
+########## Test process side ##########
+
+
+def _terminal_outcome(outcome, outcome_details):
+  """Maps the outcome of a remote group to a PhaseExecutionOutcome or None."""
+  codes = [details.code for details in outcome_details]
+  if outcome == test_record.Outcome.PASS:
+    return None
+  if outcome == test_record.Outcome.FAIL:
+    if 'STOP' in codes:
+      return phase_executor.PhaseExecutionOutcome(
+          phase_descriptor.PhaseResult.STOP)
+    return None
+  if outcome == test_record.Outcome.TIMEOUT:
+    return phase_executor.PhaseExecutionOutcome(None)
+  exc = RemoteGroupError('Remote group ended with outcome %s: %s' % (
+      outcome.name, '; '.join('%s: %s' % (details.code, details.description)
+                              for details in outcome_details)))
+  return phase_executor.PhaseExecutionOutcome(
+      phase_executor.ExceptionInfo(RemoteGroupError, exc, None))
+
+
+def _worker_lost_record(group, start_time_millis, exc):
+  """Returns an ERROR PhaseRecord standing in for a group that failed."""
+  result = phase_executor.PhaseExecutionOutcome(
+      phase_executor.ExceptionInfo(type(exc), exc, None))
+  return test_record.PhaseRecord(
+      id(group), group.name or 'remote_group',
+      test_record.CodeInfo.uncaptured(), measurements={},
+      start_time_millis=start_time_millis, end_time_millis=util.time_millis(),
+      result=result, outcome=test_record.PhaseOutcome.ERROR)
+
+
+def _serve_group(conn, group, test_state, abort_event, timeout_s):
+  """Receive the records of a remote group until it is done."""
+  _send(conn, ('run', group, test_state.test_record.dut_id,
+               test_state.test_options.name, timeout_s / 5.0))
+  last_message_time = time.time()
+  abort_sent = False
+  while True:
+    if abort_event.is_set() and not abort_sent:
+      _send(conn, ('abort',))
+      abort_sent = True
+    if not conn.poll(_POLL_INTERVAL_S):
+      if time.time() - last_message_time > timeout_s:
+        raise WorkerLostError('No heartbeat from worker %s for %s seconds.' %
+                              (group.worker, timeout_s))
+      continue
+    message = _recv(conn)
+    last_message_time = time.time()
+    if message[0] == 'phases':
+      test_state.add_phase_records(message[1])
+      test_state.notify_update()
+    elif message[0] == 'logs':
+      for log_record in message[1]:
+        test_state.test_record.add_log_record(log_record)
+    elif message[0] == 'done':
+      return _terminal_outcome(*message[1:])
+    elif message[0] == 'error':
+      raise RemoteGroupError('Worker %s could not run the group: %s' %
+                             (group.worker, message[1]))
+
+
+def run_group(group, test_state, abort_event):
+  """Run a PhaseGroup on its worker, adding its records to test_state.
+
+  Args:
+    group: phase_group.PhaseGroup with its worker set.
+    test_state: test_state.TestState of the running test.
+    abort_event: threading.Event set when the test is aborted; the worker is
+        then asked to abort the group.
+
+  Returns:
+    A terminal phase_executor.PhaseExecutionOutcome if the group is terminal,
+    else None.
+  """
+  if group.name:
+    test_state.state_logger.debug('Running PhaseGroup %s on worker %s',
+                                  group.name, group.worker)
+  start_time_millis = util.time_millis()
+  conn = None
+  try:
+    conn = connection.Client(parse_address(group.worker),
+                             authkey=_authkey(conf.remote_group_authkey))
+    return _serve_group(conn, group, test_state, abort_event,
+                        conf.remote_group_heartbeat_timeout_s)
+  except Exception as exc:  # pylint: disable=broad-except
+    if not isinstance(
+        exc, (WorkerLostError, RemoteGroupError, MissingAuthkeyError)):
+      exc = WorkerLostError('Lost worker %s: %s: %s' % (
+          group.worker, type(exc).__name__, exc))
+    test_state.state_logger.error('%s', exc)
+    phase_record = _worker_lost_record(group, start_time_millis, exc)
+    test_state.add_phase_records([phase_record])
+    test_state.notify_update()
+    return phase_record.result
+  finally:
+    if conn is not None:
+      conn.close()
+
+
+def main():
+  """Serve a GroupWorker until interrupted."""
+  parser = argparse.ArgumentParser(
+      description='Run OpenHTF PhaseGroups sent by test processes.',
+      parents=[conf.ARG_PARSER])
+  parser.add_argument('--address', default='localhost:5123',
+                      help='host:port to listen on.')
+  args = parser.parse_args()
+  logging.basicConfig(level=logging.INFO)
+  try:
+    worker = GroupWorker(args.address)
+  except MissingAuthkeyError as exc:
+    parser.error(str(exc))
+  _LOG.info('Group worker listening on %s', worker.address)
+  try:
+    worker.serve_forever()
+  except KeyboardInterrupt:
+    worker.close()
+
+
+if __name__ == '__main__':
+  main()
@@ -61,8 +61,13 @@ Examples:
 """
 
 
+import array
+import bisect
 import collections
+import copy
 import logging
+import math
+import numbers
 
 from enum import Enum
 
@@ -75,6 +80,11 @@ from openhtf.util import validators
 from openhtf.util import units
 import six
 
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
 try:
   import pandas
 except ImportError:
@@ -82,6 +92,10 @@ except ImportError:
 
 _LOG = logging.getLogger(__name__)
 
+# Typecode of the arrays storing integer columns of dimensioned measurements;
+# Python 2 arrays have no 'q' (long long) typecode.
+_INT_TYPECODE = 'q' if six.PY3 else 'l'
+
 
 class InvalidDimensionsError(Exception):
   """Raised when there is a problem with measurement dimensions."""
@@ -109,6 +123,27 @@ class DuplicateNameError(Exception):
 Outcome = Enum('Outcome', ['PASS', 'FAIL', 'UNSET', 'PARTIALLY_SET'])
 
 
+class PerSlot(tuple):
+  """The values of a measurement for each DUT slot of a panel.
+
+  Phases that test a whole panel of DUTs at once set a measurement, or a value
+  of a dimensioned measurement, to one value per slot:
+
+    test.measurements.voltage = measurements.PerSlot(voltages)
+    test.measurements.gain[frequency] = measurements.PerSlot(gains)
+
+  The measurement passes only if the value of each slot passes its validators.
+  See panel.py for splitting the panel's test record into one per DUT.
+  """
+
+  def __repr__(self):
+    return 'PerSlot(%s)' % (tuple.__repr__(self),)
+
+
+def _slot_value(value, slot):
+  return value[slot] if isinstance(value, PerSlot) else value
+
+
 class Measurement(  # pylint: disable=no-init
     mutablerecords.Record(
         'Measurement', ['name'],
@@ -183,6 +218,20 @@ class Measurement(  # pylint: disable=no-init
     if self._notification_cb:
       self._notification_cb()
 
+  def fresh_copy(self):
+    """Return a copy of this Measurement declaration with no value set.
+
+    Each run of a phase measures into fresh copies of the phase's measurements.
+    This is much cheaper than a deepcopy, since the declaration itself (units,
+    dimensions, validators) is shared rather than copied.
+
+    Returns:
+      A new Measurement.
+    """
+    return Measurement(self.name, units=self.units, dimensions=self.dimensions,
+                       docstring=self.docstring,
+                       validators=list(self.validators))
+
   def doc(self, docstring):
     """Set this Measurement's docstring, returns self for chaining."""
     self.docstring = docstring
@@ -261,7 +310,13 @@ class Measurement(  # pylint: disable=no-init
     """Validate this measurement and update its 'outcome' field."""
     # PASS if all our validators return True, otherwise FAIL.
     try:
-      if all(v(self.measured_value.value) for v in self.validators):
+      slot_count = self.measured_value.slot_count
+      if slot_count is None:
+        values = [self.measured_value.value]
+      else:
+        values = [self.measured_value.for_slot(slot).value
+                  for slot in range(slot_count)]
+      if all(v(value) for value in values for v in self.validators):
         self.outcome = Outcome.PASS
       else:
         self.outcome = Outcome.FAIL
@@ -367,6 +422,20 @@ class MeasuredValue(
     self._cached_value = data.convert_to_base_types(value)
     self.is_value_set = True
 
+  @property
+  def slot_count(self):
+    """Number of panel slots the value is for, or None if not a PerSlot."""
+    if isinstance(self.stored_value, PerSlot):
+      return len(self.stored_value)
+    return None
+
+  def for_slot(self, slot):
+    """Returns a MeasuredValue with the value of the given panel slot."""
+    slot_value = MeasuredValue(self.name)
+    if self.is_value_set:
+      slot_value.set(_slot_value(self.stored_value, slot))
+    return slot_value
+
 
 class Dimension(object):
   """Dimension for multi-dim Measurements.
@@ -437,36 +506,211 @@ class Dimension(object):
     return self._cached_dict
 
 
+class _Column(object):
+  """Growable column of the coordinates along a dimension, or of the values.
+
+  Numbers are stored in a typed array (int64 or float64) for as long as all of
+  the column's items are of the same type; any other item switches the column
+  to a plain list, so that items always read back as they were set.
+  """
+
+  def __init__(self, items=None):
+    self._items = items  # array.array or list; None until the first append.
+    self._exported = False  # Whether to_numpy() shares _items.
+
+  @staticmethod
+  def _typecode(item):
+    if isinstance(item, bool):
+      return None
+    if isinstance(item, numbers.Integral):
+      return _INT_TYPECODE
+    if isinstance(item, float):
+      return 'd'
+    return None
+
+  def __len__(self):
+    return len(self._items) if self._items is not None else 0
+
+  def __iter__(self):
+    return iter(self._items if self._items is not None else ())
+
+  def __getitem__(self, index):
+    return self._items[index]
+
+  def __copy__(self):
+    items = self._items
+    return _Column(copy.copy(items) if items is not None else None)
+
+  def _prepare_write(self, item):
+    """Copy exported items and switch to a list if item does not fit."""
+    if self._items is None:
+      typecode = self._typecode(item)
+      self._items = array.array(typecode) if typecode else []
+    elif self._exported:
+      self._items = copy.copy(self._items)
+    self._exported = False
+    if (isinstance(self._items, array.array) and
+        self._typecode(item) != self._items.typecode):
+      self._items = list(self._items)
+
+  def append(self, item):
+    self._prepare_write(item)
+    try:
+      self._items.append(item)
+    except OverflowError:
+      self._items = list(self._items)
+      self._items.append(item)
+
+  def __setitem__(self, index, item):
+    self._prepare_write(item)
+    try:
+      self._items[index] = item
+    except OverflowError:
+      self._items = list(self._items)
+      self._items[index] = item
+
+  def basetype_items(self, start):
+    """Returns the items from index start on, converted to base types."""
+    items = self._items[start:] if self._items is not None else []
+    if not isinstance(items, array.array):
+      return [data.convert_to_base_types(item) for item in items]
+    if items.typecode == 'd':
+      # Like data.convert_to_base_types(), which makes these JSON-safe.
+      return [str(item) if math.isinf(item) or math.isnan(item) else item
+              for item in items.tolist()]
+    return items.tolist()
+
+  def to_numpy(self):
+    """Returns a read-only NumPy array of the items, sharing typed arrays."""
+    if isinstance(self._items, array.array):
+      self._exported = True
+      items = numpy.frombuffer(self._items, dtype=self._items.typecode)
+    else:
+      items = numpy.asarray(self._items if self._items is not None else [])
+      if items.ndim != 1:
+        # E.g. tuples, which NumPy would stack into a 2-dimensional array.
+        items = numpy.empty(len(self._items), dtype=object)
+        items[:] = self._items
+    items.flags.writeable = False
+    return items
+
+
+class _Columns(list):
+  """List of _Column; copies of it copy each column, like a dict would be.
+
+  While rows are set in increasing order of coordinates, they are found by
+  binary search; rows_by_coordinates maps coordinates to rows once they are
+  not, and is None until then.  It is kept here so read-only views share it.
+  """
+
+  rows_by_coordinates = None
+
+  def __copy__(self):
+    columns = _Columns(copy.copy(column) for column in self)
+    if self.rows_by_coordinates is not None:
+      columns.rows_by_coordinates = dict(self.rows_by_coordinates)
+    return columns
+
+
+class _CoordinateRows(object):
+  """Sequence of the coordinate tuples of the rows of _Columns, for bisect."""
+
+  def __init__(self, columns):
+    self._columns = columns
+
+  def __len__(self):
+    return len(self._columns[-1])
+
+  def __getitem__(self, row):
+    return tuple(column[row] for column in self._columns[:-1])
+
+
 class DimensionedMeasuredValue(mutablerecords.Record(
     'DimensionedMeasuredValue', ['name', 'num_dimensions'],
     {'notify_value_set': None,
-     'value_dict': collections.OrderedDict,
-     '_cached_basetype_values': list})):
+     '_columns': None,
+     '_cached_basetype_values': list,
+     '_read_only': False})):
   """Class encapsulating actual values measured.
 
   See the MeasuredValue class docstring for more info.  This class provides a
-  dict-like interface for indexing into dimensioned measurements.
+  dict-like interface for indexing into dimensioned measurements, and extend()
+  to set many values at once.
+
+  Values are stored in columns: one per dimension with the coordinates along it,
+  then one with the values, in the order in which they were set.  Numeric
+  columns are typed arrays, which to_numpy() and to_dataframe() share rather
+  than copy.  Coordinates are looked up by binary search while they were set in
+increasing order, as in a sweep, and by an index built on demand otherwise.
 
   The _cached_basetype_values is a cached list of the dimensioned entries in
   order of being set.  Each list entry is a tuple that is composed of the key,
-  then the value.  This is set to None if a previous measurement is overridden;
-  in such a case, the list is fully reconstructed on the next call to
-  basetype_value.
+  then the value.  It is extended with the entries set since it was last
+  converted on each call to basetype_value, and set to None if a previous
+  measurement is overridden; in such a case, the list is fully reconstructed on
+  the next call to basetype_value.
   """
+
+  def __init__(self, *args, **kwargs):
+    # value_dict is accepted for compatibility with the dict-based storage.
+    value_dict = kwargs.pop('value_dict', None)
+    super(DimensionedMeasuredValue, self).__init__(*args, **kwargs)
+    if self._columns is None:
+      self._columns = _Columns(
+          _Column() for _ in range(self.num_dimensions + 1))
+    for coordinates, value in six.iteritems(value_dict or {}):
+      self._set(coordinates, value)
+
   def __str__(self):
     return str(self.value) if self.is_value_set else 'UNSET'
 
+  def __eq__(self, other):
+    return (type(self) == type(other) and self.name == other.name and
+            self.num_dimensions == other.num_dimensions and
+            list(self._iter_rows()) ==
+            list(other._iter_rows()))  # pylint: disable=protected-access
+
+  def __ne__(self, other):
+    return not self.__eq__(other)
+
+  def __setstate__(self, state):
+    state = dict(state)
+    # Records pickled before values were stored in columns have a value_dict.
+    value_dict = state.pop('value_dict', None)
+    # Records pickled before the index moved to the columns have it here.
+    rows_by_coordinates = state.pop('_rows_by_coordinates', None)
+    for attr, value in six.iteritems(state):
+      setattr(self, attr, value)
+    if rows_by_coordinates:
+      self._columns.rows_by_coordinates = rows_by_coordinates
+    if value_dict is not None:
+      self._columns = _Columns(
+          _Column() for _ in range(self.num_dimensions + 1))
+      self._cached_basetype_values = None
+      self._read_only = False
+      for coordinates, value in six.iteritems(value_dict):
+        self._set(coordinates, value)
+
   def with_notify(self, notify_value_set):
     self.notify_value_set = notify_value_set
     return self
 
+  def read_only_view(self):
+    """Returns a read-only DimensionedMeasuredValue sharing the values."""
+    return mutablerecords.CopyRecord(
+        self, notify_value_set=None, _columns=self._columns,
+        _cached_basetype_values=None, _read_only=True)
+
   @property
   def is_value_set(self):
-    return len(self.value_dict) > 0
+    return len(self._columns[-1]) > 0
 
   def __iter__(self):  # pylint: disable=invalid-name
     """Iterate over items, allows easy conversion to a dict."""
-    return iter(six.iteritems(self.value_dict))
+    return six.moves.zip(six.moves.zip(*self._columns[:-1]), self._columns[-1])
+
+  def _iter_rows(self):
+    return six.moves.zip(*self._columns)
 
   def __setitem__(self, coordinates, value):  # pylint: disable=invalid-name
     coordinates_len = len(coordinates) if hasattr(coordinates, '__len__') else 1
@@ -475,31 +719,104 @@ class DimensionedMeasuredValue(mutablerecords.Record(
           'Expected %s-dimensional coordinates, got %s' % (self.num_dimensions,
                                                            coordinates_len))
 
-    # Wrap single dimensions in a tuple so we can assume value_dict keys are
-    # always tuples later.
+    # Wrap single dimensions in a tuple so we can assume coordinates are always
+    # tuples later.
     if self.num_dimensions == 1:
       coordinates = (coordinates,)
 
-    if coordinates in self.value_dict:
-      _LOG.warning(
-          'Overriding previous measurement %s[%s] value of %s with %s',
-          self.name, coordinates, self.value_dict[coordinates], value)
-      self._cached_basetype_values = None
-    elif self._cached_basetype_values is not None:
-      self._cached_basetype_values.append(data.convert_to_base_types(
-          coordinates + (value,)))
-
-    self.value_dict[coordinates] = value
+    self._set(coordinates, value)
 
     if self.notify_value_set:
       self.notify_value_set()
 
+  def extend(self, coordinates, values):
+    """Set many values at once.
+
+    Args:
+      coordinates: The coordinates of the values.  For a one-dimensional
+          measurement, a sequence with the coordinate of each value; otherwise,
+          a sequence with, for each dimension, the sequence of the coordinates
+          of the values along it (e.g. one NumPy array per dimension).
+      values: Sequence of the values, in the same order as the coordinates.
+    """
+    if self.num_dimensions == 1:
+      coordinates = (coordinates,)
+    if len(coordinates) != self.num_dimensions:
+      raise InvalidDimensionsError(
+          'Expected coordinates along %s dimensions, got %s' % (
+              self.num_dimensions, len(coordinates)))
+    columns = [list(column) for column in coordinates] + [list(values)]
+    if any(len(column) != len(columns[-1]) for column in columns):
+      raise InvalidDimensionsError(
+          'Expected as many coordinates along each dimension as values, got '
+          '%s' % [len(column) for column in columns])
+
+    for row in six.moves.zip(*columns):
+      self._set(row[:-1], row[-1])
+
+    if columns[-1] and self.notify_value_set:
+      self.notify_value_set()
+
+  def _set(self, coordinates, value):
+    if self._read_only:
+      raise TypeError('Measurement %s is read-only.' % self.name)
+    columns = self._columns
+    if (columns.rows_by_coordinates is None and
+        not self._follows_last_row(coordinates)):
+      # The coordinates may have been set already, so index them all.
+      columns.rows_by_coordinates = {
+          row_coordinates: row for row, row_coordinates in enumerate(
+              six.moves.zip(*columns[:-1]))}
+    if columns.rows_by_coordinates is not None:
+      row = columns.rows_by_coordinates.get(coordinates)
+      if row is not None:
+        _LOG.warning(
+            'Overriding previous measurement %s[%s] value of %s with %s',
+            self.name, coordinates, columns[-1][row], value)
+        columns[-1][row] = value
+        self._cached_basetype_values = None
+        return
+      columns.rows_by_coordinates[coordinates] = len(columns[-1])
+    for column, item in zip(columns, coordinates + (value,)):
+      column.append(item)
+
+  def _follows_last_row(self, coordinates):
+    """Returns whether coordinates sort after those of every row set."""
+    rows = _CoordinateRows(self._columns)
+    if not rows:
+      return True
+    try:
+      return coordinates > rows[len(rows) - 1]
+    except TypeError:
+      return False
+
+  def _find_row(self, coordinates):
+    """Returns the row of the values set at coordinates, or None."""
+    if self._columns.rows_by_coordinates is not None:
+      return self._columns.rows_by_coordinates.get(coordinates)
+    rows = _CoordinateRows(self._columns)
+    try:
+      row = bisect.bisect_left(rows, coordinates)
+    except TypeError:
+      return None
+    if row < len(rows) and rows[row] == coordinates:
+      return row
+    return None
+
   def __getitem__(self, coordinates):  # pylint: disable=invalid-name
-    # Wrap single dimensions in a tuple so we can assume value_dict keys are
-    # always tuples later.
+    # Wrap single dimensions in a tuple so we can assume coordinates are always
+    # tuples later.
     if self.num_dimensions == 1:
       coordinates = (coordinates,)
-    return self.value_dict[coordinates]
+    row = self._find_row(coordinates)
+    if row is None:
+      raise KeyError(coordinates)
+    return self._columns[-1][row]
+
+  @property
+  def value_dict(self):
+    """OrderedDict mapping coordinate tuples to values, built on each access."""
+    return collections.OrderedDict(self)
 
   @property
   def value(self):
@@ -512,24 +829,56 @@ class DimensionedMeasuredValue(mutablerecords.Record(
     """
     if not self.is_value_set:
       raise MeasurementNotSetError('Measurement not yet set', self.name)
-    return [dimensions + (value,) for dimensions, value in
-            six.iteritems(self.value_dict)]
+    return list(self._iter_rows())
+
+  @property
+  def slot_count(self):
+    """Number of panel slots the values are for, or None if no PerSlot."""
+    for value in self._columns[-1]:
+      if isinstance(value, PerSlot):
+        return len(value)
+    return None
+
+  def for_slot(self, slot):
+    """Returns a DimensionedMeasuredValue with the values of a panel slot."""
+    slot_value = DimensionedMeasuredValue(self.name, self.num_dimensions)
+    for coordinates, value in self:
+      slot_value._set(  # pylint: disable=protected-access
+          coordinates, _slot_value(value, slot))
+    return slot_value
 
   def basetype_value(self):
     if self._cached_basetype_values is None:
-      self._cached_basetype_values = list(
-          data.convert_to_base_types(coordinates + (value,))
-          for coordinates, value in six.iteritems(self.value_dict))
+      self._cached_basetype_values = []
+    cached_count = len(self._cached_basetype_values)
+    if cached_count < len(self._columns[-1]):
+      self._cached_basetype_values.extend(six.moves.zip(*[
+          column.basetype_items(cached_count) for column in self._columns]))
     return self._cached_basetype_values
 
+  def to_numpy(self):
+    """Returns the columns of this record as one-dimensional NumPy arrays.
+
+    Returns:
+      A list with the coordinates along each dimension, then the values.
+      Numeric columns are read-only views of the stored values, not copies;
+      setting values later does not change them.
+    """
+    if not numpy:
+      raise RuntimeError('Install numpy to convert to NumPy arrays')
+    return [column.to_numpy() for column in self._columns]
+
   def to_dataframe(self, columns=None):
-    """Converts to a `pandas.DataFrame`"""
+    """Converts to a `pandas.DataFrame`, sharing numeric columns if possible."""
     if not self.is_value_set:
       raise ValueError('Value must be set before converting to a DataFrame.')
     if not pandas:
       raise RuntimeError('Install pandas to convert to pandas.DataFrame')
-    return pandas.DataFrame.from_records(self.value, columns=columns)
-
+    if columns is None:
+      columns = list(range(self.num_dimensions + 1))
+    return pandas.DataFrame(
+        collections.OrderedDict(zip(columns, self.to_numpy())),
+        columns=columns, copy=False)
 
 
 class Collection(mutablerecords.Record('Collection', ['_measurements'])):
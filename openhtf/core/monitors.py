@@ -47,6 +47,7 @@ def MyPhase(test):
 
 import functools
 import inspect
+import threading
 import time
 
 import openhtf
@@ -54,21 +55,52 @@ from openhtf import plugs
 from openhtf.core import measurements
 from openhtf.util import threads
 from openhtf.util import units as uom
+from openhtf.util import watchdog
 
 
-class _MonitorThread(threads.KillableThread):
+class _MonitorSampleTask(threads.KillableTask):
+  """Takes a sample of a monitor on a thread of the shared pool."""
 
-  daemon = True
+  def __init__(self, monitor):
+    super(_MonitorSampleTask, self).__init__(
+        name='%s_MonitorSample' % monitor.measurement_name)
+    self._monitor = monitor
+
+  def _thread_proc(self):
+    self._monitor.sample()
+
+  def _thread_exception(self, *args):
+    self._monitor.test_state.state_logger.error(
+        'Monitor for "%s" raised, stopping it.',
+        self._monitor.measurement_name, exc_info=args)
+    return True
+
+
+class _Monitor(object):
+  """Periodically samples a monitor function into a measurement.
+
+  Rather than sleeping between samples on a thread of its own, the monitor
+  schedules each sample with the shared Watchdog, which starts it as a task on
+  the shared thread pool when it is due.
+  """
 
   def __init__(self, measurement_name, monitor_desc, extra_kwargs, test_state,
                interval_ms):
-    super(_MonitorThread, self).__init__(
-        name='%s_MonitorThread' % measurement_name)
     self.measurement_name = measurement_name
     self.monitor_desc = monitor_desc
     self.test_state = test_state
     self.interval_ms = interval_ms
     self.extra_kwargs = extra_kwargs
+    self._lock = threading.Lock()
+    self._stopped = False
+    self._deadline = None
+    self._task = None
+    self._measurement = None
+    self._start_time = None
+    # The last sample number, and an approximation of the mean time it takes
+    # to sample (so we can account for it when scheduling the next sample).
+    self._last_sample = None
+    self._mean_sample_ms = None
 
   def get_value(self):
     arg_info = inspect.getargspec(self.monitor_desc.func)
@@ -81,43 +113,67 @@ class _MonitorThread(threads.KillableThread):
                 if arg in arg_info.args}
     return self.monitor_desc.with_args(**kwargs)(self.test_state)
 
-  def _thread_proc(self):
-    measurement = getattr(self.test_state.test_api.measurements,
-                          self.measurement_name)
-    start_time = time.time()
-
+  def start(self):
+    self._measurement = getattr(self.test_state.test_api.measurements,
+                                self.measurement_name)
+    self._start_time = time.time()
+    self._start_sample()
+
+  def stop(self):
+    """Stop sampling, killing the sample being taken, if any."""
+    with self._lock:
+      self._stopped = True
+      if self._deadline is not None:
+        self._deadline.cancel()
+      task = self._task
+    if task is not None:
+      task.kill()
+      task.join()
+
+  def _start_sample(self):
+    with self._lock:
+      if self._stopped:
+        return
+      self._task = _MonitorSampleTask(self)
+      self._task.start()
+
+  def _take_sample(self):
+    """Take a sample, returning its sample number and duration."""
+    pre_time, value, post_time = time.time(), self.get_value(), time.time()
+    self._measurement[(post_time - self._start_time) * 1000] = value
+    return (int((post_time - self._start_time) * 1000 / self.interval_ms),
+            (post_time - pre_time) * 1000)
+
+  def sample(self):
+    """Take a sample and schedule the next one; called by _MonitorSampleTask."""
     # Special case tight-loop monitoring.
     if not self.interval_ms:
       while True:
-        measurement[(time.time() - start_time) * 1000] = self.get_value()
-
-    # Helper to take sample, return sample number and sample duration.
-    def _take_sample():
-      pre_time, value, post_time = time.time(), self.get_value(), time.time()
-      measurement[(post_time - start_time) * 1000] = value
-      return (int((post_time - start_time) * 1000 / self.interval_ms),
-              (post_time - pre_time) * 1000)
-
-    # Track the last sample number, and an approximation of the mean time
-    # it takes to sample (so we can account for it in how long we sleep).
-    last_sample, mean_sample_ms = _take_sample()
-    while True:
-      # Find what sample number (float) we would be on if we sampled now.
-      current_time = time.time()
-      new_sample = ((((current_time - start_time) * 1000) + mean_sample_ms) /
-                    self.interval_ms)
-      if new_sample < last_sample + 1:
-        time.sleep(start_time - current_time +
-                   ((last_sample + 1) * self.interval_ms / 1000.0) -
-                   (mean_sample_ms / 1000.0))
-        continue
-      elif new_sample > last_sample + 2:
+        self._measurement[(time.time() - self._start_time) * 1000] = (
+            self.get_value())
+
+    if self._last_sample is None:
+      self._last_sample, self._mean_sample_ms = self._take_sample()
+    else:
+      # Find what sample number (float) we are on.
+      new_sample = ((((time.time() - self._start_time) * 1000) +
+                     self._mean_sample_ms) / self.interval_ms)
+      if new_sample > self._last_sample + 2:
         self.test_state.state_logger.warning(
             'Monitor for "%s" skipping %s sample(s).', self.measurement_name,
-            new_sample - last_sample - 1)
-      last_sample, cur_sample_ms = _take_sample()
+            new_sample - self._last_sample - 1)
+      self._last_sample, cur_sample_ms = self._take_sample()
       # Approximate 10-element sliding window average.
-      mean_sample_ms = ((9 * mean_sample_ms) + cur_sample_ms) / 10.0
+      self._mean_sample_ms = ((9 * self._mean_sample_ms) + cur_sample_ms) / 10.0
+
+    delay_s = (self._start_time +
+               ((self._last_sample + 1) * self.interval_ms / 1000.0) -
+               (self._mean_sample_ms / 1000.0) - time.time())
+    with self._lock:
+      if not self._stopped:
+        self._deadline = watchdog.Watchdog.shared().schedule(
+            max(0, delay_s), self._start_sample,
+            name='%s_Monitor' % self.measurement_name)
 
 
 def monitors(measurement_name, monitor_func, units=None, poll_interval_ms=1000):
@@ -139,15 +195,14 @@ def monitors(measurement_name, monitor_func, units=None, poll_interval_ms=1000):
             units).with_dimensions(uom.MILLISECOND))
     @functools.wraps(phase_desc.func)
     def monitored_phase_func(test_state, *args, **kwargs):
-      # Start monitor thread, it will run monitor_desc periodically.
-      monitor_thread = _MonitorThread(
+      # Start the monitor, it will run monitor_desc periodically.
+      monitor = _Monitor(
           measurement_name, monitor_desc, phase_desc.extra_kwargs, test_state,
           poll_interval_ms)
-      monitor_thread.start()
+      monitor.start()
       try:
         return phase_desc(test_state, *args, **kwargs)
       finally:
-        monitor_thread.kill()
-        monitor_thread.join()
+        monitor.stop()
     return monitored_phase_func
   return wrapper
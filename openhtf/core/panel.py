@@ -0,0 +1,203 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Multi-up execution of a test on a panel of DUTs.
+
+Panel fixtures test several boards at once, with a single instrument setup and
+sweep.  Rather than executing the test once per board, a panel test runs each
+phase once for the whole panel, and phases set each measurement to a PerSlot
+value, with one value per DUT slot:
+
+  @htf.measures(htf.Measurement('voltage').in_range(3.2, 3.4))
+  def measure_voltages(test, dmm):
+    test.measurements.voltage = htf.PerSlot(dmm.read_all())
+
+  test = htf.Test(measure_voltages)
+  test.add_output_callbacks(panel.SplitOutput(
+      json_factory.OutputToJSON('./{dut_id}.{start_time_millis}.json')))
+  test.execute(test_start=panel.trigger(scan_serial_numbers))
+
+The trigger sets the DUT IDs of the slots, in slot order.  SplitOutput passes
+its callbacks one TestRecord per DUT, with that DUT's ID, the value of each
+PerSlot measurement for its slot, and its own measurement, phase and test
+outcomes.  Everything else, like logs and attachments, is shared by the DUTs.
+"""
+
+import collections
+import logging
+
+import mutablerecords
+
+from openhtf.core import measurements
+from openhtf.core import phase_descriptor
+from openhtf.core import test_record
+from openhtf.util import conf
+import six
+
+_LOG = logging.getLogger(__name__)
+
+# Metadata keys of panel test records and of the records split from them.
+DUT_IDS_KEY = 'panel_dut_ids'
+PANEL_ID_KEY = 'panel_id'
+SLOT_KEY = 'panel_slot'
+
+
+class PanelSizeError(Exception):
+  """Raised when a PerSlot value does not have one value per DUT slot."""
+
+
+def set_dut_ids(test_api, dut_ids, panel_id=None):
+  """Sets the DUT IDs of the slots of the panel under test.
+
+  Args:
+    test_api: openhtf.TestApi of the running test.
+    dut_ids: DUT IDs of the panel's slots, in slot order.
+    panel_id: DUT ID of the panel test record itself; defaults to the DUT IDs
+        of the slots joined with '+'.
+  """
+  dut_ids = [str(dut_id) for dut_id in dut_ids]
+  if not dut_ids:
+    raise ValueError('A panel needs at least one DUT slot.')
+  test_api.test_record.metadata[DUT_IDS_KEY] = dut_ids
+  test_api.dut_id = panel_id or '+'.join(dut_ids)
+
+
+def dut_ids(test_api_or_record):
+  """Returns the DUT IDs of the panel's slots, or None if not a panel test."""
+  record = getattr(test_api_or_record, 'test_record', test_api_or_record)
+  return record.metadata.get(DUT_IDS_KEY)
+
+
+def trigger(get_dut_ids):
+  """Returns a trigger phase starting a panel test, for Test.execute().
+
+  Args:
+    get_dut_ids: Function returning the DUT IDs of the panel's slots, in slot
+        order, e.g. from a barcode scan of each board.
+  """
+  @phase_descriptor.PhaseOptions(name='panel_trigger')
+  def panel_trigger(test):
+    set_dut_ids(test, get_dut_ids())
+  return panel_trigger
+
+
+def _split_measurement(measurement, slot, slot_count):
+  """Returns the measurement of a slot, or the measurement if not per slot."""
+  value_slot_count = measurement.measured_value.slot_count
+  if value_slot_count is None:
+    return measurement
+  if value_slot_count != slot_count:
+    raise PanelSizeError(
+        'Measurement %s has %d values per slot, but the panel has %d slots.' %
+        (measurement.name, value_slot_count, slot_count))
+  slot_measurement = mutablerecords.CopyRecord(
+      measurement, measured_value=measurement.measured_value.for_slot(slot),
+      _notification_cb=None, _cached=None)
+  try:
+    slot_measurement.validate()
+  except Exception:  # pylint: disable=broad-except
+    # validate() already set the outcome to FAIL and logged the exception.
+    pass
+  return slot_measurement
+
+
+def _measurements_pass(measurements_by_name):
+  allowed_outcomes = {measurements.Outcome.PASS}
+  if conf.allow_unset_measurements:
+    allowed_outcomes.add(measurements.Outcome.UNSET)
+  return all(measurement.outcome in allowed_outcomes
+             for measurement in six.itervalues(measurements_by_name))
+
+
+def _split_phase_record(phase_record, slot, slot_count):
+  if not phase_record.measurements:
+    return phase_record
+  slot_measurements = collections.OrderedDict(
+      (name, _split_measurement(measurement, slot, slot_count))
+      for name, measurement in six.iteritems(phase_record.measurements))
+  outcome = phase_record.outcome
+  if outcome in (test_record.PhaseOutcome.PASS, test_record.PhaseOutcome.FAIL):
+    fail_and_continue = (phase_record.result is not None and
+                         phase_record.result.is_fail_and_continue)
+    outcome = (test_record.PhaseOutcome.PASS
+               if not fail_and_continue and
+               _measurements_pass(slot_measurements)
+               else test_record.PhaseOutcome.FAIL)
+  return mutablerecords.CopyRecord(
+      phase_record, measurements=slot_measurements, outcome=outcome)
+
+
+def split_record(record):
+  """Splits the record of a panel test into one record per DUT.
+
+  Args:
+    record: test_record.TestRecord of a panel test.
+
+  Returns:
+    A list with a test_record.TestRecord for each slot of the panel, in slot
+    order, or [record] if the record is not of a panel test.
+
+  Raises:
+    PanelSizeError: if a PerSlot value does not have a value for each slot.
+  """
+  slot_dut_ids = dut_ids(record)
+  if not slot_dut_ids:
+    return [record]
+  slot_count = len(slot_dut_ids)
+  slot_records = []
+  for slot, dut_id in enumerate(slot_dut_ids):
+    metadata = dict(record.metadata)
+    metadata[PANEL_ID_KEY] = record.dut_id
+    metadata[SLOT_KEY] = slot
+    slot_record = test_record.TestRecord(
+        dut_id, record.station_id, start_time_millis=record.start_time_millis,
+        end_time_millis=record.end_time_millis, outcome=record.outcome,
+        outcome_details=list(record.outcome_details),
+        code_info=record.code_info, metadata=metadata)
+    for phase_record in record.phases:
+      slot_record.add_phase_record(
+          _split_phase_record(phase_record, slot, slot_count))
+    for log_record in record.log_records:
+      slot_record.add_log_record(log_record)
+    # A panel that failed only because of other DUTs passes for this one; any
+    # other outcome (errors, timeouts, aborts, stops) applies to all DUTs.
+    if (record.outcome in (test_record.Outcome.PASS, test_record.Outcome.FAIL)
+        and not record.outcome_details):
+      slot_record.outcome = (
+          test_record.Outcome.FAIL
+          if slot_record.count_phases(test_record.PhaseOutcome.FAIL)
+          else test_record.Outcome.PASS)
+    slot_records.append(slot_record)
+  return slot_records
+
+
+class SplitOutput(object):
+  """Output callback passing its callbacks one test record per panel DUT.
+
+  Records of tests that are not panel tests are passed through as they are.
+  """
+
+  def __init__(self, *output_callbacks):
+    self.output_callbacks = output_callbacks
+
+  def __call__(self, record):
+    for slot_record in split_record(record):
+      for output_cb in self.output_callbacks:
+        try:
+          output_cb(slot_record)
+        except Exception:  # pylint: disable=broad-except
+          _LOG.exception(
+              'Output callback %s raised for DUT %s; continuing anyway',
+              output_cb, slot_record.dut_id)
@@ -19,9 +19,12 @@ Phases in OpenHTF are distinct steps in a test.  Each phase is an instance
 of PhaseDescriptor class.
 
 """
+import collections
 import inspect
+import itertools
 import pdb
 import sys
+import weakref
 
 import enum
 import mutablerecords
@@ -64,7 +67,8 @@ PhaseResult = enum.Enum('PhaseResult', [   # pylint: disable=invalid-name
 
 class PhaseOptions(mutablerecords.Record('PhaseOptions', [], {
     'name': None, 'timeout_s': None, 'run_if': None, 'requires_state': None,
-    'repeat_limit': None, 'run_under_pdb': False})):
+    'repeat_limit': None, 'run_under_pdb': False, 'depends_on': None,
+    'run_in_subprocess': False, 'repeat_in_place': False})):
   """Options used to override default test phase behaviors.
 
   Attributes:
@@ -82,6 +86,24 @@ class PhaseOptions(mutablerecords.Record('PhaseOptions', [], {
     run_under_pdb: If True, run the phase under the Python Debugger (pdb).  When
         setting this option, increase the phase timeout as well because the
         timeout will still apply when under the debugger.
+    depends_on: Phases (or PhaseGroups) that must finish before this phase
+        starts, given as names, PhaseDescriptors, phase functions or PhaseGroups
+        (or a list of these); stored as a tuple of names.  Dependencies must be
+        siblings of the phase in the same PhaseGroup.  In the main phases of a
+        parallel PhaseGroup, each phase starts as soon as its dependencies have
+        finished; elsewhere, dependencies must be declared before the phase.
+    run_in_subprocess: If True, run the phase function in a worker process, so
+        that CPU-heavy phases don't hold the GIL of the test process.  Plugs
+        are accessed through proxies; see phase_subprocess.py for details and
+        restrictions.
+    repeat_in_place: If True, repeat the phase (when it returns REPEAT) within
+        a single run: the attempts share one worker, one set of measurements
+        and one PhaseRecord, which records a test_record.RepeatSummary of them
+        instead of a PhaseRecord per attempt.  This is much cheaper for phases
+        that poll for a condition.  Values set by an attempt are kept unless a
+        later attempt overwrites them, an attempt that raises an exception
+        ends the phase with an ERROR as usual, and timeout_s applies to all
+        the attempts together.
 
   Example Usages:
     @PhaseOptions(timeout_s=1)
@@ -91,18 +113,34 @@ class PhaseOptions(mutablerecords.Record('PhaseOptions', [], {
     @PhaseOptions(name='Phase({port})')
     def PhaseFunc(test, port, other_info):
       pass
+
+    @PhaseOptions(depends_on=[PhaseFunc])
+    def OtherPhaseFunc(test):
+      pass
+
+    @PhaseOptions(repeat_in_place=True, repeat_limit=100, timeout_s=60)
+    def WaitForBoot(test, dut):
+      if not dut.is_booted():
+        return PhaseResult.REPEAT
   """
 
   def format_strings(self, **kwargs):
-    """String substitution of name."""
+    """String substitution of name (and names of dependencies)."""
+    depends_on = self.depends_on
+    if depends_on:
+      depends_on = tuple(util.format_string(name, kwargs)
+                         for name in depends_on)
     return mutablerecords.CopyRecord(
-        self, name=util.format_string(self.name, kwargs))
+        self, name=util.format_string(self.name, kwargs),
+        depends_on=depends_on)
 
   def update(self, **kwargs):
     for key, value in six.iteritems(kwargs):
       if key not in self.__slots__:
         raise AttributeError('Type %s does not have attribute %s' % (
             type(self).__name__, key))
+      if key == 'depends_on' and value is not None:
+        value = _dependency_names(value)
       setattr(self, key, value)
 
   def __call__(self, phase_func):
@@ -110,12 +148,59 @@ class PhaseOptions(mutablerecords.Record('PhaseOptions', [], {
     for attr in self.__slots__:
       value = getattr(self, attr)
       if value is not None:
-        setattr(phase.options, attr, value)
+        phase.options.update(**{attr: value})
     return phase
 
+
+def _dependency_names(depends_on):
+  """Convert a depends_on option value to a tuple of phase (or group) names."""
+  if (isinstance(depends_on, (six.string_types, PhaseDescriptor,
+                              openhtf.PhaseGroup)) or callable(depends_on)):
+    depends_on = [depends_on]
+  names = []
+  for dependency in depends_on:
+    if isinstance(dependency, six.string_types):
+      names.append(dependency)
+    elif isinstance(dependency, (PhaseDescriptor, openhtf.PhaseGroup)):
+      if not dependency.name:
+        raise ValueError('Cannot depend on an unnamed PhaseGroup.')
+      names.append(dependency.name)
+    else:
+      names.append(dependency.__name__)
+  return tuple(names)
+
 TestPhase = PhaseOptions
 
 
+# The argument info of phase functions, only computed once per function since a
+# phase is typically called many times (every time its test is executed).
+ArgInfo = collections.namedtuple('ArgInfo', ['varargs', 'keywords', 'args'])
+_ARG_INFO_CACHE = weakref.WeakKeyDictionary()
+
+
+def _get_arg_info(func):
+  """Return the (cached) ArgInfo of func."""
+  try:
+    return _ARG_INFO_CACHE[func]
+  except KeyError:
+    pass
+  except TypeError:
+    # Can't be weakly referenced, so can't be cached.
+    return _make_arg_info(func)
+  arg_info = _ARG_INFO_CACHE[func] = _make_arg_info(func)
+  return arg_info
+
+
+def _make_arg_info(func):
+  if sys.version_info[0] < 3:
+    arg_spec = inspect.getargspec(func)
+    keywords = arg_spec.keywords
+  else:
+    arg_spec = inspect.getfullargspec(func)
+    keywords = arg_spec.varkw
+  return ArgInfo(bool(arg_spec.varargs), bool(keywords), len(arg_spec.args))
+
+
 class PhaseDescriptor(mutablerecords.Record(
     'PhaseDescriptor', ['func'],
     {'options': PhaseOptions, 'plugs': list, 'measurements': list,
@@ -263,6 +348,10 @@ class PhaseDescriptor(mutablerecords.Record(
     any case, keyword args are passed in based on extra_kwargs, set via
     with_args(), combined with plugs (plugs override extra_kwargs).
 
+    If the phase function is a coroutine function (async def), this returns the
+    coroutine, which the caller must run; the PhaseExecutorThread runs it on the
+    test's event loop.
+
     Args:
       test_state: test_state.TestState for the currently executing Test.
 
@@ -273,16 +362,11 @@ class PhaseDescriptor(mutablerecords.Record(
     kwargs.update(test_state.plug_manager.provide_plugs(
         (plug.name, plug.cls) for plug in self.plugs if plug.update_kwargs))
 
-    if sys.version_info[0] < 3:
-      arg_info = inspect.getargspec(self.func)
-      keywords = arg_info.keywords
-    else:
-      arg_info = inspect.getfullargspec(self.func)
-      keywords = arg_info.varkw
+    arg_info = _get_arg_info(self.func)
     # Pass in test_api if the phase takes *args, or **kwargs with at least 1
     # positional, or more positional args than we have keyword args.
-    if arg_info.varargs or (keywords and len(arg_info.args) >= 1) or (
-        len(arg_info.args) > len(kwargs)):
+    if arg_info.varargs or (arg_info.keywords and arg_info.args >= 1) or (
+        arg_info.args > len(kwargs)):
       args = []
       if self.options.requires_state:
         args.append(test_state)
@@ -297,3 +381,91 @@ class PhaseDescriptor(mutablerecords.Record(
       return pdb.runcall(self.func, **kwargs)
     else:
       return self.func(**kwargs)
+
+
+def _is_format_target(target):
+  """True if util.format_string() may change target."""
+  return callable(target) or (isinstance(target, six.string_types) and
+                              ('{' in target or '%' in target))
+
+
+def _needs_formatting(measurement, kwargs):
+  """True if measurement.with_args(**kwargs) may differ from measurement."""
+  return (_is_format_target(measurement.name) or
+          _is_format_target(measurement.docstring) or
+          any(hasattr(validator, 'with_args') and
+              validator.with_args(**kwargs) is not validator
+              for validator in measurement.validators))
+
+
+class PhaseSweep(PhaseDescriptor):
+  """A phase run once for each combination of the values of some parameters.
+
+  This is equivalent to a list of copies of the phase made with with_args(),
+  one per combination of values, but the copies are only made as each one runs,
+  and measurement declarations that with_args() would not change are shared
+  rather than copied:
+
+    sweep = openhtf.PhaseSweep.over(
+        measure_gain, ('frequency', [1e9, 2e9]), ('power', range(-10, 10)))
+
+  The first parameter varies slowest.  Each combination of values is passed to
+  the phase as keyword arguments, and used to format the names of the phase and
+  of its measurements (e.g. 'gain_{frequency}_{power}').  A phase of the sweep
+  that is terminal ends the sweep.
+
+  Attributes:
+    parameters: Tuple of (name, tuple of values) pairs.
+  """
+
+  optional_attributes = {'parameters': tuple}
+
+  @classmethod
+  def over(cls, phase, *parameters, **parameter_values):
+    """Create a sweep of phase over the given parameters.
+
+    Args:
+      phase: Phase function or PhaseDescriptor to sweep.
+      *parameters: (name, iterable of values) pairs, in order.
+      **parameter_values: Iterables of values by parameter name; these come
+          after the positional parameters, sorted by name.
+
+    Returns:
+      A new PhaseSweep.
+    """
+    parameters = list(parameters) + sorted(six.iteritems(parameter_values))
+    phase = PhaseDescriptor.wrap_or_copy(phase)
+    fields = {attr: getattr(phase, attr) for attr in phase.__slots__}
+    fields['parameters'] = tuple((name, tuple(values))
+                                 for name, values in parameters)
+    return cls(**fields)
+
+  @property
+  def point_count(self):
+    """Number of combinations of values, i.e. of phases the sweep runs."""
+    count = 1
+    for _, values in self.parameters:
+      count *= len(values)
+    return count
+
+  def iter_points(self):
+    """Yields a PhaseDescriptor for each combination of values, in order."""
+    names = [name for name, _ in self.parameters]
+    formatted = None
+    for values in itertools.product(*[values for _, values in self.parameters]):
+      kwargs = dict(zip(names, values))
+      if formatted is None:
+        formatted = [index for index, measurement
+                     in enumerate(self.measurements)
+                     if _needs_formatting(measurement, kwargs)]
+      measurements = self.measurements
+      if formatted:
+        measurements = list(measurements)
+        for index in formatted:
+          measurements[index] = measurements[index].with_args(**kwargs)
+      extra_kwargs = dict(self.extra_kwargs)
+      extra_kwargs.update(kwargs)
+      yield PhaseDescriptor(
+          self.func, options=self.options.format_strings(**kwargs),
+          plugs=self.plugs, measurements=measurements,
+          extra_kwargs=extra_kwargs, code_info=self.code_info)
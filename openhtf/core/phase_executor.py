@@ -25,26 +25,38 @@ A phase may also return None, or have no return statement, which is the same as
 returning openhtf.PhaseResult.CONTINUE.  These results are then acted upon
 accordingly and a new test run status is returned.
 
-Phases are always run in order and not allowed to loop back, though a phase may
-choose to repeat itself by returning REPEAT. Returning STOP will cause a test
-to stop early, allowing a test to detect a bad state and not waste any further
-time. A phase should not return TIMEOUT or ABORT, those are handled by the
-framework.
+Phases are always run in order and not allowed to loop back (unless they are
+the main phases of a parallel PhaseGroup, see phase_group.py), though a phase
+may choose to repeat itself by returning REPEAT. Returning STOP will cause a
+test to stop early, allowing a test to detect a bad state and not waste any
+further time. A phase should not return TIMEOUT or ABORT, those are handled by
+the framework.
 """
 
 import collections
 import logging
 import sys
 import threading
-import time
 import traceback
 
 import openhtf
+from openhtf import util
+from openhtf.core import phase_subprocess
+from openhtf.core import test_record
 from openhtf.util import argv
+from openhtf.util import coroutines
+from openhtf.util import instrumentation
 from openhtf.util import threads
 from openhtf.util import timeouts
+from openhtf.util import watchdog
 
 DEFAULT_PHASE_TIMEOUT_S = 3 * 60
+# Phases that finish with less than this fraction of their timeout left are
+# logged, as they may time out intermittently.
+_TIMEOUT_WARNING_MARGIN = 0.1
+# Seconds that stopped phases watching their cancellation token get to stop on
+# their own before they are killed.
+_CANCEL_GRACE_PERIOD_S = 0.1
 
 ARG_PARSER = argv.ModuleParser()
 ARG_PARSER.add_argument(
@@ -69,6 +81,10 @@ class ExceptionInfo(collections.namedtuple(
   def __str__(self):
     return self.exc_type.__name__
 
+  def __reduce__(self):
+    # Tracebacks can't be pickled, so pickled ExceptionInfos don't have one.
+    return type(self), (self.exc_type, self.exc_val, None)
+
 
 class InvalidPhaseResultError(Exception):
   """Raised when PhaseExecutionOutcome is created with invalid phase result."""
@@ -133,27 +149,51 @@ class PhaseExecutionOutcome(collections.namedtuple(
         ExceptionInfo, threads.ThreadTerminationError))
 
 
-class PhaseExecutorThread(threads.KillableThread):
+def declared_timeout_s(phase_desc):
+  """Returns the timeout_s option of a phase, or the default timeout."""
+  if phase_desc.options.timeout_s is None:
+    return DEFAULT_PHASE_TIMEOUT_S
+  return phase_desc.options.timeout_s
+
+
+class PhaseExecutorThread(coroutines.KillableCoroutineTask):
   """Handles the execution and result of a single test phase.
 
+  The phase runs on a worker thread of the shared KillableThreadPool, rather
+  than on a thread of its own.  Coroutine (async def) phases run on the test's
+  event loop, and are cancelled rather than killed on timeout or abort.
+
   The phase outcome will be stored in the _phase_execution_outcome attribute
   once it is known (_phase_execution_outcome is None until then), and it will be
   a PhaseExecutionOutcome instance.
   """
-  daemon = True
 
-  def __init__(self, phase_desc, test_state, run_with_profiling):
+  def __init__(self, phase_desc, test_state, run_with_profiling,
+               phase_state=None, event_loop=None, timeout_s=None):
     super(PhaseExecutorThread, self).__init__(
-        name='<PhaseExecutorThread: (phase_desc.name)>',
-        run_with_profiling=run_with_profiling)
+        name=phase_desc.name, run_with_profiling=run_with_profiling,
+        event_loop=event_loop)
     self._phase_desc = phase_desc
+    # Overrides the timeout of the phase, e.g. with an adaptive timeout.
+    self._timeout_s = timeout_s
     self._test_state = test_state
+    self._phase_state = phase_state
     self._phase_execution_outcome = None
 
   def _thread_proc(self):
     """Execute the encompassed phase and save the result."""
     # Call the phase, save the return value, or default it to CONTINUE.
-    phase_return = self._phase_desc(self._test_state)
+    if self._phase_state is not None:
+      # Bind the phase to this thread so the phase sees its own TestApi, even
+      # if other phases are running in parallel.
+      with self._test_state.bind_running_phase_state(self._phase_state):
+        with threads.bind_cancellation_token(
+            self._phase_state.cancellation_token):
+          with instrumentation.bind(self._phase_state.phase_record.timings):
+            with instrumentation.section(instrumentation.PHASE):
+              phase_return = self._run_phase()
+    else:
+      phase_return = self._run_phase()
     if phase_return is None:
       phase_return = openhtf.PhaseResult.CONTINUE
 
@@ -161,6 +201,40 @@ class PhaseExecutorThread(threads.KillableThread):
     # will get set to the InvalidPhaseResultError in _thread_exception instead.
     self._phase_execution_outcome = PhaseExecutionOutcome(phase_return)
 
+  def _run_phase(self):
+    if self._phase_desc.options.repeat_in_place and self._phase_state:
+      return self._repeat_phase_in_place()
+    return self._call_phase()
+
+  def _repeat_phase_in_place(self):
+    """Call the phase until it doesn't return REPEAT or hits its repeat limit.
+
+    An exception raised by an attempt is recorded in the phase's RepeatSummary
+    and ends the phase, as it would without repeat_in_place.
+    """
+    summary = test_record.RepeatSummary()
+    self._phase_state.phase_record.repeat_summary = summary
+    repeat_limit = self._phase_desc.options.repeat_limit or sys.maxsize
+    while True:
+      start_time_millis = util.time_millis()
+      try:
+        phase_return = self._call_phase()
+      except Exception as e:  # pylint: disable=broad-except
+        summary.record_attempt(start_time_millis, error=e)
+        raise
+      summary.record_attempt(start_time_millis)
+      if (phase_return is not openhtf.PhaseResult.REPEAT or
+          summary.count >= repeat_limit):
+        return phase_return
+
+  def _call_phase(self):
+    if self._phase_desc.options.run_in_subprocess:
+      return phase_subprocess.run_phase(self._phase_desc, self._test_state)
+    phase_return = self._phase_desc(self._test_state)
+    if coroutines.iscoroutine(phase_return):
+      return self._run_coroutine(phase_return)
+    return phase_return
+
   def _log_exception(self, *args):
     """Log exception, while allowing unit testing to override."""
     self._test_state.state_logger.critical(*args)
@@ -172,10 +246,17 @@ class PhaseExecutorThread(threads.KillableThread):
 
   def join_or_die(self):
     """Wait for thread to finish, returning a PhaseExecutionOutcome instance."""
-    if self._phase_desc.options.timeout_s is not None:
-      self.join(self._phase_desc.options.timeout_s)
-    else:
-      self.join(DEFAULT_PHASE_TIMEOUT_S)
+    timeout_s = self._timeout_s
+    if timeout_s is None:
+      timeout_s = declared_timeout_s(self._phase_desc)
+    deadline = watchdog.Watchdog.shared().wait(
+        self, timeout_s, on_expired=self._time_out, name=str(self))
+    if self._phase_state is not None:
+      self._phase_state.phase_record.timeout_margin_s = deadline.margin_s
+    if (not deadline.expired and
+        deadline.margin_s < _TIMEOUT_WARNING_MARGIN * timeout_s):
+      _LOG.warning('Phase %s took %.3f s, close to its timeout of %s s.',
+                   self._phase_desc.name, deadline.elapsed_s, timeout_s)
 
     # We got a return value or an exception and handled it.
     if isinstance(self._phase_execution_outcome, PhaseExecutionOutcome):
@@ -183,13 +264,30 @@ class PhaseExecutorThread(threads.KillableThread):
 
     # Check for timeout, indicated by None for
     # PhaseExecutionOutcome.phase_result.
-    if self.is_alive():
-      self.kill()
+    if deadline.expired:
       return PhaseExecutionOutcome(None)
 
     # Phase was killed.
     return PhaseExecutionOutcome(threads.ThreadTerminationError())
 
+  def _time_out(self):
+    """Called by the watchdog when the phase runs past its timeout."""
+    self.cancel()
+    self.kill()
+
+  def cancel(self):
+    """Cancel the phase's cancellation token.
+
+    Returns:
+      True if the phase (or a plug it uses) has watched its cancellation token,
+      so it may stop on its own.
+    """
+    if self._phase_state is None:
+      return False
+    token = self._phase_state.cancellation_token
+    token.cancel()
+    return token.observed
+
   @property
   def name(self):
     return str(self)
@@ -201,12 +299,17 @@ class PhaseExecutorThread(threads.KillableThread):
 class PhaseExecutor(object):
   """Encompasses the execution of the phases of a test."""
 
-  def __init__(self, test_state):
+  def __init__(self, test_state, event_loop=None, timing_history=None):
     self.test_state = test_state
+    # The coroutines.EventLoopThread that coroutine phases run on.
+    self._event_loop = event_loop
+    # The timing_history.TimingHistory adaptive timeouts are derived from.
+    self._timing_history = timing_history
     # This lock exists to prevent stop() calls from being ignored if called when
     # _execute_phase_once is setting up the next phase thread.
     self._current_phase_thread_lock = threading.Lock()
-    self._current_phase_thread = None
+    # More than one phase thread may be running if phases are run in parallel.
+    self._current_phase_threads = set()
     self._stopping = threading.Event()
 
   def execute_phase(self, phase, run_with_profiling=False):
@@ -225,6 +328,12 @@ class PhaseExecutor(object):
       The second tuple item is the profiler Stats object if profiling was
       requested and successfully ran for this phase execution.
     """
+    if phase.options.repeat_in_place:
+      # The phase thread repeats the phase itself, so there is a single run.
+      if self._stopping.is_set():
+        return PhaseExecutionOutcome(None), None
+      return self._execute_phase_once(phase, True, run_with_profiling)
+
     repeat_count = 1
     repeat_limit = phase.options.repeat_limit or sys.maxsize
     while not self._stopping.is_set():
@@ -255,25 +364,30 @@ class PhaseExecutor(object):
         # Checking _stopping must be in the lock context, otherwise there is a
         # race condition: this thread checks _stopping and then switches to
         # another thread where stop() sets _stopping and checks
-        # _current_phase_thread (which would not be set yet).  In that case, the
-        # new phase thread will be still be started.
+        # _current_phase_threads (which would not be updated yet).  In that
+        # case, the new phase thread will be still be started.
         if self._stopping.is_set():
           # PhaseRecord will be written at this point, so ensure that it has a
           # Killed result.
           result = PhaseExecutionOutcome(threads.ThreadTerminationError())
           phase_state.result = result
           return result, None
-        phase_thread = PhaseExecutorThread(phase_desc, self.test_state,
-                                           run_with_profiling)
+        phase_thread = PhaseExecutorThread(
+            phase_desc, self.test_state, run_with_profiling,
+            phase_state=phase_state, event_loop=self._event_loop,
+            timeout_s=self._timeout_s(phase_desc))
         phase_thread.start()
-        self._current_phase_thread = phase_thread
+        self._current_phase_threads.add(phase_thread)
 
-      phase_state.result = phase_thread.join_or_die()
+      try:
+        phase_state.result = phase_thread.join_or_die()
+      finally:
+        with self._current_phase_thread_lock:
+          self._current_phase_threads.discard(phase_thread)
       if phase_state.result.is_repeat and is_last_repeat:
         _LOG.error('Phase returned REPEAT, exceeding repeat_limit.')
         phase_state.hit_repeat_limit = True
         override_result = PhaseExecutionOutcome(openhtf.PhaseResult.STOP)
-      self._current_phase_thread = None
 
     # Refresh the result in case a validation for a partially set measurement
     # raised an exception.
@@ -283,32 +397,62 @@ class PhaseExecutor(object):
     return (result,
             phase_thread.get_profile_stats() if run_with_profiling else None)
 
+  def _timeout_s(self, phase_desc):
+    """Returns the timeout of phase_desc, adapted to its timing history."""
+    timeout_s = declared_timeout_s(phase_desc)
+    if self._timing_history is None:
+      return timeout_s
+    adaptive_timeout_s = self._timing_history.timeout_s(phase_desc, timeout_s)
+    if adaptive_timeout_s < timeout_s:
+      _LOG.debug('Phase %s has an adaptive timeout of %.1f s (declared %s s).',
+                 phase_desc.name, adaptive_timeout_s, timeout_s)
+    return adaptive_timeout_s
+
   def reset_stop(self):
     self._stopping.clear()
 
   def stop(self, timeout_s=None):
-    """Stops execution of the current phase, if any.
+    """Stops execution of the current phases, if any.
 
-    It will raise a ThreadTerminationError, which will cause the test to stop
-    executing and terminate with an ERROR state.
+    The cancellation token of each running phase is cancelled.  Phases that
+    watch their token (see TestApi.cancellation_token) get a short grace period
+    to stop on their own; the others are killed right away, by raising a
+    ThreadTerminationError in them.  Either way, the test stops executing and
+    terminates with an ABORTED state.
 
     Args:
-      timeout_s: int or None, timeout in seconds to wait for the phase to stop.
+      timeout_s: int or None, timeout in seconds to wait for the phases to stop.
     """
     self._stopping.set()
     with self._current_phase_thread_lock:
-      phase_thread = self._current_phase_thread
-      if not phase_thread:
+      phase_threads = list(self._current_phase_threads)
+      if not phase_threads:
         return
 
-    if phase_thread.is_alive():
-      phase_thread.kill()
-
+    phase_threads = [thread for thread in phase_threads if thread.is_alive()]
+    cooperative_threads = []
+    for phase_thread in phase_threads:
+      if phase_thread.cancel():
+        cooperative_threads.append(phase_thread)
+      else:
+        phase_thread.kill()
+
+    timeout = timeouts.PolledTimeout.from_seconds(timeout_s)
+    # Having checked the token once doesn't mean a phase is still watching it,
+    # e.g. it may since have blocked on I/O, so only wait a little.
+    grace_period = timeouts.PolledTimeout.from_seconds(
+        _CANCEL_GRACE_PERIOD_S if timeout_s is None
+        else min(_CANCEL_GRACE_PERIOD_S, timeout_s))
+    for phase_thread in cooperative_threads:
+      phase_thread.join(grace_period.remaining)
+      if phase_thread.is_alive():
+        _LOG.debug('Cancelled phase %s did not stop on its own, killing it.',
+                   phase_thread)
+        phase_thread.kill()
+    for phase_thread in phase_threads:
       _LOG.debug('Waiting for cancelled phase to exit: %s', phase_thread)
-      timeout = timeouts.PolledTimeout.from_seconds(timeout_s)
-      while phase_thread.is_alive() and not timeout.has_expired():
-        time.sleep(0.1)
+      phase_thread.join(timeout.remaining)
       _LOG.debug('Cancelled phase %s exit',
                  "didn't" if phase_thread.is_alive() else 'did')
-    # Clear the currently running phase, whether it finished or timed out.
+    # Clear the currently running phases, whether they finished or timed out.
     self.test_state.stop_running_phase()
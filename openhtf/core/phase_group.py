@@ -28,11 +28,23 @@ PhaseGroup instances have three primary member fields:
       as the PhaseGroup was entered.  If any are terminal, other teardown phases
       will continue to be run.  One exception is that a second CTRL-C sent to
       the main thread will abort all teardown phases.
-There is one optional field:
+There are three optional fields:
   `name`: str, an arbitrary description used for logging.
+  `parallel`: bool, if True, the main phases are run concurrently instead of in
+      order.  Setup phases still all run (in order) before any main phase, and
+      teardown phases still run (in order) once every main phase has finished.
+      Phase records are added to the test record in the order the main phases
+      were declared, regardless of the order in which they finish.
+  `worker`: str, 'host:port' of a distributed.GroupWorker to run the whole
+      group on, with the worker's own plugs, instead of in the test process.
 
 PhaseGroup instances can be nested inside of each other.  A PhaseGroup is
 terminal if any of its Phases or further nested PhaseGroups are also terminal.
+
+Phases may declare dependencies on sibling phases or (named) PhaseGroups with
+the depends_on phase option.  In a parallel PhaseGroup, these make the main
+phases run as a DAG: each one starts once the siblings it depends on have
+finished.  See validate_dependencies() for the rules.
 """
 
 import collections
@@ -44,21 +56,35 @@ from openhtf.core import phase_descriptor
 from openhtf.core import test_record
 
 
+class InvalidPhaseDependencyError(Exception):
+  """Raised when the depends_on option of a phase is invalid."""
+
+
 class PhaseGroup(mutablerecords.Record(
     'PhaseGroup', [], {
         'setup': tuple,
         'main': tuple,
         'teardown': tuple,
         'name': None,
+        'parallel': False,
+        'worker': None,
     })):
   """Phase group with guaranteed end phase running.
 
   If the setup phases all continue, then the main phases and teardown phases are
   run. Even if any main phase or teardown phases has a terminal error, all the
   teardown phases are guaranteed to be run.
+
+  If parallel is True, each main phase (or nested PhaseGroup) runs in its own
+  thread.  Phases that share plugs should not be run in parallel unless those
+  plugs are thread-safe.
+
+  If worker is set, the group is run by that worker process (see
+  distributed.py), which streams the resulting records back.
   """
 
-  def __init__(self, setup=None, main=None, teardown=None, name=None):
+  def __init__(self, setup=None, main=None, teardown=None, name=None,
+               parallel=False, worker=None):
     if not setup:
       setup = ()
     elif isinstance(setup, PhaseGroup):
@@ -73,7 +99,7 @@ class PhaseGroup(mutablerecords.Record(
       teardown = (teardown,)
     super(PhaseGroup, self).__init__(
         setup=tuple(setup), main=tuple(main), teardown=tuple(teardown),
-        name=name)
+        name=name, parallel=parallel, worker=worker)
 
   @classmethod
   def convert_if_not(cls, phases_or_groups):
@@ -120,12 +146,18 @@ class PhaseGroup(mutablerecords.Record(
     return cls.with_context([], teardown_phases)
 
   def combine(self, other, name=None):
-    """Combine with another PhaseGroup and return the result."""
+    """Combine with another PhaseGroup and return the result.
+
+    The combined main phases are only run in parallel if both groups are
+    parallel, and only on a worker if both groups are run on that worker.
+    """
     return PhaseGroup(
         setup=self.setup + other.setup,
         main=self.main + other.main,
         teardown=self.teardown + other.teardown,
-        name=name)
+        name=name,
+        parallel=self.parallel and other.parallel,
+        worker=self.worker if self.worker == other.worker else None)
 
   def wrap(self, main_phases, name=None):
     """Returns PhaseGroup with additional main phases."""
@@ -138,14 +170,18 @@ class PhaseGroup(mutablerecords.Record(
         setup=self.setup,
         main=new_main,
         teardown=self.teardown,
-        name=name)
+        name=name,
+        parallel=self.parallel,
+        worker=self.worker)
 
   def transform(self, transform_fn):
     return PhaseGroup(
         setup=[transform_fn(p) for p in self.setup],
         main=[transform_fn(p) for p in self.main],
         teardown=[transform_fn(p) for p in self.teardown],
-        name=self.name)
+        name=self.name,
+        parallel=self.parallel,
+        worker=self.worker)
 
   def with_args(self, **kwargs):
     """Send known keyword-arguments to each contained phase the when called."""
@@ -178,7 +214,9 @@ class PhaseGroup(mutablerecords.Record(
         setup=flatten_phases_and_groups(self.setup),
         main=flatten_phases_and_groups(self.main),
         teardown=flatten_phases_and_groups(self.teardown),
-        name=self.name)
+        name=self.name,
+        parallel=self.parallel,
+        worker=self.worker)
 
   def load_code_info(self):
     """Load coded info for all contained phases."""
@@ -186,7 +224,9 @@ class PhaseGroup(mutablerecords.Record(
         setup=load_code_info(self.setup),
         main=load_code_info(self.main),
         teardown=load_code_info(self.teardown),
-        name=self.name)
+        name=self.name,
+        parallel=self.parallel,
+        worker=self.worker)
 
 
 def load_code_info(phases_or_groups):
@@ -273,3 +313,93 @@ def optionally_with_plugs(phase, **subplugs):
   if not isinstance(phase, phase_descriptor.PhaseDescriptor):
     phase = phase_descriptor.PhaseDescriptor.wrap_or_copy(phase)
   return phase.with_known_plugs(**subplugs)
+
+
+def _dependency_names(phase_or_group):
+  if isinstance(phase_or_group, PhaseGroup):
+    return ()
+  return phase_or_group.options.depends_on or ()
+
+
+def sibling_dependencies(phases_or_groups):
+  """Find the dependencies of each of a list of sibling phases or groups.
+
+  Args:
+    phases_or_groups: list of phase_descriptor.PhaseDescriptors or PhaseGroups.
+
+  Returns:
+    List with, for each item of phases_or_groups, the set of indices of the
+    items it depends on.  Dependencies on names that are not siblings are
+    ignored.
+  """
+  indices_by_name = collections.defaultdict(list)
+  for index, phase in enumerate(phases_or_groups):
+    if phase.name:
+      indices_by_name[phase.name].append(index)
+  return [
+      {dependency_index
+       for name in _dependency_names(phase)
+       for dependency_index in indices_by_name.get(name, ())}
+      for phase in phases_or_groups]
+
+
+def _validate_sibling_dependencies(phases_or_groups, parallel, group_name):
+  """Validate the dependencies among phases run as one list of a PhaseGroup."""
+  names = {phase.name for phase in phases_or_groups if phase.name}
+  dependencies = sibling_dependencies(phases_or_groups)
+  for index, phase in enumerate(phases_or_groups):
+    for name in _dependency_names(phase):
+      if name not in names:
+        raise InvalidPhaseDependencyError(
+            'Phase %s depends on %s, which is not one of its siblings in '
+            'PhaseGroup %s.' % (phase.name, name, group_name))
+    if not parallel and any(dependency_index >= index
+                            for dependency_index in dependencies[index]):
+      raise InvalidPhaseDependencyError(
+          'Phase %s depends on a phase that is not run before it in '
+          'PhaseGroup %s.' % (phase.name, group_name))
+
+  if not parallel:
+    return
+  # Check for cycles with a depth-first search.
+  visiting, visited = set(), set()
+
+  def _visit(index):
+    if index in visited:
+      return
+    if index in visiting:
+      raise InvalidPhaseDependencyError(
+          'Phase %s has a circular dependency in PhaseGroup %s.' % (
+              phases_or_groups[index].name, group_name))
+    visiting.add(index)
+    for dependency_index in dependencies[index]:
+      _visit(dependency_index)
+    visiting.discard(index)
+    visited.add(index)
+
+  for index in range(len(phases_or_groups)):
+    _visit(index)
+
+
+def validate_dependencies(group):
+  """Recursively validate the depends_on options of the phases in a group.
+
+  Dependencies must name siblings of the phase, i.e. phases or PhaseGroups in
+  the same setup, main or teardown list.  Main phases of parallel PhaseGroups
+  may depend on any of their siblings, as long as there are no cycles; in other
+  lists, phases run in order, so they may only depend on earlier siblings.
+
+  Args:
+    group: PhaseGroup to validate; it must already be flattened.
+
+  Raises:
+    InvalidPhaseDependencyError: if a dependency is unknown, is not run before
+        the phase or is part of a cycle.
+  """
+  for phases, parallel in ((group.setup, False),
+                           (group.main, group.parallel),
+                           (group.teardown, False)):
+    _validate_sibling_dependencies(phases, parallel, group.name)
+    for phase in phases:
+      if isinstance(phase, PhaseGroup):
+        validate_dependencies(phase)
@@ -0,0 +1,393 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Ordering phases to reduce the expected time to the first failure.
+
+When a test stops at the first failure (e.g. with stop_on_first_failure), a
+failing DUT costs the time of every phase run before the failing one, so cheap
+phases that often fail should run first.  From historical test records, this
+module computes the failure rate p and mean duration c of each phase, and
+orders the main phases of each sequential PhaseGroup by increasing c / p, which
+minimizes the expected time of the phases run,
+
+  sum over phases i of c_i * prod over phases j before i of (1 - p_j),
+
+for independent failures.  Orders always respect depends_on options: a phase
+is only moved ahead of a sibling it does not depend on.  Phases (or nested
+PhaseGroups) without history, e.g. new ones, are never moved; they split their
+list into parts that are reordered separately.  Setup and teardown phases, and
+the main phases of parallel PhaseGroups, are left alone.
+
+Reordering is only safe for phases that do not rely on side effects of the
+phases before them without declaring it with depends_on, so it is opt-in: the
+orders are written to a JSON file that Test() applies when the phase_order_file
+config key is set.  The file can be made from JSON test records (as written by
+the json_factory output callback) with:
+
+  python -m openhtf.core.phase_order --test my_test_module:make_test \\
+      --output order.json records/*.json
+
+where make_test returns the Test (or PhaseGroup) to order.  Unnamed nested
+PhaseGroups are identified by their position, so only named ones keep their
+order when their siblings are reordered.
+
+A PhaseOrderOptimizer output callback instead keeps the file up to date as
+tests run, for the next Test() to load:
+
+  test.add_output_callbacks(phase_order.PhaseOrderOptimizer(
+      'order.json', test.descriptor.phase_group))
+"""
+
+import argparse
+import collections
+import importlib
+import json
+import logging
+import os
+import sys
+import threading
+import types
+
+from openhtf.core import phase_group
+import six
+
+_LOG = logging.getLogger(__name__)
+
+_FAILED_OUTCOMES = frozenset(['FAIL', 'ERROR'])
+_COUNTED_OUTCOMES = _FAILED_OUTCOMES | frozenset(['PASS'])
+
+
+class PhaseStats(object):
+  """Runs, failures and total duration of phases, by phase name."""
+
+  def __init__(self, stats=None):
+    # Maps phase name to [runs, failures, total duration in seconds].
+    self._stats = {name: list(values)
+                   for name, values in six.iteritems(stats or {})}
+
+  def add(self, name, failed, duration_s):
+    stats = self._stats.setdefault(name, [0, 0, 0.0])
+    stats[0] += 1
+    stats[1] += int(failed)
+    stats[2] += duration_s
+
+  def add_record(self, record):
+    """Add the phases of a TestRecord, or of a record converted to a dict."""
+    if not isinstance(record, dict):
+      record = {'start_time_millis': record.start_time_millis,
+                'phases': [
+                    {'name': phase.name,
+                     'outcome': phase.outcome and phase.outcome.name,
+                     'start_time_millis': phase.start_time_millis,
+                     'end_time_millis': phase.end_time_millis}
+                    for phase in record.phases]}
+    for phase in record['phases']:
+      if (phase['outcome'] not in _COUNTED_OUTCOMES or
+          phase['end_time_millis'] is None or
+          # Records reused from a previous run (see resume.py).
+          phase['start_time_millis'] < record['start_time_millis']):
+        continue
+      self.add(phase['name'], phase['outcome'] in _FAILED_OUTCOMES,
+               (phase['end_time_millis'] - phase['start_time_millis']) / 1000.0)
+
+  def get(self, name):
+    """Returns (failure rate, mean duration in seconds) of a phase, or None."""
+    stats = self._stats.get(name)
+    if not stats:
+      return None
+    runs, failures, total_s = stats
+    return float(failures) / runs, total_s / runs
+
+  def as_base_types(self):
+    return {name: list(values) for name, values in six.iteritems(self._stats)}
+
+
+def _item_stats(item, stats):
+  """Returns (failure rate, mean duration) of a phase or group, or None."""
+  if not isinstance(item, phase_group.PhaseGroup):
+    return stats.get(item.name)
+  pass_rate, cost_s = 1.0, 0.0
+  for phase in item:
+    phase_stats = stats.get(phase.name)
+    if phase_stats is None:
+      return None
+    # Phases of the group after a failure are not run (teardown phases are,
+    # but this is close enough).
+    cost_s += pass_rate * phase_stats[1]
+    pass_rate *= 1 - phase_stats[0]
+  return 1 - pass_rate, cost_s
+
+
+def expected_time_s(item_stats):
+  """Expected time of running items in order until the first failure.
+
+  Args:
+    item_stats: List of (failure rate, mean duration in seconds) pairs.
+
+  Returns:
+    The expected time in seconds, assuming independent failures.
+  """
+  total_s, pass_rate = 0.0, 1.0
+  for failure_rate, cost_s in item_stats:
+    total_s += pass_rate * cost_s
+    pass_rate *= 1 - failure_rate
+  return total_s
+
+
+def _priority(item_stats):
+  failure_rate, cost_s = item_stats
+  if not failure_rate:
+    return float('inf')
+  return cost_s / failure_rate
+
+
+def order_items(items, stats):
+  """Returns the indices of items in the order they should run in.
+
+  Args:
+    items: List of the sibling phases and PhaseGroups of a sequential list.
+    stats: PhaseStats of past runs.
+
+  Returns:
+    List of the indices of items, in order.
+  """
+  dependencies = phase_group.sibling_dependencies(items)
+  item_stats = [_item_stats(item, stats) for item in items]
+  order = []
+  start = 0
+  while start < len(items):
+    if item_stats[start] is None:
+      # Items without history stay where they are.
+      order.append(start)
+      start += 1
+      continue
+    end = start
+    while end < len(items) and item_stats[end] is not None:
+      end += 1
+    remaining = list(range(start, end))
+    while remaining:
+      # Dependencies on items outside of this part are already satisfied.
+      ready = [index for index in remaining
+               if not dependencies[index] & set(remaining)]
+      best = min(ready, key=lambda index: (_priority(item_stats[index]), index))
+      order.append(best)
+      remaining.remove(best)
+    start = end
+  return order
+
+
+def _item_name(item, index):
+  return item.name or '#%d' % index
+
+
+def _nested_path(path, list_name, item, index):
+  return '%s/%s:%s' % (path, list_name, _item_name(item, index))
+
+
+def _walk_groups(group, path=''):
+  """Yields (path, group) for group and the PhaseGroups nested in it."""
+  yield path, group
+  for list_name in ('setup', 'main', 'teardown'):
+    for index, item in enumerate(getattr(group, list_name)):
+      if isinstance(item, phase_group.PhaseGroup):
+        for nested in _walk_groups(
+            item, _nested_path(path, list_name, item, index)):
+          yield nested
+
+
+def compute_orders(group, stats):
+  """Returns a dict of proposed orders of the main phases of group.
+
+  Args:
+    group: The top-level PhaseGroup of a test.
+    stats: PhaseStats of past runs.
+
+  Returns:
+    Dict mapping the path of each sequential PhaseGroup whose order changes
+    ('' for the top-level one, and e.g. '/main:rf/setup:#0' for the first setup
+    item of the main group named rf, if it is an unnamed group) to the names
+    of its main phases and groups, in order.
+  """
+  orders = {}
+  for path, nested_group in _walk_groups(group):
+    if nested_group.parallel or len(nested_group.main) < 2:
+      continue
+    order = order_items(list(nested_group.main), stats)
+    if order != sorted(order):
+      orders[path] = [_item_name(nested_group.main[index], index)
+                      for index in order]
+  return orders
+
+
+def format_report(group, stats):
+  """Returns a report of the current and proposed orders of group's phases."""
+  lines = []
+  for path, nested_group in _walk_groups(group):
+    if nested_group.parallel or len(nested_group.main) < 2:
+      continue
+    items = list(nested_group.main)
+    item_stats = [_item_stats(item, stats) for item in items]
+    order = order_items(items, stats)
+    lines.append('PhaseGroup %s:' % (path or '/'))
+    for position, index in enumerate(order):
+      if item_stats[index] is None:
+        description = 'no history'
+      else:
+        description = 'fails %.1f%%, takes %.3f s' % (
+            item_stats[index][0] * 100, item_stats[index][1])
+      lines.append('  %2d (was %2d) %-30s %s' % (
+          position, index, _item_name(items[index], index), description))
+    known = [index for index in range(len(items)) if item_stats[index]]
+    proposed = [index for index in order if item_stats[index]]
+    lines.append('  Expected time of phases with history: %.3f s, was %.3f s.'
+                 % (expected_time_s([item_stats[i] for i in proposed]),
+                    expected_time_s([item_stats[i] for i in known])))
+  return '\n'.join(lines)
+
+
+def _reorder(phases, order, path):
+  """Returns phases in the order of names, or phases if that is not possible."""
+  names = [_item_name(item, index) for index, item in enumerate(phases)]
+  if sorted(names) != sorted(order):
+    _LOG.warning('Ignoring the phase order of PhaseGroup %s, which no longer '
+                 'has the same phases.', path or '/')
+    return phases
+  indices_by_name = collections.defaultdict(collections.deque)
+  for index, name in enumerate(names):
+    indices_by_name[name].append(index)
+  indices = [indices_by_name[name].popleft() for name in order]
+  dependencies = phase_group.sibling_dependencies(phases)
+  placed = set()
+  for index in indices:
+    if not dependencies[index] <= placed:
+      _LOG.warning('Ignoring the phase order of PhaseGroup %s, which does not '
+                   'respect the dependencies of %s.', path or '/', names[index])
+      return phases
+    placed.add(index)
+  return [phases[index] for index in indices]
+
+
+def apply_orders(group, orders, path=''):
+  """Returns a copy of group with the main phases in the given orders.
+
+  Args:
+    group: The top-level PhaseGroup of a test.
+    orders: Dict of orders, as returned by compute_orders().
+    path: Path of group; only used for recursion.
+
+  Returns:
+    A new PhaseGroup.  Orders that no longer match the phases of their group,
+    or that do not respect their dependencies, are ignored with a warning.
+  """
+  def _apply_nested(list_name):
+    return [
+        apply_orders(item, orders,
+                     _nested_path(path, list_name, item, index))
+        if isinstance(item, phase_group.PhaseGroup) else item
+        for index, item in enumerate(getattr(group, list_name))]
+
+  main = _apply_nested('main')
+  if path in orders and not group.parallel:
+    main = _reorder(main, orders[path], path)
+  return phase_group.PhaseGroup(
+      setup=_apply_nested('setup'), main=main,
+      teardown=_apply_nested('teardown'), name=group.name,
+      parallel=group.parallel, worker=group.worker)
+
+
+def load_order_file(path):
+  """Returns the orders saved in an order file, or {} if it has none."""
+  try:
+    with open(path) as order_file:
+      return json.load(order_file).get('orders', {})
+  except (IOError, ValueError):
+    _LOG.warning('Could not load the phase order file %s; not reordering.',
+                 path, exc_info=True)
+    return {}
+
+
+def save_order_file(path, orders, stats):
+  partial_path = path + '.partial'
+  with open(partial_path, 'w') as order_file:
+    json.dump({'orders': orders, 'stats': stats.as_base_types()}, order_file,
+              indent=2, sort_keys=True)
+  os.rename(partial_path, path)
+
+
+class PhaseOrderOptimizer(object):
+  """Output callback keeping a phase order file up to date as tests run."""
+
+  def __init__(self, path, group):
+    """Initializer for PhaseOrderOptimizer.
+
+    Args:
+      path: Phase order file to write; the stats saved in it are added to.
+      group: The top-level PhaseGroup of the test, e.g.
+          test.descriptor.phase_group.
+    """
+    self.path = path
+    self.group = group
+    self._lock = threading.Lock()
+    stats = None
+    if os.path.exists(path):
+      try:
+        with open(path) as order_file:
+          stats = json.load(order_file).get('stats')
+      except (IOError, ValueError):
+        _LOG.warning('Could not load the phase order file %s; starting over.',
+                     path, exc_info=True)
+    self.stats = PhaseStats(stats)
+
+  def __call__(self, test_record):
+    with self._lock:
+      self.stats.add_record(test_record)
+      save_order_file(self.path, compute_orders(self.group, self.stats),
+                      self.stats)
+
+
+def _load_group(reference):
+  """Load a Test or PhaseGroup from 'module:attribute'; call it if needed."""
+  module_name, _, attribute = reference.partition(':')
+  loaded = getattr(importlib.import_module(module_name), attribute)
+  if isinstance(loaded, types.FunctionType):
+    loaded = loaded()
+  if isinstance(loaded, phase_group.PhaseGroup):
+    return loaded
+  return loaded.descriptor.phase_group
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(
+      description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+  parser.add_argument('records', nargs='+',
+                      help='JSON files of test records to compute stats from.')
+  parser.add_argument('--test', required=True,
+                      help='module:attribute of the Test or PhaseGroup to '
+                      'order, or of a function returning one.')
+  parser.add_argument('--output', help='Phase order file to write.')
+  args = parser.parse_args(argv)
+
+  group = _load_group(args.test)
+  stats = PhaseStats()
+  for filename in args.records:
+    with open(filename) as record_file:
+      stats.add_record(json.load(record_file))
+  print(format_report(group, stats))
+  if args.output:
+    save_order_file(args.output, compute_orders(group, stats), stats)
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -0,0 +1,467 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Run phase functions in a worker process instead of a thread.
+
+Phases that do heavy computation in Python (FFTs, image analysis, waveform
+fitting, etc.) hold the GIL, which stalls everything else running in the test
+process: the station server, monitors, log handling and any phases running in
+parallel.  Such phases can be run in a worker process instead:
+
+  @htf.PhaseOptions(run_in_subprocess=True)
+  @htf.measures('peak_frequency')
+  @htf.plugs.plug(scope=ScopePlug)
+  def analyze_waveform(test, scope):
+    test.measurements.peak_frequency = fit(scope.capture())
+
+The phase function is looked up by name in the worker process, so it must be
+defined at module level (as with multiprocessing, scripts must guard their
+entry point with `if __name__ == '__main__':`).  Everything else happens in the
+test process, by remote call from the worker:
+  - Plugs are not instantiated in the worker; phase plug arguments are proxies
+    whose attribute accesses and method calls are forwarded to the real plugs.
+  - test.measurements, test.attach(), test.attach_from_file(),
+    test.get_measurement(), test.get_attachment(), test.notify_update() and
+    test.dut_id act on the running PhaseState.
+  - Records logged to test.logger are sent back to the phase logger.
+  - test.state is a copy of the test state; once the phase ends, the keys it
+    set or deleted are set or deleted in the test state.
+Arguments, return values and exceptions passed between the processes must be
+picklable.  Phases run in a subprocess cannot use the requires_state or
+run_under_pdb options.
+
+Worker processes are started with the 'spawn' method where available, and idle
+workers are kept around to be reused by later phases.  A worker running a phase
+that times out or is stopped is terminated.
+"""
+
+import logging
+import signal
+import sys
+import threading
+import traceback
+
+import multiprocessing
+
+import openhtf
+from openhtf.core import measurements
+from openhtf.core import phase_descriptor
+from openhtf.core import test_record
+from openhtf.util import conf
+import six
+from six.moves import cPickle as pickle
+
+conf.declare('phase_subprocess_max_idle_workers', default_value=2,
+             description='Number of idle worker processes to keep around for '
+             'phases run with the run_in_subprocess option.')
+
+# How often the test process checks on a worker that is running a phase; also
+# bounds how long it takes for a timeout or stop to be noticed.
+_POLL_INTERVAL_S = 0.1
+
+# Forking a threaded process is unsafe, so use spawn when we can (Python 3).
+if hasattr(multiprocessing, 'get_context'):
+  _CONTEXT = multiprocessing.get_context('spawn')
+else:
+  _CONTEXT = multiprocessing
+
+
+class SubprocessPhaseError(Exception):
+  """Raised when a phase cannot be run in a subprocess."""
+
+
+class _RemoteTraceback(Exception):
+  """Carries the formatted traceback of an exception raised in a worker."""
+
+  def __str__(self):
+    return '\n\n%s' % self.args[0]
+
+
+def _picklable_exception(exc):
+  """Return exc, or a SubprocessPhaseError describing it if it can't pickle."""
+  try:
+    pickle.loads(pickle.dumps(exc))
+    return exc
+  except Exception:  # pylint: disable=broad-except
+    return SubprocessPhaseError('%s: %s' % (type(exc).__name__, exc))
+
+
+def _function_location(func):
+  """Return (module name, attribute name) under which func can be imported."""
+  module = sys.modules.get(getattr(func, '__module__', None))
+  name = getattr(func, '__name__', None)
+  target = getattr(module, name, None) if module and name else None
+  if isinstance(target, phase_descriptor.PhaseDescriptor):
+    target = target.func
+  if target is not func:
+    raise SubprocessPhaseError(
+        'Phase function %r must be defined at module level to run in a '
+        'subprocess.' % func)
+  return func.__module__, name
+
+
+def _import_function(module_name, name):
+  __import__(module_name)
+  func = getattr(sys.modules[module_name], name)
+  if isinstance(func, phase_descriptor.PhaseDescriptor):
+    func = func.func
+  return func
+
+
+########## Worker process side ##########
+
+
+class _Connection(object):
+  """Thread-safe wrapper around the worker's end of the pipe."""
+
+  def __init__(self, conn):
+    self._conn = conn
+    self._lock = threading.Lock()
+
+  def send(self, message):
+    with self._lock:
+      self._conn.send(message)
+
+  def call(self, target, operation, *args):
+    """Perform an operation on a target object in the test process."""
+    with self._lock:
+      self._conn.send(('call', target, operation, args))
+      reply = self._conn.recv()
+    kind = reply[0]
+    if kind == 'error':
+      raise reply[1]
+    if kind == 'proxy':
+      return _RemoteObject(self, reply[1])
+    if kind == 'callable':
+      return self.method(target, args[0])
+    if kind == 'attachment':
+      return test_record.Attachment(reply[1], reply[2])
+    return reply[1]
+
+  def method(self, target, name):
+    """Return a function that calls a method of a target in the test process."""
+    def _remote_method(*args, **kwargs):
+      return self.call(target, 'call', name, args, kwargs)
+    _remote_method.__name__ = str(name)
+    return _remote_method
+
+
+class _RemoteObject(object):
+  """Proxy for an object (plug, measurements, ...) in the test process."""
+
+  def __init__(self, connection, target):
+    object.__setattr__(self, '_connection', connection)
+    object.__setattr__(self, '_target', target)
+
+  def __getattr__(self, name):
+    if name.startswith('__'):
+      raise AttributeError(name)
+    return self._connection.call(self._target, 'getattr', name)
+
+  def __setattr__(self, name, value):
+    self._connection.call(self._target, 'setattr', name, value)
+
+  def __getitem__(self, key):
+    return self._connection.call(self._target, 'getitem', key)
+
+  def __setitem__(self, key, value):
+    self._connection.call(self._target, 'setitem', key, value)
+
+  def __contains__(self, key):
+    return self._connection.call(self._target, 'call', '__contains__', (key,),
+                                 {})
+
+  def __repr__(self):
+    return '<%s: %s>' % (type(self).__name__, self._target)
+
+
+class _PipeLogHandler(logging.Handler):
+  """Sends log records to the test process."""
+
+  def __init__(self, connection):
+    super(_PipeLogHandler, self).__init__()
+    self._connection = connection
+
+  def emit(self, record):
+    try:
+      record_dict = dict(record.__dict__)
+      record_dict['msg'] = record.getMessage()
+      record_dict['args'] = None
+      if record.exc_info:
+        record_dict['exc_text'] = logging.Formatter().formatException(
+            record.exc_info)
+        record_dict['exc_info'] = None
+      self._connection.send(('log', record_dict))
+    except Exception:  # pylint: disable=broad-except
+      self.handleError(record)
+
+
+class _WorkerTestState(object):
+  """Stands in for the TestState when calling a PhaseDescriptor in a worker."""
+
+  def __init__(self, test_api):
+    self.test_api = test_api
+    self.plug_manager = self
+
+  def provide_plugs(self, plug_name_map):  # pylint: disable=unused-argument
+    # Plug proxies are passed in with the extra_kwargs instead.
+    return {}
+
+
+def _pickled_items(state):
+  return {key: pickle.dumps(value, -1) for key, value in six.iteritems(state)}
+
+
+def _state_changes(pickled_items, state):
+  """Returns the items of state changed since pickled_items, and deleted keys.
+
+  Values are compared pickled, since they may be modified in place and may not
+  support comparison.
+  """
+  changed = {key: value for key, value in six.iteritems(state)
+             if pickle.dumps(value, -1) != pickled_items.get(key)}
+  deleted = [key for key in pickled_items if key not in state]
+  return changed, deleted
+
+
+def _run_phase_in_worker(conn, module_name, func_name, kwargs, plug_names,
+                         logger_name, state):
+  """Run a phase function in the worker, reporting back over conn."""
+  pickled_items = _pickled_items(state)
+  connection = _Connection(conn)
+  logger = logging.getLogger(logger_name)
+  logger.setLevel(logging.DEBUG)
+  logger.propagate = False
+  handler = _PipeLogHandler(connection)
+  logger.addHandler(handler)
+  try:
+    func = _import_function(module_name, func_name)
+    kwargs.update((name, _RemoteObject(connection, ('plug', name)))
+                  for name in plug_names)
+    test_api = openhtf.TestApi(
+        logger, state,
+        _RemoteObject(connection, 'test_record'),
+        _RemoteObject(connection, 'measurements'),
+        _RemoteObject(connection, 'attachments'),
+        connection.method('api', 'attach'),
+        connection.method('api', 'attach_from_file'),
+        connection.method('api', 'get_measurement'),
+        connection.method('api', 'get_attachment'),
+        connection.method('api', 'notify_update'),
+        None)  # The worker is terminated rather than cancelled.
+    phase = phase_descriptor.PhaseDescriptor(func, extra_kwargs=kwargs)
+    result = phase(_WorkerTestState(test_api))
+    connection.send(('result', result, _state_changes(pickled_items, state)))
+  except Exception as exc:  # pylint: disable=broad-except
+    connection.send(('error', _picklable_exception(exc),
+                     traceback.format_exc(),
+                     _state_changes(pickled_items, state)))
+  finally:
+    logger.removeHandler(handler)
+
+
+def _worker_main(conn):
+  """Entry point of worker processes; runs phases until told to exit."""
+  # CTRL-C is handled by the test process, which terminates us as needed.
+  signal.signal(signal.SIGINT, signal.SIG_IGN)
+  while True:
+    try:
+      request = conn.recv()
+    except EOFError:
+      return
+    if request is None:
+      return
+    _run_phase_in_worker(conn, *request)
+
+
+########## Test process side ##########
+
+
+class _Worker(object):
+  """A worker process and the test process' end of the pipe to it."""
+
+  def __init__(self):
+    self.conn, child_conn = _CONTEXT.Pipe()
+    self.process = _CONTEXT.Process(
+        target=_worker_main, args=(child_conn,), name='PhaseWorker')
+    self.process.daemon = True
+    self.process.start()
+    child_conn.close()
+
+  def close(self):
+    """Ask the worker to exit once it's done with what it's doing."""
+    try:
+      self.conn.send(None)
+    except (IOError, OSError):
+      pass
+    self.conn.close()
+
+  def terminate(self):
+    self.process.terminate()
+    self.process.join()
+    self.conn.close()
+
+
+class _WorkerPool(object):
+  """Hands out worker processes, keeping idle ones around for reuse."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._idle = []
+
+  def acquire(self):
+    with self._lock:
+      while self._idle:
+        worker = self._idle.pop()
+        if worker.process.is_alive():
+          return worker
+    return _Worker()
+
+  def release(self, worker):
+    with self._lock:
+      if len(self._idle) < conf.phase_subprocess_max_idle_workers:
+        self._idle.append(worker)
+        return
+    worker.close()
+
+
+_WORKER_POOL = _WorkerPool()
+
+
+class _PhaseServer(object):
+  """Serves remote calls from a worker that is running a phase."""
+
+  def __init__(self, worker, test_api, plugs):
+    self._worker = worker
+    self._test_api = test_api
+    self._plugs = plugs
+
+  def _resolve(self, target):
+    if isinstance(target, tuple):
+      kind, name = target
+      if kind == 'plug':
+        return self._plugs[name]
+      return self._test_api.measurements[name]  # 'dimensioned'
+    if target == 'api':
+      return self._test_api
+    return getattr(self._test_api, target)
+
+  def _call(self, target, operation, args):
+    """Perform a remote call and return the reply to send to the worker."""
+    try:
+      obj = self._resolve(target)
+      if operation == 'getattr':
+        value = getattr(obj, args[0])
+      elif operation == 'getitem':
+        value = obj[args[0]]
+      elif operation == 'setattr':
+        setattr(obj, *args)
+        value = None
+      elif operation == 'setitem':
+        obj[args[0]] = args[1]
+        value = None
+      else:
+        name, call_args, call_kwargs = args
+        value = getattr(obj, name)(*call_args, **call_kwargs)
+    except Exception as exc:  # pylint: disable=broad-except
+      return ('error', _picklable_exception(exc))
+
+    if isinstance(value, measurements.DimensionedMeasuredValue):
+      return ('proxy', ('dimensioned', args[0]))
+    if isinstance(value, test_record.Attachment):
+      return ('attachment', value.data, value.mimetype)
+    if operation == 'getattr' and callable(value):
+      return ('callable',)
+    return ('ok', value)
+
+  def _reply(self, reply):
+    try:
+      self._worker.conn.send(reply)
+    except (pickle.PicklingError, TypeError, AttributeError) as exc:
+      self._worker.conn.send(('error', SubprocessPhaseError(
+          'Cannot send result to subprocess: %s' % exc)))
+
+  def serve(self):
+    """Serve the worker until the phase finishes, returning its last message."""
+    conn = self._worker.conn
+    while True:
+      # Poll rather than block so that a timeout or stop (which kill the
+      # calling thread) takes effect.
+      if not conn.poll(_POLL_INTERVAL_S):
+        if not self._worker.process.is_alive():
+          raise SubprocessPhaseError(
+              'Phase worker process exited with code %s' %
+              self._worker.process.exitcode)
+        continue
+      try:
+        message = conn.recv()
+      except EOFError:
+        raise SubprocessPhaseError('Phase worker process exited unexpectedly.')
+      if message[0] == 'log':
+        self._test_api.logger.handle(logging.makeLogRecord(message[1]))
+      elif message[0] == 'call':
+        self._reply(self._call(*message[1:]))
+      else:
+        return message
+
+
+def run_phase(phase_desc, test_state):
+  """Run the given phase in a worker process.
+
+  Must be called while the phase is the running phase of test_state on the
+  calling thread (the PhaseExecutorThread).
+
+  Args:
+    phase_desc: PhaseDescriptor of the phase to run.
+    test_state: test_state.TestState for the currently executing Test.
+
+  Raises:
+    SubprocessPhaseError: If the phase can't be run in a subprocess, or the
+      worker process dies while running it.
+
+  Returns:
+    The return value from calling the underlying function.
+  """
+  if phase_desc.options.requires_state or phase_desc.options.run_under_pdb:
+    raise SubprocessPhaseError(
+        'Phase %s cannot be run in a subprocess with the requires_state or '
+        'run_under_pdb options.' % phase_desc.name)
+  module_name, func_name = _function_location(phase_desc.func)
+  plugs = test_state.plug_manager.provide_plugs(
+      (plug.name, plug.cls) for plug in phase_desc.plugs if plug.update_kwargs)
+  kwargs = {name: value
+            for name, value in six.iteritems(phase_desc.extra_kwargs)
+            if name not in plugs}
+  test_api = test_state.test_api
+
+  worker = _WORKER_POOL.acquire()
+  try:
+    worker.conn.send((module_name, func_name, kwargs, list(plugs),
+                      test_api.logger.name, dict(test_api.state)))
+    message = _PhaseServer(worker, test_api, plugs).serve()
+  except BaseException:
+    # Timed out, stopped or broken; don't leave the phase running.
+    worker.terminate()
+    raise
+  _WORKER_POOL.release(worker)
+
+  # Only apply the worker's changes, since other phases may have changed the
+  # state in the meantime.
+  changed, deleted = message[-1]
+  test_api.state.update(changed)
+  for key in deleted:
+    test_api.state.pop(key, None)
+  if message[0] == 'error':
+    six.raise_from(message[1], _RemoteTraceback(message[2]))
+  return message[1]
@@ -0,0 +1,159 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Resuming a test on a DUT from the last run of the test that did not pass.
+
+When the resume_store test option is set to a ResultsStore (which should also
+be one of the test's output callbacks), each PhaseRecord gets a fingerprint of
+its phase: a hash of the phase's name, source code, extra_kwargs, plugs and
+measurement declarations.  When the test starts on a DUT whose last stored run
+of the test did not pass, the PhaseRecords of the main phases that passed in
+that run and whose fingerprint is unchanged are reused instead of running those
+phases again, up to the first phase that must run again; from there on, all
+phases run as usual.
+
+Setup and teardown phases of PhaseGroups always run, since later phases may
+depend on what they do, and resuming stops at the first parallel PhaseGroup or
+PhaseSweep.
+"""
+
+import collections
+import hashlib
+import logging
+import threading
+
+from openhtf.core import test_record
+import six
+
+_LOG = logging.getLogger(__name__)
+
+# Maps code objects to their source, which is slow to look up.
+_SOURCE_CACHE = {}
+_SOURCE_CACHE_LOCK = threading.Lock()
+
+
+def _function_source(func):
+  """Returns the source of func, or a description of its bytecode."""
+  code = getattr(func, '__code__', None)
+  if code is None:
+    return repr(func)
+  with _SOURCE_CACHE_LOCK:
+    source = _SOURCE_CACHE.get(code)
+  if source is None:
+    source = test_record.CodeInfo.for_function(func).sourcecode
+    if not source:
+      source = repr((code.co_code, code.co_consts))
+    with _SOURCE_CACHE_LOCK:
+      _SOURCE_CACHE[code] = source
+  return source
+
+
+def phase_fingerprint(phase_desc):
+  """Returns a hash of what determines the behavior of a phase.
+
+  Args:
+    phase_desc: phase_descriptor.PhaseDescriptor to fingerprint.
+
+  Returns:
+    Hex digest string, equal for phases that have the same name, source code,
+    extra_kwargs, plugs and measurement declarations.
+  """
+  parts = [
+      phase_desc.name,
+      _function_source(phase_desc.func),
+      repr(sorted(phase_desc.extra_kwargs.items())),
+      repr(sorted((plug.name, plug.cls.__module__, plug.cls.__name__)
+                  for plug in phase_desc.plugs)),
+      repr([(m.name, str(m.units), [str(d) for d in m.dimensions or ()],
+             [str(v) for v in m.validators], m.docstring)
+            for m in phase_desc.measurements]),
+  ]
+  fingerprint = hashlib.sha1()
+  for part in parts:
+    fingerprint.update(six.text_type(part).encode('utf-8', 'replace'))
+    fingerprint.update(b'\0')
+  return fingerprint.hexdigest()
+
+
+class ResumePlan(object):
+  """Decides which PhaseRecords of a previous test run to reuse.
+
+  Phases are offered to the plan with take(), in the order they run; the plan
+  returns the record to reuse for each until a phase has no passing record of
+  the same fingerprint, after which it returns None for all phases.
+  """
+
+  def __init__(self, previous_record):
+    self.previous_record = previous_record
+    self.reused_phase_names = []
+    self._active = True
+    self._lock = threading.Lock()
+    # Maps fingerprint to the records of the phase in the previous run, in
+    # order; records of phases that did not pass are None.
+    self._records = collections.defaultdict(collections.deque)
+    for phase_record in previous_record.phases:
+      fingerprint = getattr(phase_record, 'fingerprint', None)
+      if (fingerprint is None or
+          phase_record.outcome == test_record.PhaseOutcome.SKIP):
+        continue
+      self._records[fingerprint].append(
+          phase_record
+          if phase_record.outcome == test_record.PhaseOutcome.PASS else None)
+
+  @classmethod
+  def from_store(cls, store, dut_id, test_name):
+    """Returns a ResumePlan for the last run of test_name on dut_id, or None.
+
+    Args:
+      store: results_store.ResultsStore the test's records are stored in.
+      dut_id: DUT ID of the test about to run.
+      test_name: Name of the test about to run.
+
+    Returns:
+      A ResumePlan, or None if there is no stored run to resume from (or the
+      last stored run passed).
+    """
+    try:
+      previous_record = store.last_record(dut_id, test_name=test_name)
+    except Exception:  # pylint: disable=broad-except
+      _LOG.exception('Could not look up the last run on %s; not resuming.',
+                     dut_id)
+      return None
+    if (previous_record is None or
+        previous_record.outcome == test_record.Outcome.PASS):
+      return None
+    return cls(previous_record)
+
+  @property
+  def active(self):
+    return self._active
+
+  def take(self, phase_desc):
+    """Returns the PhaseRecord to reuse for phase_desc, or None to run it."""
+    with self._lock:
+      if not self._active:
+        return None
+      records = self._records.get(phase_fingerprint(phase_desc))
+      phase_record = records.popleft() if records else None
+      if phase_record is None:
+        self._active = False
+        return None
+      self.reused_phase_names.append(phase_record.name)
+      return phase_record
+
+  def finish(self):
+    """Stop reusing records; all phases from now on run as usual."""
+    with self._lock:
+      self._active = False
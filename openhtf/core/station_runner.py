@@ -0,0 +1,149 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Run a test over and over, overlapping the executions of consecutive DUTs.
+
+A station usually runs the same Test in a loop, one DUT after another:
+
+  while True:
+    test.execute(test_start=trigger)
+
+Each execution runs its start trigger, initializes plugs, runs the phases,
+tears down the plugs and then runs the output callbacks, so the fixture sits
+idle while the plugs are torn down and the record is output.  A StationRunner
+runs the executions in slots (copies of the Test), and starts the next DUT's
+execution as soon as the phases of the previous DUT have finished:
+
+  runner = station_runner.StationRunner(test, test_start=trigger, slots=2)
+  runner.run()
+
+The start trigger and plug initialization of DUT N+1 then run while DUT N
+tears down its plugs and outputs its record.  The phases of consecutive DUTs
+never overlap, and the number of slots bounds how many executions can be in
+flight at once (e.g. if output callbacks are slow).
+
+Since executions overlap, output callbacks may run for two DUTs at once, and two
+instances of a plug may exist at once (one being torn down and one being
+initialized).  Plugs that can't tolerate that, or that are expensive to set up,
+should set share_across_tests, so that they are kept for as long as any slot
+uses them.
+"""
+
+import copy
+import itertools
+import logging
+import threading
+
+import mutablerecords
+from six.moves import queue
+
+_LOG = logging.getLogger(__name__)
+
+
+def _copy_test(test):
+  """Return a copy of test that can be executed at the same time as test."""
+  # pylint: disable=protected-access
+  test_copy = copy.copy(test)
+  test_copy._lock = threading.Lock()
+  test_copy._executor = None
+  test_copy._test_options = mutablerecords.CopyRecord(test._test_options)
+  return test_copy
+
+
+class StationRunner(object):
+  """Runs a Test for one DUT after another, overlapping their executions."""
+
+  def __init__(self, test, test_start=None, slots=2):
+    """Initializer for StationRunner.
+
+    Args:
+      test: The openhtf.Test to run.  It should be configured (and have its
+          output callbacks added) before the StationRunner is created.
+      test_start: The test_start argument of Test.execute(), usually a trigger
+          phase that waits for the next DUT.
+      slots: Maximum number of executions in flight at once; 1 runs the
+          executions one after another, like calling test.execute() in a loop.
+    """
+    if slots < 1:
+      raise ValueError('A StationRunner needs at least one slot.')
+    self._test_start = test_start
+    self._tests = [test] + [_copy_test(test) for _ in range(slots - 1)]
+    self._stopping = threading.Event()
+    self._results_lock = threading.Lock()
+    self._results = {}
+
+  @property
+  def results(self):
+    """Values returned by Test.execute() (True if the test passed) so far."""
+    with self._results_lock:
+      return [self._results[index] for index in sorted(self._results)]
+
+  def stop(self):
+    """Stop starting new executions; running executions finish normally."""
+    self._stopping.set()
+
+  def run(self, count=None):
+    """Run executions until count DUTs have been tested, or stop() is called.
+
+    Args:
+      count: Number of DUTs to test, or None to run until stop() is called.
+
+    Returns:
+      The values returned by Test.execute() for each DUT tested by this call
+      (True if the test passed), in the order the DUTs were tested.
+    """
+    with self._results_lock:
+      self._results = {}
+    idle_tests = queue.Queue()
+    for test in self._tests:
+      idle_tests.put(test)
+    execution_threads = []
+    previous_phases_finished = None
+    try:
+      for index in itertools.count():
+        if self._stopping.is_set() or (count is not None and index >= count):
+          break
+        test = idle_tests.get()
+        if previous_phases_finished is not None:
+          previous_phases_finished.wait()
+        if self._stopping.is_set():
+          break
+        phases_finished = threading.Event()
+        execution_thread = threading.Thread(
+            target=self._execute,
+            args=(test, index, phases_finished, idle_tests),
+            name='StationRunner execution %d' % index)
+        execution_thread.daemon = True
+        execution_thread.start()
+        execution_threads.append(execution_thread)
+        previous_phases_finished = phases_finished
+    finally:
+      for execution_thread in execution_threads:
+        execution_thread.join()
+    return self.results
+
+  def _execute(self, test, index, phases_finished, idle_tests):
+    result = False
+    try:
+      result = test.execute(test_start=self._test_start,
+                            phases_finished_cb=phases_finished.set)
+    except Exception:  # pylint: disable=broad-except
+      _LOG.exception('Execution %d of %s raised.', index, test)
+    finally:
+      # In case the execution ended before it could start its phases.
+      phases_finished.set()
+      with self._results_lock:
+        self._results[index] = result
+      idle_tests.put(test)
@@ -37,6 +37,7 @@ from openhtf import util
 from openhtf.core import phase_descriptor
 from openhtf.core import phase_executor
 from openhtf.core import phase_group
+from openhtf.core import phase_order
 from openhtf.core import test_executor
 from openhtf.core import test_record
 
@@ -55,6 +56,9 @@ conf.declare('capture_source', description=textwrap.dedent(
 
     Set to 'true' if you want to capture your test's source.'''),
              default_value=False)
+conf.declare('phase_order_file', default_value=None, description=(
+    'JSON file of phase orders written by openhtf.core.phase_order, to run the '
+    'phases of Tests created afterwards in.'))
 # TODO(arsharma): Deprecate this configuration after removing the old teardown
 # specification.
 conf.declare('teardown_timeout_s', default_value=30, description=
@@ -121,7 +125,10 @@ class Test(object):
     Test(PhaseOne, PhaseTwo).execute()
 
   Note that Test() objects *must* be created in the main thread, but can be
-  .execute()'d in a separate thread.
+  .execute()'d in a separate thread.  Separate Test() objects may be executed
+  concurrently, e.g. one per slot of a multi-up fixture; each execution has its
+  own TestState, test record logs and plug instances (see
+  BasePlug.share_across_tests for plugs that should be shared).
   """
 
   TEST_INSTANCES = weakref.WeakValueDictionary()
@@ -141,6 +148,12 @@ class Test(object):
     self._executor = None
     self._test_desc = TestDescriptor(
         phases, test_record.CodeInfo.uncaptured(), metadata)
+    phase_group.validate_dependencies(self._test_desc.phase_group)
+    if conf.phase_order_file:
+      self._test_desc = self._test_desc._replace(
+          phase_group=phase_order.apply_orders(
+              self._test_desc.phase_group,
+              phase_order.load_order_file(conf.phase_order_file)))
 
     if conf.capture_source:
       # First, we copy the phases with the real CodeInfo for them.
@@ -235,7 +248,7 @@ class Test(object):
       return
 
     _LOG.error('Received SIGINT, stopping all tests.')
-    for test in cls.TEST_INSTANCES.values():
+    for test in list(cls.TEST_INSTANCES.values()):
       test.abort_from_sig_int()
     if not cls.HANDLED_SIGINT_ONCE:
       cls.HANDLED_SIGINT_ONCE = True
@@ -268,7 +281,8 @@ class Test(object):
                                teardown=[teardown_phase]),
         self._test_desc.code_info, self._test_desc.metadata)
 
-  def execute(self, test_start=None, profile_filename=None):
+  def execute(self, test_start=None, profile_filename=None,
+              phases_finished_cb=None):
     """Starts the framework and executes the given test.
 
     Args:
@@ -277,6 +291,10 @@ class Test(object):
           setting the DUT ID.
       profile_filename: Name of file to put profiling stats into. This also
           enables profiling data collection.
+      phases_finished_cb: Function called (with no arguments, from the test
+          executor thread) once no more phases of this execution will run,
+          before plugs are torn down and output callbacks are run; see
+          station_runner.py.
 
     Returns:
       Boolean indicating whether the test failed (False) or passed (True).
@@ -316,7 +334,8 @@ class Test(object):
           self.make_uid(),
           trigger,
           self._test_options,
-          run_with_profiling=profile_filename is not None)
+          run_with_profiling=profile_filename is not None,
+          phases_finished_cb=phases_finished_cb)
 
       _LOG.info('Executing test: %s', self.descriptor.code_info.name)
       self.TEST_INSTANCES[self.uid] = self
@@ -375,7 +394,9 @@ class TestOptions(mutablerecords.Record('TestOptions', [], {
     'teardown_function': None,
     'failure_exceptions': list,
     'default_dut_id': 'UNKNOWN_DUT',
-    'stop_on_first_failure': False
+    'stop_on_first_failure': False,
+    'resume_store': None,
+    'timing_history': None,
 })):
   """Class encapsulating various tunable knobs for Tests and their defaults.
 
@@ -391,6 +412,13 @@ class TestOptions(mutablerecords.Record('TestOptions', [], {
   default_dut_id: The DUT ID that will be used if the start trigger and all
       subsequent phases fail to set one.
   stop_on_first_failure: Stop Test on first failed measurement.
+  resume_store: A results_store.ResultsStore, to resume the test from the last
+      run of the test on the DUT if it did not pass: main phases that passed
+      in that run and are unchanged are not run again (see core/resume.py).
+      The store should also be one of the output callbacks.
+  timing_history: A timing_history.TimingHistory, to derive the timeouts of
+      phases from their past durations.  The history should also be one of
+      the output callbacks.
   """
 
 
@@ -424,7 +452,7 @@ class TestDescriptor(collections.namedtuple(
 class TestApi(collections.namedtuple('TestApi', [
     'logger', 'state', 'test_record', 'measurements', 'attachments',
     'attach', 'attach_from_file', 'get_measurement', 'get_attachment',
-    'notify_update'])):
+    'notify_update', 'cancellation_token'])):
   """Class passed to test phases as the first argument.
 
   Attributes:
@@ -465,11 +493,15 @@ class TestApi(collections.namedtuple('TestApi', [
     attach_from_file: Attach binary data from a file, see
         TestState.attach_from_file().
 
-    get_attachment:  Get copy of attachment contents from current or previous
-        phase, see TestState.get_attachement.
+    get_attachment:  Get a read-only view of an attachment from current or
+        previous phase, see TestState.get_attachment().
 
-    get_measurement: Get copy of a measurement from a current or previous phase,
-        see TestState.get_measurement().
+    get_measurement: Get a read-only view of a measurement from a current or
+        previous phase, see TestState.get_measurement().  Note that the value
+        is not a copy: a list value is returned as a read-only tuple and a dict
+        value as a read-only dict (see data.read_only_view()), which compare
+        equal to the measured value and can be passed to json.dumps().  Use
+        list(value) or dict(value) to get a mutable (shallow) copy.
 
     notify_update: Notify any frontends of an interesting update. Typically
         this is automatically called internally when interesting things happen,
@@ -479,6 +511,17 @@ class TestApi(collections.namedtuple('TestApi', [
 
 
   Read-only Attributes:
+    cancellation_token: A threads.CancellationToken that is cancelled when the
+        phase is stopped, e.g. because the test is aborted or the phase timed
+        out.  Phases that wait or poll for a long time can wait on it, or check
+        it, to stop right away instead of being killed:
+
+          if test.cancellation_token.wait(timeout_s=5):
+            return openhtf.PhaseResult.STOP
+
+        None for phases run in a subprocess, which are terminated instead.
+
+
     attachments: Dict mapping attachment name to test_record.Attachment
         instance containing the data that was attached (and the MIME type
         that was assumed based on extension, if any).  Only attachments
@@ -498,3 +541,7 @@ class TestApi(collections.namedtuple('TestApi', [
                           self.test_record.dut_id, dut_id)
     self.test_record.dut_id = dut_id
     self.notify_update()
+
+
+# Let code written before cancellation tokens existed construct a TestApi.
+TestApi.__new__.__defaults__ = (None,)
@@ -14,19 +14,25 @@
 
 """TestExecutor executes tests."""
 
+import collections
+import contextlib
 import logging
 import pstats
 import sys
 import tempfile
 import threading
 
+from openhtf.core import distributed
 from openhtf.core import phase_descriptor
 from openhtf.core import phase_executor
 from openhtf.core import phase_group
+from openhtf.core import resume
 from openhtf.core import test_record
 from openhtf.core import test_state
 from openhtf.util import conf
+from openhtf.util import coroutines
 from openhtf.util import threads
+from six.moves import queue
 
 
 _LOG = logging.getLogger(__name__)
@@ -35,6 +41,14 @@ conf.declare('cancel_timeout_s', default_value=2,
              description='Timeout (in seconds) when the test has been cancelled'
              'to wait for the running phase to exit.')
 
+conf.declare('remote_group_heartbeat_timeout_s', default_value=10,
+             description='Seconds without a heartbeat after which the worker '
+             'running a remote PhaseGroup is considered lost.')
+
+conf.declare('remote_group_authkey', default_value=None,
+             description='Key authenticating test processes to the workers '
+             'that run their remote PhaseGroups; required by both.')
+
 conf.declare('stop_on_first_failure', default_value=False,
              description='Stop current test execution and return Outcome FAIL'
              'on first phase with failed measurement.')
@@ -60,6 +74,38 @@ def CombineProfileStats(profile_stats_iter, output_filename):
     pstats.Stats(*profile_stats_filenames).dump_stats(output_filename)
 
 
+class _ParallelBranchThread(threads.KillableThread):
+  """Runs one main phase (or PhaseGroup) of a parallel PhaseGroup."""
+  daemon = True
+
+  def __init__(self, test_executor, phase, index, finished_queue):
+    super(_ParallelBranchThread, self).__init__(
+        name='<ParallelBranchThread: %s>' % phase.name)
+    self._test_executor = test_executor
+    self._phase = phase
+    self._finished_queue = finished_queue
+    self.index = index
+    self.phase_records = []
+    self.is_terminal = False
+
+  def _thread_proc(self):
+    # pylint: disable=protected-access
+    test_state = self._test_executor.test_state
+    with test_state.parallel_branch_context() as phase_records:
+      self.phase_records = phase_records
+      self.is_terminal = self._test_executor._handle_phase(self._phase)
+
+  def _thread_exception(self, *args):
+    self.is_terminal = True
+    self._test_executor.test_state.state_logger.critical(
+        'Parallel branch for %s raised an exception', self._phase.name,
+        exc_info=args)
+    return True  # Never propagate exceptions upward.
+
+  def _thread_finished(self):
+    self._finished_queue.put(self)
+
+
 # pylint: disable=too-many-instance-attributes
 class TestExecutor(threads.KillableThread):
   """Encompasses the execution of a single test."""
@@ -70,7 +116,8 @@ class TestExecutor(threads.KillableThread):
                execution_uid,
                test_start,
                test_options,
-               run_with_profiling):
+               run_with_profiling,
+               phases_finished_cb=None):
     super(TestExecutor, self).__init__(
         name='TestExecutorThread', run_with_profiling=run_with_profiling)
     self.test_state = None
@@ -78,14 +125,23 @@ class TestExecutor(threads.KillableThread):
     self._test_descriptor = test_descriptor
     self._test_start = test_start
     self._test_options = test_options
+    # Called once no more phases will run, before plugs are torn down.
+    self._phases_finished_cb = phases_finished_cb
     self._lock = threading.Lock()
     self._phase_exec = None
     self.uid = execution_uid
     self._last_outcome = None
     self._abort = threading.Event()
     self._full_abort = threading.Event()
+    # Coroutine phases and plug methods of this test run on this event loop,
+    # which is only started if needed.
+    self._event_loop = coroutines.EventLoopThread(
+        name='<TestEventLoop: %s>' % execution_uid)
     self._teardown_phases_lock = threading.Lock()
+    # Locks per plug type, held while running phases that use those plugs.
+    self._plug_locks = collections.defaultdict(threading.Lock)
     self._phase_profile_stats = []  # Populated if profiling is enabled.
+    self._resume_plan = None  # Set if resuming from a previous run.
 
   @property
   def phase_profile_stats(self):
@@ -157,7 +213,9 @@ class TestExecutor(threads.KillableThread):
           self._test_descriptor,
           self.uid,
           self._test_options)
-      phase_exec = phase_executor.PhaseExecutor(self.test_state)
+      phase_exec = phase_executor.PhaseExecutor(
+          self.test_state, event_loop=self._event_loop,
+          timing_history=self._test_options.timing_history)
 
       # Any access to self._exit_stacks must be done while holding this lock.
       with self._lock:
@@ -174,6 +232,8 @@ class TestExecutor(threads.KillableThread):
       if self._initialize_plugs():
         return
 
+      self._plan_resume()
+
       # Everything is set, set status and begin test execution.
       self.test_state.set_status_running()
       self._execute_phase_group(self._test_descriptor.phase_group)
@@ -181,7 +241,19 @@ class TestExecutor(threads.KillableThread):
       _LOG.exception('Exception in TestExecutor.')
       raise
     finally:
-      self._execute_test_teardown()
+      try:
+        self._notify_phases_finished()
+        self._execute_test_teardown()
+      finally:
+        self._event_loop.stop(timeout_s=conf.cancel_timeout_s)
+
+  def _notify_phases_finished(self):
+    if self._phases_finished_cb is None:
+      return
+    try:
+      self._phases_finished_cb()
+    except Exception:  # pylint: disable=broad-except
+      _LOG.exception('Phases finished callback raised; continuing anyway.')
 
   def _initialize_plugs(self, plug_types=None):
     """Initialize plugs.
@@ -201,6 +273,43 @@ class TestExecutor(threads.KillableThread):
           phase_executor.ExceptionInfo(*sys.exc_info()))
       return True
 
+  def _plan_resume(self):
+    """Look up the previous run to resume from, if resuming is enabled."""
+    store = self._test_options.resume_store
+    dut_id = self.test_state.test_record.dut_id
+    if store is None or dut_id is None:
+      return
+    self._resume_plan = resume.ResumePlan.from_store(
+        store, dut_id, self._test_options.name)
+    if self._resume_plan is not None:
+      self.test_state.test_record.metadata['resumed_from'] = {
+          'start_time_millis':
+              self._resume_plan.previous_record.start_time_millis,
+          'phases': self._resume_plan.reused_phase_names,
+      }
+
+  def _resume_phase(self, phase):
+    """Reuse the record of phase from the previous run, if possible.
+
+    Args:
+      phase: phase_descriptor.PhaseDescriptor about to be run.
+
+    Returns:
+      True if a record was reused, in which case the phase must not be run.
+    """
+    if isinstance(phase, phase_descriptor.PhaseSweep):
+      self._resume_plan.finish()
+      return False
+    phase_record = self._resume_plan.take(phase)
+    if phase_record is None:
+      return False
+    self.test_state.state_logger.info(
+        'Reusing the passing record of phase %s from the previous run.',
+        phase.name)
+    self.test_state.add_phase_records([phase_record])
+    self.test_state.notify_update()
+    return True
+
   def _execute_test_start(self):
     """Run the start trigger phase, and check that the DUT ID is set after.
 
@@ -254,7 +363,7 @@ class TestExecutor(threads.KillableThread):
   # TODO(kschiller): Cleanup the naming here and possibly merge with finalize.
   def _execute_test_teardown(self):
     # Plug teardown does not affect the test outcome.
-    self.test_state.plug_manager.tear_down_plugs()
+    self.test_state.plug_manager.tear_down_plugs(event_loop=self._event_loop)
 
     # Now finalize the test state.
     if self._abort.is_set():
@@ -265,13 +374,43 @@ class TestExecutor(threads.KillableThread):
     else:
       self.test_state.finalize_normally()
 
+  @contextlib.contextmanager
+  def _plug_locks_context(self, phase):
+    """Hold the locks of the plugs used by phase while it runs.
+
+    This ensures that phases run in parallel never use the same plug at the
+    same time.  Locks are always acquired in the same order to avoid deadlocks.
+
+    Args:
+      phase: phase_descriptor.PhaseDescriptor about to be run.
+
+    Yields:
+      None.
+    """
+    plug_types = sorted({plug.cls for plug in phase.plugs},
+                        key=lambda cls: (cls.__module__, cls.__name__, id(cls)))
+    with self._lock:
+      plug_locks = [self._plug_locks[cls] for cls in plug_types]
+    for plug_lock in plug_locks:
+      plug_lock.acquire()
+    try:
+      yield
+    finally:
+      for plug_lock in reversed(plug_locks):
+        plug_lock.release()
+
   def _handle_phase(self, phase):
     if isinstance(phase, phase_group.PhaseGroup):
+      if phase.worker is not None:
+        return self._execute_remote_group(phase)
       return self._execute_phase_group(phase)
+    if isinstance(phase, phase_descriptor.PhaseSweep):
+      return self._execute_phase_sweep(phase)
 
     self.test_state.state_logger.debug('Handling phase %s', phase.name)
-    outcome, profile_stats = self._phase_exec.execute_phase(
-        phase, self._run_with_profiling)
+    with self._plug_locks_context(phase):
+      outcome, profile_stats = self._phase_exec.execute_phase(
+          phase, self._run_with_profiling)
 
     if profile_stats is not None:
       self._phase_profile_stats.append(profile_stats)
@@ -279,19 +418,59 @@ class TestExecutor(threads.KillableThread):
     if (self.test_state.test_options.stop_on_first_failure or
         conf.stop_on_first_failure):
       # Stop Test on first measurement failure
-      current_phase_result = self.test_state.test_record.phases[
-          len(self.test_state.test_record.phases) - 1]
-      if current_phase_result.outcome == test_record.PhaseOutcome.FAIL:
+      current_phase_result = self.test_state.last_phase_record
+      if (current_phase_result is not None and
+          current_phase_result.outcome == test_record.PhaseOutcome.FAIL):
         outcome = phase_executor.PhaseExecutionOutcome(
             phase_descriptor.PhaseResult.STOP)
         self.test_state.state_logger.error(
             'Stopping test because stop_on_first_failure is True')
 
-    if outcome.is_terminal and not self._last_outcome:
-      self._last_outcome = outcome
+    if outcome.is_terminal:
+      # Phases in parallel PhaseGroups may finish at the same time.
+      with self._lock:
+        if not self._last_outcome:
+          self._last_outcome = outcome
 
     return outcome.is_terminal
 
+  def _execute_phase_sweep(self, sweep):
+    """Execute the phases of a sweep, expanding them as they run.
+
+    Args:
+      sweep: phase_descriptor.PhaseSweep, the sweep to execute.
+
+    Returns:
+      True if a phase of the sweep is terminal or the test is aborted, False
+      otherwise.
+    """
+    self.test_state.state_logger.debug(
+        'Sweeping phase %s over %d combinations of %s', sweep.name,
+        sweep.point_count, ', '.join(name for name, _ in sweep.parameters))
+    for phase in sweep.iter_points():
+      if self._abort.is_set() or self._handle_phase(phase):
+        return True
+    return False
+
+  def _execute_remote_group(self, group):
+    """Execute a phase group on its worker, see distributed.py.
+
+    Args:
+      group: phase_group.PhaseGroup, the phase group to execute.
+
+    Returns:
+      True if the group is terminal or its worker is lost, False otherwise.
+    """
+    if self._resume_plan is not None:
+      self._resume_plan.finish()
+    outcome = distributed.run_group(group, self.test_state, self._abort)
+    if outcome is None:
+      return False
+    with self._lock:
+      if not self._last_outcome:
+        self._last_outcome = outcome
+    return True
+
   def _execute_abortable_phases(self, type_name, phases, group_name):
     """Execute phases, returning immediately if any error or abort is triggered.
 
@@ -308,7 +487,14 @@ class TestExecutor(threads.KillableThread):
       self.test_state.state_logger.debug(
           'Executing %s phases for %s', type_name, group_name)
     for phase in phases:
-      if self._abort.is_set() or self._handle_phase(phase):
+      if self._abort.is_set():
+        return True
+      if (type_name == 'main' and self._resume_plan is not None and
+          self._resume_plan.active and
+          not isinstance(phase, phase_group.PhaseGroup) and
+          self._resume_phase(phase)):
+        continue
+      if self._handle_phase(phase):
         return True
     return False
 
@@ -336,6 +522,51 @@ class TestExecutor(threads.KillableThread):
           ret = True
     return ret
 
+  def _execute_parallel_phases(self, phases, group_name):
+    """Execute phases concurrently, each in its own thread.
+
+    Each phase is started as soon as the phases it depends on (see the
+    depends_on phase option) have finished.  Once any phase is terminal or the
+    test is aborted, no more phases are started, but phases already started are
+    allowed to finish.  The resulting PhaseRecords are added to the test record
+    in the order of phases, once all of them have finished.
+
+    Args:
+      phases: iterable of phase_descriptor.Phase or phase_group.PhaseGroup
+          instances, the phases to execute.
+      group_name: str or None, name of the executing group.
+
+    Returns:
+      True if there is a terminal error or the test is aborted, False otherwise.
+    """
+    if group_name and phases:
+      self.test_state.state_logger.debug(
+          'Executing main phases in parallel for %s', group_name)
+    if self._resume_plan is not None:
+      self._resume_plan.finish()
+    dependencies = phase_group.sibling_dependencies(phases)
+    finished_queue = queue.Queue()
+    branches = {}
+    finished = set()
+    is_terminal = False
+    while True:
+      if not is_terminal and not self._abort.is_set():
+        for index, phase in enumerate(phases):
+          if index not in branches and dependencies[index] <= finished:
+            branches[index] = _ParallelBranchThread(
+                self, phase, index, finished_queue)
+            branches[index].start()
+      if len(finished) == len(branches):
+        break
+      branch = finished_queue.get()
+      finished.add(branch.index)
+      is_terminal = is_terminal or branch.is_terminal
+
+    for index in sorted(branches):
+      self.test_state.add_phase_records(branches[index].phase_records)
+    self.test_state.notify_update()
+    return self._abort.is_set() or is_terminal
+
   def _execute_phase_group(self, group):
     """Executes the phases in a phase group.
 
@@ -357,8 +588,11 @@ class TestExecutor(threads.KillableThread):
     if self._execute_abortable_phases(
         'setup', group.setup, group.name):
       return True
-    main_ret = self._execute_abortable_phases(
-        'main', group.main, group.name)
+    if group.parallel:
+      main_ret = self._execute_parallel_phases(group.main, group.name)
+    else:
+      main_ret = self._execute_abortable_phases(
+          'main', group.main, group.name)
     teardown_ret = self._execute_teardown_phases(
         group.teardown, group.name)
     return main_ret or teardown_ret
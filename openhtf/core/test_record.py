@@ -19,6 +19,7 @@ import collections
 import hashlib
 import inspect
 import logging
+import mmap
 import os
 import tempfile
 
@@ -92,12 +93,64 @@ class Attachment(object):
         'sha1': self.sha1,
     }
 
+  def view(self):
+    """Returns a read-only AttachmentView of this attachment.
+
+    The view's data is a read-only memory map of the attachment's temporary
+    file, so no data is read or copied until it is accessed.
+    """
+    try:
+      mapped = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+      # Empty files cannot be mapped.
+      return AttachmentView(b'', self.mimetype, self.sha1)
+    try:
+      return AttachmentView(memoryview(mapped), self.mimetype, self.sha1)
+    except TypeError:
+      # Python 2 mmaps do not support memoryview.
+      mapped.close()
+      return AttachmentView(self.data, self.mimetype, self.sha1)
+
   def __copy__(self):
     return Attachment(self.data, self.mimetype)
 
   def __deepcopy__(self, memo):
     return Attachment(self.data, self.mimetype)
 
+  def __getstate__(self):
+    # The temporary file can't be pickled, so pickle its data instead.
+    return {'data': self.data, 'mimetype': self.mimetype}
+
+  def __setstate__(self, state):
+    self.__init__(state['data'], state['mimetype'])
+
+
+class AttachmentView(object):
+  """Read-only view of an Attachment, see Attachment.view().
+
+  Attributes:
+    data: Read-only memoryview of the attachment data.
+    mimetype: str, MIME type of the data.
+    sha1: str, SHA-1 hash of the data.
+  """
+
+  __slots__ = ['data', 'mimetype', 'sha1']
+
+  def __init__(self, data, mimetype, sha1):
+    self.data = memoryview(data) if isinstance(data, bytes) else data
+    self.mimetype = mimetype
+    self.sha1 = sha1
+
+  def _asdict(self):
+    return {
+        'mimetype': self.mimetype,
+        'sha1': self.sha1,
+    }
+
+  def __reduce__(self):
+    # Memory maps can't be pickled, so pickle a copy of the data instead.
+    return AttachmentView, (self.data.tobytes(), self.mimetype, self.sha1)
+
 
 class TestRecord(  # pylint: disable=no-init
     mutablerecords.Record(
@@ -114,11 +167,31 @@ class TestRecord(  # pylint: disable=no-init
          '_cached_phases': list,
          '_cached_log_records': list,
          '_cached_config_from_metadata': dict,
+         '_phase_outcome_counts': collections.Counter,
+         '_failed_phase_names': list,
+         '_failed_measurement_names': list,
+         '_measurements_by_name': dict,
+         '_attachments_by_name': dict,
         })):
-  """The record of a single run of a test."""
+  """The record of a single run of a test.
+
+  Phase records should be added with add_phase_record(), which keeps an index
+  of the phase outcomes, so that checkpoints and the test's final outcome don't
+  need to scan all the phases (burn-in tests can have tens of thousands), and an
+  index of the measurements and attachments by name, for get_measurement() and
+  get_attachment().
+  """
 
   def __init__(self, *args, **kwargs):
     super(TestRecord, self).__init__(*args, **kwargs)
+    # Copies of a record pass in its indexes, so rebuild them from scratch.
+    self._phase_outcome_counts = collections.Counter()
+    self._failed_phase_names = []
+    self._failed_measurement_names = []
+    self._measurements_by_name = {}
+    self._attachments_by_name = {}
+    for phase_record in self.phases:
+      self._index_phase_record(phase_record)
     # Cache data that does not change during execution.
     # Cache the metadata config so it does not recursively copied over and over
     # again.
@@ -140,6 +213,52 @@ class TestRecord(  # pylint: disable=no-init
   def add_phase_record(self, phase_record):
     self.phases.append(phase_record)
     self._cached_phases.append(phase_record.as_base_types())
+    self._index_phase_record(phase_record)
+
+  def _index_phase_record(self, phase_record):
+    self._phase_outcome_counts[phase_record.outcome] += 1
+    if phase_record.outcome == PhaseOutcome.FAIL:
+      self._failed_phase_names.append(phase_record.name)
+    if phase_record.outcome != PhaseOutcome.SKIP and phase_record.measurements:
+      # Compared by name, since the measurements module depends on this one.
+      self._failed_measurement_names.extend(
+          name for name, measurement in six.iteritems(phase_record.measurements)
+          if getattr(measurement.outcome, 'name', None) == 'FAIL')
+      self._measurements_by_name.update(phase_record.measurements)
+    for name, attachment in six.iteritems(phase_record.attachments):
+      self._attachments_by_name.setdefault(name, attachment)
+
+  def count_phases(self, outcome=None):
+    """Returns the number of phase records with the given PhaseOutcome.
+
+    Args:
+      outcome: A PhaseOutcome, or None to count all phase records.
+    """
+    if outcome is None:
+      return len(self.phases)
+    return self._phase_outcome_counts[outcome]
+
+  @property
+  def failed_phase_names(self):
+    """Names of the phases with a FAIL outcome, in the order they ran."""
+    return list(self._failed_phase_names)
+
+  @property
+  def failed_measurement_names(self):
+    """Names of the failed measurements of phases that were not skipped."""
+    return list(self._failed_measurement_names)
+
+  def get_measurement(self, name):
+    """Returns the most recent measurement with the given name, or None.
+
+    Measurements of skipped phases are ignored, since the framework ignores
+    them.
+    """
+    return self._measurements_by_name.get(name)
+
+  def get_attachment(self, name):
+    """Returns the first attachment with the given name, or None."""
+    return self._attachments_by_name.get(name)
 
   def add_log_record(self, log_record):
     self.log_records.append(log_record)
@@ -179,7 +298,9 @@ class PhaseRecord(  # pylint: disable=no-init
         'PhaseRecord', ['descriptor_id', 'name', 'codeinfo'],
         {'measurements': None, 'options': None,
          'start_time_millis': int, 'end_time_millis': None,
-         'attachments': dict, 'result': None, 'outcome': None})):
+         'attachments': dict, 'result': None, 'outcome': None,
+         'repeat_summary': None, 'timings': None,
+         'timeout_margin_s': None, 'fingerprint': None})):
   """The record of a single run of a phase.
 
   Measurement metadata (declarations) and values are stored in separate
@@ -197,6 +318,20 @@ class PhaseRecord(  # pylint: disable=no-init
 
   The 'outcome' attribute is a PhaseOutcome, which caches the pass/fail outcome
   of the phase's measurements or indicates that the verification was skipped.
+
+  The 'repeat_summary' attribute is a RepeatSummary of the attempts of a phase
+  run with the repeat_in_place option, and None for other phases.
+
+  The 'timings' attribute is an instrumentation.Timings of the time spent in
+  the phase and in framework work around it, if the instrument_overhead config
+  key is set, and None otherwise.
+
+  The 'timeout_margin_s' attribute is the number of seconds that were left
+  before the phase's timeout when it finished (zero or less if it timed out).
+
+  The 'fingerprint' attribute is a hash of the phase's code and configuration
+  (see resume.phase_fingerprint), if the test's resume_store or timing_history
+  option is set.
   """
 
   @classmethod
@@ -226,6 +361,37 @@ class PhaseRecord(  # pylint: disable=no-init
     self.options = options
 
 
+class RepeatSummary(  # pylint: disable=no-init
+    mutablerecords.Record(
+        'RepeatSummary', [],
+        {'count': 0, 'total_time_millis': 0, 'max_time_millis': 0,
+         'last_time_millis': 0, 'error_count': 0, 'last_error': None})):
+  """Summary of the attempts of a phase run with the repeat_in_place option.
+
+  Such a phase is repeated within a single PhaseRecord, which records this
+  summary instead of a full PhaseRecord for every attempt.
+
+  Attributes:
+    count: Number of attempts, including the final one.
+    total_time_millis: Total duration of the attempts.
+    max_time_millis: Duration of the longest attempt.
+    last_time_millis: Duration of the final attempt.
+    error_count: Number of attempts that raised an exception.
+    last_error: Description of the last exception raised by an attempt, if any.
+  """
+
+  def record_attempt(self, start_time_millis, error=None):
+    """Record an attempt that started at start_time_millis and just ended."""
+    duration_millis = util.time_millis() - start_time_millis
+    self.count += 1
+    self.total_time_millis += duration_millis
+    self.max_time_millis = max(self.max_time_millis, duration_millis)
+    self.last_time_millis = duration_millis
+    if error is not None:
+      self.error_count += 1
+      self.last_error = '%s: %s' % (type(error).__name__, error)
+
+
 def _get_source_safely(obj):
   try:
     return inspect.getsource(obj)
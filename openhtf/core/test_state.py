@@ -43,10 +43,13 @@ from openhtf import plugs
 from openhtf import util
 from openhtf.core import measurements
 from openhtf.core import phase_executor
+from openhtf.core import resume
 from openhtf.core import test_record
 from openhtf.util import conf
 from openhtf.util import data
+from openhtf.util import instrumentation
 from openhtf.util import logs
+from openhtf.util import threads
 from past.builtins import long
 import six
 
@@ -60,6 +63,15 @@ conf.declare('allow_unset_measurements', default_value=False,
 # are provided then we'll fall back to the machine's hostname.
 conf.declare('station_id', 'The name of this test station',
              default_value=socket.gethostname())
+conf.declare('instrument_overhead', default_value=False,
+             description='If True, record the wall and CPU time spent in each '
+             'phase and in framework work around it on its PhaseRecord; see '
+             'openhtf.util.instrumentation.')
+conf.declare('notify_update_window_s', default_value=0.05,
+             description='Updates of a running test (log records, '
+             'measurements, phase starts and ends, ...) within this many '
+             'seconds are coalesced into a single update for watchers such as '
+             'the station server; 0 notifies watchers of each update.')
 
 _LOG = logging.getLogger(__name__)
 
@@ -78,19 +90,16 @@ class DuplicateAttachmentError(Exception):
 class ImmutableMeasurement(collections.namedtuple(
     'ImmutableMeasurement',
     ['name', 'value', 'units', 'dimensions', 'outcome'])):
-  """Immutable copy of a measurement."""
+  """Immutable view of a measurement."""
 
   @classmethod
   def FromMeasurement(cls, measurement):
-    """Convert a Measurement into an ImmutableMeasurement."""
+    """Convert a Measurement into an ImmutableMeasurement, without copying."""
     measured_value = measurement.measured_value
     if isinstance(measured_value, measurements.DimensionedMeasuredValue):
-      value = mutablerecords.CopyRecord(
-          measured_value,
-          value_dict=copy.deepcopy(measured_value.value_dict)
-      )
+      value = measured_value.read_only_view()
     else:
-      value = (copy.deepcopy(measured_value.value)
+      value = (data.read_only_view(measured_value.value)
                if measured_value.is_value_set else None)
 
     return cls(
@@ -119,7 +128,9 @@ class TestState(util.SubscribableStateMixin):
     test_record: TestRecord instance for the currently running test.
     state_logger: Logger that logs to test_record's log_records attribute.
     running_phase_state: PhaseState object for the currently running phase,
-        if any, otherwise None.
+        if any, otherwise None.  When phases run in parallel, this is the phase
+        bound to the calling thread, falling back to the most recently started
+        phase for threads that are not running a phase (e.g. the frontend).
     user_defined_state: Dictionary for users to persist state across phase
         invocations.  It's passed to the user via test_api.
     test_api: An openhtf.TestApi instance for passing to test phases,
@@ -132,6 +143,7 @@ class TestState(util.SubscribableStateMixin):
 
   def __init__(self, test_desc, execution_uid, test_options):
     super(TestState, self).__init__()
+    self.notify_window_s = float(conf.notify_update_window_s)
     self._status = self.Status.WAITING_FOR_TEST_START
 
     self.test_record = test_record.TestRecord(
@@ -144,7 +156,11 @@ class TestState(util.SubscribableStateMixin):
     self.state_logger = logs.get_record_logger_for(execution_uid)
     self.plug_manager = plugs.PlugManager(
         test_desc.plug_types, self.state_logger)
-    self.running_phase_state = None
+    # All currently running phases, in the order in which they were started.
+    # Replaced rather than modified, under self._lock, so it can be read
+    # without the lock.
+    self._running_phase_states = []
+    self._local = threads.NoneByDefaultThreadLocal()
     self.user_defined_state = {}
     self.execution_uid = execution_uid
     self.test_options = test_options
@@ -160,6 +176,84 @@ class TestState(util.SubscribableStateMixin):
     """
     logs.remove_record_handler(self.execution_uid)
 
+  @property
+  def running_phase_state(self):
+    running_phase_state = self._local.running_phase_state
+    if running_phase_state is not None:
+      return running_phase_state
+    running_phase_states = self._running_phase_states
+    return running_phase_states[-1] if running_phase_states else None
+
+  @running_phase_state.setter
+  def running_phase_state(self, running_phase_state):
+    if running_phase_state is None:
+      self._running_phase_states = []
+    else:
+      self._running_phase_states = [running_phase_state]
+
+  @contextlib.contextmanager
+  def bind_running_phase_state(self, running_phase_state):
+    """Make running_phase_state the current phase for the calling thread.
+
+    This is used by the framework so that the TestApi and logger seen by a phase
+    refer to that phase, even if other phases are running at the same time.
+
+    Args:
+      running_phase_state: PhaseState to bind to the calling thread.
+
+    Yields:
+      None.
+    """
+    previous = self._local.running_phase_state
+    self._local.running_phase_state = running_phase_state
+    try:
+      yield
+    finally:
+      self._local.running_phase_state = previous
+
+  @contextlib.contextmanager
+  def parallel_branch_context(self):
+    """Create a context within which phases may run concurrently.
+
+    Phases that run in this context (on the calling thread) are allowed to run
+    while phases on other threads are running.  Their PhaseRecords are not added
+    to the test record when they finish; instead, they are collected in the
+    yielded list so the caller can add them in a deterministic order.
+
+    Yields:
+      List of PhaseRecords for the phases run in this context, in run order.
+    """
+    phase_records = []
+    self._local.phase_records = phase_records
+    try:
+      yield phase_records
+    finally:
+      self._local.phase_records = None
+
+  def add_phase_records(self, phase_records):
+    """Add PhaseRecords collected from parallel branches, in the given order.
+
+    If called from within a parallel_branch_context() (i.e. for nested parallel
+    PhaseGroups), the records are added to that branch instead.
+
+    Args:
+      phase_records: iterable of PhaseRecords to add.
+    """
+    branch_phase_records = self._local.phase_records
+    for phase_record in phase_records:
+      if branch_phase_records is not None:
+        branch_phase_records.append(phase_record)
+      else:
+        self.test_record.add_phase_record(phase_record)
+
+  @property
+  def last_phase_record(self):
+    """The PhaseRecord of the last phase run by the calling thread, or None."""
+    phase_records = self._local.phase_records
+    if phase_records is None:
+      phase_records = self.test_record.phases
+    return phase_records[-1] if phase_records else None
+
   @property
   def logger(self):
     if self.running_phase_state:
@@ -190,60 +284,54 @@ class TestState(util.SubscribableStateMixin):
                 running_phase_state.attach_from_file,
                 self.get_measurement,
                 self.get_attachment,
-                self.notify_update,))
+                self.notify_update,
+                running_phase_state.cancellation_token))
 
   def get_attachment(self, attachment_name):
-    """Get a copy of an attachment from current or previous phases.
+    """Get a read-only view of an attachment from current or previous phases.
 
     Args:
       attachment_name:  str of the attachment name
 
     Returns:
-      A copy of the attachment or None if the attachment cannot be found.
-
+      A test_record.AttachmentView of the attachment, whose data is a read-only
+      memoryview, or None if the attachment cannot be found.
     """
     # Check current running phase state
+    attachment = None
     if self.running_phase_state:
-      if attachment_name in self.running_phase_state.phase_record.attachments:
-        attachment = self.running_phase_state.phase_record.attachments.get(
-            attachment_name)
-        return copy.deepcopy(attachment)
-
-    for phase_record in self.test_record.phases:
-      if attachment_name in phase_record.attachments:
-        attachment = phase_record.attachments[attachment_name]
-        return copy.deepcopy(attachment)
+      attachment = self.running_phase_state.phase_record.attachments.get(
+          attachment_name)
+    if attachment is None:
+      attachment = self.test_record.get_attachment(attachment_name)
+    if attachment is not None:
+      return attachment.view()
 
     self.state_logger.warning('Could not find attachment: %s', attachment_name)
     return None
 
   def get_measurement(self, measurement_name):
-    """Get a copy of a measurement value from current or previous phase.
+    """Get a read-only view of a measurement from current or previous phase.
 
     Measurement and phase name uniqueness is not enforced, so this method will
-    return an immutable copy of the most recent measurement recorded.
+    return a view of the most recent measurement recorded, ignoring those of
+    skipped phases.  The value is not copied; lists and dicts are returned as
+    read-only tuple and dict views (see data.read_only_view()).
 
     Args:
       measurement_name: str of the measurement name
     Returns:
       an ImmutableMeasurement or None if the measurement cannot be found.
     """
-    # The framework ignores measurements from SKIP and REPEAT phases
-    ignore_outcomes = {test_record.PhaseOutcome.SKIP}
-
     # Check current running phase state
     if self.running_phase_state:
       if measurement_name in self.running_phase_state.measurements:
         return ImmutableMeasurement.FromMeasurement(
             self.running_phase_state.measurements[measurement_name])
 
-    # Iterate through phases in reversed order to return most recent (necessary
-    # because measurement and phase names are not necessarily unique)
-    for phase_record in reversed(self.test_record.phases):
-      if (phase_record.result not in ignore_outcomes and
-          measurement_name in phase_record.measurements):
-        measurement = phase_record.measurements[measurement_name]
-        return ImmutableMeasurement.FromMeasurement(measurement)
+    measurement = self.test_record.get_measurement(measurement_name)
+    if measurement is not None:
+      return ImmutableMeasurement.FromMeasurement(measurement)
 
     self.state_logger.warning(
         'Could not find measurement: %s', measurement_name)
@@ -260,24 +348,49 @@ class TestState(util.SubscribableStateMixin):
     Within this context, the Station API will report the given phase as the
     currently running phase.
 
+    Only one phase may run at a time, unless each concurrently running phase is
+    run within its own parallel_branch_context().
+
     Args:
       phase_desc: openhtf.PhaseDescriptor to start a context for.
 
     Yields:
       PhaseState to track transient state.
     """
-    assert not self.running_phase_state, 'Phase already running!'
-    phase_logger = self.state_logger.getChild('phase.' + phase_desc.name)
-    phase_state = self.running_phase_state = PhaseState.from_descriptor(
-        phase_desc, self.notify_update, logger=phase_logger)
-    try:
-      with phase_state.record_timing_context:
-        self.notify_update()  # New phase started.
-        yield phase_state
-    finally:
-      self.test_record.add_phase_record(phase_state.phase_record)
-      self.running_phase_state = None
-      self.notify_update()  # Phase finished.
+    branch_phase_records = self._local.phase_records
+    assert not self._local.running_phase_state, 'Phase already running!'
+    assert branch_phase_records is not None or not self.running_phase_state, (
+        'Phase already running!')
+    timings = instrumentation.Timings() if conf.instrument_overhead else None
+    with instrumentation.bind(timings):
+      with instrumentation.section(instrumentation.PHASE_STATE):
+        phase_logger = self.state_logger.getChild('phase.' + phase_desc.name)
+        phase_state = PhaseState.from_descriptor(
+            phase_desc, self.notify_update, logger=phase_logger)
+        phase_state.phase_record.timings = timings
+        if (self.test_options.resume_store is not None or
+            self.test_options.timing_history is not None):
+          phase_state.phase_record.fingerprint = resume.phase_fingerprint(
+              phase_desc)
+      with self._lock:
+        self._running_phase_states = (
+            self._running_phase_states + [phase_state])
+      try:
+        with self.bind_running_phase_state(phase_state):
+          with phase_state.record_timing_context:
+            self.notify_update()  # New phase started.
+            yield phase_state
+      finally:
+        with instrumentation.section(instrumentation.FINALIZE):
+          if branch_phase_records is not None:
+            branch_phase_records.append(phase_state.phase_record)
+          else:
+            self.test_record.add_phase_record(phase_state.phase_record)
+        with self._lock:
+          self._running_phase_states = [
+              running for running in self._running_phase_states
+              if running is not phase_state]
+        self.notify_update()  # Phase finished.
 
   def as_base_types(self):
     """Convert to a dict representation composed exclusively of base types."""
@@ -300,8 +413,8 @@ class TestState(util.SubscribableStateMixin):
     return self._status == self.Status.COMPLETED
 
   def stop_running_phase(self):
-    """Stops the currently running phase, allowing another phase to run."""
-    self.running_phase_state = None
+    """Stops the currently running phases, allowing another phase to run."""
+    self._running_phase_states = []
 
   @property
   def last_run_phase_name(self):
@@ -393,16 +506,15 @@ class TestState(util.SubscribableStateMixin):
     if self._is_aborted():
       return
 
-    phases = self.test_record.phases
-    if not phases:
+    record = self.test_record
+    phase_count = record.count_phases()
+    if not phase_count:
       # Vacuously PASS a TestRecord with no phases.
       self._finalize(test_record.Outcome.PASS)
-    elif any(
-        phase.outcome == test_record.PhaseOutcome.FAIL for phase in phases):
+    elif record.count_phases(test_record.PhaseOutcome.FAIL):
       # Any FAIL phase results in a test failure.
       self._finalize(test_record.Outcome.FAIL)
-    elif all(
-        phase.outcome == test_record.PhaseOutcome.SKIP for phase in phases):
+    elif record.count_phases(test_record.PhaseOutcome.SKIP) == phase_count:
       # Error when all phases are skipped; otherwise, it could lead to
       # unintentional passes.
       self.state_logger.error('All phases were skipped, outcome ERROR.')
@@ -470,6 +582,7 @@ class PhaseState(
                           {'hit_repeat_limit': False,
                            'notify_cb': None,
                            'logger': None,
+                           'cancellation_token': threads.CancellationToken,
                            '_cached': dict,
                            '_update_measurements': set})):
   """Data type encapsulating interesting information about a running phase.
@@ -482,6 +595,8 @@ class PhaseState(
         facing Collection for setting measurements.
     options: the PhaseOptions from the phase descriptor.
     result: Convenience getter/setter for phase_record.result.
+    cancellation_token: threads.CancellationToken cancelled when the phase is
+        stopped (e.g. the test is aborted) or times out.
     _cached: A cached representation of the running test state that; updated in
         place to save allocation time.
   """
@@ -509,7 +624,7 @@ class PhaseState(
         phase_desc.name,
         test_record.PhaseRecord.from_descriptor(phase_desc),
         collections.OrderedDict(
-            (measurement.name, copy.deepcopy(measurement))
+            (measurement.name, measurement.fresh_copy())
             for measurement in phase_desc.measurements),
         phase_desc.options,
         notify_cb=notify_cb,
@@ -661,6 +776,7 @@ class PhaseState(
     try:
       yield
     finally:
-      self._finalize_measurements()
-      self._set_phase_outcome()
-      self.phase_record.finalize_phase(self.options)
+      with instrumentation.section(instrumentation.FINALIZE):
+        self._finalize_measurements()
+        self._set_phase_outcome()
+        self.phase_record.finalize_phase(self.options)
@@ -0,0 +1,218 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""History of phase durations, for adaptive phase timeouts.
+
+Most phases run with the default timeout (see phase_executor) or a generous
+hand-picked timeout_s, so a hung instrument can tie up a fixture for minutes.
+A TimingHistory keeps the recent durations of each phase, keyed by the phase's
+name and fingerprint (see resume.phase_fingerprint, so changing a phase starts
+a new history), in a JSON file on the station.  When a test's timing_history
+option is set, each phase with enough history gets a timeout of its p99
+duration times a factor, though never more than its declared timeout:
+
+  history = timing_history.TimingHistory('/var/lib/openhtf/timings.json')
+  test.add_output_callbacks(history)
+  test.configure(timing_history=history)
+
+As an output callback, the history adds the durations of the phases of each
+test record that passed, failed or timed out (rather than erred), saves them
+and warns about phases that are drifting slower: those whose recent median
+duration is well above their earlier median.  A phase that timed out is
+recorded with the duration it ran for, i.e. the timeout it hit, so a phase
+that got slower than its adaptive timeout gets a longer one on later runs.
+"""
+
+import collections
+import json
+import logging
+import math
+import os
+import threading
+
+from openhtf.core import resume
+from openhtf.core import test_record
+
+_LOG = logging.getLogger(__name__)
+
+# Number of most recent durations compared with earlier ones to detect drift.
+_DRIFT_WINDOW = 10
+
+
+class PhaseDrift(collections.namedtuple(
+    'PhaseDrift', ['name', 'fingerprint', 'baseline_s', 'recent_s'])):
+  """A phase whose recent median duration is above its earlier median.
+
+  Attributes:
+    name: Name of the phase.
+    fingerprint: Fingerprint of the phase.
+    baseline_s: Median duration of the earlier runs, in seconds.
+    recent_s: Median duration of the recent runs, in seconds.
+  """
+
+
+def _percentile(sorted_values, percentile):
+  """Nearest-rank percentile of a sorted, non-empty list."""
+  rank = int(math.ceil(percentile / 100.0 * len(sorted_values)))
+  return sorted_values[max(rank, 1) - 1]
+
+
+def _median(values):
+  return _percentile(sorted(values), 50)
+
+
+class TimingHistory(object):
+  """Recent durations of phases, by phase name and fingerprint."""
+
+  def __init__(self, path=None, max_samples=100, min_samples=20,
+               percentile=99, factor=3.0, min_timeout_s=5.0, drift_ratio=1.5):
+    """Initializer for TimingHistory.
+
+    Args:
+      path: JSON file to load the history from and save it to, or None to only
+          keep it in memory.
+      max_samples: Number of most recent durations kept per phase.
+      min_samples: Number of durations a phase needs before its timeout is
+          derived from them.
+      percentile: Percentile of the durations the timeout is derived from.
+      factor: Factor applied to that percentile to get the timeout.
+      min_timeout_s: Adaptive timeouts are never shorter than this.
+      drift_ratio: Phases whose recent median duration exceeds their earlier
+          median by this factor are reported as drifting.
+    """
+    self.path = path
+    self.max_samples = max_samples
+    self.min_samples = min_samples
+    self.percentile = percentile
+    self.factor = factor
+    self.min_timeout_s = min_timeout_s
+    self.drift_ratio = drift_ratio
+    self._lock = threading.Lock()
+    # Maps (name, fingerprint) to a deque of durations in seconds.
+    self._durations = {}
+    if path and os.path.exists(path):
+      self._load()
+
+  def _load(self):
+    try:
+      with open(self.path) as history_file:
+        entries = json.load(history_file)
+    except (IOError, ValueError):
+      _LOG.warning('Could not load the timing history from %s; starting a new '
+                   'one.', self.path, exc_info=True)
+      return
+    for entry in entries:
+      self._durations[entry['name'], entry['fingerprint']] = collections.deque(
+          entry['durations_s'], maxlen=self.max_samples)
+
+  def save(self):
+    """Save the history to its path, if it has one."""
+    if not self.path:
+      return
+    with self._lock:
+      entries = [
+          {'name': name, 'fingerprint': fingerprint,
+           'durations_s': list(durations)}
+          for (name, fingerprint), durations in sorted(self._durations.items())
+      ]
+    partial_path = self.path + '.partial'
+    with open(partial_path, 'w') as history_file:
+      json.dump(entries, history_file)
+    os.rename(partial_path, self.path)
+
+  def add_duration(self, name, fingerprint, duration_s):
+    """Add a duration of the phase with the given name and fingerprint."""
+    with self._lock:
+      durations = self._durations.get((name, fingerprint))
+      if durations is None:
+        durations = self._durations[name, fingerprint] = collections.deque(
+            maxlen=self.max_samples)
+      durations.append(duration_s)
+
+  def durations_s(self, name, fingerprint):
+    """Returns the kept durations of a phase, oldest first, in seconds."""
+    with self._lock:
+      return list(self._durations.get((name, fingerprint), ()))
+
+  def percentile_s(self, name, fingerprint, percentile=None):
+    """Returns a percentile of the durations of a phase, or None if unknown."""
+    durations = self.durations_s(name, fingerprint)
+    if not durations:
+      return None
+    return _percentile(sorted(durations), percentile or self.percentile)
+
+  def timeout_s(self, phase_desc, declared_timeout_s):
+    """Returns the timeout to apply to a phase.
+
+    Args:
+      phase_desc: phase_descriptor.PhaseDescriptor about to run.
+      declared_timeout_s: The timeout of the phase without history, i.e. its
+          timeout_s option or the default timeout.
+
+    Returns:
+      The adaptive timeout of the phase if it has at least min_samples
+      durations, else declared_timeout_s; never more than declared_timeout_s.
+    """
+    durations = self.durations_s(
+        phase_desc.name, resume.phase_fingerprint(phase_desc))
+    if len(durations) < self.min_samples:
+      return declared_timeout_s
+    adaptive_timeout_s = max(
+        self.min_timeout_s,
+        _percentile(sorted(durations), self.percentile) * self.factor)
+    return min(adaptive_timeout_s, declared_timeout_s)
+
+  def drift(self, name, fingerprint):
+    """Returns a PhaseDrift if the phase is drifting slower, else None."""
+    durations = self.durations_s(name, fingerprint)
+    if len(durations) < 2 * _DRIFT_WINDOW:
+      return None
+    baseline_s = _median(durations[:-_DRIFT_WINDOW])
+    recent_s = _median(durations[-_DRIFT_WINDOW:])
+    if recent_s <= baseline_s * self.drift_ratio:
+      return None
+    return PhaseDrift(name, fingerprint, baseline_s, recent_s)
+
+  def drifting_phases(self):
+    """Returns a PhaseDrift for each phase that is drifting slower."""
+    with self._lock:
+      keys = sorted(self._durations)
+    return [drift for drift in (self.drift(*key) for key in keys) if drift]
+
+  def __call__(self, record):
+    keys = set()
+    for phase_record in record.phases:
+      if (phase_record.fingerprint is None or
+          phase_record.end_time_millis is None or
+          # Records reused from a previous run (see resume.py).
+          phase_record.start_time_millis < record.start_time_millis or
+          (phase_record.outcome not in (test_record.PhaseOutcome.PASS,
+                                        test_record.PhaseOutcome.FAIL) and
+           not (phase_record.result and phase_record.result.is_timeout))):
+        continue
+      key = phase_record.name, phase_record.fingerprint
+      self.add_duration(
+          key[0], key[1],
+          (phase_record.end_time_millis - phase_record.start_time_millis) /
+          1000.0)
+      keys.add(key)
+    self.save()
+    for key in sorted(keys):
+      drift = self.drift(*key)
+      if drift:
+        _LOG.warning(
+            'Phase %s is drifting slower: median %.3f s over its last %d runs, '
+            'up from %.3f s.', drift.name, drift.recent_s, _DRIFT_WINDOW,
+            drift.baseline_s)
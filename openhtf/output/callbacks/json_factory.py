@@ -56,7 +56,10 @@ class OutputToJSON(callbacks.OutputToFile):
     as_dict = data.convert_to_base_types(test_record,
                                          json_safe=(not self.allow_nan))
     if self.inline_attachments:
+      # Copy the phase dicts, which the test record caches for later calls.
+      as_dict['phases'] = [dict(phase) for phase in as_dict['phases']]
       for phase, original_phase in zip(as_dict['phases'], test_record.phases):
+        phase['attachments'] = dict(phase['attachments'])
         for name, attachment in six.iteritems(original_phase.attachments):
           phase['attachments'][name] = attachment
     return as_dict
@@ -0,0 +1,106 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Output callback keeping the last few test records of each DUT on disk.
+
+Besides keeping a local history of each DUT, a ResultsStore is what tests
+resume from (see the resume_store test option):
+
+  store = results_store.ResultsStore('/var/lib/openhtf/results')
+  test.add_output_callbacks(store)
+  test.configure(resume_store=store)
+"""
+
+import logging
+import os
+import re
+import uuid
+
+from openhtf.output import pipeline
+from six.moves import cPickle as pickle
+
+_LOG = logging.getLogger(__name__)
+
+_RECORD_SUFFIX = '.record'
+_PARTIAL_SUFFIX = '.partial'
+
+
+class ResultsStore(object):
+  """Keeps the last records_per_dut test records of each DUT in a directory."""
+
+  def __init__(self, directory, records_per_dut=5):
+    """Initializer for ResultsStore.
+
+    Args:
+      directory: Directory to keep the records in, one subdirectory per DUT.
+      records_per_dut: Number of records to keep for each DUT.
+    """
+    self.directory = directory
+    self.records_per_dut = records_per_dut
+
+  def _dut_directory(self, dut_id):
+    return os.path.join(self.directory, re.sub(r'[^\w.-]', '_', str(dut_id)))
+
+  def _record_paths(self, dut_id):
+    """Paths of the records of dut_id, newest first."""
+    dut_directory = self._dut_directory(dut_id)
+    if not os.path.isdir(dut_directory):
+      return []
+    return [os.path.join(dut_directory, filename)
+            for filename in sorted(os.listdir(dut_directory), reverse=True)
+            if filename.endswith(_RECORD_SUFFIX)]
+
+  def __call__(self, test_record):
+    if not test_record.dut_id:
+      return
+    try:
+      pickled_record = pipeline.pickle_test_record(test_record)
+    except Exception:  # pylint: disable=broad-except
+      _LOG.warning('Could not pickle the test record of %s, not storing it.',
+                   test_record.dut_id, exc_info=True)
+      return
+    dut_directory = self._dut_directory(test_record.dut_id)
+    if not os.path.isdir(dut_directory):
+      os.makedirs(dut_directory)
+    # Start times sort the records; the uuid breaks ties.
+    path = os.path.join(dut_directory, '%015d-%s' % (
+        test_record.start_time_millis, uuid.uuid4().hex[:8]))
+    with open(path + _PARTIAL_SUFFIX, 'wb') as record_file:
+      record_file.write(pickled_record)
+    os.rename(path + _PARTIAL_SUFFIX, path + _RECORD_SUFFIX)
+    for old_path in self._record_paths(test_record.dut_id)[
+        self.records_per_dut:]:
+      os.remove(old_path)
+
+  def records(self, dut_id):
+    """Yields the stored test records of dut_id, newest first."""
+    for path in self._record_paths(dut_id):
+      try:
+        with open(path, 'rb') as record_file:
+          test_record = pickle.load(record_file)
+      except Exception:  # pylint: disable=broad-except
+        _LOG.warning('Could not load stored record %s.', path, exc_info=True)
+        continue
+      # Different DUT IDs may map to the same directory.
+      if test_record.dut_id == dut_id:
+        yield test_record
+
+  def last_record(self, dut_id, test_name=None):
+    """Returns the newest stored record of dut_id (and test_name), or None."""
+    for test_record in self.records(dut_id):
+      if (test_name is None or
+          test_record.metadata.get('test_name') == test_name):
+        return test_record
+    return None
@@ -0,0 +1,398 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Run output callbacks in the background.
+
+Test.execute() runs the output callbacks of a test one after another before it
+returns, so a slow callback (an upload, a large export) adds directly to the
+time before the next DUT can be tested.  An OutputPipeline is an output callback
+that queues the test record for its own callbacks, which run in the background:
+
+  pipeline = pipeline.OutputPipeline(spool_directory='/var/spool/openhtf')
+  pipeline.add_callback(upload_record, workers=2, timeout_s=120)
+  pipeline.add_callback(json_factory.OutputToJSON('./{dut_id}.json'))
+  test.add_output_callbacks(pipeline)
+  while True:
+    test.execute(test_start=...)
+
+Each callback has its own bounded queue and worker threads, so a slow callback
+only delays itself.  A callback that runs for longer than its timeout is killed
+(like a phase that times out).  When the queue of a callback is full, handing a
+record to the pipeline blocks until there is room again (backpressure), rather
+than letting a stalled callback use up memory.
+
+If a spool directory is given, each record is pickled there before it is
+queued, and deleted once all callbacks have handled it.  Records left there by
+a crash are queued again for the callbacks that had not handled them when the
+pipeline starts, so callback names must be stable across runs.  Records that
+can't be pickled (e.g. those of phases with a lambda run_if option) are only
+queued in memory.
+"""
+
+import io
+import logging
+import os
+import re
+import threading
+import uuid
+
+from mutablerecords import records
+from openhtf.util import threads
+import six
+from six.moves import copyreg
+from six.moves import cPickle as pickle
+from six.moves import queue
+
+_LOG = logging.getLogger(__name__)
+
+_RECORD_SUFFIX = '.record'
+_PENDING_SUFFIX = '.pending'
+_PARTIAL_SUFFIX = '.partial'
+
+
+class OutputPipelineError(Exception):
+  """Raised when an OutputPipeline is used incorrectly."""
+
+
+def _restore_record(record_type, state):
+  record = record_type.__new__(record_type)
+  if set(state) - set(record_type.__slots__):
+    # State pickled by an older version of the record type, which its
+    # __setstate__ converts (e.g. DimensionedMeasuredValue's value_dict).
+    record.__setstate__(state)
+    return record
+  for attr, value in six.iteritems(state):
+    # Bypass __setattr__ overrides, which expect a fully initialized record.
+    object.__setattr__(record, attr, value)
+  return record
+
+
+def _reduce_record(record):
+  return _restore_record, (type(record), record.__getstate__())
+
+
+class _DispatchTable(object):
+  """Pickle dispatch table for mutablerecords (__setstate__ is py2-only)."""
+
+  def __getitem__(self, obj_type):
+    if issubclass(obj_type, records.RecordClass):
+      return _reduce_record
+    return copyreg.dispatch_table[obj_type]
+
+  def get(self, obj_type, default=None):
+    try:
+      return self[obj_type]
+    except KeyError:
+      return default
+
+
+def pickle_test_record(test_record, persistent_id=None):
+  """Pickle test_record, returning bytes that pickle.loads() can load.
+
+  Args:
+    test_record: The TestRecord (or other object) to pickle.
+    persistent_id: Optional persistent_id function for the pickler, for
+        objects that are pickled by reference; see the pickle module.
+  """
+  output = io.BytesIO()
+  pickler = pickle.Pickler(output, pickle.HIGHEST_PROTOCOL)
+  if not six.PY2:
+    pickler.dispatch_table = _DispatchTable()
+  if persistent_id is not None:
+    pickler.persistent_id = persistent_id
+  pickler.dump(test_record)
+  return output.getvalue()
+
+
+class _QueuedRecord(object):
+  """A test record queued for some callbacks, possibly spooled to a file."""
+
+  def __init__(self, test_record, callback_names, path=None):
+    self.test_record = test_record
+    self._path = path
+    self._lock = threading.Lock()
+    self._pending = set(callback_names)
+
+  def callback_done(self, name):
+    """Record that the callback called name has handled the record."""
+    with self._lock:
+      self._pending.discard(name)
+      if self._path is None:
+        return
+      _remove(self._path + '.' + name + _PENDING_SUFFIX)
+      if not self._pending:
+        _remove(self._path + _RECORD_SUFFIX)
+
+
+def _remove(path):
+  try:
+    os.remove(path)
+  except OSError:
+    _LOG.warning('Could not remove spooled file %s.', path, exc_info=True)
+
+
+class _CallbackTask(threads.KillableTask):
+  """Calls an output callback with a test record."""
+
+  def __init__(self, callback, test_record):
+    super(_CallbackTask, self).__init__(name='Output callback %s' % callback)
+    self._callback = callback
+    self._test_record = test_record
+
+  def _thread_proc(self):
+    self._callback(self._test_record)
+
+  def _thread_exception(self, *args):
+    _LOG.error('Output callback %s raised; continuing anyway', self._callback,
+               exc_info=args)
+    return True
+
+
+class _Channel(object):
+  """The queue and worker threads of one callback of an OutputPipeline."""
+
+  def __init__(self, callback, name, workers, timeout_s, max_queued_records):
+    self.callback = callback
+    self.name = name
+    self._timeout_s = timeout_s
+    self._queue = queue.Queue(max_queued_records)
+    self._threads = [
+        threading.Thread(target=self._thread_proc,
+                         name='OutputPipeline %s %d' % (name, i))
+        for i in range(workers)]
+    for thread in self._threads:
+      thread.daemon = True
+
+  def start(self):
+    for thread in self._threads:
+      thread.start()
+
+  def put(self, queued_record):
+    """Queue queued_record, blocking while the queue is full."""
+    self._queue.put(queued_record)
+
+  def join(self):
+    """Wait for all queued records to be handled."""
+    self._queue.join()
+
+  def close(self, timeout_s=None):
+    """Stop the worker threads once the queued records are handled.
+
+    Args:
+      timeout_s: Seconds to wait for each worker thread; None waits forever.
+    """
+    for _ in self._threads:
+      self._queue.put(None)
+    for thread in self._threads:
+      thread.join(timeout_s)
+
+  def _thread_proc(self):
+    while True:
+      queued_record = self._queue.get()
+      try:
+        if queued_record is None:
+          return
+        try:
+          self._output(queued_record.test_record)
+        finally:
+          queued_record.callback_done(self.name)
+      finally:
+        self._queue.task_done()
+
+  def _output(self, test_record):
+    task = _CallbackTask(self.callback, test_record)
+    task.start()
+    task.join(self._timeout_s)
+    if task.is_alive():
+      _LOG.error('Output callback %s timed out after %s seconds, killing it.',
+                 self.callback, self._timeout_s)
+      task.kill()
+
+
+class OutputPipeline(object):
+  """An output callback that runs other output callbacks in the background.
+
+  Callbacks are added with add_callback() before the pipeline is first used;
+  the pipeline starts the first time it is called with a test record, or when
+  start() is called.  close() waits for the queued records to be handled.
+  """
+
+  def __init__(self, spool_directory=None, max_queued_records=100):
+    """Initializer for OutputPipeline.
+
+    Args:
+      spool_directory: Directory to spool queued records to, or None to only
+          queue them in memory.  It should only be used by this pipeline.
+      max_queued_records: Maximum number of records queued for each callback.
+    """
+    self._spool_directory = spool_directory
+    self._max_queued_records = max_queued_records
+    self._channels = []
+    self._lock = threading.Lock()
+    self._started = False
+    self._closed = False
+
+  def add_callback(self, callback, name=None, workers=1, timeout_s=None):
+    """Add an output callback to the pipeline.
+
+    Args:
+      callback: The output callback, called with each TestRecord.
+      name: Name of the callback, used to track which callbacks have handled
+          spooled records; defaults to the name of the callback's function or
+          type.
+      workers: Number of records to output concurrently with this callback.
+      timeout_s: Seconds after which a call to the callback is killed, or None
+          to let it run for as long as it takes.
+
+    Raises:
+      OutputPipelineError: If the pipeline has already started, or another
+          callback has the same name.
+    """
+    name = re.sub(r'[^\w-]', '_', name or getattr(
+        callback, '__name__', type(callback).__name__))
+    with self._lock:
+      if self._started:
+        raise OutputPipelineError(
+            'Callbacks must be added before the pipeline starts.')
+      if any(channel.name == name for channel in self._channels):
+        raise OutputPipelineError('Duplicate output callback name: %s' % name)
+      self._channels.append(_Channel(
+          callback, name, workers, timeout_s, self._max_queued_records))
+
+  def start(self):
+    """Start the worker threads and queue records left in the spool directory.
+
+    Raises:
+      OutputPipelineError: If the pipeline has been closed.
+    """
+    with self._lock:
+      if self._closed:
+        raise OutputPipelineError('The pipeline has been closed.')
+      if self._started:
+        return
+      self._started = True
+      for channel in self._channels:
+        channel.start()
+      if self._spool_directory:
+        if not os.path.isdir(self._spool_directory):
+          os.makedirs(self._spool_directory)
+        self._requeue_spooled_records()
+
+  def _requeue_spooled_records(self):
+    """Queue the records left in the spool directory by a previous run."""
+    channels = {channel.name: channel for channel in self._channels}
+    pending = {}
+    record_ids = []
+    for filename in sorted(os.listdir(self._spool_directory)):
+      path = os.path.join(self._spool_directory, filename)
+      if filename.endswith(_PARTIAL_SUFFIX):
+        _remove(path)
+      elif filename.endswith(_RECORD_SUFFIX):
+        record_ids.append(filename[:-len(_RECORD_SUFFIX)])
+      elif filename.endswith(_PENDING_SUFFIX):
+        record_id, _, name = filename[:-len(_PENDING_SUFFIX)].partition('.')
+        pending.setdefault(record_id, []).append(name)
+
+    # Markers are written before their record is renamed into place, so a
+    # crash while spooling can leave markers without a record.
+    for record_id in set(pending) - set(record_ids):
+      for name in pending[record_id]:
+        _remove(os.path.join(self._spool_directory, record_id) + '.' + name +
+                _PENDING_SUFFIX)
+
+    # Queue records in the order they were spooled.
+    record_ids.sort(key=lambda record_id: os.path.getmtime(os.path.join(
+        self._spool_directory, record_id + _RECORD_SUFFIX)))
+    for record_id in record_ids:
+      path = os.path.join(self._spool_directory, record_id)
+      names = pending.get(record_id, [])
+      unknown_names = [name for name in names if name not in channels]
+      if unknown_names:
+        _LOG.warning('Spooled record %s is pending for unknown output '
+                     'callbacks %s; not deleting it.', path, unknown_names)
+      names = [name for name in names if name in channels]
+      if not names:
+        if not unknown_names:
+          _remove(path + _RECORD_SUFFIX)
+        continue
+      try:
+        with open(path + _RECORD_SUFFIX, 'rb') as record_file:
+          test_record = pickle.load(record_file)
+      except Exception:  # pylint: disable=broad-except
+        _LOG.exception('Could not load spooled record %s.', path)
+        continue
+      _LOG.info('Queueing spooled record %s for output callbacks %s.',
+                path, names)
+      queued_record = _QueuedRecord(
+          test_record, names + unknown_names, path=path)
+      for name in names:
+        channels[name].put(queued_record)
+
+  def _spool(self, test_record):
+    """Return a _QueuedRecord for test_record, spooling it if possible."""
+    names = [channel.name for channel in self._channels]
+    if not self._spool_directory:
+      return _QueuedRecord(test_record, names)
+    try:
+      pickled_record = pickle_test_record(test_record)
+    except Exception:  # pylint: disable=broad-except
+      _LOG.warning('Could not pickle the test record of %s, only queueing it '
+                   'in memory.', test_record.dut_id, exc_info=True)
+      return _QueuedRecord(test_record, names)
+
+    path = os.path.join(self._spool_directory, uuid.uuid4().hex)
+    for name in names:
+      open(path + '.' + name + _PENDING_SUFFIX, 'wb').close()
+    # Rename the file once it is complete, so a crash can't leave a partial
+    # record behind.
+    with open(path + _PARTIAL_SUFFIX, 'wb') as record_file:
+      record_file.write(pickled_record)
+    os.rename(path + _PARTIAL_SUFFIX, path + _RECORD_SUFFIX)
+    return _QueuedRecord(test_record, names, path=path)
+
+  def __call__(self, test_record):
+    """Queue test_record for the callbacks, blocking while a queue is full."""
+    self.start()
+    queued_record = self._spool(test_record)
+    for channel in self._channels:
+      channel.put(queued_record)
+
+  def join(self):
+    """Wait for all queued records to be handled by all callbacks."""
+    for channel in self._channels:
+      channel.join()
+
+  def close(self, timeout_s=None):
+    """Wait for the queued records to be handled, and stop the pipeline.
+
+    Args:
+      timeout_s: Seconds to wait for each worker thread; None waits forever.
+          Records that are not handled in time stay in the spool directory.
+    """
+    with self._lock:
+      if self._closed:
+        return
+      self._closed = True
+      started = self._started
+    if started:
+      for channel in self._channels:
+        channel.close(timeout_s)
+
+  def __enter__(self):
+    self.start()
+    return self
+
+  def __exit__(self, *unused_exc_info):
+    self.close()
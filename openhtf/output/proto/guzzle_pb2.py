@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: openhtf/output/proto/guzzle.proto
+"""Generated protocol buffer code."""
+from google.protobuf.internal import enum_type_wrapper
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import message as _message
+from google.protobuf import reflection as _reflection
+from google.protobuf import symbol_database as _symbol_database
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n!openhtf/output/proto/guzzle.proto\x12\x07openhtf\"N\n\x0fTestRunEnvelope\x12*\n\x0cpayload_type\x18\x02 \x01(\x0e\x32\x14.openhtf.PayloadType\x12\x0f\n\x07payload\x18\x03 \x01(\x0c*S\n\x0bPayloadType\x12\x17\n\x13\x43OMPRESSED_TEST_RUN\x10\x01\x12\x13\n\x0f\x43OMPRESSED_VARZ\x10\x02\x12\x16\n\x12\x43OMPRESSED_LOGFILE\x10\x03')
+
+_PAYLOADTYPE = DESCRIPTOR.enum_types_by_name['PayloadType']
+PayloadType = enum_type_wrapper.EnumTypeWrapper(_PAYLOADTYPE)
+COMPRESSED_TEST_RUN = 1
+COMPRESSED_VARZ = 2
+COMPRESSED_LOGFILE = 3
+
+
+_TESTRUNENVELOPE = DESCRIPTOR.message_types_by_name['TestRunEnvelope']
+TestRunEnvelope = _reflection.GeneratedProtocolMessageType('TestRunEnvelope', (_message.Message,), {
+  'DESCRIPTOR' : _TESTRUNENVELOPE,
+  '__module__' : 'openhtf.output.proto.guzzle_pb2'
+  # @@protoc_insertion_point(class_scope:openhtf.TestRunEnvelope)
+  })
+_sym_db.RegisterMessage(TestRunEnvelope)
+
+if _descriptor._USE_C_DESCRIPTORS == False:
+
+  DESCRIPTOR._options = None
+  _PAYLOADTYPE._serialized_start=126
+  _PAYLOADTYPE._serialized_end=209
+  _TESTRUNENVELOPE._serialized_start=46
+  _TESTRUNENVELOPE._serialized_end=124
+# @@protoc_insertion_point(module_scope)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: openhtf/output/proto/mfg_event.proto
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import message as _message
+from google.protobuf import reflection as _reflection
+from google.protobuf import symbol_database as _symbol_database
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+from openhtf.output.proto import assembly_event_pb2 as openhtf_dot_output_dot_proto_dot_assembly__event__pb2
+from openhtf.output.proto import test_runs_pb2 as openhtf_dot_output_dot_proto_dot_test__runs__pb2
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n$openhtf/output/proto/mfg_event.proto\x12\x07openhtf\x1a)openhtf/output/proto/assembly_event.proto\x1a$openhtf/output/proto/test_runs.proto\"\xb4\x05\n\x08MfgEvent\x12\x14\n\ndut_serial\x18\x01 \x01(\tH\x00\x12&\n\x03lot\x18\x02 \x01(\x0b\x32\x17.openhtf.MfgEvent.ByLotH\x00\x12\x15\n\rstart_time_ms\x18\x03 \x02(\x03\x12\x13\n\x0b\x65nd_time_ms\x18\x04 \x01(\x03\x12\x13\n\x0btester_name\x18\x05 \x02(\t\x12\x11\n\ttest_name\x18\x06 \x02(\t\x12\x14\n\x0ctest_version\x18\x14 \x01(\t\x12\x18\n\x10test_description\x18\x15 \x01(\t\x12\x15\n\rtest_run_name\x18\x16 \x01(\t\x12-\n\x0btest_status\x18\x08 \x02(\x0e\x32\x0f.openhtf.Status:\x07\x43REATED\x12/\n\x0f\x61ssembly_events\x18\n \x03(\x0b\x32\x16.openhtf.AssemblyEvent\x12 \n\x07timings\x18\x0b \x03(\x0b\x32\x0f.openhtf.Timing\x12\x1e\n\x06phases\x18\x0c \x03(\x0b\x32\x0e.openhtf.Phase\x12\x17\n\x0f\x66ramework_build\x18\r \x01(\t\x12)\n\x0bmeasurement\x18\x0e \x03(\x0b\x32\x14.openhtf.Measurement\x12,\n\nattachment\x18\x0f \x03(\x0b\x32\x18.openhtf.EventAttachment\x12-\n\ttest_logs\x18\x10 \x03(\x0b\x32\x1a.openhtf.TestRunLogMessage\x12+\n\rfailure_codes\x18\x11 \x03(\x0b\x32\x14.openhtf.FailureCode\x12\x15\n\roperator_name\x18\x12 \x01(\t\x12\x11\n\tpart_tags\x18\x13 \x03(\t\x1a.\n\x05\x42yLot\x12\x12\n\nlot_number\x18\x01 \x02(\t\x12\x11\n\tlot_index\x18\x02 \x01(\tB\x05\n\x03\x64ut\"\xa6\x03\n\x0bMeasurement\x12\x0c\n\x04name\x18\x01 \x02(\t\x12\x1f\n\x06status\x18\x02 \x01(\x0e\x32\x0f.openhtf.Status\x12\x13\n\x0b\x64\x65scription\x18\x06 \x01(\t\x12\x11\n\timportant\x18\x12 \x01(\x08\x12\x15\n\rparameter_tag\x18\x10 \x03(\t\x12\x15\n\rnumeric_value\x18\x0b \x01(\x01\x12\x17\n\x0fnumeric_minimum\x18\x0c \x01(\x01\x12\x17\n\x0fnumeric_maximum\x18\r \x01(\x01\x12\x12\n\ntext_value\x18\x0e \x01(\t\x12\x15\n\rexpected_text\x18\x0f \x01(\t\x12\x13\n\x0bis_optional\x18\x11 \x01(\x08\x12\x17\n\x0fset_time_millis\x18\x13 \x01(\x03\x12*\n\tunit_code\x18\x14 \x01(\x0e\x32\x17.openhtf.Units.UnitCode\x12\x18\n\x10\x63ustom_unit_code\x18\x16 \x01(\t\x12\x1a\n\x12\x63ustom_unit_suffix\x18\x17 \x01(\t\x12\x1d\n\x15\x61ssociated_attachment\x18\x15 \x01(\t*\x06\x08\x88\'\x10\xd0(\"\xc4\x01\n\x0f\x45ventAttachment\x12\x0c\n\x04name\x18\x01 \x02(\t\x12\x14\n\x0cvalue_binary\x18\x02 \x01(\x0c\x12\x13\n\x0b\x64\x65scription\x18\x03 \x01(\t\x12\x17\n\x0fset_time_millis\x18\x04 \x01(\x03\x12\x15\n\rparameter_tag\x18\x05 \x03(\t\x12\'\n\x04type\x18\x06 \x01(\x0e\x32\x17.openhtf.InformationTagH\x00\x12\x13\n\tmime_type\x18\x07 \x01(\tH\x00\x42\n\n\x08\x64\x61tatype')
+
+
+
+_MFGEVENT = DESCRIPTOR.message_types_by_name['MfgEvent']
+_MFGEVENT_BYLOT = _MFGEVENT.nested_types_by_name['ByLot']
+_MEASUREMENT = DESCRIPTOR.message_types_by_name['Measurement']
+_EVENTATTACHMENT = DESCRIPTOR.message_types_by_name['EventAttachment']
+MfgEvent = _reflection.GeneratedProtocolMessageType('MfgEvent', (_message.Message,), {
+
+  'ByLot' : _reflection.GeneratedProtocolMessageType('ByLot', (_message.Message,), {
+    'DESCRIPTOR' : _MFGEVENT_BYLOT,
+    '__module__' : 'openhtf.output.proto.mfg_event_pb2'
+    # @@protoc_insertion_point(class_scope:openhtf.MfgEvent.ByLot)
+    })
+  ,
+  'DESCRIPTOR' : _MFGEVENT,
+  '__module__' : 'openhtf.output.proto.mfg_event_pb2'
+  # @@protoc_insertion_point(class_scope:openhtf.MfgEvent)
+  })
+_sym_db.RegisterMessage(MfgEvent)
+_sym_db.RegisterMessage(MfgEvent.ByLot)
+
+Measurement = _reflection.GeneratedProtocolMessageType('Measurement', (_message.Message,), {
+  'DESCRIPTOR' : _MEASUREMENT,
+  '__module__' : 'openhtf.output.proto.mfg_event_pb2'
+  # @@protoc_insertion_point(class_scope:openhtf.Measurement)
+  })
+_sym_db.RegisterMessage(Measurement)
+
+EventAttachment = _reflection.GeneratedProtocolMessageType('EventAttachment', (_message.Message,), {
+  'DESCRIPTOR' : _EVENTATTACHMENT,
+  '__module__' : 'openhtf.output.proto.mfg_event_pb2'
+  # @@protoc_insertion_point(class_scope:openhtf.EventAttachment)
+  })
+_sym_db.RegisterMessage(EventAttachment)
+
+if _descriptor._USE_C_DESCRIPTORS == False:
+
+  DESCRIPTOR._options = None
+  _MFGEVENT._serialized_start=131
+  _MFGEVENT._serialized_end=823
+  _MFGEVENT_BYLOT._serialized_start=770
+  _MFGEVENT_BYLOT._serialized_end=816
+  _MEASUREMENT._serialized_start=826
+  _MEASUREMENT._serialized_end=1248
+  _EVENTATTACHMENT._serialized_start=1251
+  _EVENTATTACHMENT._serialized_end=1447
+# @@protoc_insertion_point(module_scope)
@@ -27,6 +27,7 @@ MULTIDIM_JSON schema:
 }
 """
 
+import itertools
 import json
 import logging
 import numbers
@@ -172,8 +173,8 @@ def _mangle_measurement(name, measured_value, measurement, mangled_parameters,
   We generate these by doing some name mangling, using some sane limits for
   very large multidimensional measurements.
   """
-  for coord, val in list(measured_value.value_dict.items(
-      ))[:MAX_PARAMS_PER_MEASUREMENT]:
+  for coord, val in itertools.islice(
+      measured_value, MAX_PARAMS_PER_MEASUREMENT):
     # Mangle names so they look like 'myparameter_Xsec_Ynm_ZHz'
     mangled_name = '_'.join([name] + [
         '%s%s' % (
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: openhtf/output/proto/test_runs.proto
+"""Generated protocol buffer code."""
+from google.protobuf.internal import enum_type_wrapper
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import message as _message
+from google.protobuf import reflection as _reflection
+from google.protobuf import symbol_database as _symbol_database
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+from google.protobuf import descriptor_pb2 as google_dot_protobuf_dot_descriptor__pb2
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n$openhtf/output/proto/test_runs.proto\x12\x07openhtf\x1a google/protobuf/descriptor.proto\",\n\x0b\x46\x61ilureCode\x12\x0c\n\x04\x63ode\x18\x01 \x01(\t\x12\x0f\n\x07\x64\x65tails\x18\x02 \x01(\t\">\n\x08TimeInfo\x12\x19\n\x11start_time_millis\x18\x01 \x01(\x03\x12\x17\n\x0f\x65nd_time_millis\x18\x02 \x01(\x03\"Q\n\x06Timing\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x02 \x01(\t\x12$\n\ttime_info\x18\x03 \x01(\x0b\x32\x11.openhtf.TimeInfo\"c\n\x05Phase\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x02 \x01(\t\x12\x14\n\x0c\x63\x61pabilities\x18\x03 \x03(\t\x12!\n\x06timing\x18\x04 \x01(\x0b\x32\x11.openhtf.TimeInfo\"\xf2\x02\n\rTestParameter\x12\x0c\n\x04name\x18\x01 \x02(\t\x12\x1f\n\x06status\x18\x02 \x01(\x0e\x32\x0f.openhtf.Status\x12\x13\n\x0b\x64\x65scription\x18\x06 \x01(\t\x12\x11\n\timportant\x18\x12 \x01(\x08\x12\x15\n\rparameter_tag\x18\x10 \x01(\t\x12\x15\n\rnumeric_value\x18\x0b \x01(\x01\x12\x17\n\x0fnumeric_minimum\x18\x0c \x01(\x01\x12\x17\n\x0fnumeric_maximum\x18\r \x01(\x01\x12\x12\n\ntext_value\x18\x0e \x01(\t\x12\x15\n\rexpected_text\x18\x0f \x01(\t\x12\x13\n\x0bis_optional\x18\x11 \x01(\x08\x12\x17\n\x0fset_time_millis\x18\x13 \x01(\x03\x12*\n\tunit_code\x18\x14 \x01(\x0e\x32\x17.openhtf.Units.UnitCode\x12\x1d\n\x15\x61ssociated_attachment\x18\x15 \x01(\t*\x06\x08\x88\'\x10\xd0(\"\x81\x02\n\x11TestRunLogMessage\x12\x18\n\x10timestamp_millis\x18\x01 \x01(\x03\x12\x13\n\x0blog_message\x18\x02 \x01(\t\x12\x13\n\x0blogger_name\x18\x03 \x01(\t\x12\x0f\n\x07levelno\x18\x04 \x01(\x05\x12/\n\x05level\x18\x07 \x01(\x0e\x32 .openhtf.TestRunLogMessage.Level\x12\x12\n\nlog_source\x18\x05 \x01(\t\x12\x0e\n\x06lineno\x18\x06 \x01(\x05\"B\n\x05Level\x12\t\n\x05\x44\x45\x42UG\x10\n\x12\x08\n\x04INFO\x10\x14\x12\x0b\n\x07WARNING\x10\x1e\x12\t\n\x05\x45RROR\x10(\x12\x0c\n\x08\x43RITICAL\x10\x32\"\xc0\x04\n\x07TestRun\x12\x12\n\ndut_serial\x18\x01 \x02(\t\x12\x13\n\x0btester_name\x18\x02 \x02(\t\x12$\n\ttest_info\x18\x03 \x02(\x0b\x32\x11.openhtf.TestInfo\x12-\n\x0btest_status\x18\x04 \x02(\x0e\x32\x0f.openhtf.Status:\x07\x43REATED\x12\x19\n\x11start_time_millis\x18\x08 \x01(\x03\x12\x17\n\x0f\x65nd_time_millis\x18\t \x01(\x03\x12\x10\n\x08run_name\x18\n \x01(\t\x12/\n\x0ftest_parameters\x18\x05 \x03(\x0b\x32\x16.openhtf.TestParameter\x12\x36\n\x0finfo_parameters\x18\x06 \x03(\x0b\x32\x1d.openhtf.InformationParameter\x12-\n\ttest_logs\x18\x0b \x03(\x0b\x32\x1a.openhtf.TestRunLogMessage\x12+\n\rfailure_codes\x18\x13 \x03(\x0b\x32\x14.openhtf.FailureCode\x12\x15\n\roperator_name\x18\x16 \x01(\t\x12\x12\n\nlot_number\x18\x17 \x01(\t\x12\x0f\n\x07part_id\x18\x18 \x01(\t\x12\x15\n\rsynthetic_dut\x18\x19 \x01(\x08\x12 \n\x07timings\x18\x1b \x03(\x0b\x32\x0f.openhtf.Timing\x12\x1e\n\x06phases\x18\x1c \x03(\x0b\x32\x0e.openhtf.Phase\x12\x17\n\x0f\x66ramework_build\x18\x11 \x01(\t\"E\n\x08TestInfo\x12\x0c\n\x04name\x18\x01 \x02(\t\x12\x13\n\x0b\x64\x65scription\x18\x02 \x01(\t\x12\x16\n\x0eversion_string\x18\x05 \x01(\t\"\xb1\x01\n\x14InformationParameter\x12\x0c\n\x04name\x18\x01 \x02(\t\x12\x14\n\x0cvalue_binary\x18\x07 \x01(\x0c\x12\x13\n\x0b\x64\x65scription\x18\x03 \x01(\t\x12\x17\n\x0fset_time_millis\x18\x08 \x01(\x03\x12\x15\n\rparameter_tag\x18\x05 \x01(\t\x12\x30\n\x04type\x18\x04 \x01(\x0e\x32\x17.openhtf.InformationTag:\tTEXT_UTF8\"\xa4\t\n\x05Units\"\x9a\t\n\x08UnitCode\x12\x08\n\x04NONE\x10\x01\x12\x1c\n\x07PERCENT\x10\x02\x1a\x0f\xd2\xb0\xd6\xc0\x01\x02P1\x9a\xd0\x86\xfd\x01\x01%\x12\x1b\n\x0cNO_DIMENSION\x10\x03\x1a\t\xd2\xb0\xd6\xc0\x01\x03NDL\x12\x1b\n\x05PIXEL\x10\x04\x1a\x10\xd2\xb0\xd6\xc0\x01\x02PX\x9a\xd0\x86\xfd\x01\x02px\x12\x1a\n\x0bPIXEL_LEVEL\x10\x05\x1a\t\xd2\xb0\xd6\xc0\x01\x03PXL\x12,\n\x14ROTATIONS_PER_MINUTE\x10\x07\x1a\x12\xd2\xb0\xd6\xc0\x01\x03RPM\x9a\xd0\x86\xfd\x01\x03rpm\x12\x1c\n\x06SECOND\x10\n\x1a\x10\xd2\xb0\xd6\xc0\x01\x03SEC\x9a\xd0\x86\xfd\x01\x01s\x12\x1b\n\x03MHZ\x10\x0b\x1a\x12\xd2\xb0\xd6\xc0\x01\x03MHZ\x9a\xd0\x86\xfd\x01\x03MHz\x12\x1c\n\x05HERTZ\x10\x0c\x1a\x11\xd2\xb0\xd6\xc0\x01\x03HTZ\x9a\xd0\x86\xfd\x01\x02Hz\x12#\n\x0bMICROSECOND\x10\r\x1a\x12\xd2\xb0\xd6\xc0\x01\x03\x42\x39\x38\x9a\xd0\x86\xfd\x01\x03\xc2\xb5s\x12!\n\nMILLIMETER\x10\x15\x1a\x11\xd2\xb0\xd6\xc0\x01\x03MMT\x9a\xd0\x86\xfd\x01\x02mm\x12 \n\nCENTIMETER\x10\x16\x1a\x10\xd2\xb0\xd6\xc0\x01\x02LC\x9a\xd0\x86\xfd\x01\x02\x63m\x12\x1b\n\x05METER\x10\x17\x1a\x10\xd2\xb0\xd6\xc0\x01\x03MTR\x9a\xd0\x86\xfd\x01\x01m\x12$\n\tPER_METER\x10\x18\x1a\x15\xd2\xb0\xd6\xc0\x01\x03M0R\x9a\xd0\x86\xfd\x01\x06m\xe2\x81\xbb\xc2\xb9\x12!\n\nMILLILITER\x10\x19\x1a\x11\xd2\xb0\xd6\xc0\x01\x03MLT\x9a\xd0\x86\xfd\x01\x02mL\x12#\n\nCUBIC_FOOT\x10\x1a\x1a\x13\xd2\xb0\xd6\xc0\x01\x03MTQ\x9a\xd0\x86\xfd\x01\x04\x46t\xc2\xb3\x12\x1d\n\x07\x44\x45\x43IBEL\x10\x1e\x1a\x10\xd2\xb0\xd6\xc0\x01\x02\x32N\x9a\xd0\x86\xfd\x01\x02\x64\x42\x12\"\n\nDECIBEL_MW\x10\x1f\x1a\x12\xd2\xb0\xd6\xc0\x01\x02\x32N\x9a\xd0\x86\xfd\x01\x04\x64\x42mW\x12 \n\x08MICROAMP\x10 \x1a\x12\xd2\xb0\xd6\xc0\x01\x03\x42\x38\x34\x9a\xd0\x86\xfd\x01\x03\xc2\xb5\x41\x12\x1e\n\x08MILLIAMP\x10!\x1a\x10\xd2\xb0\xd6\xc0\x01\x02\x34K\x9a\xd0\x86\xfd\x01\x02mA\x12!\n\tMICROVOLT\x10\"\x1a\x12\xd2\xb0\xd6\xc0\x01\x03\x44\x38\x32\x9a\xd0\x86\xfd\x01\x03\xc2\xb5V\x12\x1a\n\x04VOLT\x10#\x1a\x10\xd2\xb0\xd6\xc0\x01\x03VLT\x9a\xd0\x86\xfd\x01\x01V\x12\x1f\n\tPICOFARAD\x10$\x1a\x10\xd2\xb0\xd6\xc0\x01\x02\x34T\x9a\xd0\x86\xfd\x01\x02pF\x12\x16\n\x07\x43OULOMB\x10%\x1a\t\xd2\xb0\xd6\xc0\x01\x03\x43OU\x12\x1f\n\tMILLIVOLT\x10&\x1a\x10\xd2\xb0\xd6\xc0\x01\x02\x32Z\x9a\xd0\x86\xfd\x01\x02mV\x12\x1a\n\x04WATT\x10\'\x1a\x10\xd2\xb0\xd6\xc0\x01\x03WTT\x9a\xd0\x86\xfd\x01\x01W\x12\x1c\n\x06\x41MPERE\x10\x1d\x1a\x10\xd2\xb0\xd6\xc0\x01\x03\x41MP\x9a\xd0\x86\xfd\x01\x01\x41\x12&\n\x0e\x44\x45GREE_CELSIUS\x10(\x1a\x12\xd2\xb0\xd6\xc0\x01\x03\x43\x45L\x9a\xd0\x86\xfd\x01\x03\xc2\xb0\x43\x12\x1c\n\x06KELVIN\x10)\x1a\x10\xd2\xb0\xd6\xc0\x01\x03KEL\x9a\xd0\x86\xfd\x01\x01K\x12\x12\n\x04\x42YTE\x10\x32\x1a\x08\xd2\xb0\xd6\xc0\x01\x02\x41\x44\x12/\n\x15MEGA_BYTES_PER_SECOND\x10\x33\x1a\x14\xd2\xb0\xd6\xc0\x01\x04MBPS\x9a\xd0\x86\xfd\x01\x04MB/s\x12\x1c\n\x06\x44\x45GREE\x10<\x1a\x10\xd2\xb0\xd6\xc0\x01\x02\x44\x44\x9a\xd0\x86\xfd\x01\x02\xc2\xb0\x12\x1e\n\x06RADIAN\x10=\x1a\x12\xd2\xb0\xd6\xc0\x01\x03\x43\x38\x31\x9a\xd0\x86\xfd\x01\x03rad\x12\x1c\n\x06NEWTON\x10\x46\x1a\x10\xd2\xb0\xd6\xc0\x01\x03NEW\x9a\xd0\x86\xfd\x01\x01N\x12\x32\n\x18\x43UBIC_CENTIMETER_PER_SEC\x10P\x1a\x14\xd2\xb0\xd6\xc0\x01\x02\x32J\x9a\xd0\x86\xfd\x01\x06\x63m\xc2\xb3/s\x12!\n\x08MILLIBAR\x10Q\x1a\x13\xd2\xb0\xd6\xc0\x01\x03MBR\x9a\xd0\x86\xfd\x01\x04mbar*\x85\x01\n\x0eInformationTag\x12\x07\n\x03JPG\x10\x02\x12\x07\n\x03PNG\x10\x03\x12\x07\n\x03WAV\x10\x04\x12\x08\n\x04TIFF\x10\x08\x12\x07\n\x03MP4\x10\t\x12\x07\n\x03\x41VI\x10\x0b\x12\n\n\x06\x42INARY\x10\x05\x12\x0e\n\nTIMESERIES\x10\x06\x12\r\n\tTEXT_UTF8\x10\x07\x12\x11\n\rMULTIDIM_JSON\x10\n*\xa0\x01\n\x06Status\x12\x08\n\x04PASS\x10\x01\x12\x08\n\x04\x46\x41IL\x10\x02\x12\t\n\x05\x45RROR\x10\x03\x12\x0b\n\x07RUNNING\x10\x04\x12\x0b\n\x07\x43REATED\x10\x05\x12\x0b\n\x07TIMEOUT\x10\x06\x12\x0b\n\x07\x41\x42ORTED\x10\x07\x12\x0b\n\x07WAITING\x10\x08\x12\x0b\n\x07\x43ONSUME\x10\n\x12\x07\n\x03RMA\x10\x0b\x12\n\n\x06REWORK\x10\x0c\x12\t\n\x05SCRAP\x10\r\x12\t\n\x05\x44\x45\x42UG\x10\x0e:6\n\x08uom_code\x12!.google.protobuf.EnumValueOptions\x18\x8a\xe6\x8a\x18 \x01(\t:8\n\nuom_suffix\x12!.google.protobuf.EnumValueOptions\x18\x83\xea\xd0\x1f \x01(\t')
+
+_INFORMATIONTAG = DESCRIPTOR.enum_types_by_name['InformationTag']
+InformationTag = enum_type_wrapper.EnumTypeWrapper(_INFORMATIONTAG)
+_STATUS = DESCRIPTOR.enum_types_by_name['Status']
+Status = enum_type_wrapper.EnumTypeWrapper(_STATUS)
+JPG = 2
+PNG = 3
+WAV = 4
+TIFF = 8
+MP4 = 9
+AVI = 11
+BINARY = 5
+TIMESERIES = 6
+TEXT_UTF8 = 7
+MULTIDIM_JSON = 10
+PASS = 1
+FAIL = 2
+ERROR = 3
+RUNNING = 4
+CREATED = 5
+TIMEOUT = 6
+ABORTED = 7
+WAITING = 8
+CONSUME = 10
+RMA = 11
+REWORK = 12
+SCRAP = 13
+DEBUG = 14
+
+UOM_CODE_FIELD_NUMBER = 50508554
+uom_code = DESCRIPTOR.extensions_by_name['uom_code']
+UOM_SUFFIX_FIELD_NUMBER = 66336003
+uom_suffix = DESCRIPTOR.extensions_by_name['uom_suffix']
+
+_FAILURECODE = DESCRIPTOR.message_types_by_name['FailureCode']
+_TIMEINFO = DESCRIPTOR.message_types_by_name['TimeInfo']
+_TIMING = DESCRIPTOR.message_types_by_name['Timing']
+_PHASE = DESCRIPTOR.message_types_by_name['Phase']
+_TESTPARAMETER = DESCRIPTOR.message_types_by_name['TestParameter']
+_TESTRUNLOGMESSAGE = DESCRIPTOR.message_types_by_name['TestRunLogMessage']
+_TESTRUN = DESCRIPTOR.message_types_by_name['TestRun']
+_TESTINFO = DESCRIPTOR.message_types_by_name['TestInfo']
+_INFORMATIONPARAMETER = DESCRIPTOR.message_types_by_name['InformationParameter']
+_UNITS = DESCRIPTOR.message_types_by_name['Units']
+_TESTRUNLOGMESSAGE_LEVEL = _TESTRUNLOGMESSAGE.enum_types_by_name['Level']
+_UNITS_UNITCODE = _UNITS.enum_types_by_name['UnitCode']
+FailureCode = _reflection.GeneratedProtocolMessageType('FailureCode', (_message.Message,), {
+  'DESCRIPTOR' : _FAILURECODE,
+  '__module__' : 'openhtf.output.proto.test_runs_pb2'
+  # @@protoc_insertion_point(class_scope:openhtf.FailureCode)
+  })
+_sym_db.RegisterMessage(FailureCode)
+
+TimeInfo = _reflection.GeneratedProtocolMessageType('TimeInfo', (_message.Message,), {
+  'DESCRIPTOR' : _TIMEINFO,
+  '__module__' : 'openhtf.output.proto.test_runs_pb2'
+  # @@protoc_insertion_point(class_scope:openhtf.TimeInfo)
+  })
+_sym_db.RegisterMessage(TimeInfo)
+
+Timing = _reflection.GeneratedProtocolMessageType('Timing', (_message.Message,), {
+  'DESCRIPTOR' : _TIMING,
+  '__module__' : 'openhtf.output.proto.test_runs_pb2'
+  # @@protoc_insertion_point(class_scope:openhtf.Timing)
+  })
+_sym_db.RegisterMessage(Timing)
+
+Phase = _reflection.GeneratedProtocolMessageType('Phase', (_message.Message,), {
+  'DESCRIPTOR' : _PHASE,
+  '__module__' : 'openhtf.output.proto.test_runs_pb2'
+  # @@protoc_insertion_point(class_scope:openhtf.Phase)
+  })
+_sym_db.RegisterMessage(Phase)
+
+TestParameter = _reflection.GeneratedProtocolMessageType('TestParameter', (_message.Message,), {
+  'DESCRIPTOR' : _TESTPARAMETER,
+  '__module__' : 'openhtf.output.proto.test_runs_pb2'
+  # @@protoc_insertion_point(class_scope:openhtf.TestParameter)
+  })
+_sym_db.RegisterMessage(TestParameter)
+
+TestRunLogMessage = _reflection.GeneratedProtocolMessageType('TestRunLogMessage', (_message.Message,), {
+  'DESCRIPTOR' : _TESTRUNLOGMESSAGE,
+  '__module__' : 'openhtf.output.proto.test_runs_pb2'
+  # @@protoc_insertion_point(class_scope:openhtf.TestRunLogMessage)
+  })
+_sym_db.RegisterMessage(TestRunLogMessage)
+
+TestRun = _reflection.GeneratedProtocolMessageType('TestRun', (_message.Message,), {
+  'DESCRIPTOR' : _TESTRUN,
+  '__module__' : 'openhtf.output.proto.test_runs_pb2'
+  # @@protoc_insertion_point(class_scope:openhtf.TestRun)
+  })
+_sym_db.RegisterMessage(TestRun)
+
+TestInfo = _reflection.GeneratedProtocolMessageType('TestInfo', (_message.Message,), {
+  'DESCRIPTOR' : _TESTINFO,
+  '__module__' : 'openhtf.output.proto.test_runs_pb2'
+  # @@protoc_insertion_point(class_scope:openhtf.TestInfo)
+  })
+_sym_db.RegisterMessage(TestInfo)
+
+InformationParameter = _reflection.GeneratedProtocolMessageType('InformationParameter', (_message.Message,), {
+  'DESCRIPTOR' : _INFORMATIONPARAMETER,
+  '__module__' : 'openhtf.output.proto.test_runs_pb2'
+  # @@protoc_insertion_point(class_scope:openhtf.InformationParameter)
+  })
+_sym_db.RegisterMessage(InformationParameter)
+
+Units = _reflection.GeneratedProtocolMessageType('Units', (_message.Message,), {
+  'DESCRIPTOR' : _UNITS,
+  '__module__' : 'openhtf.output.proto.test_runs_pb2'
+  # @@protoc_insertion_point(class_scope:openhtf.Units)
+  })
+_sym_db.RegisterMessage(Units)
+
+if _descriptor._USE_C_DESCRIPTORS == False:
+  google_dot_protobuf_dot_descriptor__pb2.EnumValueOptions.RegisterExtension(uom_code)
+  google_dot_protobuf_dot_descriptor__pb2.EnumValueOptions.RegisterExtension(uom_suffix)
+
+  DESCRIPTOR._options = None
+  _UNITS_UNITCODE.values_by_name["PERCENT"]._options = None
+  _UNITS_UNITCODE.values_by_name["PERCENT"]._serialized_options = b'\322\260\326\300\001\002P1\232\320\206\375\001\001%'
+  _UNITS_UNITCODE.values_by_name["NO_DIMENSION"]._options = None
+  _UNITS_UNITCODE.values_by_name["NO_DIMENSION"]._serialized_options = b'\322\260\326\300\001\003NDL'
+  _UNITS_UNITCODE.values_by_name["PIXEL"]._options = None
+  _UNITS_UNITCODE.values_by_name["PIXEL"]._serialized_options = b'\322\260\326\300\001\002PX\232\320\206\375\001\002px'
+  _UNITS_UNITCODE.values_by_name["PIXEL_LEVEL"]._options = None
+  _UNITS_UNITCODE.values_by_name["PIXEL_LEVEL"]._serialized_options = b'\322\260\326\300\001\003PXL'
+  _UNITS_UNITCODE.values_by_name["ROTATIONS_PER_MINUTE"]._options = None
+  _UNITS_UNITCODE.values_by_name["ROTATIONS_PER_MINUTE"]._serialized_options = b'\322\260\326\300\001\003RPM\232\320\206\375\001\003rpm'
+  _UNITS_UNITCODE.values_by_name["SECOND"]._options = None
+  _UNITS_UNITCODE.values_by_name["SECOND"]._serialized_options = b'\322\260\326\300\001\003SEC\232\320\206\375\001\001s'
+  _UNITS_UNITCODE.values_by_name["MHZ"]._options = None
+  _UNITS_UNITCODE.values_by_name["MHZ"]._serialized_options = b'\322\260\326\300\001\003MHZ\232\320\206\375\001\003MHz'
+  _UNITS_UNITCODE.values_by_name["HERTZ"]._options = None
+  _UNITS_UNITCODE.values_by_name["HERTZ"]._serialized_options = b'\322\260\326\300\001\003HTZ\232\320\206\375\001\002Hz'
+  _UNITS_UNITCODE.values_by_name["MICROSECOND"]._options = None
+  _UNITS_UNITCODE.values_by_name["MICROSECOND"]._serialized_options = b'\322\260\326\300\001\003B98\232\320\206\375\001\003\302\265s'
+  _UNITS_UNITCODE.values_by_name["MILLIMETER"]._options = None
+  _UNITS_UNITCODE.values_by_name["MILLIMETER"]._serialized_options = b'\322\260\326\300\001\003MMT\232\320\206\375\001\002mm'
+  _UNITS_UNITCODE.values_by_name["CENTIMETER"]._options = None
+  _UNITS_UNITCODE.values_by_name["CENTIMETER"]._serialized_options = b'\322\260\326\300\001\002LC\232\320\206\375\001\002cm'
+  _UNITS_UNITCODE.values_by_name["METER"]._options = None
+  _UNITS_UNITCODE.values_by_name["METER"]._serialized_options = b'\322\260\326\300\001\003MTR\232\320\206\375\001\001m'
+  _UNITS_UNITCODE.values_by_name["PER_METER"]._options = None
+  _UNITS_UNITCODE.values_by_name["PER_METER"]._serialized_options = b'\322\260\326\300\001\003M0R\232\320\206\375\001\006m\342\201\273\302\271'
+  _UNITS_UNITCODE.values_by_name["MILLILITER"]._options = None
+  _UNITS_UNITCODE.values_by_name["MILLILITER"]._serialized_options = b'\322\260\326\300\001\003MLT\232\320\206\375\001\002mL'
+  _UNITS_UNITCODE.values_by_name["CUBIC_FOOT"]._options = None
+  _UNITS_UNITCODE.values_by_name["CUBIC_FOOT"]._serialized_options = b'\322\260\326\300\001\003MTQ\232\320\206\375\001\004Ft\302\263'
+  _UNITS_UNITCODE.values_by_name["DECIBEL"]._options = None
+  _UNITS_UNITCODE.values_by_name["DECIBEL"]._serialized_options = b'\322\260\326\300\001\0022N\232\320\206\375\001\002dB'
+  _UNITS_UNITCODE.values_by_name["DECIBEL_MW"]._options = None
+  _UNITS_UNITCODE.values_by_name["DECIBEL_MW"]._serialized_options = b'\322\260\326\300\001\0022N\232\320\206\375\001\004dBmW'
+  _UNITS_UNITCODE.values_by_name["MICROAMP"]._options = None
+  _UNITS_UNITCODE.values_by_name["MICROAMP"]._serialized_options = b'\322\260\326\300\001\003B84\232\320\206\375\001\003\302\265A'
+  _UNITS_UNITCODE.values_by_name["MILLIAMP"]._options = None
+  _UNITS_UNITCODE.values_by_name["MILLIAMP"]._serialized_options = b'\322\260\326\300\001\0024K\232\320\206\375\001\002mA'
+  _UNITS_UNITCODE.values_by_name["MICROVOLT"]._options = None
+  _UNITS_UNITCODE.values_by_name["MICROVOLT"]._serialized_options = b'\322\260\326\300\001\003D82\232\320\206\375\001\003\302\265V'
+  _UNITS_UNITCODE.values_by_name["VOLT"]._options = None
+  _UNITS_UNITCODE.values_by_name["VOLT"]._serialized_options = b'\322\260\326\300\001\003VLT\232\320\206\375\001\001V'
+  _UNITS_UNITCODE.values_by_name["PICOFARAD"]._options = None
+  _UNITS_UNITCODE.values_by_name["PICOFARAD"]._serialized_options = b'\322\260\326\300\001\0024T\232\320\206\375\001\002pF'
+  _UNITS_UNITCODE.values_by_name["COULOMB"]._options = None
+  _UNITS_UNITCODE.values_by_name["COULOMB"]._serialized_options = b'\322\260\326\300\001\003COU'
+  _UNITS_UNITCODE.values_by_name["MILLIVOLT"]._options = None
+  _UNITS_UNITCODE.values_by_name["MILLIVOLT"]._serialized_options = b'\322\260\326\300\001\0022Z\232\320\206\375\001\002mV'
+  _UNITS_UNITCODE.values_by_name["WATT"]._options = None
+  _UNITS_UNITCODE.values_by_name["WATT"]._serialized_options = b'\322\260\326\300\001\003WTT\232\320\206\375\001\001W'
+  _UNITS_UNITCODE.values_by_name["AMPERE"]._options = None
+  _UNITS_UNITCODE.values_by_name["AMPERE"]._serialized_options = b'\322\260\326\300\001\003AMP\232\320\206\375\001\001A'
+  _UNITS_UNITCODE.values_by_name["DEGREE_CELSIUS"]._options = None
+  _UNITS_UNITCODE.values_by_name["DEGREE_CELSIUS"]._serialized_options = b'\322\260\326\300\001\003CEL\232\320\206\375\001\003\302\260C'
+  _UNITS_UNITCODE.values_by_name["KELVIN"]._options = None
+  _UNITS_UNITCODE.values_by_name["KELVIN"]._serialized_options = b'\322\260\326\300\001\003KEL\232\320\206\375\001\001K'
+  _UNITS_UNITCODE.values_by_name["BYTE"]._options = None
+  _UNITS_UNITCODE.values_by_name["BYTE"]._serialized_options = b'\322\260\326\300\001\002AD'
+  _UNITS_UNITCODE.values_by_name["MEGA_BYTES_PER_SECOND"]._options = None
+  _UNITS_UNITCODE.values_by_name["MEGA_BYTES_PER_SECOND"]._serialized_options = b'\322\260\326\300\001\004MBPS\232\320\206\375\001\004MB/s'
+  _UNITS_UNITCODE.values_by_name["DEGREE"]._options = None
+  _UNITS_UNITCODE.values_by_name["DEGREE"]._serialized_options = b'\322\260\326\300\001\002DD\232\320\206\375\001\002\302\260'
+  _UNITS_UNITCODE.values_by_name["RADIAN"]._options = None
+  _UNITS_UNITCODE.values_by_name["RADIAN"]._serialized_options = b'\322\260\326\300\001\003C81\232\320\206\375\001\003rad'
+  _UNITS_UNITCODE.values_by_name["NEWTON"]._options = None
+  _UNITS_UNITCODE.values_by_name["NEWTON"]._serialized_options = b'\322\260\326\300\001\003NEW\232\320\206\375\001\001N'
+  _UNITS_UNITCODE.values_by_name["CUBIC_CENTIMETER_PER_SEC"]._options = None
+  _UNITS_UNITCODE.values_by_name["CUBIC_CENTIMETER_PER_SEC"]._serialized_options = b'\322\260\326\300\001\0022J\232\320\206\375\001\006cm\302\263/s'
+  _UNITS_UNITCODE.values_by_name["MILLIBAR"]._options = None
+  _UNITS_UNITCODE.values_by_name["MILLIBAR"]._serialized_options = b'\322\260\326\300\001\003MBR\232\320\206\375\001\004mbar'
+  _INFORMATIONTAG._serialized_start=3032
+  _INFORMATIONTAG._serialized_end=3165
+  _STATUS._serialized_start=3168
+  _STATUS._serialized_end=3328
+  _FAILURECODE._serialized_start=83
+  _FAILURECODE._serialized_end=127
+  _TIMEINFO._serialized_start=129
+  _TIMEINFO._serialized_end=191
+  _TIMING._serialized_start=193
+  _TIMING._serialized_end=274
+  _PHASE._serialized_start=276
+  _PHASE._serialized_end=375
+  _TESTPARAMETER._serialized_start=378
+  _TESTPARAMETER._serialized_end=748
+  _TESTRUNLOGMESSAGE._serialized_start=751
+  _TESTRUNLOGMESSAGE._serialized_end=1008
+  _TESTRUNLOGMESSAGE_LEVEL._serialized_start=942
+  _TESTRUNLOGMESSAGE_LEVEL._serialized_end=1008
+  _TESTRUN._serialized_start=1011
+  _TESTRUN._serialized_end=1587
+  _TESTINFO._serialized_start=1589
+  _TESTINFO._serialized_end=1658
+  _INFORMATIONPARAMETER._serialized_start=1661
+  _INFORMATIONPARAMETER._serialized_end=1838
+  _UNITS._serialized_start=1841
+  _UNITS._serialized_end=3029
+  _UNITS_UNITCODE._serialized_start=1851
+  _UNITS_UNITCODE._serialized_end=3029
+# @@protoc_insertion_point(module_scope)
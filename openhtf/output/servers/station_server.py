@@ -1,10 +1,15 @@
-"""Serves an Angular frontend and information about a running OpenHTF test.
-
-This server does not currently support more than one test running in the same
-process. However, the dashboard server (dashboard_server.py) can be used to
-aggregate info from multiple station servers with a single frontend.
+"""Serves an Angular frontend and information about running OpenHTF tests.
+
+Several tests may run at the same time in the same process, e.g. one per slot of
+a multi-up fixture.  Updates for all of them are published on the station
+channel; clients can subscribe to a single slot (i.e. a single openhtf.Test
+object, across executions) by passing its descriptor UID as the
+`test_descriptor_uid` query argument.  The dashboard server
+(dashboard_server.py) can be used to aggregate info from multiple station
+servers with a single frontend.
 """
 
+import collections
 import contextlib
 import itertools
 import json
@@ -42,7 +47,7 @@ _LOG = logging.getLogger(__name__)
 # Constants related to response times within the server.
 _CHECK_FOR_FINISHED_TEST_POLL_S = 0.5
 _DEFAULT_FRONTEND_THROTTLE_S = 0.15
-_WAIT_FOR_ANY_EVENT_POLL_S = 0.05
+_WAIT_FOR_ANY_UPDATE_POLL_S = 0.05
 _WAIT_FOR_EXECUTING_TEST_POLL_S = 0.1
 
 conf.declare('frontend_throttle_s', default_value=_DEFAULT_FRONTEND_THROTTLE_S,
@@ -58,38 +63,67 @@ conf.declare('station_discovery_port')
 conf.declare('station_discovery_ttl')
 
 
-def _get_executing_test():
-  """Get the currently executing test and its state.
+def _get_executing_tests():
+  """Get the currently executing tests and their states.
 
-  When this function returns, it is not guaranteed that the returned test is
+  When this function returns, it is not guaranteed that the returned tests are
   still running. A consumer of this function that wants to access test.state is
   exposed to a race condition in which test.state may become None at any time
-  due to the test finishing. To address this, in addition to returning the test
-  itself, this function returns the last known test state.
+  due to the test finishing. To address this, in addition to returning the tests
+  themselves, this function returns their last known test states.
 
   Returns:
-    test: The test that was executing when this function was called, or None.
-    test_state: The state of the executing test, or None.
+    List of (test, test_state) tuples for the tests that were executing when
+    this function was called, in order of execution start.
   """
-  tests = list(six.itervalues(openhtf.Test.TEST_INSTANCES))
+  executing_tests = []
+  for test in list(six.itervalues(openhtf.Test.TEST_INSTANCES)):
+    test_state = test.state
 
-  if not tests:
-    return None, None
+    if test_state is None:
+      # This is the case if:
+      # 1. The test executor was created but has not started running.
+      # 2. The test finished while this function was running, after we got the
+      #        list of tests but before we accessed the test state.
+      continue
 
-  if len(tests) > 1:
-    _LOG.warn('Station server does not support multiple executing tests.')
+    executing_tests.append((test, test_state))
 
-  test = tests[0]
-  test_state = test.state
+  executing_tests.sort(key=lambda pair: pair[0].last_run_time_millis)
+  return executing_tests
 
-  if test_state is None:
-    # This is the case if:
-    # 1. The test executor was created but has not started running.
-    # 2. The test finished while this function was running, after we got the
-    #        list of tests but before we accessed the test state.
+
+def _get_executing_test(test_uid=None):
+  """Get an executing test and its state.
+
+  Args:
+    test_uid: Execution UID of the test to get.  If None, the test that started
+        executing first is returned.
+
+  Returns:
+    test: The requested test, if it was executing when this function was
+        called, or None.
+    test_state: The state of that test, or None.
+  """
+  if test_uid is not None:
+    test = openhtf.Test.TEST_INSTANCES.get(test_uid)
+    test_state = test.state if test is not None else None
+    if test_state is None:
+      return None, None
+    return test, test_state
+
+  executing_tests = _get_executing_tests()
+  if not executing_tests:
     return None, None
+  return executing_tests[0]
+
 
-  return test, test_state
+def _descriptor_uid_from_test_uid(test_uid):
+  """Extract the descriptor UID from an execution UID (see Test.make_uid)."""
+  if not test_uid:
+    return None
+  parts = test_uid.split(':')
+  return parts[1] if len(parts) > 1 else None
 
 
 def _test_state_from_record(test_record_dict, execution_uid=None):
@@ -115,38 +149,44 @@ def _test_state_from_record(test_record_dict, execution_uid=None):
   }
 
 
-def _wait_for_any_event(events, timeout_s):
-  """Wait for any in a list of threading.Event's to be set.
+def _wait_for_any_update(versions, timeout_s):
+  """Wait for any in a list of subscribable states to be updated.
 
   Args:
-    events: List of threading.Event's.
+    versions: List of (util.SubscribableStateMixin, version) tuples, with the
+        versions of the states that were seen.
     timeout_s: Max duration in seconds to wait before returning.
 
   Returns:
-      True if at least one event was set before the timeout expired, else False.
+      True if at least one state was updated before the timeout expired, else
+      False.
   """
-  def any_event_set():
-    return any(event.is_set() for event in events)
+  def any_updated():
+    return any(state.version > version for state, version in versions)
 
   result = timeouts.loop_until_timeout_or_true(
-      timeout_s, any_event_set, sleep_s=_WAIT_FOR_ANY_EVENT_POLL_S)
+      timeout_s, any_updated, sleep_s=_WAIT_FOR_ANY_UPDATE_POLL_S)
 
-  return result or any_event_set()
+  return result or any_updated()
 
 
 class StationWatcher(threading.Thread):
-  """Watches for changes in the state of the currently running OpenHTF test.
+  """Watches for changes in the state of the currently running OpenHTF tests.
 
-  The StationWatcher uses an event-based mechanism to detect changes in test
-  state. This means we rely on the OpenHTF framework to call notify_update()
-  when a change occurs. Authors of frontend-aware plugs must ensure that
-  notify_update() is called when a change occurs to that plug's state.
+  The StationWatcher compares the versions of test states (see
+  util.SubscribableStateMixin) to detect changes in test state. This means we
+  rely on the OpenHTF framework to call notify_update() when a change occurs.
+  Authors of frontend-aware plugs must ensure that notify_update() is called
+  when a change occurs to that plug's state.
   """
   daemon = True
 
   def __init__(self, update_callback):
     super(StationWatcher, self).__init__(name=type(self).__name__)
     self._update_callback = update_callback
+    # (state, version) tuples of the last published state of each executing
+    # test and of its frontend-aware plugs, by UID.
+    self._versions_by_uid = {}
 
   def run(self):
     """Call self._poll_for_update() in a loop and handle errors."""
@@ -173,40 +213,162 @@ class StationWatcher(threading.Thread):
 
   @functions.call_at_most_every(float(conf.frontend_throttle_s))
   def _poll_for_update(self):
-    """Call the callback with the current test state, then wait for a change."""
-    test, test_state = _get_executing_test()
+    """Call the callback for changed test states, then wait for a change."""
+    executing_tests = _get_executing_tests()
 
-    if test is None:
+    if not executing_tests:
+      self._versions_by_uid = {}
       time.sleep(_WAIT_FOR_EXECUTING_TEST_POLL_S)
       return
 
-    state_dict, event = self._to_dict_with_event(test_state)
-    self._update_callback(state_dict)
-
-    plug_manager = test_state.plug_manager
-    plug_events = [
-        plug_manager.get_plug_by_class_path(plug_name).asdict_with_event()[1]
-        for plug_name in plug_manager.get_frontend_aware_plug_names()
-    ]
-    events = [event] + plug_events
-
-    # Wait for the test state or a plug state to change, or for the previously
-    # executing test to finish.
-    while not _wait_for_any_event(events, _CHECK_FOR_FINISHED_TEST_POLL_S):
-      new_test, _ = _get_executing_test()
-      if test != new_test:
+    versions_by_uid = {}
+    for _, test_state in executing_tests:
+      uid = test_state.execution_uid
+      previous_versions = self._versions_by_uid.get(uid)
+      if previous_versions is not None and not any(
+          state.version > version for state, version in previous_versions):
+        # Nothing changed for this test since it was last published.
+        versions_by_uid[uid] = previous_versions
+        continue
+
+      # Plug states are part of the test state, so get their versions first.
+      plug_manager = test_state.plug_manager
+      plug_versions = [
+          (plug, plug.version) for plug in (
+              plug_manager.get_plug_by_class_path(plug_name)
+              for plug_name in plug_manager.get_frontend_aware_plug_names())
+      ]
+      state_dict, version = self._to_dict_with_version(test_state)
+      self._update_callback(state_dict)
+      versions_by_uid[uid] = [(test_state, version)] + plug_versions
+    self._versions_by_uid = versions_by_uid
+
+    versions = [state_version for test_versions in six.itervalues(
+        versions_by_uid) for state_version in test_versions]
+
+    # Wait for a test state or a plug state to change, or for the set of
+    # executing tests to change.
+    while not _wait_for_any_update(versions, _CHECK_FOR_FINISHED_TEST_POLL_S):
+      new_uids = {test_state.execution_uid
+                  for _, test_state in _get_executing_tests()}
+      if new_uids != set(versions_by_uid):
         break
 
   @classmethod
-  def _to_dict_with_event(cls, test_state):
+  def _to_dict_with_version(cls, test_state):
     """Process a test state into the format we want to send to the frontend."""
-    original_dict, event = test_state.asdict_with_event()
+    original_dict, version = test_state.asdict_with_version()
 
     # This line may produce a 'dictionary changed size during iteration' error.
     test_state_dict = data.convert_to_base_types(original_dict)
 
     test_state_dict['execution_uid'] = test_state.execution_uid
-    return test_state_dict, event
+    return test_state_dict, version
+
+
+class StateDeltaEncoder(object):
+  """Encodes the successive states of an executing test as versioned deltas.
+
+  The test record of an executing test only grows: phases and log records are
+  appended, and only the measurements of the running phase change.  Rather than
+  re-sending the full state on every update, each update after the first is a
+  delta with the new phases, the new log records, the changed measurements of
+  the running phase and whichever other top-level fields changed.  Deltas carry
+  the version they produce and the version they apply to, so that clients that
+  missed one can detect the gap and ask for the full state again.
+  """
+
+  def __init__(self, execution_uid):
+    self.execution_uid = execution_uid
+    self.version = 0
+    self._phase_count = 0
+    self._log_record_count = 0
+    self._plugs = None
+    self._record_fields = {}
+    # (descriptor_id, start_time_millis) of the running phase and the last
+    # published value of each of its measurements.
+    self._running_phase_id = None
+    self._running_measurements = {}
+
+  def encode(self, test_state_dict):
+    """Encode a new state of the test.
+
+    Args:
+      test_state_dict: The test state, converted to base types.
+
+    Returns:
+      full_message: An 'update' message with the full state, to send to clients
+          that do not yet have the previous version.
+      delta_message: A 'delta' message from the previous version, or None if
+          this is the first version or the state cannot be expressed as a delta.
+    """
+    test_record_dict = test_state_dict['test_record']
+    phases = test_record_dict['phases']
+    log_records = test_record_dict['log_records']
+    record_fields = {
+        key: value for key, value in six.iteritems(test_record_dict)
+        if key not in ('phases', 'log_records')}
+    running_phase = test_state_dict['running_phase_state']
+    running_phase_id = None
+    running_measurements = {}
+    if running_phase is not None:
+      running_phase_id = (running_phase.get('descriptor_id'),
+                          running_phase.get('start_time_millis'))
+      running_measurements = running_phase.get('measurements') or {}
+
+    delta = None
+    if (self.version and len(phases) >= self._phase_count and
+        len(log_records) >= self._log_record_count):
+      delta = {
+          'new_phases': phases[self._phase_count:],
+          'new_log_records': log_records[self._log_record_count:],
+          'status': test_state_dict['status'],
+          'test_record': {
+              key: value for key, value in six.iteritems(record_fields)
+              if self._record_fields.get(key) != value},
+      }
+      if test_state_dict['plugs'] != self._plugs:
+        delta['plugs'] = test_state_dict['plugs']
+      if running_phase is None:
+        delta['running_phase_state'] = None
+      else:
+        # A new running phase is sent in full; otherwise only the measurements
+        # that changed since the previous version are.
+        new_running_phase = running_phase_id != self._running_phase_id
+        changed_measurements = {
+            name: measurement
+            for name, measurement in six.iteritems(running_measurements)
+            if new_running_phase or
+            self._running_measurements.get(name) != measurement}
+        running_phase_delta = dict(running_phase)
+        running_phase_delta['measurements'] = changed_measurements
+        delta['running_phase_state'] = running_phase_delta
+        delta['new_running_phase'] = new_running_phase
+
+    self.version += 1
+    self._phase_count = len(phases)
+    self._log_record_count = len(log_records)
+    self._plugs = test_state_dict['plugs']
+    self._record_fields = record_fields
+    self._running_phase_id = running_phase_id
+    self._running_measurements = running_measurements
+
+    full_message = {
+        'state': test_state_dict,
+        'test_uid': self.execution_uid,
+        'type': 'update',
+        'version': self.version,
+    }
+    if delta is None:
+      return full_message, None
+    delta_message = {
+        'base_version': self.version - 1,
+        'delta': delta,
+        'test_uid': self.execution_uid,
+        'type': 'delta',
+        'version': self.version,
+    }
+    return full_message, delta_message
 
 
 class DashboardPubSub(sockjs.tornado.SockJSConnection):
@@ -249,42 +411,107 @@ class DashboardPubSub(sockjs.tornado.SockJSConnection):
 class StationPubSub(pub_sub.PubSub):
   """WebSocket endpoint for test updates.
 
-  The endpoint provides information about the test that is currently running
-  with this StationServer. Two types of message are sent: 'update' and 'record',
-  where 'record' indicates the final state of a test.
+  The endpoint provides information about the tests that are currently running
+  with this StationServer. Three types of message are sent: 'update', 'delta'
+  and 'record'. 'update' carries the full state of an executing test, 'delta'
+  the changes to it since the previous version (see StateDeltaEncoder), and
+  'record' the final state of a test.
+
+  New subscribers get the full state of each test, then deltas.  A client that
+  misses a version, i.e. receives a delta whose base_version is not the version
+  it has, sends a {"type": "resync"} message to get the full states again.
+
+  Clients that pass a `test_descriptor_uid` query argument only receive the
+  messages of that test (i.e. that slot).
   """
   _lock = threading.Lock()  # Required by pub_sub.PubSub.
   subscribers = set()  # Required by pub_sub.PubSub.
   _last_execution_uid = None
-  _last_message = None
+  # Most recent full message for each test, keyed by test descriptor UID.
+  _last_messages = collections.OrderedDict()
+  # StateDeltaEncoder of each executing test, keyed by test descriptor UID.
+  _encoders = {}
+  # Set per client in on_subscribe().
+  _test_descriptor_uid = None
 
   @classmethod
   def publish_test_record(cls, test_record):
     test_record_dict = data.convert_to_base_types(test_record)
-    test_state_dict = _test_state_from_record(test_record_dict,
-                                              cls._last_execution_uid)
-    cls._publish_test_state(test_state_dict, 'record')
+    test_state_dict = _test_state_from_record(
+        test_record_dict, cls._execution_uid_for_record(test_record))
+    descriptor_uid = _descriptor_uid_from_test_uid(
+        test_state_dict['execution_uid'])
+    with cls._lock:
+      cls._encoders.pop(descriptor_uid, None)
+    cls._publish_message(descriptor_uid, {
+        'state': test_state_dict,
+        'test_uid': test_state_dict['execution_uid'],
+        'type': 'record',
+    })
 
   @classmethod
   def publish_update(cls, test_state_dict):
-    """Publish the state of the currently executing test."""
-    cls._publish_test_state(test_state_dict, 'update')
+    """Publish the state of an executing test, as a delta when possible."""
+    execution_uid = test_state_dict['execution_uid']
+    descriptor_uid = _descriptor_uid_from_test_uid(execution_uid)
+    with cls._lock:
+      encoder = cls._encoders.get(descriptor_uid)
+      if encoder is None or encoder.execution_uid != execution_uid:
+        encoder = StateDeltaEncoder(execution_uid)
+        cls._encoders[descriptor_uid] = encoder
+    full_message, delta_message = encoder.encode(test_state_dict)
+    cls._publish_message(descriptor_uid, full_message, delta_message)
 
   @classmethod
-  def _publish_test_state(cls, test_state_dict, message_type):
-    message = {
-        'state': test_state_dict,
-        'test_uid': test_state_dict['execution_uid'],
-        'type': message_type,
-    }
-    super(StationPubSub, cls).publish(message)
-    cls._last_execution_uid = test_state_dict['execution_uid']
-    cls._last_message = message
+  def _execution_uid_for_record(cls, test_record):
+    """Find the execution UID of the test that produced test_record."""
+    # Output callbacks are called while the test is still registered.
+    for test in list(six.itervalues(openhtf.Test.TEST_INSTANCES)):
+      test_state = test.state
+      if test_state is not None and test_state.test_record is test_record:
+        return test_state.execution_uid
+    return cls._last_execution_uid
+
+  @classmethod
+  def _publish_message(cls, descriptor_uid, full_message, delta_message=None):
+    """Publish a message and keep the full one for new subscribers."""
+    super(StationPubSub, cls).publish(
+        delta_message or full_message,
+        client_filter=lambda client: client.wants(descriptor_uid))
+    with cls._lock:
+      cls._last_execution_uid = full_message['test_uid']
+      cls._last_messages.pop(descriptor_uid, None)
+      cls._last_messages[descriptor_uid] = full_message
+
+  def wants(self, descriptor_uid):
+    """Whether this client is subscribed to the given test's messages."""
+    return self._test_descriptor_uid in (None, descriptor_uid)
 
   def on_subscribe(self, info):
-    """Send the more recent test state to new subscribers when they connect."""
-    if self._last_message is not None:
-      self.send(self._last_message)
+    """Send the most recent test states to new subscribers when they connect."""
+    self._test_descriptor_uid = info.get_argument('test_descriptor_uid')
+    self._send_last_messages()
+
+  def on_message(self, message):
+    """Resend the full test states to clients that ask for a resync."""
+    try:
+      request = json.loads(message)
+      request_type = request['type']
+    except (KeyError, TypeError, ValueError):
+      _LOG.debug('Ignoring malformed message from a client: %r', message)
+      return
+    if request_type == 'resync':
+      self._send_last_messages()
+    else:
+      _LOG.debug('Ignoring unknown message type from a client: %r',
+                 request_type)
+
+  def _send_last_messages(self):
+    with self._lock:
+      last_messages = list(six.iteritems(self._last_messages))
+    for descriptor_uid, message in last_messages:
+      if self.wants(descriptor_uid):
+        self.send(message)
 
 
 class BaseTestHandler(web_gui_server.CorsRequestHandler):
@@ -292,9 +519,9 @@ class BaseTestHandler(web_gui_server.CorsRequestHandler):
 
   def get_test(self, test_uid):
     """Get the specified test. Write 404 and return None if it is not found."""
-    test, test_state = _get_executing_test()
+    test, test_state = _get_executing_test(test_uid)
 
-    if test is None or str(test.uid) != test_uid:
+    if test is None:
       self.write('Unknown test UID %s' % test_uid)
       self.set_status(404)
       return None, None
@@ -9,6 +9,8 @@ export class MockSockJsInstance {
   onopen;
 
   close() {}
+
+  send(_data: string) {}
 }
 
 export class MockSockJsService {
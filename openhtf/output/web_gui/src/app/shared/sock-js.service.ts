@@ -14,6 +14,7 @@ export interface SockJsObject {
   onclose: {};
   onmessage: {};
   onopen: {};
+  send: (data: string) => void;
 }
 
 export interface SockJsMessage { data: string; }
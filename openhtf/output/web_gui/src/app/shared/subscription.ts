@@ -64,6 +64,16 @@ export class Subscription {
     this.subscribeWithSavedParams();
   }
 
+  /**
+   * Send a message to the other end of the socket, if subscribed.
+   */
+  send(data: {}) {
+    if (this.state !== SubscriptionState.subscribed) {
+      return;
+    }
+    this.sock.send(JSON.stringify(data));
+  }
+
   subscribeToUrl(
       url: string, retryMs: number|null = null, retryBackoff = 1.0,
       retryMax = Number.MAX_VALUE) {
@@ -40,6 +40,20 @@ export interface RawTestState {
   test_record: RawTestRecord;
 }
 
+/**
+ * Changes to a test state since the previous version, see StateDeltaEncoder in
+ * station_server.py.
+ */
+export interface RawTestStateDelta {
+  new_log_records: RawLogRecord[];
+  new_phases: RawPhase[];
+  new_running_phase?: boolean;  // Present if running_phase_state is not null.
+  plugs?: RawPlugsInfo;         // Present if the plugs changed.
+  running_phase_state: RawPhase|null;
+  status: string;
+  test_record: Partial<RawTestRecord>;  // Only the changed fields.
+}
+
 export interface RawPlugsInfo {
   plug_descriptors: {[name: string]: PlugDescriptor};
   plug_states: {[name: string]: {}};
@@ -98,6 +112,33 @@ export interface RawPhaseDescriptor {
   measurements: RawMeasurement[];
 }
 
+/**
+ * Returns a new raw test state with the changes of a delta applied to it.
+ */
+export function applyDelta(rawState: RawTestState, delta: RawTestStateDelta) {
+  const testRecord = Object.assign({}, rawState.test_record, delta.test_record);
+  testRecord.phases = rawState.test_record.phases.concat(delta.new_phases);
+  testRecord.log_records =
+      rawState.test_record.log_records.concat(delta.new_log_records);
+
+  // Only the changed measurements of an already running phase are sent.
+  let runningPhase = delta.running_phase_state;
+  if (runningPhase !== null && !delta.new_running_phase &&
+      rawState.running_phase_state !== null) {
+    const measurements = Object.assign(
+        {}, rawState.running_phase_state.measurements,
+        runningPhase.measurements);
+    runningPhase = Object.assign({}, runningPhase, {measurements});
+  }
+
+  return {
+    plugs: delta.plugs || rawState.plugs,
+    running_phase_state: runningPhase,
+    status: delta.status,
+    test_record: testRecord,
+  } as RawTestState;
+}
+
 export function makeTest(
     rawState: RawTestState, testId: string|null, fileName: string|null,
     station: Station) {
@@ -67,9 +67,36 @@ const createMockTestStateResponse = (testId: string, status: string) => {
     },
     test_uid: testId,
     type: 'update',
+    version: 1,
   };
 };
 
+const createMockDeltaResponse =
+    (testId: string, baseVersion: number, newPhaseDescriptorId: number) => {
+      return {
+        base_version: baseVersion,
+        delta: {
+          new_log_records: [],
+          new_phases: [{
+            attachments: {},
+            descriptor_id: newPhaseDescriptorId,
+            measurements: {},
+          }],
+          new_running_phase: true,
+          running_phase_state: {
+            attachments: {},
+            descriptor_id: newPhaseDescriptorId + 1,
+            measurements: {},
+          },
+          status: 'RUNNING',
+          test_record: {},
+        },
+        test_uid: testId,
+        type: 'delta',
+        version: baseVersion + 1,
+      };
+    };
+
 /**
  * Mock phase descriptor data.
  */
@@ -235,4 +262,33 @@ describe('station service', () => {
        expect(test.phases[1].status).toEqual(PhaseStatus.running);
        expect(test.phases[2].status).toEqual(PhaseStatus.waiting);
      }));
+
+  it('should apply deltas to a test state', fakeAsync(() => {
+       stationService.subscribe(mockStation);
+       connectSuccessfully();
+       receiveMockMessage(
+           createMockTestStateResponse('mock-id-000', 'RUNNING'));
+       receiveMockMessage(createMockDeltaResponse('mock-id-000', 1, 2));
+       tick();
+
+       const test: TestState = stationService.getTest(mockStation);
+       expect(test.phases.length).toEqual(3);
+       expect(test.phases[1].status).toEqual(PhaseStatus.pass);
+       expect(test.phases[2].status).toEqual(PhaseStatus.running);
+     }));
+
+  it('should resync when a delta is missed', fakeAsync(() => {
+       stationService.subscribe(mockStation);
+       connectSuccessfully();
+       spyOn(mockSockJsInstance, 'send');
+       receiveMockMessage(
+           createMockTestStateResponse('mock-id-000', 'RUNNING'));
+       receiveMockMessage(createMockDeltaResponse('mock-id-000', 2, 2));
+       tick();
+
+       expect(mockSockJsInstance.send)
+           .toHaveBeenCalledWith(JSON.stringify({type: 'resync'}));
+       const test: TestState = stationService.getTest(mockStation);
+       expect(test.phases[1].status).toEqual(PhaseStatus.running);
+     }));
 });
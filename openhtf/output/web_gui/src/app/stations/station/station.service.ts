@@ -2,6 +2,7 @@
  * Maintains info about tests on each station.
  */
 
+import 'rxjs/add/observable/empty';
 import 'rxjs/add/observable/fromPromise';
 import 'rxjs/add/observable/of';
 import 'rxjs/add/operator/catch';
@@ -21,12 +22,20 @@ import { Subscription } from '../../shared/subscription';
 import { getStationBaseUrl, getTestBaseUrl, messageFromErrorResponse } from '../../shared/util';
 
 import { HistoryService } from './history.service';
-import { makePhaseFromDescriptor, makeTest, RawTestState } from './station-data';
+import { applyDelta, makePhaseFromDescriptor, makeTest, RawTestState, RawTestStateDelta } from './station-data';
 
 interface StationApiResponse {
-  test_uid?: string;     // Present on messages of type 'update'.
-  state?: RawTestState;  // Present on messages of type 'update'.
-  type: 'update'|'record';
+  base_version?: number;       // Present on messages of type 'delta'.
+  delta?: RawTestStateDelta;   // Present on messages of type 'delta'.
+  test_uid?: string;
+  state?: RawTestState;        // Present on messages of type 'update'/'record'.
+  type: 'update'|'delta'|'record';
+  version?: number;            // Present on messages of type 'update'/'delta'.
+}
+
+interface VersionedRawTestState {
+  state: RawTestState;
+  version: number|null;  // Null once the test has completed.
 }
 
 /**
@@ -36,6 +45,9 @@ interface StationApiResponse {
  */
 @Injectable()
 export class StationService extends Subscription {
+  private readonly rawStatesById: {[testId: string]: VersionedRawTestState} =
+      {};
+  private resyncRequested = false;
   private readonly phaseDescriptorPromise:
       {[testId: string]: Promise<Phase[]>} = {};
   private readonly testsById: {[testId: string]: TestState} = {};
@@ -61,7 +73,11 @@ export class StationService extends Subscription {
             .mergeMap((message: SockJsMessage) => {
               const response = StationService.validateResponse(message.data);
               console.debug('StationService received response:', response);
-              const test = this.parseResponse(response, station);
+              const rawState = this.resolveRawState(response);
+              if (rawState === null) {
+                return Observable.empty<TestState>();
+              }
+              const test = this.parseResponse(response, rawState, station);
               return this.applyPhaseDescriptors(test);
             })
             .subscribe(test => {
@@ -86,7 +102,38 @@ export class StationService extends Subscription {
   }
 
   /**
-   * Step 2: Transform a response object into a test state object.
+   * Step 2: Reconstruct the full raw test state from the response.
+   *
+   * Except for the first one, the station sends the updates of an executing
+   * test as deltas from the previous version. If a delta does not apply to the
+   * version we have, e.g. because we just connected, we ask the station to
+   * resend the full test states and drop the delta. Returns null in that case.
+   */
+  private resolveRawState(response: StationApiResponse) {
+    if (response.type !== 'delta') {
+      this.resyncRequested = false;
+      const version =
+          response.type === 'update' ? response.version || null : null;
+      this.rawStatesById[response.test_uid] = {state: response.state, version};
+      return response.state;
+    }
+
+    const previous = this.rawStatesById[response.test_uid];
+    if (!previous || previous.version !== response.base_version) {
+      if (!this.resyncRequested) {
+        console.debug('StationService missed a test state; resyncing.');
+        this.resyncRequested = true;
+        this.send({type: 'resync'});
+      }
+      return null;
+    }
+    const state = applyDelta(previous.state, response.delta);
+    this.rawStatesById[response.test_uid] = {state, version: response.version};
+    return state;
+  }
+
+  /**
+   * Step 3: Transform a raw test state into a test state object.
    *
    * In OpenHTF's built-in frontend, the test state is passed around frontend
    * templates in the same structure with which it was received, so that the
@@ -99,9 +146,9 @@ export class StationService extends Subscription {
    * we can minimize the work done by the templates and we can handle changes to
    * the station API without having to modify the templates.
    */
-  private parseResponse(response: StationApiResponse, station: Station) {
-    const testState =
-        makeTest(response.state, response.test_uid, null, station);
+  private parseResponse(
+      response: StationApiResponse, rawState: RawTestState, station: Station) {
+    const testState = makeTest(rawState, response.test_uid, null, station);
     if (response.type === 'record') {
       this.historyService.prependItemFromTestState(station, testState);
     }
@@ -109,7 +156,7 @@ export class StationService extends Subscription {
   }
 
   /**
-   * Step 3: Construct the full phase list using the phase descriptors.
+   * Step 4: Construct the full phase list using the phase descriptors.
    *
    * The test state only includes executed and executing phases, whereas the
    * phase descriptors include all phases. We use the descriptors to extend the
@@ -193,7 +240,7 @@ export class StationService extends Subscription {
   }
 
   /**
-   * Step 4: Update our data store with new test information.
+   * Step 5: Update our data store with new test information.
    */
   private applyResponse(test: TestState, station: Station) {
     // If we have old information for this test, update it.
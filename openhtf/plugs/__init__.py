@@ -92,10 +92,21 @@ example, you would also need a configuration .yaml file with something like:
 
 This will result in the ExamplePlug being constructed with
 self._my_config having a value of 'my_config_value'.
+
+When several tests run at the same time in one process (e.g. one per slot of a
+multi-up fixture), each test gets its own instance of each plug, unless the plug
+class sets share_across_tests to True.
+
+Plug methods may be coroutines (async def), for use by coroutine phases; for
+example, a plug for an instrument on a network socket can expose async methods
+so that one phase can poll many instruments concurrently.  Coroutine phases
+and a coroutine tearDown() all run on the test's event loop.
 """
 
 import collections
+import contextlib
 import logging
+import threading
 
 import mutablerecords
 
@@ -103,9 +114,11 @@ from openhtf import util
 import openhtf.core.phase_descriptor
 from openhtf.util import classproperty
 from openhtf.util import conf
+from openhtf.util import coroutines
 from openhtf.util import data
 from openhtf.util import logs
 from openhtf.util import threads
+from openhtf.util import watchdog
 import six
 
 
@@ -160,6 +173,12 @@ class BasePlug(object):
   # plug without needing to use placeholder.  This will only affect the classes
   # that explicitly define this; subclasses do not share the declaration.
   auto_placeholder = False
+  # Override this to True in subclasses to share a single instance of the plug
+  # among all tests running concurrently in this process, e.g. for a fixture
+  # used by every slot of a multi-up station.  The instance is created by the
+  # first test that needs it and torn down by the last test to finish using it,
+  # so it must be thread-safe.  Its logs are not saved to any one test record.
+  share_across_tests = False
   # Default logger to be used only in __init__ of subclasses.
   # This is overwritten both on the class and the instance so don't store
   # a copy of it anywhere.
@@ -269,8 +288,8 @@ def plug(update_kwargs=True, **plugs_map):
   return result
 
 
-class _PlugTearDownThread(threads.KillableThread):
-  """Killable thread that runs a plug's tearDown function."""
+class _PlugTearDownThread(coroutines.KillableCoroutineTask):
+  """Killable task that runs a plug's tearDown function on a pool thread."""
 
   def __init__(self, a_plug, *args, **kwargs):
     super(_PlugTearDownThread, self).__init__(*args, **kwargs)
@@ -278,7 +297,9 @@ class _PlugTearDownThread(threads.KillableThread):
 
   def _thread_proc(self):
     try:
-      self._plug.tearDown()
+      result = self._plug.tearDown()
+      if coroutines.iscoroutine(result):
+        self._run_coroutine(result)
     except Exception:  # pylint: disable=broad-except
       # Including the stack trace from ThreadTerminationErrors received when
       # killed.
@@ -286,6 +307,70 @@ class _PlugTearDownThread(threads.KillableThread):
                    self._plug, exc_info=True)
 
 
+class _SharedPlugRegistry(object):
+  """Reference-counted instances of plugs shared among concurrent tests."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._plugs_by_type = {}
+    self._ref_counts = collections.Counter()
+    self._type_locks = collections.defaultdict(threading.RLock)
+
+  @contextlib.contextmanager
+  def instantiation_lock(self, plug_type):
+    """Hold while instantiating plugs of plug_type (or of its subclasses).
+
+    The logger is temporarily set on the plug class (and so seen by subclasses)
+    during instantiation, so this locks plug_type and all its plug base classes.
+    Locks are always taken in the same order to avoid deadlocks.
+
+    Args:
+      plug_type: BasePlug subclass about to be instantiated.
+
+    Yields:
+      None.
+    """
+    base_classes = sorted(
+        (cls for cls in plug_type.mro()
+         if issubclass(cls, BasePlug) and cls is not BasePlug),
+        key=lambda cls: (cls.__module__, cls.__name__, id(cls)))
+    with self._lock:
+      type_locks = [self._type_locks[cls] for cls in base_classes]
+    for lock in type_locks:
+      lock.acquire()
+    try:
+      yield
+    finally:
+      for lock in reversed(type_locks):
+        lock.release()
+
+  def acquire(self, plug_type, factory):
+    """Returns the shared instance of plug_type, creating it with factory()."""
+    with self.instantiation_lock(plug_type):
+      with self._lock:
+        if plug_type in self._plugs_by_type:
+          self._ref_counts[plug_type] += 1
+          return self._plugs_by_type[plug_type]
+      plug_instance = factory()
+      with self._lock:
+        self._plugs_by_type[plug_type] = plug_instance
+        self._ref_counts[plug_type] = 1
+      return plug_instance
+
+  def release(self, plug_type):
+    """Release a reference, returning True if it was the last one."""
+    with self._lock:
+      self._ref_counts[plug_type] -= 1
+      if self._ref_counts[plug_type] > 0:
+        return False
+      del self._ref_counts[plug_type]
+      self._plugs_by_type.pop(plug_type, None)
+      return True
+
+
+_SHARED_PLUGS = _SharedPlugRegistry()
+
+
 class PlugManager(object):
   """Class to manage the lifetimes of plugs.
 
@@ -294,7 +379,8 @@ class PlugManager(object):
   the executor, and should not be instantiated outside the framework itself.
 
   Note this class is not thread-safe.  It should only ever be used by the
-  main framework thread anyway.
+  main framework thread anyway.  Separate PlugManagers (i.e. separate tests)
+  may be used concurrently.
 
   Attributes:
     _plug_types: Initial set of plug types, additional plug types may be
@@ -315,6 +401,7 @@ class PlugManager(object):
     self._plugs_by_type = {}
     self._plugs_by_name = {}
     self._plug_descriptors = {}
+    self._shared_plug_types = set()
     if not record_logger:
       record_logger = _LOG
     self.logger = record_logger.getChild('plug')
@@ -381,33 +468,47 @@ class PlugManager(object):
         if not issubclass(plug_type, BasePlug):
           raise InvalidPlugError(
               'Plug type "%s" is not an instance of BasePlug' % plug_type)
-        if plug_type.logger != _LOG:
-          # They put a logger attribute on the class itself, overriding ours.
-          raise InvalidPlugError(
-              'Do not override "logger" in your plugs.', plug_type)
-
-        # Override the logger so that __init__'s logging goes into the record.
-        plug_type.logger = plug_logger
-        try:
-          plug_instance = plug_type()
-        finally:
-          # Now set it back since we'll give the instance a logger in a moment.
-          plug_type.logger = _LOG
-        # Set the logger attribute directly (rather than in BasePlug) so we
-        # don't depend on subclasses' implementation of __init__ to have it
-        # set.
-        if plug_instance.logger != _LOG:
-          raise InvalidPlugError(
-              'Do not set "self.logger" in __init__ in your plugs', plug_type)
+        if plug_type.share_across_tests:
+          # Shared plugs don't belong to any one test record.
+          plug_instance = _SHARED_PLUGS.acquire(
+              plug_type, lambda: self._instantiate_plug(
+                  plug_type, _LOG.getChild(plug_type.__name__)))
+          self._shared_plug_types.add(plug_type)
         else:
-          # Now the instance has its own copy of the test logger.
-          plug_instance.logger = plug_logger
+          plug_instance = self._instantiate_plug(plug_type, plug_logger)
       except Exception:  # pylint: disable=broad-except
         plug_logger.exception('Exception instantiating plug type %s', plug_type)
         self.tear_down_plugs()
         raise
       self.update_plug(plug_type, plug_instance)
 
+  def _instantiate_plug(self, plug_type, plug_logger):
+    """Instantiate plug_type, giving the instance the given logger."""
+    # The logger is temporarily set on the class itself, so plugs of the same
+    # type must not be instantiated by multiple tests at the same time.
+    with _SHARED_PLUGS.instantiation_lock(plug_type):
+      if plug_type.logger != _LOG:
+        # They put a logger attribute on the class itself, overriding ours.
+        raise InvalidPlugError(
+            'Do not override "logger" in your plugs.', plug_type)
+
+      # Override the logger so that __init__'s logging goes into the record.
+      plug_type.logger = plug_logger
+      try:
+        plug_instance = plug_type()
+      finally:
+        # Now set it back since we'll give the instance a logger in a moment.
+        plug_type.logger = _LOG
+    # Set the logger attribute directly (rather than in BasePlug) so we
+    # don't depend on subclasses' implementation of __init__ to have it
+    # set.
+    if plug_instance.logger != _LOG:
+      raise InvalidPlugError(
+          'Do not set "self.logger" in __init__ in your plugs', plug_type)
+    # Now the instance has its own copy of the test logger.
+    plug_instance.logger = plug_logger
+    return plug_instance
+
   def get_plug_by_class_path(self, plug_name):
     """Get a plug instance by name (class path).
 
@@ -445,7 +546,7 @@ class PlugManager(object):
     """Provide the requested plugs [(name, type),] as {name: plug instance}."""
     return {name: self._plugs_by_type[cls] for name, cls in plug_name_map}
 
-  def tear_down_plugs(self):
+  def tear_down_plugs(self, event_loop=None):
     """Call tearDown() on all instantiated plugs.
 
     Note that initialize_plugs must have been called before calling
@@ -454,21 +555,30 @@ class PlugManager(object):
 
     Any exceptions in tearDown() methods are logged, but do not get raised
     by this method.
+
+    Args:
+      event_loop: coroutines.EventLoopThread to run coroutine tearDown() methods
+        on; defaults to the shared one.
     """
     _LOG.debug('Tearing down all plugs.')
     for plug_type, plug_instance in six.iteritems(self._plugs_by_type):
+      if plug_type in self._shared_plug_types:
+        self._shared_plug_types.discard(plug_type)
+        if not _SHARED_PLUGS.release(plug_type):
+          # Still in use by another test.
+          continue
       if plug_instance.uses_base_tear_down():
         name = '<PlugTearDownThread: BasePlug No-Op for %s>' % plug_type
       else:
         name = '<PlugTearDownThread: %s>' % plug_type
-      thread = _PlugTearDownThread(plug_instance, name=name)
-      thread.start()
+      thread = _PlugTearDownThread(plug_instance, name=name,
+                                   event_loop=event_loop)
       timeout_s = (conf.plug_teardown_timeout_s
                    if conf.plug_teardown_timeout_s
                    else None)
-      thread.join(timeout_s)
-      if thread.is_alive():
-        thread.kill()
+      deadline = watchdog.Watchdog.shared().run_with_deadline(
+          thread, timeout_s)
+      if deadline.expired:
         _LOG.warning('Killed tearDown for plug %s after timeout.',
                      plug_instance)
     self._plugs_by_type.clear()
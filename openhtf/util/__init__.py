@@ -22,6 +22,8 @@ import time
 import weakref
 
 import mutablerecords
+from openhtf.util import instrumentation
+from openhtf.util import watchdog
 
 import six
 
@@ -144,17 +146,39 @@ class SubscribableStateMixin(object):
   asdict_with_event to get the current state and an event object. This object
   can then notify watchers holding those events that the state has changed by
   calling notify_update.
+
+  Updates are also versioned: each notify_update() increments the state's
+  version, so watchers can instead call asdict_with_version, then check the
+  version attribute or call wait_for_update for changes since that version.
+
+  If notify_window_s is set, the notify_update() calls within that many seconds
+  are coalesced: the first one schedules a wake-up of the watchers at the end
+  of the window and the others only increment the version.  The version
+  attribute and wait_for_update only see the versions of these wake-ups.
   """
 
+  # Seconds over which notify_update() calls are coalesced, or 0 to wake the
+  # watchers on each call.
+  notify_window_s = 0
+
   def __init__(self):
     super(SubscribableStateMixin, self).__init__()
     self._lock = threading.Lock()
+    self._update_condition = threading.Condition(self._lock)
     self._update_events = weakref.WeakSet()
+    self._version = 0
+    self._published_version = 0
+    self._wake_pending = False
 
   def _asdict(self):
     raise NotImplementedError(
         'Subclasses of SubscribableStateMixin must implement _asdict.')
 
+  @property
+  def version(self):
+    """Version of the state as of the last time watchers were woken."""
+    return self._published_version
+
   def asdict_with_event(self):
     """Get a dict representation of this object and an update event.
 
@@ -168,9 +192,65 @@ class SubscribableStateMixin(object):
       self._update_events.add(event)
     return self._asdict(), event
 
+  def asdict_with_version(self):
+    """Get a dict representation of this object and its version.
+
+    Returns:
+      state: Dict representation of this object.
+      version: Version of the state; the version attribute is guaranteed to be
+          greater once an update has been triggered since the returned dict was
+          generated.
+    """
+    version = self._version
+    return self._asdict(), version
+
+  def wait_for_update(self, since_version, timeout_s=None):
+    """Wait for an update of the state since the given version.
+
+    Args:
+      since_version: Version of the state the caller has seen, e.g. from
+          asdict_with_version.
+      timeout_s: Seconds to wait for, or None to wait forever.
+
+    Returns:
+      The version attribute once it is greater than since_version, or None if
+      timeout_s runs out first.
+    """
+    deadline = None if timeout_s is None else time.time() + timeout_s
+    with self._update_condition:
+      while self._published_version <= since_version:
+        if deadline is None:
+          self._update_condition.wait()
+          continue
+        remaining_s = deadline - time.time()
+        if remaining_s <= 0:
+          return None
+        self._update_condition.wait(remaining_s)
+      return self._published_version
+
   def notify_update(self):
     """Notify any update events that there was an update."""
+    with instrumentation.section(instrumentation.NOTIFY_UPDATE):
+      with self._lock:
+        self._version += 1
+        if self._wake_pending:
+          return
+        if not self.notify_window_s:
+          self._wake_watchers()
+          return
+        self._wake_pending = True
+      watchdog.Watchdog.shared().schedule(
+          self.notify_window_s, self._wake_coalesced, name='notify_update')
+
+  def _wake_coalesced(self):
     with self._lock:
-      for event in self._update_events:
-        event.set()
-      self._update_events.clear()
+      self._wake_pending = False
+      self._wake_watchers()
+
+  def _wake_watchers(self):
+    """Wake the watchers; must be called with the lock held."""
+    self._published_version = self._version
+    for event in self._update_events:
+      event.set()
+    self._update_events.clear()
+    self._update_condition.notify_all()
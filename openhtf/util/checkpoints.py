@@ -29,18 +29,13 @@ previous phase has failed.
 """
 
 from openhtf.core import phase_descriptor
-from openhtf.core import test_record
 
 def checkpoint(checkpoint_name=None):
   name = checkpoint_name if checkpoint_name else 'Checkpoint'
 
   @phase_descriptor.PhaseOptions(name=name)
   def _checkpoint(test_run):
-    failed_phases = []
-    for phase_record in test_run.test_record.phases:
-      if phase_record.outcome == test_record.PhaseOutcome.FAIL:
-        failed_phases.append(phase_record.name)
-
+    failed_phases = test_run.test_record.failed_phase_names
     if failed_phases:
       test_run.logger.error('Stopping execution because phases failed: %s',
                             failed_phases)
@@ -0,0 +1,201 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Support for running coroutines (async def phases and plug methods).
+
+Coroutines are run on an EventLoopThread, a thread running an asyncio event
+loop.  Each test execution has its own EventLoopThread (owned by its
+TestExecutor), so that all coroutine phases and plug methods of a test share a
+loop; for example, a phase can await many instruments concurrently, using
+connections opened by plugs in earlier phases, without a thread per instrument.
+
+A KillableCoroutineTask is a KillableTask that can run coroutines on an
+EventLoopThread.  Killing it while it waits on a coroutine cancels the
+coroutine (raising asyncio.CancelledError at its current await) instead of
+raising ThreadTerminationError in the waiting thread.
+
+Coroutines require Python 3; on Python 2 nothing here is ever a coroutine.
+"""
+
+import inspect
+import logging
+import threading
+
+from openhtf.util import threads
+
+try:
+  import asyncio
+except ImportError:
+  asyncio = None  # pylint: disable=invalid-name
+
+
+_LOG = logging.getLogger(__name__)
+
+
+def iscoroutine(obj):
+  """True if obj is a coroutine object, e.g. as returned by an async def."""
+  return bool(asyncio and inspect.iscoroutine(obj))
+
+
+class CoroutineTask(object):
+  """A coroutine scheduled on an event loop, that other threads can wait on."""
+
+  def __init__(self, loop, coro):
+    self._loop = loop
+    self._task = None
+    self._done = threading.Event()
+    loop.call_soon_threadsafe(self._start, coro)
+
+  def _start(self, coro):
+    self._task = asyncio.ensure_future(coro, loop=self._loop)
+    self._task.add_done_callback(lambda _: self._done.set())
+
+  def _cancel(self):
+    self._task.cancel()
+
+  def cancel(self):
+    """Cancel the coroutine; it is done once it has handled the cancellation."""
+    # Callbacks run in order, so the task exists by the time this runs.
+    self._loop.call_soon_threadsafe(self._cancel)
+
+  def wait(self, timeout=None):
+    """Wait for the coroutine to be done, returning True if it is."""
+    return self._done.wait(timeout)
+
+  def result(self):
+    """Return the result of the coroutine, or raise its exception.
+
+    Raises:
+      ThreadTerminationError: If the coroutine was cancelled.
+    """
+    if self._task.cancelled():
+      raise threads.ThreadTerminationError('Coroutine was cancelled.')
+    return self._task.result()
+
+
+class EventLoopThread(threads.KillableThread):
+  """A thread running an asyncio event loop, started when first needed."""
+  daemon = True
+
+  _shared_loop = None
+  _shared_loop_lock = threading.Lock()
+
+  def __init__(self, name='EventLoopThread'):
+    super(EventLoopThread, self).__init__(name=name)
+    self._lock = threading.Lock()
+    self._loop = None
+    self._stopped = False
+
+  @classmethod
+  def shared(cls):
+    """Return the process-wide EventLoopThread, for use outside of tests."""
+    with cls._shared_loop_lock:
+      if cls._shared_loop is None:
+        cls._shared_loop = cls(name='SharedEventLoopThread')
+      return cls._shared_loop
+
+  def submit(self, coro):
+    """Schedule coro on the event loop, returning a CoroutineTask.
+
+    Args:
+      coro: The coroutine object to run.
+
+    Raises:
+      RuntimeError: If the event loop has been stopped.
+
+    Returns:
+      A CoroutineTask for coro.
+    """
+    with self._lock:
+      if self._stopped:
+        coro.close()
+        raise RuntimeError('Event loop %s has been stopped.' % self.name)
+      if self._loop is None:
+        self._loop = asyncio.new_event_loop()
+        self.start()
+    return CoroutineTask(self._loop, coro)
+
+  def _thread_proc(self):
+    asyncio.set_event_loop(self._loop)
+    try:
+      self._loop.run_forever()
+      # Cancel anything left behind, e.g. background tasks started by phases.
+      all_tasks = getattr(asyncio, 'all_tasks', None) or asyncio.Task.all_tasks
+      tasks = all_tasks(self._loop)
+      for task in tasks:
+        task.cancel()
+      if tasks:
+        self._loop.run_until_complete(
+            asyncio.gather(*tasks, return_exceptions=True))
+      self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+    finally:
+      self._loop.close()
+
+  def stop(self, timeout_s=None):
+    """Stop the event loop, cancelling any coroutines still running on it.
+
+    Args:
+      timeout_s: Seconds to wait for the loop to finish; None waits forever.
+    """
+    with self._lock:
+      self._stopped = True
+      loop = self._loop
+    if loop is None:
+      return
+    loop.call_soon_threadsafe(loop.stop)
+    self.join(timeout_s)
+
+
+class KillableCoroutineTask(threads.KillableTask):
+  """A KillableTask that can run coroutines on an EventLoopThread."""
+
+  def __init__(self, *args, **kwargs):
+    """Initializer for KillableCoroutineTask.
+
+    Args:
+      *args: Passed to KillableTask.
+      **kwargs: Passed to KillableTask, except for event_loop, the
+        EventLoopThread to run coroutines on (defaults to the shared one).
+    """
+    self._event_loop = kwargs.pop('event_loop', None)
+    super(KillableCoroutineTask, self).__init__(*args, **kwargs)
+    self._coroutine_lock = threading.Lock()
+    self._coroutine_task = None
+
+  def _run_coroutine(self, coro):
+    """Run coro on the event loop, returning its result once it is done."""
+    with self._coroutine_lock:
+      if self.was_killed:
+        coro.close()
+        raise threads.ThreadTerminationError()
+      self._coroutine_task = (
+          self._event_loop or EventLoopThread.shared()).submit(coro)
+    try:
+      self._coroutine_task.wait()
+      return self._coroutine_task.result()
+    finally:
+      with self._coroutine_lock:
+        self._coroutine_task = None
+
+  def kill(self):
+    """Cancels the running coroutine, if any, else kills the task."""
+    with self._coroutine_lock:
+      coroutine_task = self._coroutine_task
+      if coroutine_task is None:
+        super(KillableCoroutineTask, self).kill()
+        return
+      self._killed.set()
+    _LOG.debug('Cancelling coroutine of task %s.', self.name)
+    coroutine_task.cancel()
@@ -19,6 +19,7 @@ little easier to work with them.
 """
 
 import collections
+import copy
 import difflib
 import itertools
 import logging
@@ -29,12 +30,18 @@ import struct
 import sys
 
 from mutablerecords import records
+from openhtf.util import instrumentation
 from past.builtins import long
 from past.builtins import unicode
 
 from enum import Enum
 import six
 
+try:
+  from collections.abc import Mapping, Sequence
+except ImportError:  # Python 2.
+  from collections import Mapping, Sequence
+
 # Used by convert_to_base_types().
 PASSTHROUGH_TYPES = {bool, bytes, int, long, type(None), unicode}
 
@@ -138,6 +145,15 @@ def convert_to_base_types(obj, ignore_keys=tuple(), tuple_type=tuple,
   to json.dumps to create valid JSON. Otherwise, json.dumps may return values
   such as NaN which are not valid JSON.
   """
+  if not instrumentation.is_active():
+    return _convert_to_base_types(obj, ignore_keys, tuple_type, json_safe)
+  with instrumentation.section(instrumentation.CONVERT_TO_BASE_TYPES):
+    return _convert_to_base_types(obj, ignore_keys, tuple_type, json_safe)
+
+
+def _convert_to_base_types(obj, ignore_keys=tuple(), tuple_type=tuple,
+                           json_safe=True):
+  """Recursive implementation of convert_to_base_types."""
   # Because it's *really* annoying to pass a single string accidentally.
   assert not isinstance(ignore_keys, six.string_types), 'Pass a real iterable!'
 
@@ -158,15 +174,15 @@ def convert_to_base_types(obj, ignore_keys=tuple(), tuple_type=tuple,
 
   # Recursively convert values in dicts, lists, and tuples.
   if isinstance(obj, dict):
-    return {convert_to_base_types(k, ignore_keys, tuple_type):
-               convert_to_base_types(v, ignore_keys, tuple_type)
+    return {_convert_to_base_types(k, ignore_keys, tuple_type):
+               _convert_to_base_types(v, ignore_keys, tuple_type)
             for k, v in six.iteritems(obj) if k not in ignore_keys}
   elif isinstance(obj, list):
-    return [convert_to_base_types(val, ignore_keys, tuple_type, json_safe)
+    return [_convert_to_base_types(val, ignore_keys, tuple_type, json_safe)
             for val in obj]
   elif isinstance(obj, tuple):
     return tuple_type(
-        convert_to_base_types(value, ignore_keys, tuple_type, json_safe)
+        _convert_to_base_types(value, ignore_keys, tuple_type, json_safe)
         for value in obj)
 
   # Convert numeric types (e.g. numpy ints and floats) into built-in types.
@@ -186,6 +202,151 @@ def convert_to_base_types(obj, ignore_keys=tuple(), tuple_type=tuple,
     raise
 
 
+# Types whose instances read_only_view() returns as they are.
+_IMMUTABLE_TYPES = (bool, bytes, float, numbers.Number, six.string_types, Enum,
+                    frozenset, type(None))
+
+
+def read_only_view(obj):
+  """Returns a read-only view of obj, without deep-copying it.
+
+  Lists and dicts are wrapped in ReadOnlySequence (a tuple) and ReadOnlyMapping
+  (a dict) views, which only copy references to their items and return them as
+  read-only views themselves.  Immutable values, and tuples of them, are
+  returned as they are.  Any other object is deep-copied, since we cannot know
+  how to prevent its modification.
+
+  Args:
+    obj: The object to view, e.g. the value of a measurement.
+
+  Returns:
+    An object that compares equal to obj and cannot be used to modify it.
+  """
+  if isinstance(obj, _IMMUTABLE_TYPES) or isinstance(
+      obj, (ReadOnlySequence, ReadOnlyMapping)):
+    return obj
+  if isinstance(obj, tuple) and all(
+      isinstance(item, _IMMUTABLE_TYPES) for item in obj):
+    return obj
+  if isinstance(obj, (list, tuple)):
+    return ReadOnlySequence(obj)
+  if isinstance(obj, dict):
+    return ReadOnlyMapping(obj)
+  return copy.deepcopy(obj)
+
+
+class ReadOnlySequence(tuple, Sequence):
+  """Read-only view of a list or tuple; see read_only_view().
+
+  This is a tuple of the items of the viewed sequence, so it can be passed to
+  json.dumps() or concatenated like any sequence, but it compares equal to the
+  viewed list, and items are returned as read-only views themselves.
+  """
+
+  __slots__ = ()
+
+  def __new__(cls, sequence):
+    return super(ReadOnlySequence, cls).__new__(cls, sequence)
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return ReadOnlySequence(tuple.__getitem__(self, index))
+    return read_only_view(tuple.__getitem__(self, index))
+
+  def __getslice__(self, start, stop):  # Python 2 only.
+    return self[start:stop]
+
+  def __iter__(self):
+    return (read_only_view(item) for item in tuple.__iter__(self))
+
+  def __reversed__(self):
+    return (read_only_view(item) for item in reversed(tuple(
+        tuple.__iter__(self))))
+
+  def __add__(self, other):
+    return list(self) + list(other)
+
+  def __radd__(self, other):
+    return list(other) + list(self)
+
+  def __mul__(self, count):
+    return list(self) * count
+
+  __rmul__ = __mul__
+
+  def __eq__(self, other):
+    if not isinstance(other, (list, tuple)):
+      return NotImplemented
+    return tuple.__eq__(self, tuple(other))
+
+  def __ne__(self, other):
+    equal = self.__eq__(other)
+    return equal if equal is NotImplemented else not equal
+
+  __hash__ = None
+
+  def __repr__(self):
+    return repr(list(tuple.__iter__(self)))
+
+  def __reduce__(self):
+    return type(self), (tuple(tuple.__iter__(self)),)
+
+  def as_base_types(self):
+    return convert_to_base_types(list(tuple.__iter__(self)))
+
+
+def _read_only(self, *unused_args, **unused_kwargs):
+  raise TypeError('%s is read-only.' % type(self).__name__)
+
+
+class ReadOnlyMapping(dict, Mapping):
+  """Read-only view of a dict; see read_only_view().
+
+  This is a dict of the items of the viewed dict, so it can be passed to
+  json.dumps() like any dict, but it cannot be modified, and values are
+  returned as read-only views themselves.
+  """
+
+  __slots__ = ()
+
+  def __getitem__(self, key):
+    return read_only_view(dict.__getitem__(self, key))
+
+  def __iter__(self):
+    # Overridden so that dict(view) copies the values with __getitem__.
+    return dict.__iter__(self)
+
+  __setitem__ = __delitem__ = _read_only
+  clear = pop = popitem = setdefault = update = _read_only
+
+  def __reduce__(self):
+    return type(self), (dict(dict.items(self)),)
+
+  def get(self, key, default=None):
+    return self[key] if key in self else default
+
+  def copy(self):
+    return dict(self.items())
+
+  def values(self):
+    return list(self.itervalues())
+
+  def items(self):
+    return list(self.iteritems())
+
+  def iterkeys(self):
+    return iter(self)
+
+  def itervalues(self):
+    return (read_only_view(value) for value in dict.values(self))
+
+  def iteritems(self):
+    return ((key, read_only_view(value)) for key, value in dict.items(self))
+
+  def as_base_types(self):
+    return convert_to_base_types(dict(dict.items(self)))
+
+
 def total_size(obj):
   """Returns the approximate total memory footprint an object."""
   seen = set()
@@ -0,0 +1,279 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Instrumentation of the time the framework spends around each phase.
+
+cProfile (see Test.execute's profile_filename) shows where time goes, but not
+how much of a phase's time was spent in the phase itself versus in the
+framework.  When the instrument_overhead config key is set, each PhaseRecord
+gets a Timings instance in its timings attribute, with the wall and CPU time
+spent in each of these categories of work:
+
+  phase: The phase function itself (the body of the phase).
+  phase_state: Creating the PhaseState (and measurements) of the phase.
+  notify_update: Notifying watchers (e.g. the station server) of updates.
+  logging: Saving log records to the test record.
+  convert_to_base_types: Converting objects with data.convert_to_base_types.
+  finalize: Validating measurements and finalizing the phase record.
+
+Times are exclusive: e.g. time spent logging from within a phase counts as
+logging, not as phase.  The CPU time is the CPU time of the thread doing the
+work, where the platform supports it (Python 3.7+), else of the process.
+
+Work is attributed to a Timings instance bound to the thread doing it with
+bind(), by wrapping it in a section():
+
+  with instrumentation.section(instrumentation.LOGGING):
+    ...
+
+Sections cost very little when no Timings instance is bound, and hot paths can
+skip them with is_active().  Timings across many runs can be aggregated into
+histograms with a TimingHistograms output callback.
+"""
+
+import contextlib
+import math
+import threading
+import time
+
+PHASE = 'phase'
+PHASE_STATE = 'phase_state'
+NOTIFY_UPDATE = 'notify_update'
+LOGGING = 'logging'
+CONVERT_TO_BASE_TYPES = 'convert_to_base_types'
+FINALIZE = 'finalize'
+
+# pylint: disable=invalid-name
+_cpu_time = (getattr(time, 'thread_time', None) or
+             getattr(time, 'process_time', None) or time.clock)
+# pylint: enable=invalid-name
+
+_LOCAL = threading.local()
+# Number of threads with a Timings instance bound, so that hot paths can skip
+# sections entirely when instrumentation is off.
+_BOUND_COUNT = [0]
+_BOUND_COUNT_LOCK = threading.Lock()
+
+
+class Timings(object):
+  """Wall and CPU time spent in each category of work, in seconds."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    # Maps category to [count, wall_s, cpu_s].
+    self._totals = {}
+
+  def add(self, category, wall_s, cpu_s):
+    with self._lock:
+      totals = self._totals.get(category)
+      if totals is None:
+        self._totals[category] = [1, wall_s, cpu_s]
+      else:
+        totals[0] += 1
+        totals[1] += wall_s
+        totals[2] += cpu_s
+
+  def wall_s(self, category):
+    """Wall time spent in category, in seconds."""
+    totals = self._totals.get(category)
+    return totals[1] if totals else 0.0
+
+  def cpu_s(self, category):
+    """CPU time spent in category, in seconds."""
+    totals = self._totals.get(category)
+    return totals[2] if totals else 0.0
+
+  @property
+  def categories(self):
+    return sorted(self._totals)
+
+  @property
+  def framework_wall_s(self):
+    """Wall time spent in all categories of framework work, in seconds."""
+    return sum(totals[1] for category, totals in self._totals.items()
+               if category != PHASE)
+
+  @property
+  def framework_cpu_s(self):
+    """CPU time spent in all categories of framework work, in seconds."""
+    return sum(totals[2] for category, totals in self._totals.items()
+               if category != PHASE)
+
+  def as_base_types(self):
+    with self._lock:
+      return {
+          category: {'count': count, 'wall_s': wall_s, 'cpu_s': cpu_s}
+          for category, (count, wall_s, cpu_s) in self._totals.items()
+      }
+
+  def __getstate__(self):
+    with self._lock:
+      return {'totals': {category: list(totals)
+                         for category, totals in self._totals.items()}}
+
+  def __setstate__(self, state):
+    self.__init__()
+    self._totals = state['totals']
+
+  def __repr__(self):
+    return '<%s: %s>' % (type(self).__name__, self.as_base_types())
+
+
+def current():
+  """Returns the Timings instance bound to the calling thread, if any."""
+  return getattr(_LOCAL, 'timings', None)
+
+
+def is_active():
+  """False if no thread has a Timings instance bound; cheap to call."""
+  return _BOUND_COUNT[0] > 0
+
+
+def _add_bound_count(delta):
+  with _BOUND_COUNT_LOCK:
+    _BOUND_COUNT[0] += delta
+
+
+@contextlib.contextmanager
+def bind(timings):
+  """Attribute the sections run by the calling thread to timings.
+
+  Args:
+    timings: Timings instance, or None to not record sections.
+
+  Yields:
+    None.
+  """
+  previous = current(), getattr(_LOCAL, 'stack', None)
+  if timings is None and previous[0] is None:
+    yield
+    return
+  _LOCAL.timings = timings
+  _LOCAL.stack = []
+  if timings is not None:
+    _add_bound_count(1)
+  try:
+    yield
+  finally:
+    if timings is not None:
+      _add_bound_count(-1)
+    _LOCAL.timings, _LOCAL.stack = previous
+
+
+class section(object):  # pylint: disable=invalid-name
+  """Context manager recording the time spent in a category of work.
+
+  Time spent in sections nested in this one is only recorded for those, and a
+  section nested in a section of the same category is ignored (e.g. for
+  recursive functions).
+  """
+
+  __slots__ = ('_category', '_timings', '_start_wall_s', '_start_cpu_s',
+               '_nested_wall_s', '_nested_cpu_s')
+
+  def __init__(self, category):
+    self._category = category
+    self._timings = None
+
+  def __enter__(self):
+    timings = current()
+    if timings is None:
+      return self
+    stack = _LOCAL.stack
+    # pylint: disable=protected-access
+    if stack and stack[-1]._category == self._category:
+      return self
+    # pylint: enable=protected-access
+    self._timings = timings
+    self._nested_wall_s = self._nested_cpu_s = 0.0
+    stack.append(self)
+    self._start_wall_s = time.time()
+    self._start_cpu_s = _cpu_time()
+    return self
+
+  def __exit__(self, *unused_exc_info):
+    if self._timings is None:
+      return
+    wall_s = time.time() - self._start_wall_s
+    cpu_s = _cpu_time() - self._start_cpu_s
+    stack = _LOCAL.stack
+    stack.pop()
+    if stack:
+      # pylint: disable=protected-access
+      stack[-1]._nested_wall_s += wall_s
+      stack[-1]._nested_cpu_s += cpu_s
+    self._timings.add(self._category, wall_s - self._nested_wall_s,
+                      cpu_s - self._nested_cpu_s)
+    self._timings = None
+
+
+class TimingHistograms(object):
+  """Output callback aggregating the phase Timings of test records.
+
+  For each category (and for all framework work, as 'framework'), this keeps a
+  histogram of the per-phase wall time, with buckets whose upper bounds are
+  powers of two microseconds.
+
+  Example:
+    histograms = instrumentation.TimingHistograms()
+    test.add_output_callbacks(histograms)
+    ...
+    print(histograms.format())
+  """
+
+  FRAMEWORK = 'framework'
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    # Maps category to {bucket upper bound in microseconds: count}.
+    self._histograms = {}
+    self._totals_s = {}
+
+  def _add(self, category, wall_s):
+    bucket = 2 ** max(0, int(math.ceil(math.log(max(wall_s * 1e6, 1), 2))))
+    histogram = self._histograms.setdefault(category, {})
+    histogram[bucket] = histogram.get(bucket, 0) + 1
+    self._totals_s[category] = self._totals_s.get(category, 0.0) + wall_s
+
+  def __call__(self, test_record):
+    with self._lock:
+      for phase_record in test_record.phases:
+        timings = getattr(phase_record, 'timings', None)
+        if timings is None:
+          continue
+        for category in timings.categories:
+          self._add(category, timings.wall_s(category))
+        self._add(self.FRAMEWORK, timings.framework_wall_s)
+
+  def as_base_types(self):
+    with self._lock:
+      return {
+          category: {
+              'count': sum(histogram.values()),
+              'total_wall_s': self._totals_s[category],
+              'buckets_us': dict(histogram),
+          } for category, histogram in self._histograms.items()
+      }
+
+  def format(self):
+    """Returns a human-readable summary of the histograms."""
+    lines = []
+    for category, histogram in sorted(self.as_base_types().items()):
+      lines.append('%s: %d phases, mean %.1f us' % (
+          category, histogram['count'],
+          histogram['total_wall_s'] / histogram['count'] * 1e6))
+      for bucket, count in sorted(histogram['buckets_us'].items()):
+        lines.append('  <= %8d us: %d' % (bucket, count))
+    return '\n'.join(lines)
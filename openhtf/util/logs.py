@@ -108,10 +108,12 @@ import os
 import re
 import sys
 import textwrap
+import threading
 
 from openhtf.util import argv
 from openhtf.util import console_output
 from openhtf.util import functions
+from openhtf.util import instrumentation
 from openhtf.util import threads
 import six
 
@@ -169,20 +171,21 @@ def get_record_logger_for(test_uid):
 def initialize_record_handler(test_uid, test_record, notify_update):
   """Initialize the record handler for a test.
 
-  For each running test, we attach a record handler to the top-level OpenHTF
-  logger. The handler will append OpenHTF logs to the test record, while
-  filtering out logs that are specific to any other test run.
+  For each running test, we register a record handler with the dispatcher
+  attached to the top-level OpenHTF logger. The handler will append OpenHTF
+  logs to the test record, while the dispatcher filters out logs that are
+  specific to any other test run.
   """
   htf_logger = logging.getLogger(LOGGER_PREFIX)
-  htf_logger.addHandler(RecordHandler(test_uid, test_record, notify_update))
+  with _RECORD_DISPATCHER_LOCK:
+    if _RECORD_DISPATCHER not in htf_logger.handlers:
+      htf_logger.addHandler(_RECORD_DISPATCHER)
+  _RECORD_DISPATCHER.add_handler(
+      RecordHandler(test_uid, test_record, notify_update))
 
 
 def remove_record_handler(test_uid):
-  handlers = logging.getLogger(LOGGER_PREFIX).handlers
-  for handler in handlers:
-    if isinstance(handler, RecordHandler) and handler.test_uid is test_uid:
-      handlers.remove(handler)
-      break
+  _RECORD_DISPATCHER.remove_handler(test_uid)
 
 
 def log_once(log_func, msg, *args, **kwargs):
@@ -220,24 +223,6 @@ class MacAddressLogFilter(logging.Filter):
 MAC_FILTER = MacAddressLogFilter()
 
 
-class TestUidFilter(logging.Filter):
-  """Exclude logs emitted by the record loggers of other tests."""
-
-  def __init__(self, test_uid):
-    super(TestUidFilter, self).__init__()
-    self.test_uid = test_uid
-
-  def filter(self, record):
-    match = RECORD_LOGGER_RE.match(record.name)
-
-    # Keep framework logs.
-    if not match:
-      return True
-
-    # Exclude logs emitted by the record loggers of other tests.
-    return match.group('test_uid') == self.test_uid
-
-
 class KillableThreadSafeStreamHandler(logging.StreamHandler):
 
   def handle(self, record):
@@ -257,7 +242,6 @@ class RecordHandler(logging.Handler):
     self._test_record = test_record
     self._notify_update = notify_update
     self.addFilter(MAC_FILTER)
-    self.addFilter(TestUidFilter(test_uid))
 
   def handle(self, record):
     # logging.Handler objects have an internal lock attribute that is a
@@ -277,17 +261,73 @@ class RecordHandler(logging.Handler):
       record: A logging.LogRecord to record.
     """
     try:
-      message = self.format(record)
-      log_record = LogRecord(
-          record.levelno, record.name, os.path.basename(record.pathname),
-          record.lineno, int(record.created * 1000), message,
-      )
-      self._test_record.add_log_record(log_record)
-      self._notify_update()
+      with instrumentation.section(instrumentation.LOGGING):
+        message = self.format(record)
+        log_record = LogRecord(
+            record.levelno, record.name, os.path.basename(record.pathname),
+            record.lineno, int(record.created * 1000), message,
+        )
+        self._test_record.add_log_record(log_record)
+        self._notify_update()
     except Exception:  # pylint: disable=broad-except
       self.handleError(record)
 
 
+class RecordHandlerDispatcher(logging.Handler):
+  """A handler that routes logs to the RecordHandlers of running tests.
+
+  A single instance of this handler is attached to the top-level OpenHTF logger,
+  regardless of how many tests are running.  Logs emitted by the record loggers
+  of a test are only passed to the RecordHandler of that test, while framework
+  logs are passed to the RecordHandlers of all running tests.  This keeps the
+  cost of a test record log independent of the number of concurrently running
+  tests.
+  """
+
+  def __init__(self):
+    super(RecordHandlerDispatcher, self).__init__()
+    self._lock = threading.Lock()
+    # Replaced rather than mutated, so it can be read without the lock.
+    self._handlers_by_uid = {}
+
+  def add_handler(self, handler):
+    with self._lock:
+      handlers_by_uid = dict(self._handlers_by_uid)
+      handlers_by_uid[handler.test_uid] = handler
+      self._handlers_by_uid = handlers_by_uid
+
+  def remove_handler(self, test_uid):
+    with self._lock:
+      handlers_by_uid = dict(self._handlers_by_uid)
+      handlers_by_uid.pop(test_uid, None)
+      self._handlers_by_uid = handlers_by_uid
+
+  def get_handler(self, test_uid):
+    """Returns the RecordHandler for the given test UID, or None."""
+    return self._handlers_by_uid.get(test_uid)
+
+  def handle(self, record):
+    # Each RecordHandler takes its own lock, so don't take self.lock here.
+    handlers_by_uid = self._handlers_by_uid
+    match = RECORD_LOGGER_RE.match(record.name)
+    if match:
+      handler = handlers_by_uid.get(match.group('test_uid'))
+      handlers = (handler,) if handler is not None else ()
+    else:
+      handlers = six.itervalues(handlers_by_uid)
+    for handler in handlers:
+      handler.handle(record)
+    return True
+
+  def emit(self, record):
+    # Records are dispatched in handle().
+    pass
+
+
+_RECORD_DISPATCHER = RecordHandlerDispatcher()
+_RECORD_DISPATCHER_LOCK = threading.Lock()
+
+
 class CliFormatter(logging.Formatter):
   """Formats log messages for printing to the CLI."""
 
@@ -19,12 +19,14 @@ import contextlib
 import cProfile
 import ctypes
 import functools
+import itertools
 import logging
 import pstats
 import sys
 import threading
 
 import six
+from six.moves import queue
 try:
   from six.moves import _thread
 except ImportError:
@@ -42,6 +44,103 @@ class InvalidUsageError(Exception):
   """Raised when an API is used in an invalid or unsupported manner."""
 
 
+class CancellationToken(object):
+  """Lets code learn that the work it is doing is being cancelled.
+
+  Killing a thread raises an exception in it at the next Python bytecode, which
+  can't interrupt blocking calls (sleeps, I/O) and leaves no chance to clean up
+  in an orderly way.  Code that checks or waits on a token instead can stop as
+  soon as it is cancelled:
+
+    while not token.wait(poll_interval_s):
+      poll_the_device()
+    token.raise_if_cancelled()
+
+  Code that uses a token (by checking it, waiting on it or adding a callback to
+  it) is considered cooperative, so whoever cancels it may give it some time to
+  stop on its own before killing it.
+  """
+
+  def __init__(self):
+    self._event = threading.Event()
+    self._lock = threading.Lock()
+    self._callbacks = []
+    self._observed = False
+
+  @property
+  def observed(self):
+    """True if the token has been checked, waited on or had callbacks added."""
+    return self._observed
+
+  @property
+  def is_cancelled(self):
+    self._observed = True
+    return self._event.is_set()
+
+  def wait(self, timeout_s=None):
+    """Wait for the token to be cancelled, returning True if it was."""
+    self._observed = True
+    return self._event.wait(timeout_s)
+
+  def raise_if_cancelled(self):
+    """Raise ThreadTerminationError if the token has been cancelled."""
+    if self.is_cancelled:
+      raise ThreadTerminationError('Cancelled.')
+
+  def add_callback(self, callback):
+    """Call callback (with no arguments) when the token is cancelled.
+
+    Callbacks are called by the thread cancelling the token, so they should be
+    quick, e.g. close a socket to interrupt a blocking read.  If the token is
+    already cancelled, callback is called right away.
+
+    Args:
+      callback: Callable taking no arguments.
+    """
+    self._observed = True
+    with self._lock:
+      if not self._event.is_set():
+        self._callbacks.append(callback)
+        return
+    callback()
+
+  def cancel(self):
+    """Cancel the token, waking up waiters and calling callbacks once."""
+    with self._lock:
+      if self._event.is_set():
+        return
+      self._event.set()
+      callbacks, self._callbacks = self._callbacks, []
+    for callback in callbacks:
+      try:
+        callback()
+      except Exception:  # pylint: disable=broad-except
+        _LOG.exception('Cancellation callback %s raised.', callback)
+
+
+_CANCELLATION_LOCAL = threading.local()
+
+
+def current_cancellation_token():
+  """Returns the CancellationToken bound to the calling thread, if any.
+
+  Phases run with a token bound, so plugs can use this to learn that the phase
+  calling them is being cancelled.
+  """
+  return getattr(_CANCELLATION_LOCAL, 'token', None)
+
+
+@contextlib.contextmanager
+def bind_cancellation_token(token):
+  """Bind token to the calling thread, see current_cancellation_token()."""
+  previous = current_cancellation_token()
+  _CANCELLATION_LOCAL.token = token
+  try:
+    yield
+  finally:
+    _CANCELLATION_LOCAL.token = previous
+
+
 def safe_lock_release_context(rlock):
   if six.PY2:
     return _safe_lock_release_py2(rlock)
@@ -253,6 +352,273 @@ class KillableThread(threading.Thread):
           exc_type, self.name, self.ident, result))
 
 
+class KillableTask(object):
+  """A unit of work run by a KillableThreadPool, which is able to be killed.
+
+  This mirrors the KillableThread interface (start, join, is_alive, kill and the
+  _thread_proc, _thread_exception and _thread_finished hooks), but runs on one
+  of the pool's persistent worker threads instead of a new thread, which avoids
+  the cost of creating a thread for many short-lived tasks.
+
+  Killing a task raises ThreadTerminationError in the worker thread running it,
+  only while its _thread_proc function is running, exactly like KillableThread.
+  A worker that ran a killed task is retired rather than reused, so that a late
+  exception can never affect another task.
+
+  Since worker threads are reused, tasks should not rely on thread-local state
+  being fresh.
+  """
+
+  def __init__(self, name=None, run_with_profiling=None, pool=None):
+    """Initializer for KillableTask.
+
+    Args:
+      name: str, name used in logs.
+      run_with_profiling: Whether to run this task with profiling data
+        collection.
+      pool: KillableThreadPool to run on; defaults to the shared pool.
+    """
+    self._name = name or type(self).__name__
+    self._pool = pool
+    self._state_lock = threading.Lock()
+    self._worker = None  # The worker running _thread_proc, if any.
+    self._started = False
+    self._kill_raised = False
+    self._killed = threading.Event()
+    self._done = threading.Event()
+    self._done_callbacks = []
+    if run_with_profiling:
+      self._profiler = cProfile.Profile()
+    else:
+      self._profiler = None
+
+  @property
+  def name(self):
+    return self._name
+
+  def start(self):
+    """Schedule this task to run on a worker thread."""
+    if self._started:
+      raise RuntimeError('Tasks can only be started once.')
+    self._started = True
+    (self._pool or KillableThreadPool.shared()).submit(self)
+
+  def run(self, worker):
+    """Run the task on the given worker thread; called by the worker.
+
+    Args:
+      worker: The _PoolWorkerThread calling this.
+
+    Returns:
+      True if the worker can be reused, i.e. no ThreadTerminationError (or
+      other BaseException) was raised in it while running this task.
+    """
+    reusable = False
+    try:
+      try:
+        with self._state_lock:
+          if self._killed.is_set():
+            # Killed before it started, so there is nothing to run.
+            reusable = True
+            return reusable
+          self._worker = worker
+        try:
+          if self._profiler is not None:
+            self._profiler.enable()
+          self._thread_proc()
+        finally:
+          with self._state_lock:
+            self._worker = None
+      except Exception:  # pylint: disable=broad-except
+        if not self._thread_exception(*sys.exc_info()):
+          _LOG.critical('Task raised an exception: %s', self.name,
+                        exc_info=True)
+      finally:
+        self._thread_finished()
+        _LOG.debug('Task finished: %s', self.name)
+        if self._profiler is not None:
+          self._profiler.disable()
+      # Not reached if a BaseException escaped, in which case the worker exits.
+      reusable = not self._kill_raised
+    finally:
+      # Let the worker become available before anyone waiting on this task is
+      # woken up, so that a task started right after this one reuses it.
+      worker.task_done(reusable)
+      with self._state_lock:
+        self._done.set()
+        callbacks, self._done_callbacks = self._done_callbacks, []
+      for callback in callbacks:
+        callback()
+    return reusable
+
+  def join(self, timeout=None):
+    """Wait for the task to finish, or for timeout seconds to pass."""
+    self._done.wait(timeout)
+
+  def is_alive(self):
+    """True if the task has been started but has not finished yet."""
+    return self._started and not self._done.is_set()
+
+  def add_done_callback(self, callback):
+    """Call callback (with no arguments) once the task has finished.
+
+    Callbacks are called by the worker thread, so they should be quick.  If the
+    task has already finished, callback is called right away.
+
+    Args:
+      callback: Callable taking no arguments.
+    """
+    with self._state_lock:
+      if not self._done.is_set():
+        self._done_callbacks.append(callback)
+        return
+    callback()
+
+  @property
+  def was_killed(self):
+    return self._killed.is_set()
+
+  def get_profile_stats(self):
+    """Returns profile_stats from profiler. Raises if profiling not enabled."""
+    if self._profiler is not None:
+      return pstats.Stats(self._profiler)
+    raise InvalidUsageError(
+        'Profiling not enabled via __init__, or task has not run yet.')
+
+  def _thread_proc(self):
+    """The method called when executing the task."""
+
+  def _thread_finished(self):
+    """The method called once _thread_proc has finished."""
+
+  def _thread_exception(self, exc_type, exc_val, exc_tb):
+    """The method called if _thread_proc raises an exception.
+
+    To suppress the exception, return True from this method.  Exceptions that
+    are not suppressed are logged, since there is no thread to propagate them
+    to.
+
+    Args:
+      exc_type: exception class.
+      exc_val: exception instance of the type exc_type.
+      exc_tb: traceback object for the current exception instance.
+
+    Returns:
+      True if the exception should be ignored.
+    """
+    return False
+
+  def kill(self):
+    """Terminates the task by raising an error in its worker thread."""
+    self._killed.set()
+    # Holding the lock prevents the worker from moving on to another task
+    # before the exception is raised in it.
+    with self._state_lock:
+      if self._worker is None or self._kill_raised:
+        _LOG.debug('Task %s is not running, will not kill.', self.name)
+        return
+      self._kill_raised = True
+      self._worker.async_raise(ThreadTerminationError)
+
+  def __str__(self):
+    return '<%s: %s>' % (type(self).__name__, self.name)
+
+
+class _PoolWorkerThread(KillableThread):
+  """A worker thread of a KillableThreadPool."""
+  daemon = True
+
+  def __init__(self, pool, name, first_task):
+    super(_PoolWorkerThread, self).__init__(name=name)
+    self._pool = pool
+    self._first_task = first_task
+
+  def task_done(self, reusable):
+    """Called by a task when it finishes running on this worker."""
+    # Once the task has finished, it can no longer be killed, so this is safe.
+    if reusable:
+      self._pool._mark_idle()  # pylint: disable=protected-access
+
+  def _thread_proc(self):
+    task, self._first_task = self._first_task, None
+    while task is not None:
+      if not task.run(self):
+        # A ThreadTerminationError may still be pending, so don't reuse this
+        # thread.
+        return
+      task = self._pool._get_task()  # pylint: disable=protected-access
+
+  def _thread_finished(self):
+    self._pool._retire(self)  # pylint: disable=protected-access
+
+
+class KillableThreadPool(object):
+  """A pool of persistent worker threads that run KillableTasks.
+
+  A new worker is created whenever a task is submitted and no worker is idle,
+  so tasks never wait for one another.  Workers exit after being idle for
+  idle_timeout_s seconds, or after running a task that was killed.
+  """
+
+  _shared_pool = None
+  _shared_pool_lock = threading.Lock()
+
+  def __init__(self, name='KillableThreadPool', idle_timeout_s=60):
+    self._name = name
+    self._idle_timeout_s = idle_timeout_s
+    self._lock = threading.Lock()
+    self._tasks = queue.Queue()
+    # Number of idle workers not yet reserved by a submitted task.
+    self._idle_count = 0
+    self._workers = set()
+    self._worker_ids = itertools.count()
+
+  @classmethod
+  def shared(cls):
+    """Returns the process-wide pool used by tasks by default."""
+    with cls._shared_pool_lock:
+      if cls._shared_pool is None:
+        cls._shared_pool = cls(name='SharedPoolWorker')
+      return cls._shared_pool
+
+  @property
+  def worker_count(self):
+    with self._lock:
+      return len(self._workers)
+
+  def submit(self, task):
+    """Run the given KillableTask on a worker thread."""
+    with self._lock:
+      if self._idle_count:
+        self._idle_count -= 1
+        self._tasks.put(task)
+      else:
+        worker = _PoolWorkerThread(
+            self, '%s-%d' % (self._name, next(self._worker_ids)), task)
+        self._workers.add(worker)
+        worker.start()
+
+  def _mark_idle(self):
+    with self._lock:
+      self._idle_count += 1
+
+  def _get_task(self):
+    """Returns the next task for an idle worker, or None to retire it."""
+    while True:
+      try:
+        return self._tasks.get(timeout=self._idle_timeout_s)
+      except queue.Empty:
+        with self._lock:
+          # Only retire if no submitted task is waiting for an idle worker.
+          if self._tasks.empty() and self._idle_count:
+            self._idle_count -= 1
+            return None
+
+  def _retire(self, worker):
+    with self._lock:
+      self._workers.discard(worker)
+
+
 class NoneByDefaultThreadLocal(threading.local):
   """Makes thread local a bit easier to use by returning None by default.
 
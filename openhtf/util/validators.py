@@ -148,11 +148,11 @@ class InRange(RangeValidatorBase):
     return converter(self._maximum)
 
   def with_args(self, **kwargs):
-    return type(self)(
-        minimum=util.format_string(self._minimum, kwargs),
-        maximum=util.format_string(self._maximum, kwargs),
-        type=self._type,
-    )
+    minimum = util.format_string(self._minimum, kwargs)
+    maximum = util.format_string(self._maximum, kwargs)
+    if minimum is self._minimum and maximum is self._maximum:
+      return self  # Nothing to format, and validators are immutable.
+    return type(self)(minimum=minimum, maximum=maximum, type=self._type)
 
   def __call__(self, value):
     if value is None:
@@ -0,0 +1,282 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""A single thread enforcing the deadlines of all running work.
+
+Rather than each timeout being enforced by a thread blocked in join(timeout) or
+polling in a sleep loop, work registers a Deadline with a Watchdog, whose one
+thread keeps the deadlines in a heap and runs the callback of each deadline
+that expires before it is cancelled:
+
+  deadline = watchdog.Watchdog.shared().schedule(5, on_expired)
+  ...  # Do the work.
+  deadline.cancel()
+
+The watchdog's thread hands expired deadlines to a threads.KillableThreadPool,
+so a slow callback (e.g. one cancelling a CancellationToken, which calls the
+token's callbacks) doesn't delay the other deadlines.  run_with_deadline() and
+wait() handle the common case of a threads.KillableTask that is killed if it
+runs past its deadline:
+
+  deadline = watchdog.Watchdog.shared().run_with_deadline(task, timeout_s=5)
+  if deadline.expired:
+    ...
+
+Deadlines also record how long the work took, and how close it came to its
+timeout (margin_s).  They have the same interface as timeouts.PolledTimeout, so
+they can be passed to functions that expect one.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from openhtf.util import threads
+
+_LOG = logging.getLogger(__name__)
+
+
+class Deadline(object):
+  """A time by which some work should be done, see Watchdog.schedule()."""
+
+  def __init__(self, watchdog, timeout_s, callback, name):
+    self.name = name
+    self.timeout_s = timeout_s
+    self.start = time.time()
+    self.expiry = None if timeout_s is None else self.start + timeout_s
+    self._watchdog = watchdog
+    self._callback = callback
+    self._end = None
+    self._expired = False
+
+  @property
+  def expired(self):
+    """True if the deadline expired (and its callback was called)."""
+    return self._expired
+
+  @property
+  def cancelled(self):
+    return self._end is not None
+
+  def cancel(self):
+    """Cancel the deadline, recording that the work is done.
+
+    Returns:
+      True if the deadline was cancelled before it expired.
+    """
+    return self._watchdog._cancel(self)  # pylint: disable=protected-access
+
+  @property
+  def elapsed_s(self):
+    """Seconds between scheduling and cancelling the deadline (or now)."""
+    return (self._end or time.time()) - self.start
+
+  @property
+  def margin_s(self):
+    """Seconds left before expiry when the deadline was cancelled (or now).
+
+    None if the deadline has no timeout; negative if the work ran past it.
+    """
+    if self.timeout_s is None:
+      return None
+    return self.timeout_s - self.elapsed_s
+
+  # These mirror timeouts.PolledTimeout.
+  def has_expired(self):
+    return self.timeout_s is not None and time.time() >= self.expiry
+
+  @property
+  def seconds(self):
+    return time.time() - self.start
+
+  @property
+  def remaining(self):
+    if self.timeout_s is None:
+      return None
+    return max(0, self.expiry - time.time())
+
+  def __repr__(self):
+    return '<%s: %s, timeout %s s>' % (
+        type(self).__name__, self.name, self.timeout_s)
+
+
+class _CallbackTask(threads.KillableTask):
+  """Calls the callback of an expired deadline."""
+
+  def __init__(self, deadline, pool):
+    super(_CallbackTask, self).__init__(
+        name='<DeadlineCallback: %s>' % deadline.name, pool=pool)
+    self._deadline = deadline
+
+  def _thread_proc(self):
+    self._deadline._callback()  # pylint: disable=protected-access
+
+  def _thread_exception(self, *args):
+    _LOG.error('Callback of %s raised.', self._deadline, exc_info=args)
+    return True
+
+
+class Watchdog(object):
+  """Calls the callbacks of deadlines that expire, from a thread pool."""
+
+  _shared = None
+  _shared_lock = threading.Lock()
+
+  # Cancelled deadlines stay in the heap until they reach its top, unless they
+  # are more than half of it, in which case the heap is rebuilt.
+  _MIN_COMPACT_SIZE = 64
+
+  def __init__(self, name='Watchdog', pool=None):
+    """Initializer for Watchdog.
+
+    Args:
+      name: Name of the watchdog's thread.
+      pool: threads.KillableThreadPool running the callbacks of expired
+          deadlines; defaults to the shared pool.
+    """
+    self._name = name
+    self._pool = pool
+    self._condition = threading.Condition()
+    self._heap = []
+    self._cancelled_count = 0
+    self._counter = itertools.count()
+    self._thread = None
+
+  @classmethod
+  def shared(cls):
+    """Returns the Watchdog shared by all tests in this process."""
+    with cls._shared_lock:
+      if cls._shared is None:
+        cls._shared = cls()
+      return cls._shared
+
+  @property
+  def pending_count(self):
+    """Number of deadlines that have neither expired nor been cancelled."""
+    with self._condition:
+      return len(self._heap) - self._cancelled_count
+
+  def schedule(self, timeout_s, callback, name=None):
+    """Call callback (with no arguments) in timeout_s, unless cancelled first.
+
+    Args:
+      timeout_s: Seconds until the deadline, or None for no deadline (the
+          returned Deadline then only records the elapsed time).
+      callback: Called on a pool worker thread when the deadline expires.
+      name: Name of the deadline, used in logs.
+
+    Returns:
+      A Deadline, which should be cancelled once the work is done.
+    """
+    deadline = Deadline(self, timeout_s, callback, name)
+    if timeout_s is None:
+      return deadline
+    with self._condition:
+      heapq.heappush(self._heap, (deadline.expiry, next(self._counter),
+                                  deadline))
+      if self._thread is None:
+        self._thread = threading.Thread(target=self._thread_proc,
+                                        name=self._name)
+        self._thread.daemon = True
+        self._thread.start()
+      elif self._heap[0][2] is deadline:
+        # The watchdog thread is waiting for a later deadline.
+        self._condition.notify()
+    return deadline
+
+  def wait(self, task, timeout_s, on_expired=None, name=None):
+    """Wait for a started task to finish, or for its deadline to expire.
+
+    Args:
+      task: A started threads.KillableTask.
+      timeout_s: Seconds the task may run for, or None to wait until it
+          finishes.
+      on_expired: Called (on a pool worker thread) if the deadline expires;
+          defaults to killing the task.
+      name: Name of the deadline; defaults to the task's name.
+
+    Returns:
+      The cancelled Deadline of the task; if it expired, the task may still be
+      running (e.g. if it was killed while blocked in a system call).
+    """
+    finished = threading.Event()
+    on_expired = on_expired or task.kill
+
+    def _expired():
+      try:
+        on_expired()
+      finally:
+        finished.set()
+
+    deadline = self.schedule(timeout_s, _expired, name=name or task.name)
+    task.add_done_callback(finished.set)
+    finished.wait()
+    deadline.cancel()
+    return deadline
+
+  def run_with_deadline(self, task, timeout_s, on_expired=None, name=None):
+    """Start task and wait for it to finish, or for its deadline to expire.
+
+    See wait() for the arguments.
+
+    Returns:
+      The cancelled Deadline of the task.
+    """
+    task.start()
+    return self.wait(task, timeout_s, on_expired=on_expired, name=name)
+
+  def _cancel(self, deadline):
+    with self._condition:
+      if deadline.cancelled:
+        return not deadline.expired
+      deadline._end = time.time()  # pylint: disable=protected-access
+      if deadline.expired or deadline.timeout_s is None:
+        return not deadline.expired
+      self._cancelled_count += 1
+      if (len(self._heap) >= self._MIN_COMPACT_SIZE and
+          self._cancelled_count * 2 > len(self._heap)):
+        self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+        heapq.heapify(self._heap)
+        self._cancelled_count = 0
+      return True
+
+  def _next_expired(self):
+    """Wait for the next deadline to expire, and return it."""
+    with self._condition:
+      while True:
+        while self._heap and self._heap[0][2].cancelled:
+          heapq.heappop(self._heap)
+          self._cancelled_count -= 1
+        if not self._heap:
+          self._condition.wait()
+          continue
+        wait_s = self._heap[0][0] - time.time()
+        if wait_s > 0:
+          self._condition.wait(wait_s)
+          continue
+        deadline = heapq.heappop(self._heap)[2]
+        deadline._expired = True  # pylint: disable=protected-access
+        return deadline
+
+  def _thread_proc(self):
+    while True:
+      deadline = self._next_expired()
+      _LOG.debug('Deadline expired: %s', deadline)
+      try:
+        _CallbackTask(deadline, self._pool).start()
+      except Exception:  # pylint: disable=broad-except
+        _LOG.exception('Could not run the callback of %s.', deadline)
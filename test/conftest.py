@@ -0,0 +1,22 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""pytest configuration for the OpenHTF tests."""
+
+import sys
+
+# Tests using async def syntax can't even be imported on Python 2.
+collect_ignore = []
+if sys.version_info[0] < 3:
+  collect_ignore.append('core/coroutine_phase_test.py')
@@ -0,0 +1,144 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for coroutine (async def) phases and plugs; Python 3 only."""
+
+import asyncio
+import threading
+import time
+import unittest
+
+import openhtf as htf
+from openhtf import plugs
+from openhtf.core.test_record import Outcome
+from openhtf.core.test_record import PhaseOutcome
+from openhtf.util import coroutines
+from openhtf.util import threads
+
+
+class InstrumentPlug(plugs.BasePlug):
+
+  def __init__(self):
+    self.loops = set()
+    self.torn_down_on = None
+
+  async def read(self, channel):
+    self.loops.add(asyncio.get_event_loop())
+    await asyncio.sleep(0.2)
+    return channel * 10
+
+  async def tearDown(self):
+    await asyncio.sleep(0)
+    self.torn_down_on = asyncio.get_event_loop()
+
+
+@htf.measures(htf.Measurement('reading').with_dimensions('channel'))
+@plugs.plug(instrument=InstrumentPlug)
+async def poll_phase(test, instrument):
+  readings = await asyncio.gather(
+      *[instrument.read(channel) for channel in range(10)])
+  for channel, reading in enumerate(readings):
+    test.measurements.reading[channel] = reading
+  test.logger.info('Polled %d channels', len(readings))
+
+
+@plugs.plug(instrument=InstrumentPlug)
+async def second_poll_phase(test, instrument):
+  assert await instrument.read(1) == 10
+
+
+class CoroutinePhaseTest(unittest.TestCase):
+
+  def _execute(self, *phases):
+    records = []
+    test = htf.Test(*phases)
+    test.configure(default_dut_id='dut')
+    test.add_output_callbacks(records.append)
+    test.execute()
+    return records[0]
+
+  def test_coroutine_phase(self):
+    instruments = []
+
+    @plugs.plug(instrument=InstrumentPlug)
+    def save_plug(instrument):
+      instruments.append(instrument)
+
+    start = time.time()
+    record = self._execute(poll_phase, second_poll_phase, save_plug)
+    # The ten reads ran concurrently.
+    self.assertLess(time.time() - start, 1.5)
+    self.assertEqual(Outcome.PASS, record.outcome)
+    self.assertEqual(
+        [(channel, channel * 10) for channel in range(10)],
+        record.phases[0].measurements['reading'].measured_value.value)
+    self.assertIn('Polled 10 channels',
+                  [log_record.message for log_record in record.log_records])
+
+    # All coroutines, including tearDown, ran on one per-test loop, which has
+    # been closed.
+    instrument, = instruments
+    loop, = instrument.loops
+    self.assertIs(loop, instrument.torn_down_on)
+    self.assertTrue(loop.is_closed())
+
+  def test_timeout_cancels(self):
+    cancelled = threading.Event()
+
+    @htf.PhaseOptions(timeout_s=0.2)
+    async def hanging_phase():
+      try:
+        await asyncio.sleep(60)
+      except asyncio.CancelledError:
+        cancelled.set()
+        raise
+
+    record = self._execute(hanging_phase)
+    self.assertTrue(cancelled.wait(2))
+    self.assertEqual(PhaseOutcome.ERROR, record.phases[0].outcome)
+    self.assertEqual(Outcome.TIMEOUT, record.outcome)
+
+  def test_exception(self):
+    async def raising_phase():
+      await asyncio.sleep(0)
+      raise ValueError('raised in coroutine')
+
+    record = self._execute(raising_phase)
+    self.assertEqual(Outcome.ERROR, record.outcome)
+    self.assertEqual('ValueError', record.outcome_details[0].code)
+
+
+class EventLoopThreadTest(unittest.TestCase):
+
+  def test_submit_and_stop(self):
+    event_loop = coroutines.EventLoopThread()
+    task = event_loop.submit(asyncio.sleep(0, result='done'))
+    self.assertTrue(task.wait(1))
+    self.assertEqual('done', task.result())
+
+    background = event_loop.submit(asyncio.sleep(60))
+    event_loop.stop(timeout_s=1)
+    self.assertFalse(event_loop.is_alive())
+    self.assertTrue(background.wait(1))
+    with self.assertRaises(RuntimeError):
+      event_loop.submit(asyncio.sleep(0))
+
+  def test_cancel(self):
+    event_loop = coroutines.EventLoopThread()
+    task = event_loop.submit(asyncio.sleep(60))
+    task.cancel()
+    self.assertTrue(task.wait(1))
+    with self.assertRaises(threads.ThreadTerminationError):
+      task.result()
+    event_loop.stop(timeout_s=1)
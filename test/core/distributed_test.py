@@ -0,0 +1,183 @@
+# Lint as: python2, python3
+"""Unit tests for the distributed module."""
+
+import os
+import shutil
+import signal
+import tempfile
+import unittest
+
+from multiprocessing import connection
+
+import openhtf as htf
+from openhtf import plugs
+from openhtf.core import distributed
+from openhtf.core import phase_subprocess
+from openhtf.core.test_record import Outcome
+from openhtf.core.test_record import PhaseOutcome
+from openhtf.util import conf
+
+_AUTHKEY = 'secret'
+
+
+class PidPlug(plugs.BasePlug):
+
+  def get_pid(self):
+    return os.getpid()
+
+
+@htf.measures(htf.Measurement('worker_pid'))
+@plugs.plug(pid_plug=PidPlug)
+def remote_phase(test, pid_plug):
+  test.measurements.worker_pid = pid_plug.get_pid()
+  test.logger.info('Hello from the worker.')
+  test.attach('note', b'from the worker')
+
+
+@htf.measures(htf.Measurement('count').equals(1))
+def failing_remote_phase(test):
+  test.measurements.count = 2
+
+
+def local_phase():
+  pass
+
+
+def crash_worker():
+  os._exit(3)  # pylint: disable=protected-access
+
+
+def hang_worker():
+  os.kill(os.getpid(), signal.SIGSTOP)
+
+
+class _CreateFile(object):
+  """Creates a file when unpickled."""
+
+  def __init__(self, path):
+    self.path = path
+
+  def __reduce__(self):
+    return open, (self.path, 'w')
+
+
+def _serve(address_queue):
+  worker = distributed.GroupWorker(authkey=_AUTHKEY)
+  address_queue.put(worker.address)
+  worker.serve_forever()
+
+
+def _execute(*phases):
+  records = []
+  test = htf.Test(*phases)
+  test.add_output_callbacks(records.append)
+  test.execute(test_start=lambda: 'dut')
+  return records[0]
+
+
+class DistributedTest(unittest.TestCase):
+
+  def setUp(self):
+    super(DistributedTest, self).setUp()
+    self.workers = []
+
+  def tearDown(self):
+    for process in self.workers:
+      os.kill(process.pid, signal.SIGKILL)
+      process.join()
+    super(DistributedTest, self).tearDown()
+
+  def _start_worker(self):
+    context = phase_subprocess._CONTEXT  # pylint: disable=protected-access
+    address_queue = context.Queue()
+    process = context.Process(target=_serve, args=(address_queue,))
+    process.daemon = True
+    process.start()
+    self.workers.append(process)
+    return address_queue.get(timeout=30), process
+
+  @conf.save_and_restore(remote_group_authkey=_AUTHKEY)
+  def test_remote_group(self):
+    address, process = self._start_worker()
+    record = _execute(local_phase, htf.PhaseGroup(
+        main=[remote_phase, failing_remote_phase], name='remote',
+        worker=address))
+    self.assertEqual(Outcome.FAIL, record.outcome)
+    self.assertEqual(
+        ['trigger_phase', 'local_phase', 'remote_phase',
+         'failing_remote_phase'],
+        [phase_record.name for phase_record in record.phases])
+    self.assertEqual(['failing_remote_phase'], record.failed_phase_names)
+    remote_record = record.phases[2]
+    self.assertEqual(
+        process.pid,
+        remote_record.measurements['worker_pid'].measured_value.value)
+    self.assertEqual(b'from the worker', remote_record.attachments['note'].data)
+    self.assertIn('Hello from the worker.',
+                  [log_record.message for log_record in record.log_records])
+    self.assertEqual('dut', record.dut_id)
+
+  @conf.save_and_restore(remote_group_authkey=_AUTHKEY)
+  def test_parallel_workers(self):
+    groups = [htf.PhaseGroup(main=[remote_phase], name='remote_%d' % index,
+                             worker=self._start_worker()[0])
+              for index in range(2)]
+    record = _execute(htf.PhaseGroup(main=groups, parallel=True))
+    self.assertEqual(Outcome.PASS, record.outcome)
+    self.assertEqual(
+        {process.pid for process in self.workers},
+        {phase_record.measurements['worker_pid'].measured_value.value
+         for phase_record in record.phases[1:]})
+
+  @conf.save_and_restore(remote_group_authkey=_AUTHKEY)
+  def test_worker_lost(self):
+    address, _ = self._start_worker()
+    record = _execute(
+        htf.PhaseGroup(main=[crash_worker], name='remote', worker=address),
+        local_phase)
+    self.assertEqual(Outcome.ERROR, record.outcome)
+    self.assertEqual(['trigger_phase', 'remote'],
+                     [phase_record.name for phase_record in record.phases])
+    self.assertEqual(PhaseOutcome.ERROR, record.phases[1].outcome)
+    self.assertEqual('WorkerLostError', record.outcome_details[0].code)
+
+  @conf.save_and_restore(remote_group_authkey=_AUTHKEY,
+                         remote_group_heartbeat_timeout_s=1)
+  def test_heartbeat_timeout(self):
+    address, _ = self._start_worker()
+    record = _execute(
+        htf.PhaseGroup(main=[hang_worker], name='remote', worker=address))
+    self.assertEqual(Outcome.ERROR, record.outcome)
+    self.assertIn('No heartbeat',
+                  str(record.phases[1].result.phase_result.exc_val))
+
+  @conf.save_and_restore(remote_group_authkey='wrong')
+  def test_authentication_failure(self):
+    address, _ = self._start_worker()
+    record = _execute(
+        htf.PhaseGroup(main=[local_phase], name='remote', worker=address))
+    self.assertEqual(Outcome.ERROR, record.outcome)
+    self.assertEqual('WorkerLostError', record.outcome_details[0].code)
+
+  def test_unauthenticated_client_is_rejected(self):
+    address, _ = self._start_worker()
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    path = os.path.join(directory, 'unpickled')
+    conn = connection.Client(distributed.parse_address(address))
+    self.addCleanup(conn.close)
+    conn.send(('run', _CreateFile(path)))
+    with self.assertRaises((EOFError, IOError, OSError)):
+      while conn.poll(10):
+        conn.recv_bytes()
+    self.assertFalse(os.path.exists(path))
+
+  @conf.save_and_restore(remote_group_authkey=None)
+  def test_authkey_required(self):
+    with self.assertRaises(distributed.MissingAuthkeyError):
+      distributed.GroupWorker()
+    record = _execute(
+        htf.PhaseGroup(main=[local_phase], name='remote',
+                       worker='localhost:1'))
+    self.assertEqual(Outcome.ERROR, record.outcome)
+    self.assertEqual('MissingAuthkeyError', record.outcome_details[0].code)
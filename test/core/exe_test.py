@@ -29,9 +29,11 @@ from openhtf.core import test_descriptor
 from openhtf.core import test_executor
 from openhtf.core import test_state
 from openhtf.core.test_record import Outcome
+from openhtf.core.test_record import PhaseOutcome
 
 from openhtf.util import conf
 from openhtf.util import logs
+from openhtf.util import threads
 from openhtf.util import timeouts
 
 
@@ -209,6 +211,37 @@ class TestExecutorTest(unittest.TestCase):
     record = executor.test_state.test_record
     self.assertEqual(record.outcome, Outcome.FAIL)
 
+  def test_concurrent_tests(self):
+    started = [threading.Event(), threading.Event()]
+    records = []
+
+    def _make_test(index):
+      @openhtf.PhaseOptions()
+      def slot_phase(test):
+        test.logger.info('Slot %d', index)
+        started[index].set()
+        # Only completes if the other test runs at the same time.
+        if not started[1 - index].wait(5):
+          return openhtf.PhaseResult.STOP
+      test = openhtf.Test(slot_phase)
+      test.configure(default_dut_id='dut%d' % index)
+      test.add_output_callbacks(records.append)
+      return test
+
+    tests = [_make_test(0), _make_test(1)]
+    threads = [threading.Thread(target=test.execute) for test in tests]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    self.assertEqual(2, len(records))
+    for record in records:
+      self.assertEqual(Outcome.PASS, record.outcome)
+      slot_logs = [log_record.message for log_record in record.log_records
+                   if log_record.message.startswith('Slot')]
+      self.assertEqual(['Slot %s' % record.dut_id[-1]], slot_logs)
+
   def test_plug_map(self):
     test = openhtf.Test(phase_one, phase_two)
     self.assertIn(self.test_plug_type, test.descriptor.plug_types)
@@ -355,6 +388,62 @@ class TestExecutorTest(unittest.TestCase):
     self.assertFalse(ev2.is_set())
     executor.close()
 
+  def test_cancel_cooperative_phase(self):
+    phase_started = threading.Event()
+    cancelled = []
+
+    def cooperative_phase(test):
+      phase_started.set()
+      cancelled.append(test.cancellation_token.wait(10))
+      # Plugs called by the phase see the same token.
+      self.assertIs(test.cancellation_token,
+                    threads.current_cancellation_token())
+
+    test = openhtf.Test(cooperative_phase)
+    test.configure(default_dut_id='dut')
+    executor = test_executor.TestExecutor(
+        test.descriptor, 'uid', None, test._test_options,
+        run_with_profiling=False)
+
+    executor.start()
+    self.assertTrue(phase_started.wait(5))
+    start = time.time()
+    executor.abort()
+    abort_s = time.time() - start
+    executor.wait()
+    self.assertEqual([True], cancelled)
+    self.assertLess(abort_s, 1)
+    record = executor.test_state.test_record
+    self.assertEqual(Outcome.ABORTED, record.outcome)
+    self.assertEqual(PhaseOutcome.PASS, record.phases[0].outcome)
+    executor.close()
+
+  @conf.save_and_restore(cancel_timeout_s=10)
+  def test_cancel_phase_that_stopped_watching(self):
+    phase_started = threading.Event()
+
+    def busy_phase(test):
+      test.cancellation_token.is_cancelled  # pylint: disable=pointless-statement
+      phase_started.set()
+      while True:
+        time.sleep(0.01)
+
+    test = openhtf.Test(busy_phase)
+    test.configure(default_dut_id='dut')
+    executor = test_executor.TestExecutor(
+        test.descriptor, 'uid', None, test._test_options,
+        run_with_profiling=False)
+
+    executor.start()
+    self.assertTrue(phase_started.wait(5))
+    start = time.time()
+    executor.abort()
+    executor.wait()
+    self.assertLess(time.time() - start, 2)
+    self.assertEqual(Outcome.ABORTED,
+                     executor.test_state.test_record.outcome)
+    executor.close()
+
   def test_failure_during_plug_init(self):
     ev = threading.Event()
     group = phase_group.PhaseGroup(
@@ -511,6 +600,116 @@ class TestExecutorTest(unittest.TestCase):
     self.assertTrue(ev.wait(1))
     executor.close()
 
+  def _execute_phases(self, *phases):
+    test = openhtf.Test(*phases)
+    test.configure(default_dut_id='dut')
+    executor = test_executor.TestExecutor(
+        test.descriptor, 'uid', None, test._test_options,
+        run_with_profiling=False)
+    executor.start()
+    executor.wait()
+    executor.close()
+    return executor.test_state.test_record
+
+  def test_timeout_margin(self):
+
+    @openhtf.PhaseOptions(timeout_s=30)
+    def quick_phase():
+      pass
+
+    @openhtf.PhaseOptions(timeout_s=0.1)
+    def slow_phase():
+      time.sleep(0.2)
+
+    record = self._execute_phases(quick_phase, slow_phase)
+    self.assertGreater(record.phases[0].timeout_margin_s, 20)
+    self.assertLessEqual(record.phases[1].timeout_margin_s, 0)
+    self.assertIsNone(record.phases[1].result.phase_result)
+
+  def test_repeat_in_place(self):
+    attempts = []
+
+    @openhtf.PhaseOptions(repeat_in_place=True, repeat_limit=10)
+    @openhtf.measures('attempt')
+    def poll_phase(test):
+      attempts.append(threading.current_thread())
+      test.measurements.attempt = len(attempts)
+      if len(attempts) < 5:
+        return openhtf.PhaseResult.REPEAT
+
+    record = self._execute_phases(poll_phase)
+    self.assertEqual(Outcome.PASS, record.outcome)
+    self.assertEqual(1, len(record.phases))
+    self.assertEqual(1, len(set(attempts)))
+    phase_record = record.phases[0]
+    self.assertEqual(
+        5, phase_record.measurements['attempt'].measured_value.value)
+    summary = phase_record.repeat_summary
+    self.assertEqual(5, summary.count)
+    self.assertEqual(0, summary.error_count)
+    self.assertIsNone(summary.last_error)
+    self.assertLessEqual(summary.max_time_millis, summary.total_time_millis)
+    self.assertEqual(
+        5, phase_record.as_base_types()['repeat_summary']['count'])
+
+  def test_repeat_in_place_limit(self):
+
+    @openhtf.PhaseOptions(repeat_in_place=True, repeat_limit=3)
+    def repeat_phase():
+      return openhtf.PhaseResult.REPEAT
+
+    record = self._execute_phases(repeat_phase)
+    self.assertEqual(Outcome.FAIL, record.outcome)
+    self.assertEqual(3, record.phases[0].repeat_summary.count)
+    self.assertEqual(PhaseOutcome.ERROR, record.phases[0].outcome)
+
+  def test_repeat_in_place_exception_is_not_repeated(self):
+    attempts = []
+
+    @openhtf.PhaseOptions(repeat_in_place=True, timeout_s=1)
+    def raising_phase():
+      attempts.append(None)
+      raise self.TestDummyExceptionError('still not ready')
+
+    record = self._execute_phases(raising_phase)
+    self.assertEqual(Outcome.ERROR, record.outcome)
+    self.assertEqual(1, len(attempts))
+    summary = record.phases[0].repeat_summary
+    self.assertEqual(1, summary.count)
+    self.assertEqual(1, summary.error_count)
+    self.assertEqual('TestDummyExceptionError: still not ready',
+                     summary.last_error)
+    self.assertEqual('TestDummyExceptionError',
+                     record.outcome_details[0].code)
+
+  def test_phase_sweep(self):
+    points = []
+
+    @openhtf.PhaseOptions(name='gain_{frequency}_{power}')
+    @openhtf.measures(openhtf.Measurement('gain_{power}').in_range(0, 5),
+                      openhtf.Measurement('noise'))
+    def gain_phase(test, frequency, power):
+      points.append((frequency, power))
+      test.measurements['gain_%d' % power] = power
+      test.measurements.noise = frequency
+
+    sweep = openhtf.PhaseSweep.over(gain_phase, ('frequency', [1, 2]),
+                                    power=range(0, 10, 3))
+    self.assertEqual(8, sweep.point_count)
+    record = self._execute_phases(sweep)
+    self.assertEqual([(f, p) for f in (1, 2) for p in (0, 3, 6, 9)], points)
+    self.assertEqual(Outcome.FAIL, record.outcome)
+    self.assertEqual(['gain_1_0', 'gain_1_3', 'gain_1_6', 'gain_1_9'],
+                     [phase.name for phase in record.phases[:4]])
+    self.assertEqual(PhaseOutcome.FAIL, record.phases[2].outcome)
+    self.assertIn('gain_6', record.phases[2].measurements)
+
+    stop_sweep = openhtf.PhaseSweep.over(
+        lambda value: openhtf.PhaseResult.STOP if value == 1 else None,
+        value=range(3))
+    record = self._execute_phases(stop_sweep)
+    self.assertEqual(2, len(record.phases))
+
 
 class TestExecutorHandlePhaseTest(unittest.TestCase):
 
@@ -20,6 +20,8 @@ actually care about.
 """
 
 import collections
+import pickle
+import unittest
 
 from openhtf.core import measurements
 
@@ -205,6 +207,23 @@ class TestMeasurement(htf_test.TestCase):
     with self.assertRaises(BadValidatorError):
       measurement.validate()
 
+  def test_fresh_copy(self):
+    declaration = htf.Measurement('trace').with_dimensions('ms').in_range(0, 5)
+    declaration.doc('A trace.')
+    first = declaration.fresh_copy()
+    first.measured_value[0] = 1
+    first.notify_value_set()
+    second = declaration.fresh_copy()
+
+    self.assertEqual(measurements.Outcome.PARTIALLY_SET, first.outcome)
+    self.assertEqual(measurements.Outcome.UNSET, second.outcome)
+    self.assertFalse(second.measured_value.is_value_set)
+    self.assertFalse(declaration.measured_value.is_value_set)
+    self.assertEqual('A trace.', second.docstring)
+    self.assertEqual(declaration.dimensions, second.dimensions)
+    self.assertEqual(declaration.validators, second.validators)
+    self.assertIsNot(declaration.validators, second.validators)
+
 
 class TestMeasuredValue(htf_test.TestCase):
 
@@ -224,3 +243,109 @@ class TestMeasuredValue(htf_test.TestCase):
     named_complex = NamedComplex(10)
     measured_value.set(named_complex)
     self.assertEqual({'a': 10}, measured_value._cached_value)
+
+
+class TestDimensionedMeasuredValue(htf_test.TestCase):
+
+  def test_dict_interface(self):
+    measured_value = measurements.DimensionedMeasuredValue('sweep', 2)
+    measured_value[1, 'a'] = 1.5
+    measured_value[2, 'b'] = 'text'
+    measured_value[1, 'a'] = 2.5
+    self.assertEqual(2.5, measured_value[1, 'a'])
+    self.assertEqual([(1, 'a', 2.5), (2, 'b', 'text')], measured_value.value)
+    self.assertEqual(
+        collections.OrderedDict([((1, 'a'), 2.5), ((2, 'b'), 'text')]),
+        measured_value.value_dict)
+    self.assertEqual([[1, 'a', 2.5], [2, 'b', 'text']],
+                     [list(row) for row in measured_value.basetype_value()])
+
+  def test_extend(self):
+    measured_value = measurements.DimensionedMeasuredValue('sweep', 1)
+    measured_value[0] = 0.0
+    measured_value.extend([1, 2, 0], [1.0, 4.0, 9.0])
+    self.assertEqual([(0, 9.0), (1, 1.0), (2, 4.0)], measured_value.value)
+    with self.assertRaises(measurements.InvalidDimensionsError):
+      measured_value.extend([3, 4], [1.0])
+
+  def test_extend_multiple_dimensions(self):
+    measured_value = measurements.DimensionedMeasuredValue('sweep', 2)
+    measured_value.extend([[0, 0, 1], ['x', 'y', 'x']], [1, 2, 3])
+    self.assertEqual(3, measured_value[1, 'x'])
+    with self.assertRaises(measurements.InvalidDimensionsError):
+      measured_value.extend([[0, 1]], [1, 2])
+
+  def test_coordinates_index_is_built_on_demand(self):
+    # pylint: disable=protected-access
+    measured_value = measurements.DimensionedMeasuredValue('sweep', 2)
+    measured_value.extend([[0, 0, 1, 1], [0, 1, 0, 1]], [1, 2, 3, 4])
+    view = measured_value.read_only_view()
+    self.assertEqual(3, view[1, 0])
+    with self.assertRaises(KeyError):
+      view[0, 2]  # pylint: disable=pointless-statement
+    with self.assertRaises(KeyError):
+      view[0, 'x']  # pylint: disable=pointless-statement
+    self.assertIsNone(measured_value._columns.rows_by_coordinates)
+
+    # Coordinates set out of order may already have been set.
+    measured_value.extend([[0, 2], [1, 0]], [5, 6])
+    self.assertIsNotNone(measured_value._columns.rows_by_coordinates)
+    self.assertEqual([(0, 0, 1), (0, 1, 5), (1, 0, 3), (1, 1, 4), (2, 0, 6)],
+                     measured_value.value)
+    self.assertEqual(5, view[0, 1])
+    self.assertEqual(6, view[2, 0])
+
+  @unittest.skipIf(measurements.numpy is None, 'NumPy is not installed.')
+  def test_to_numpy_shares_typed_columns(self):
+    measured_value = measurements.DimensionedMeasuredValue('sweep', 1)
+    measured_value.extend(range(3), [0.5, 1.5, 2.5])
+    coordinates, values = measured_value.to_numpy()
+    self.assertEqual('int64', coordinates.dtype.name)
+    self.assertEqual([0.5, 1.5, 2.5], values.tolist())
+    self.assertFalse(values.flags.writeable)
+    self.assertFalse(values.flags.owndata)
+
+    # Setting values later leaves the exported arrays unchanged.
+    measured_value[0] = 10.0
+    measured_value[3] = 3.5
+    self.assertEqual([0.5, 1.5, 2.5], values.tolist())
+    self.assertEqual([10.0, 1.5, 2.5, 3.5],
+                     measured_value.to_numpy()[1].tolist())
+
+  def test_mixed_types_read_back_unchanged(self):
+    measured_value = measurements.DimensionedMeasuredValue('sweep', 1)
+    measured_value.extend([0, 1, 2], [1, 2.5, True])
+    self.assertEqual([1, 2.5, True],
+                     [value for _, value in measured_value])
+    self.assertIs(True, measured_value[2])
+
+  def test_read_only_view(self):
+    measured_value = measurements.DimensionedMeasuredValue('sweep', 1)
+    measured_value[0] = 1
+    view = measured_value.read_only_view()
+    self.assertEqual(measured_value, view)
+    with self.assertRaises(TypeError):
+      view[1] = 2
+    measured_value[1] = 2
+    self.assertEqual(2, view[1])
+
+  def test_pickle(self):
+    measured_value = measurements.DimensionedMeasuredValue('sweep', 1)
+    measured_value.extend([0, 1], [0.5, 'text'])
+    self.assertEqual(measured_value,
+                     pickle.loads(pickle.dumps(measured_value)))
+
+  def test_legacy_state_is_converted_to_columns(self):
+    # The state pickled before values were stored in columns.
+    state = {
+        'name': 'sweep', 'num_dimensions': 1, 'notify_value_set': None,
+        'value_dict': collections.OrderedDict([((0,), 0.5), ((1,), 1.5)]),
+        '_cached_basetype_values': [],
+    }
+    measured_value = measurements.DimensionedMeasuredValue.__new__(
+        measurements.DimensionedMeasuredValue)
+    measured_value.__setstate__(state)
+    self.assertEqual([(0, 0.5), (1, 1.5)], measured_value.value)
+    measured_value[2] = 2.5
+    self.assertEqual([[0, 0.5], [1, 1.5], [2, 2.5]],
+                     [list(row) for row in measured_value.basetype_value()])
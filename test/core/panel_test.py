@@ -0,0 +1,88 @@
+# Lint as: python2, python3
+"""Unit tests for the panel module."""
+
+import unittest
+
+import openhtf
+from openhtf.core import measurements
+from openhtf.core import panel
+from openhtf.core import test_record
+
+
+def _gains_at_most_10(rows):
+  return all(gain <= 10 for _, gain in rows)
+
+
+@openhtf.measures(
+    openhtf.Measurement('voltage').in_range(3.2, 3.4),
+    openhtf.Measurement('gain').with_dimensions('Hz').with_validator(
+        _gains_at_most_10),
+    openhtf.Measurement('fixture'))
+def sweep_panel(test):
+  test.measurements.voltage = openhtf.PerSlot([3.3, 3.5, 3.25])
+  for frequency in (100, 200):
+    test.measurements.gain[frequency] = openhtf.PerSlot(
+        [frequency / 100, 5, frequency / 10])
+  test.measurements.fixture = 'panel_fixture'
+
+
+@openhtf.measures(openhtf.Measurement('current').in_range(maximum=1))
+def measure_current(test):
+  test.measurements.current = openhtf.PerSlot([0.1, 0.2])
+
+
+def _execute(*phases):
+  records = []
+  test = openhtf.Test(*phases)
+  test.add_output_callbacks(records.append)
+  test.execute(test_start=panel.trigger(lambda: ['a', 'b', 'c']))
+  return records[0]
+
+
+class PanelTest(unittest.TestCase):
+
+  def test_per_slot_validation(self):
+    measurement = openhtf.Measurement('voltage').in_range(1, 2)
+    measurement.measured_value.set(openhtf.PerSlot([1, 1.5]))
+    self.assertEqual(measurements.Outcome.PASS, measurement.validate().outcome)
+    measurement.measured_value.set(openhtf.PerSlot([1, 3]))
+    self.assertEqual(measurements.Outcome.FAIL, measurement.validate().outcome)
+
+  def test_split_record(self):
+    record = _execute(sweep_panel)
+    self.assertEqual('a+b+c', record.dut_id)
+    self.assertEqual(test_record.Outcome.FAIL, record.outcome)
+
+    slot_records = panel.split_record(record)
+    self.assertEqual(['a', 'b', 'c'],
+                     [slot_record.dut_id for slot_record in slot_records])
+    self.assertEqual(
+        [test_record.Outcome.PASS, test_record.Outcome.FAIL,
+         test_record.Outcome.FAIL],
+        [slot_record.outcome for slot_record in slot_records])
+    phase_measurements = slot_records[2].phases[1].measurements
+    self.assertEqual(3.25, phase_measurements['voltage'].measured_value.value)
+    self.assertEqual([(100, 10), (200, 20)],
+                     phase_measurements['gain'].measured_value.value)
+    self.assertEqual(measurements.Outcome.FAIL,
+                     phase_measurements['gain'].outcome)
+    self.assertEqual('panel_fixture',
+                     phase_measurements['fixture'].measured_value.value)
+    self.assertEqual(['gain'], slot_records[2].failed_measurement_names)
+    self.assertEqual({'panel_id': 'a+b+c', 'panel_slot': 1}, {
+        key: slot_records[1].metadata[key]
+        for key in (panel.PANEL_ID_KEY, panel.SLOT_KEY)})
+    self.assertEqual(3.5, slot_records[1].as_base_types()['phases'][1][
+        'measurements']['voltage']['measured_value'])
+
+  def test_split_output(self):
+    records = []
+    panel.SplitOutput(records.append)(_execute(sweep_panel))
+    self.assertEqual(3, len(records))
+
+    with self.assertRaises(panel.PanelSizeError):
+      panel.split_record(_execute(measure_current))
+
+    record = _execute(sweep_panel)
+    record.metadata.pop(panel.DUT_IDS_KEY)
+    self.assertEqual([record], panel.split_record(record))
@@ -1,10 +1,12 @@
 """Unit tests for PhaseGroups generally and running under the test executor."""
 
 import threading
+import time
 import unittest
 
 import openhtf as htf
 from openhtf import plugs
+from openhtf.core import phase_group
 from openhtf.util import test as htf_test
 
 
@@ -124,6 +126,19 @@ class PhaseGroupTest(unittest.TestCase):
         teardown=_fake_phases('t1', 't2'))
     self.assertEqual(expected, group1.combine(group2))
 
+  def testCombine_Parallel(self):
+    group1 = htf.PhaseGroup(main=_fake_phases('m1'), parallel=True)
+    group2 = htf.PhaseGroup(main=_fake_phases('m2'), parallel=True)
+    group3 = htf.PhaseGroup(main=_fake_phases('m3'))
+    self.assertTrue(group1.combine(group2).parallel)
+    self.assertFalse(group1.combine(group3).parallel)
+
+  def testTransform_KeepsParallel(self):
+    group = htf.PhaseGroup(main=_fake_phases('m1'), parallel=True)
+    self.assertTrue(group.with_args(arg1=1).parallel)
+    self.assertTrue(group.flatten().parallel)
+    self.assertTrue(group.load_code_info().parallel)
+
   def testWrap(self):
     group = htf.PhaseGroup(
         setup=_fake_phases('s1'),
@@ -261,6 +276,47 @@ class PhaseGroupTest(unittest.TestCase):
         blank.__name__, code_group.teardown[0].code_info.name)
 
 
+class PhaseDependencyTest(unittest.TestCase):
+
+  def _depends_on(self, name, *depends_on):
+    return htf.PhaseOptions(name=name, depends_on=depends_on)(blank_phase)
+
+  def testSiblingDependencies(self):
+    phases = [self._depends_on('a'), self._depends_on('b', 'a'),
+              self._depends_on('c', 'a', 'b')]
+    self.assertEqual([set(), {0}, {0, 1}],
+                     phase_group.sibling_dependencies(phases))
+
+  def testValidate_Parallel(self):
+    group = htf.PhaseGroup(
+        main=[self._depends_on('b', 'a'), self._depends_on('a')],
+        parallel=True)
+    phase_group.validate_dependencies(group)
+
+  def testValidate_Unknown(self):
+    group = htf.PhaseGroup(main=[self._depends_on('a', 'unknown')])
+    with self.assertRaises(phase_group.InvalidPhaseDependencyError):
+      phase_group.validate_dependencies(group)
+
+  def testValidate_NotRunBefore(self):
+    group = htf.PhaseGroup(
+        main=[self._depends_on('b', 'a'), self._depends_on('a')])
+    with self.assertRaises(phase_group.InvalidPhaseDependencyError):
+      phase_group.validate_dependencies(group)
+
+  def testValidate_Cycle(self):
+    group = htf.PhaseGroup(
+        main=[self._depends_on('a', 'b'), self._depends_on('b', 'a')],
+        parallel=True)
+    with self.assertRaises(phase_group.InvalidPhaseDependencyError):
+      phase_group.validate_dependencies(group)
+
+  def testValidate_OnTestCreation(self):
+    with self.assertRaises(phase_group.InvalidPhaseDependencyError):
+      htf.Test(htf.PhaseGroup(
+          main=[self._depends_on('a', 'a')], parallel=True))
+
+
 class PhaseGroupIntegrationTest(htf_test.TestCase):
 
   def _assert_phase_names(self, expected_names, test_rec):
@@ -385,6 +441,112 @@ class PhaseGroupIntegrationTest(htf_test.TestCase):
     self._assert_phase_names(
         ['setup', 'main0', 'stop_phase', 'teardown0'], test_rec)
 
+  @htf_test.yields_phases
+  def testParallel(self):
+    started = [threading.Event(), threading.Event()]
+
+    def _make_phase(index):
+      @htf.PhaseOptions(name='main%d' % index)
+      def _phase():
+        started[index].set()
+        # Only completes if the other main phase runs at the same time.
+        if not started[1 - index].wait(5):
+          return htf.PhaseResult.STOP
+      return _phase
+
+    parallel = htf.PhaseGroup(
+        setup=_fake_phases('setup'),
+        main=[_make_phase(0), _make_phase(1)],
+        teardown=_fake_phases('teardown'),
+        name='parallel',
+        parallel=True)
+    test_rec = yield htf.Test(parallel)
+    self.assertTestPass(test_rec)
+    self._assert_phase_names(
+        ['setup', 'main0', 'main1', 'teardown'], test_rec)
+
+  @htf_test.yields_phases
+  def testParallel_Recursive(self):
+    inner = htf.PhaseGroup(
+        main=_fake_phases('inner-main0', 'inner-main1'),
+        teardown=_fake_phases('inner-teardown'),
+        name='inner',
+        parallel=True)
+    parallel = htf.PhaseGroup(
+        main=_fake_phases('main-pre') + [inner] + _fake_phases('main-post'),
+        name='parallel',
+        parallel=True)
+    test_rec = yield htf.Test(parallel)
+    self.assertTestPass(test_rec)
+    self._assert_phase_names(
+        ['main-pre', 'inner-main0', 'inner-main1', 'inner-teardown',
+         'main-post'],
+        test_rec)
+
+  @htf_test.yields_phases
+  def testParallel_Dependencies(self):
+    finished = []
+
+    def _make_phase(name, *depends_on):
+      @htf.PhaseOptions(name=name, depends_on=depends_on)
+      def _phase():
+        finished.append(name)
+      return _phase
+
+    @htf.PhaseOptions(name='slow')
+    def slow_phase():
+      time.sleep(0.2)
+      finished.append('slow')
+
+    parallel = htf.PhaseGroup(
+        main=[_make_phase('after_slow', 'slow'), slow_phase,
+              _make_phase('independent')],
+        name='parallel',
+        parallel=True)
+    test_rec = yield htf.Test(parallel)
+    self.assertTestPass(test_rec)
+    self.assertEqual(['independent', 'slow', 'after_slow'], finished)
+    self._assert_phase_names(
+        ['after_slow', 'slow', 'independent'], test_rec)
+
+  @htf_test.yields_phases
+  def testParallel_PlugLocks(self):
+    running = []
+    overlapped = []
+
+    def _make_phase(name):
+      @htf.PhaseOptions(name=name)
+      @plugs.plug(instrument=ParentPlug)
+      def _phase(instrument):
+        del instrument  # Unused.
+        running.append(name)
+        if len(running) > 1:
+          overlapped.append(name)
+        time.sleep(0.05)
+        running.remove(name)
+      return _phase
+
+    parallel = htf.PhaseGroup(
+        main=[_make_phase('use0'), _make_phase('use1')],
+        name='parallel',
+        parallel=True)
+    test_rec = yield htf.Test(parallel)
+    self.assertTestPass(test_rec)
+    self.assertEqual([], overlapped)
+
+  @htf_test.yields_phases
+  def testParallel_Failure(self):
+    fail_main = htf.PhaseGroup(
+        main=_fake_phases('main0') + [stop_phase] + _fake_phases('main1'),
+        teardown=_fake_phases('teardown'),
+        name='fail_main',
+        parallel=True)
+    test_rec = yield htf.Test(fail_main)
+    self.assertTestFail(test_rec)
+    # Main phases already running in parallel are not skipped.
+    self._assert_phase_names(
+        ['main0', 'stop_phase', 'main1', 'teardown'], test_rec)
+
   @htf_test.yields_phases
   def testFailure_Teardown(self):
     fail_teardown = htf.PhaseGroup(
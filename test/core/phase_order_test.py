@@ -0,0 +1,126 @@
+# Lint as: python2, python3
+"""Unit tests for the phase_order module."""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import openhtf
+from openhtf.core import phase_order
+from openhtf.util import conf
+
+
+def slow_reliable():
+  pass
+
+
+def cheap_flaky():
+  pass
+
+
+def pricey_flaky():
+  pass
+
+
+@openhtf.PhaseOptions(depends_on='pricey_flaky')
+def dependent():
+  pass
+
+
+def new_phase():
+  pass
+
+
+def _stats():
+  stats = phase_order.PhaseStats()
+  for name, runs, failures, duration_s in [
+      ('slow_reliable', 10, 0, 30.0),
+      ('cheap_flaky', 10, 2, 1.0),
+      ('pricey_flaky', 10, 5, 10.0),
+      ('dependent', 10, 5, 0.1)]:
+    for run in range(runs):
+      stats.add(name, run < failures, duration_s)
+  return stats
+
+
+def _names(phases):
+  return [phase.name for phase in phases]
+
+
+class PhaseOrderTest(unittest.TestCase):
+
+  def setUp(self):
+    super(PhaseOrderTest, self).setUp()
+    self.directory = tempfile.mkdtemp()
+    self.path = os.path.join(self.directory, 'order.json')
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+    super(PhaseOrderTest, self).tearDown()
+
+  def test_compute_orders(self):
+    group = openhtf.PhaseGroup(
+        setup=[new_phase],
+        main=[slow_reliable, pricey_flaky, dependent, cheap_flaky, new_phase,
+              cheap_flaky, openhtf.PhaseGroup(
+                  main=[slow_reliable, pricey_flaky, dependent], name='inner')])
+    # Test() wraps the group in a top-level group.
+    group = openhtf.Test(group).descriptor.phase_group
+    stats = _stats()
+    self.assertEqual({
+        '/main:#0': ['cheap_flaky', 'pricey_flaky', 'dependent',
+                     'slow_reliable', 'new_phase', 'cheap_flaky', 'inner'],
+        '/main:#0/main:inner': ['pricey_flaky', 'dependent', 'slow_reliable'],
+    }, phase_order.compute_orders(group, stats))
+
+    before = phase_order.expected_time_s(
+        [stats.get(name) for name in
+         ('slow_reliable', 'pricey_flaky', 'dependent', 'cheap_flaky')])
+    after = phase_order.expected_time_s(
+        [stats.get(name) for name in
+         ('cheap_flaky', 'pricey_flaky', 'dependent', 'slow_reliable')])
+    self.assertLess(after, before)
+    self.assertIn('PhaseGroup /main:#0/main:inner:',
+                  phase_order.format_report(group, stats))
+
+  def test_apply_orders(self):
+    group = openhtf.PhaseGroup.convert_if_not(
+        [slow_reliable, pricey_flaky, dependent])
+    reordered = phase_order.apply_orders(
+        group, {'': ['pricey_flaky', 'dependent', 'slow_reliable']})
+    self.assertEqual(['pricey_flaky', 'dependent', 'slow_reliable'],
+                     _names(reordered.main))
+    # Orders breaking dependencies or of other phases are ignored.
+    for order in (['dependent', 'pricey_flaky', 'slow_reliable'],
+                  ['pricey_flaky', 'slow_reliable']):
+      self.assertEqual(_names(group.main), _names(
+          phase_order.apply_orders(group, {'': order}).main))
+
+  @conf.save_and_restore
+  def test_optimizer_and_order_file(self):
+    records = []
+    test = openhtf.Test(slow_reliable, cheap_flaky)
+    optimizer = phase_order.PhaseOrderOptimizer(
+        self.path, test.descriptor.phase_group)
+    optimizer.stats = _stats()
+    test.add_output_callbacks(records.append, optimizer)
+    test.execute(test_start=lambda: 'dut')
+    with open(self.path) as order_file:
+      saved = json.load(order_file)
+    self.assertEqual({'': ['cheap_flaky', 'slow_reliable']}, saved['orders'])
+    self.assertEqual(11, saved['stats']['cheap_flaky'][0])
+
+    conf.load(phase_order_file=self.path)
+    reordered = openhtf.Test(slow_reliable, cheap_flaky)
+    self.assertEqual(['cheap_flaky', 'slow_reliable'],
+                     _names(reordered.descriptor.phase_group.main))
+    stats = phase_order.PhaseStats()
+    stats.add_record(records[0])
+    stats.add_record(records[0].as_base_types())
+    self.assertEqual((0.0, stats.get('cheap_flaky')[1]),
+                     stats.get('cheap_flaky'))
+    self.assertEqual(2, stats.as_base_types()['cheap_flaky'][0])
+    self.assertEqual(11, phase_order.PhaseOrderOptimizer(
+        self.path, None).stats.as_base_types()['slow_reliable'][0])
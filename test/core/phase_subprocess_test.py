@@ -0,0 +1,167 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import threading
+import time
+import unittest
+
+import openhtf as htf
+from openhtf import plugs
+from openhtf.core import phase_subprocess
+from openhtf.core.test_record import Outcome
+from openhtf.core.test_record import PhaseOutcome
+
+
+class CounterPlug(plugs.BasePlug):
+
+  def __init__(self):
+    self.count = 0
+    self.pids = []
+
+  def increment(self, pid):
+    self.count += 1
+    self.pids.append(pid)
+    return self.count
+
+
+_SUBPROCESS_PHASE_STARTED = threading.Event()
+_LOCAL_PHASE_DONE = threading.Event()
+
+
+class SyncPlug(plugs.BasePlug):
+
+  def start_and_wait(self):
+    _SUBPROCESS_PHASE_STARTED.set()
+    _LOCAL_PHASE_DONE.wait(10)
+
+
+class SubprocessPhaseError(Exception):
+  pass
+
+
+@htf.PhaseOptions(run_in_subprocess=True)
+@htf.measures('pid', 'count', htf.Measurement('spectrum').with_dimensions('hz'))
+@plugs.plug(counter=CounterPlug)
+def heavy_phase(test, counter):
+  test.measurements.pid = os.getpid()
+  test.measurements.count = counter.increment(os.getpid())
+  for hz in range(3):
+    test.measurements.spectrum[hz] = hz * 10
+  test.attach('data.txt', b'computed')
+  test.logger.info('Ran in %s', os.getpid())
+  test.state['visited'] = True
+  test.dut_id = 'subprocess_dut'
+
+
+@htf.PhaseOptions(run_in_subprocess=True)
+def reading_phase(test):
+  assert test.get_attachment('data.txt').data == b'computed'
+  assert test.get_measurement('count').value == 1
+  assert test.state['visited']
+
+
+def state_setup_phase(test):
+  test.state.update(deleted=True, kept=True)
+
+
+@htf.PhaseOptions(run_in_subprocess=True)
+@plugs.plug(sync=SyncPlug)
+def state_subprocess_phase(test, sync):
+  test.state['set_in_subprocess'] = True
+  del test.state['deleted']
+  sync.start_and_wait()
+
+
+def state_local_phase(test):
+  # Change the state while the subprocess phase runs.
+  _SUBPROCESS_PHASE_STARTED.wait(10)
+  test.state['set_locally'] = True
+  _LOCAL_PHASE_DONE.set()
+
+
+def state_check_phase(test):
+  assert test.state == {
+      'kept': True, 'set_in_subprocess': True, 'set_locally': True}
+
+
+@htf.PhaseOptions(run_in_subprocess=True)
+def raising_phase():
+  raise SubprocessPhaseError('raised in %s' % os.getpid())
+
+
+@htf.PhaseOptions(run_in_subprocess=True, timeout_s=0.5)
+def hanging_phase():
+  time.sleep(60)
+
+
+def _execute(*phases):
+  records = []
+  test = htf.Test(*phases)
+  test.configure(default_dut_id='dut')
+  test.add_output_callbacks(records.append)
+  test.execute()
+  return records[0]
+
+
+class PhaseSubprocessTest(unittest.TestCase):
+
+  def test_run_in_subprocess(self):
+    record = _execute(heavy_phase, reading_phase, heavy_phase)
+    self.assertEqual(Outcome.PASS, record.outcome)
+    self.assertEqual('subprocess_dut', record.dut_id)
+
+    first, _, second = record.phases
+    pid = first.measurements['pid'].measured_value.value
+    self.assertNotEqual(os.getpid(), pid)
+    # The idle worker is reused.
+    self.assertEqual(pid, second.measurements['pid'].measured_value.value)
+    # Both runs used the same plug, in the test process.
+    self.assertEqual(2, second.measurements['count'].measured_value.value)
+    self.assertEqual(
+        [(0, 0), (1, 10), (2, 20)],
+        first.measurements['spectrum'].measured_value.value)
+    self.assertEqual(b'computed', first.attachments['data.txt'].data)
+    self.assertIn('Ran in %s' % pid,
+                  [log_record.message for log_record in record.log_records])
+
+  def test_state_changes_are_merged(self):
+    record = _execute(
+        state_setup_phase,
+        htf.PhaseGroup(main=[state_subprocess_phase, state_local_phase],
+                       parallel=True),
+        state_check_phase)
+    self.assertEqual(Outcome.PASS, record.outcome)
+
+  def test_exception(self):
+    record = _execute(raising_phase)
+    self.assertEqual(Outcome.ERROR, record.outcome)
+    self.assertEqual('SubprocessPhaseError',
+                     record.outcome_details[0].code)
+    self.assertIn('raised in', record.outcome_details[0].description)
+    self.assertNotIn(str(os.getpid()), record.outcome_details[0].description)
+
+  def test_timeout(self):
+    start = time.time()
+    record = _execute(hanging_phase)
+    self.assertLess(time.time() - start, 30)
+    self.assertEqual(PhaseOutcome.ERROR, record.phases[0].outcome)
+    self.assertEqual(Outcome.TIMEOUT, record.outcome)
+
+  def test_not_module_level(self):
+    @htf.PhaseOptions(run_in_subprocess=True)
+    def local_phase():
+      pass
+    with self.assertRaises(phase_subprocess.SubprocessPhaseError):
+      phase_subprocess.run_phase(local_phase, None)
@@ -0,0 +1,104 @@
+# Lint as: python2, python3
+"""Unit tests for resuming tests from previous runs."""
+
+import shutil
+import tempfile
+import unittest
+
+import openhtf
+from openhtf.core import resume
+from openhtf.core import test_record
+from openhtf.output.callbacks import results_store
+
+_CALLS = []
+_SHOULD_FAIL = [True]
+
+
+@openhtf.measures(openhtf.Measurement('voltage').in_range(1, 2))
+def measure_voltage(test, channel=1):
+  _CALLS.append('measure_voltage %d' % channel)
+  test.measurements.voltage = 1.5
+
+
+def flaky_phase():
+  _CALLS.append('flaky_phase')
+  if _SHOULD_FAIL[0]:
+    return openhtf.PhaseResult.STOP
+
+
+def last_phase():
+  _CALLS.append('last_phase')
+
+
+def teardown_phase():
+  _CALLS.append('teardown_phase')
+
+
+class ResumeTest(unittest.TestCase):
+
+  def setUp(self):
+    super(ResumeTest, self).setUp()
+    self.directory = tempfile.mkdtemp()
+    self.store = results_store.ResultsStore(self.directory)
+    self.records = []
+    del _CALLS[:]
+    _SHOULD_FAIL[0] = True
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+    super(ResumeTest, self).tearDown()
+
+  def _execute(self, *phases):
+    test = openhtf.Test(openhtf.PhaseGroup(
+        main=phases, teardown=[teardown_phase]))
+    test.add_output_callbacks(self.store, self.records.append)
+    test.configure(resume_store=self.store)
+    del _CALLS[:]
+    test.execute(test_start=lambda: 'dut_1')
+    return self.records[-1]
+
+  def test_resume(self):
+    first = self._execute(measure_voltage, flaky_phase, last_phase)
+    self.assertEqual(test_record.Outcome.FAIL, first.outcome)
+
+    _SHOULD_FAIL[0] = False
+    second = self._execute(measure_voltage, flaky_phase, last_phase)
+
+    self.assertEqual(['flaky_phase', 'last_phase', 'teardown_phase'], _CALLS)
+    self.assertEqual(test_record.Outcome.PASS, second.outcome)
+    self.assertEqual(
+        ['trigger_phase', 'measure_voltage', 'flaky_phase', 'last_phase',
+         'teardown_phase'], [phase.name for phase in second.phases])
+    self.assertEqual(first.phases[1].start_time_millis,
+                     second.phases[1].start_time_millis)
+    self.assertEqual(1.5, second.phases[1].measurements['voltage'].
+                     measured_value.value)
+    self.assertEqual({'start_time_millis': first.start_time_millis,
+                      'phases': ['measure_voltage']},
+                     second.metadata['resumed_from'])
+
+    # The last run passed, so the next one runs every phase again.
+    self._execute(measure_voltage, flaky_phase, last_phase)
+    self.assertNotIn('resumed_from', self.records[-1].metadata)
+    self.assertEqual(5, len(self.records[-1].phases))
+
+  def test_changed_phase_runs_again(self):
+    self._execute(measure_voltage, flaky_phase, last_phase)
+    _SHOULD_FAIL[0] = False
+    changed = openhtf.PhaseDescriptor.wrap_or_copy(
+        measure_voltage).with_args(channel=2)
+    record = self._execute(changed, flaky_phase, last_phase)
+    self.assertEqual(test_record.Outcome.PASS, record.outcome)
+    self.assertEqual(['measure_voltage 2', 'flaky_phase', 'last_phase',
+                      'teardown_phase'], _CALLS)
+    self.assertNotEqual(resume.phase_fingerprint(measure_voltage),
+                        resume.phase_fingerprint(changed))
+    self.assertEqual([], record.metadata['resumed_from']['phases'])
+
+  def test_results_store(self):
+    store = results_store.ResultsStore(self.directory, records_per_dut=2)
+    for i in range(3):
+      store(test_record.TestRecord('dut/1', 'station', start_time_millis=i))
+    self.assertEqual([2, 1], [record.start_time_millis
+                              for record in store.records('dut/1')])
+    self.assertIsNone(store.last_record('dut_1'))
@@ -0,0 +1,111 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+import unittest
+
+import openhtf as htf
+from openhtf import plugs
+from openhtf.core import station_runner
+
+_EVENTS = []
+_EVENTS_LOCK = threading.Lock()
+
+
+def _log_event(name, dut_id):
+  with _EVENTS_LOCK:
+    _EVENTS.append((name, dut_id))
+
+
+class SlowTearDownPlug(plugs.BasePlug):
+
+  def __init__(self):
+    self.dut_id = None
+
+  def tearDown(self):
+    time.sleep(0.2)
+    _log_event('plug_torn_down', self.dut_id)
+
+
+_DUT_IDS = iter(range(1000))
+
+
+@htf.PhaseOptions()
+def trigger_phase(test):
+  test.dut_id = next(_DUT_IDS)
+  _log_event('trigger', test.dut_id)
+
+
+@plugs.plug(slow=SlowTearDownPlug)
+def main_phase(test, slow):
+  slow.dut_id = test.dut_id
+  _log_event('phase_started', test.dut_id)
+  time.sleep(0.05)
+  _log_event('phase_finished', test.dut_id)
+  if test.dut_id == 1:
+    raise RuntimeError('DUT 1 is broken.')
+
+
+class StationRunnerTest(unittest.TestCase):
+
+  def setUp(self):
+    super(StationRunnerTest, self).setUp()
+    del _EVENTS[:]
+    self.records = []
+    self.test = htf.Test(main_phase)
+    self.test.add_output_callbacks(self.records.append)
+
+  def test_overlapping_executions(self):
+    runner = station_runner.StationRunner(
+        self.test, test_start=trigger_phase, slots=2)
+    results = runner.run(count=3)
+    self.assertEqual(results, runner.results)
+    self.assertEqual([True, False, True], results)
+    self.assertEqual(3, len(self.records))
+
+    first_dut = min(dut_id for _, dut_id in _EVENTS)
+    events = [(name, dut_id - first_dut) for name, dut_id in _EVENTS]
+    # Each DUT is triggered once the previous one finished its phases, while
+    # its plugs are still being torn down.
+    for dut in (1, 2):
+      self.assertLess(events.index(('phase_finished', dut - 1)),
+                      events.index(('trigger', dut)))
+      self.assertLess(events.index(('trigger', dut)),
+                      events.index(('plug_torn_down', dut - 1)))
+
+  def test_single_slot(self):
+    runner = station_runner.StationRunner(
+        self.test, test_start=trigger_phase, slots=1)
+    runner.run(count=2)
+    first_dut = min(dut_id for _, dut_id in _EVENTS)
+    events = [(name, dut_id - first_dut) for name, dut_id in _EVENTS]
+    self.assertLess(events.index(('plug_torn_down', 0)),
+                    events.index(('trigger', 1)))
+
+  def test_stop(self):
+    runner = station_runner.StationRunner(self.test, slots=2)
+
+    def stop_after_first(record):
+      del record  # Unused.
+      runner.stop()
+
+    self.test.add_output_callbacks(stop_after_first)
+    results = runner.run()
+    self.assertLessEqual(len(results), 2)
+    self.assertEqual(len(results), len(self.records))
+
+  def test_invalid_slots(self):
+    with self.assertRaises(ValueError):
+      station_runner.StationRunner(self.test, slots=0)
@@ -1,10 +1,16 @@
 # Lint as: python2, python3
 """Unit tests for test_record module."""
 
+import copy
 import sys
 import unittest
 
+import mock
+import mutablerecords
+
+from openhtf.core import measurements
 from openhtf.core import test_record
+from six.moves import cPickle as pickle
 
 
 def _get_obj_size(obj):
@@ -30,3 +36,56 @@ class TestRecordTest(unittest.TestCase):
     attachment = test_record.Attachment(large_data, 'text')
     obj_size = _get_obj_size(attachment)
     self.assertEqual(obj_size, expected_obj_size)
+
+  def test_attachment_pickle(self):
+    attachment = test_record.Attachment(b'test attachment data', 'text')
+    unpickled = pickle.loads(pickle.dumps(attachment, -1))
+    self.assertEqual(b'test attachment data', unpickled.data)
+    self.assertEqual('text', unpickled.mimetype)
+    self.assertEqual(attachment.sha1, unpickled.sha1)
+
+  def test_phase_outcome_index(self):
+    record = test_record.TestRecord('dut', 'station')
+    outcomes = [test_record.PhaseOutcome.PASS, test_record.PhaseOutcome.FAIL,
+                test_record.PhaseOutcome.SKIP, test_record.PhaseOutcome.FAIL]
+    for index, outcome in enumerate(outcomes):
+      phase_record = test_record.PhaseRecord(
+          index, 'phase_%d' % index, None, outcome=outcome)
+      phase_record.measurements = {
+          'meas_%d' % index: mock.Mock(outcome=measurements.Outcome.FAIL),
+          'passing': mock.Mock(outcome=measurements.Outcome.PASS),
+      }
+      record.add_phase_record(phase_record)
+    self.assertEqual(4, record.count_phases())
+    self.assertEqual(2, record.count_phases(test_record.PhaseOutcome.FAIL))
+    self.assertEqual(0, record.count_phases(test_record.PhaseOutcome.ERROR))
+    self.assertEqual(['phase_1', 'phase_3'], record.failed_phase_names)
+    # Measurements of skipped phases don't count.
+    self.assertEqual(['meas_0', 'meas_1', 'meas_3'],
+                     record.failed_measurement_names)
+
+    copied = test_record.TestRecord('dut', 'station', phases=record.phases)
+    self.assertEqual(['phase_1', 'phase_3'], copied.failed_phase_names)
+
+  def test_copies_rebuild_indexes(self):
+    record = test_record.TestRecord('dut', 'station')
+    for index, outcome in enumerate((test_record.PhaseOutcome.PASS,
+                                     test_record.PhaseOutcome.FAIL)):
+      phase_record = test_record.PhaseRecord(
+          index, 'phase_%d' % index, None, outcome=outcome)
+      phase_record.measurements = {
+          'meas_%d' % index: measurements.Measurement(
+              'meas_%d' % index, outcome=measurements.Outcome.FAIL)}
+      phase_record.attachments = {
+          'attachment': test_record.Attachment(b'data %d' % index, 'text')}
+      record.add_phase_record(phase_record)
+
+    for copied in (mutablerecords.CopyRecord(record), copy.copy(record),
+                   copy.deepcopy(record)):
+      self.assertEqual(2, copied.count_phases())
+      self.assertEqual(
+          1, copied.count_phases(test_record.PhaseOutcome.FAIL))
+      self.assertEqual(['phase_1'], copied.failed_phase_names)
+      self.assertEqual(['meas_0', 'meas_1'], copied.failed_measurement_names)
+      self.assertEqual('meas_1', copied.get_measurement('meas_1').name)
+      self.assertEqual(b'data 0', copied.get_attachment('attachment').data)
@@ -0,0 +1,103 @@
+# Lint as: python2, python3
+"""Unit tests for the timing_history module."""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import openhtf
+from openhtf.core import resume
+from openhtf.core import test_record
+from openhtf.core import timing_history
+
+_RELEASE = threading.Event()
+
+
+def quick_phase():
+  pass
+
+
+def hanging_phase():
+  _RELEASE.wait(5)
+
+
+class TimingHistoryTest(unittest.TestCase):
+
+  def setUp(self):
+    super(TimingHistoryTest, self).setUp()
+    self.directory = tempfile.mkdtemp()
+    self.path = os.path.join(self.directory, 'timings.json')
+
+  def tearDown(self):
+    _RELEASE.set()
+    shutil.rmtree(self.directory)
+    super(TimingHistoryTest, self).tearDown()
+
+  def test_timeout(self):
+    history = timing_history.TimingHistory(min_samples=10, min_timeout_s=1)
+    phase = openhtf.PhaseDescriptor.wrap_or_copy(quick_phase)
+    fingerprint = resume.phase_fingerprint(phase)
+    for i in range(9):
+      history.add_duration('quick_phase', fingerprint, 0.5 + i * 0.1)
+    self.assertEqual(60, history.timeout_s(phase, 60))
+    history.add_duration('quick_phase', fingerprint, 0.5)
+    self.assertAlmostEqual(1.3, history.percentile_s('quick_phase',
+                                                     fingerprint))
+    self.assertAlmostEqual(3.9, history.timeout_s(phase, 60))
+    self.assertEqual(2, history.timeout_s(phase, 2))
+
+    # Durations of a changed phase are kept separately.
+    changed = phase.with_args(unused=1)
+    self.assertEqual(60, history.timeout_s(changed, 60))
+
+  def test_drift_and_persistence(self):
+    history = timing_history.TimingHistory(self.path, max_samples=30)
+    for duration_s in [1.0] * 20 + [2.0] * 10:
+      history.add_duration('phase', 'abc', duration_s)
+    self.assertIsNone(history.drift('phase', 'unknown'))
+    self.assertEqual([timing_history.PhaseDrift('phase', 'abc', 1.0, 2.0)],
+                     history.drifting_phases())
+    history.save()
+
+    loaded = timing_history.TimingHistory(self.path, max_samples=25)
+    self.assertEqual([1.0] * 15 + [2.0] * 10,
+                     loaded.durations_s('phase', 'abc'))
+
+  def test_adaptive_timeout(self):
+    history = timing_history.TimingHistory(
+        self.path, min_samples=3, min_timeout_s=0.2)
+    records = []
+
+    def _execute(phase):
+      test = openhtf.Test(openhtf.PhaseOptions(name='phase')(phase))
+      test.add_output_callbacks(history, records.append)
+      test.configure(timing_history=history)
+      test.execute(test_start=lambda: 'dut')
+      return records[-1]
+
+    for _ in range(3):
+      self.assertEqual(test_record.Outcome.PASS,
+                       _execute(quick_phase).outcome)
+    self.assertEqual(3, len(history.durations_s(
+        'phase', records[-1].phases[1].fingerprint)))
+
+    # A different phase has no history, so it gets its declared timeout.
+    self.assertEqual(
+        60, history.timeout_s(openhtf.PhaseDescriptor.wrap_or_copy(
+            hanging_phase, name='phase', timeout_s=60), 60))
+
+    phase = openhtf.PhaseDescriptor.wrap_or_copy(hanging_phase, name='phase')
+    for _ in range(3):
+      history.add_duration('phase', resume.phase_fingerprint(phase), 0.01)
+    record = _execute(phase)
+    self.assertEqual(test_record.Outcome.TIMEOUT, record.outcome)
+    self.assertLess(record.phases[1].end_time_millis -
+                    record.phases[1].start_time_millis, 2000)
+
+    # The timed-out run counts as lasting as long as its timeout, so the next
+    # run gets a longer timeout instead of timing out again.
+    self.assertEqual(4, len(history.durations_s(
+        'phase', resume.phase_fingerprint(phase))))
+    self.assertGreater(history.timeout_s(phase, 60), 0.5)
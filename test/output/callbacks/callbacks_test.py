@@ -31,6 +31,7 @@ from openhtf.output.callbacks import json_factory
 from openhtf.output.proto import mfg_event_converter
 from openhtf.output.proto import test_runs_converter
 from openhtf.output.proto import test_runs_pb2
+from openhtf.util import data
 from openhtf.util import test
 
 
@@ -62,6 +63,8 @@ class TestOutput(test.TestCase):
         json_output, sort_keys=True, indent=2)(record)
     json_output.seek(0)
     json.loads(json_output.read())
+    # Inlining the attachments must not change the record's cached dicts.
+    json.dumps(data.convert_to_base_types(record))
 
   @test.patch_plugs(user_mock='openhtf.plugs.user_input.UserInput')
   def test_test_run_from_test_record(self, user_mock):
@@ -0,0 +1,160 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import openhtf as htf
+from openhtf.core.test_record import Outcome
+from openhtf.output import pipeline
+
+
+class DummyError(Exception):
+  pass
+
+
+@htf.measures(htf.Measurement('value').in_range(0, 10))
+def measure_phase(test):
+  test.measurements.value = 5
+  test.attach('data.txt', b'attached')
+
+
+def raising_phase():
+  raise DummyError('raised')
+
+
+def _execute(output_pipeline, *phases):
+  test = htf.Test(*phases)
+  test.configure(default_dut_id='dut')
+  test.add_output_callbacks(output_pipeline)
+  test.execute()
+
+
+class OutputPipelineTest(unittest.TestCase):
+
+  def setUp(self):
+    super(OutputPipelineTest, self).setUp()
+    self.spool_directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.spool_directory)
+    super(OutputPipelineTest, self).tearDown()
+
+  def test_callbacks_run_in_background(self):
+    release = threading.Event()
+    slow_records = []
+    fast_records = []
+
+    def slow_callback(test_record):
+      release.wait(5)
+      slow_records.append(test_record)
+
+    output_pipeline = pipeline.OutputPipeline(self.spool_directory)
+    output_pipeline.add_callback(slow_callback)
+    output_pipeline.add_callback(fast_records.append, name='fast')
+    _execute(output_pipeline, measure_phase)
+    _execute(output_pipeline, raising_phase)
+    # Test.execute() returned before the slow callback handled the records.
+    self.assertFalse(slow_records)
+    self.assertEqual(2, len([
+        filename for filename in os.listdir(self.spool_directory)
+        if filename.endswith('.slow_callback.pending')]))
+
+    release.set()
+    output_pipeline.close()
+    self.assertEqual([Outcome.PASS, Outcome.ERROR],
+                     [record.outcome for record in slow_records])
+    self.assertEqual(2, len(fast_records))
+    self.assertFalse(os.listdir(self.spool_directory))
+
+  def test_requeue_spooled_records(self):
+    crashed = threading.Event()
+    output_pipeline = pipeline.OutputPipeline(self.spool_directory)
+    output_pipeline.add_callback(lambda record: crashed.wait(5), name='stuck')
+    output_pipeline.add_callback(lambda record: None, name='done')
+    _execute(output_pipeline, measure_phase)
+    _execute(output_pipeline, raising_phase)
+    output_pipeline._channels[1].join()
+    # Simulate a crash while the stuck callback is pending, and one while
+    # spooling another record.
+    for filename in ('abc.partial', 'abc.stuck.pending'):
+      with open(os.path.join(self.spool_directory, filename), 'wb'):
+        pass
+    self.assertEqual(6, len(os.listdir(self.spool_directory)))
+
+    records = []
+    try:
+      output_pipeline = pipeline.OutputPipeline(self.spool_directory)
+      output_pipeline.add_callback(records.append, name='stuck')
+      output_pipeline.add_callback(lambda record: self.fail('Not pending'),
+                                   name='done')
+      output_pipeline.start()
+      output_pipeline.close()
+    finally:
+      crashed.set()
+    self.assertEqual([Outcome.PASS, Outcome.ERROR],
+                     [record.outcome for record in records])
+    self.assertEqual(
+        b'attached', records[0].phases[0].attachments['data.txt'].data)
+    self.assertEqual(
+        5, records[0].phases[0].measurements['value'].measured_value.value)
+    self.assertFalse(os.listdir(self.spool_directory))
+
+  def test_timeout(self):
+    records = []
+    output_pipeline = pipeline.OutputPipeline(self.spool_directory)
+    output_pipeline.add_callback(lambda record: time.sleep(60), name='hangs',
+                                 timeout_s=0.1)
+    output_pipeline.add_callback(records.append, name='appends')
+    start = time.time()
+    _execute(output_pipeline, measure_phase)
+    _execute(output_pipeline, measure_phase)
+    output_pipeline.close()
+    self.assertLess(time.time() - start, 30)
+    self.assertEqual(2, len(records))
+    self.assertFalse(os.listdir(self.spool_directory))
+
+  def test_backpressure(self):
+    release = threading.Event()
+    output_pipeline = pipeline.OutputPipeline(max_queued_records=1)
+    output_pipeline.add_callback(lambda record: release.wait(5), name='slow')
+    output_pipeline('first')  # Picked up by the worker.
+    output_pipeline('second')  # Fills the queue.
+    third_queued = threading.Event()
+
+    def queue_third():
+      output_pipeline('third')
+      third_queued.set()
+
+    threading.Thread(target=queue_third).start()
+    self.assertFalse(third_queued.wait(0.2))
+    release.set()
+    self.assertTrue(third_queued.wait(5))
+    output_pipeline.close()
+
+  def test_add_callback_errors(self):
+    output_pipeline = pipeline.OutputPipeline()
+    output_pipeline.add_callback(lambda record: None, name='callback')
+    with self.assertRaises(pipeline.OutputPipelineError):
+      output_pipeline.add_callback(lambda record: None, name='callback')
+    output_pipeline.start()
+    with self.assertRaises(pipeline.OutputPipelineError):
+      output_pipeline.add_callback(lambda record: None, name='other')
+    output_pipeline.close()
+    with self.assertRaises(pipeline.OutputPipelineError):
+      output_pipeline('record')
@@ -0,0 +1,140 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import copy
+import json
+import unittest
+
+from openhtf.output.servers import station_server
+
+_EXECUTION_UID = 'station:descriptor:execution'
+
+
+def _measurement(name, value=None):
+  measurement = {'name': name, 'outcome': 'UNSET'}
+  if value is not None:
+    measurement.update(measured_value=value, outcome='PASS')
+  return measurement
+
+
+def _test_state(phase_count, log_count, values, running_start=100):
+  return {
+      'execution_uid': _EXECUTION_UID,
+      'plugs': {'plug_descriptors': {}, 'plug_states': {}},
+      'running_phase_state': {
+          'descriptor_id': 7,
+          'name': 'running',
+          'start_time_millis': running_start,
+          'measurements': {
+              name: _measurement(name, value)
+              for name, value in values.items()},
+      },
+      'status': 'RUNNING',
+      'test_record': {
+          'dut_id': 'dut',
+          'log_records': [{'message': str(i)} for i in range(log_count)],
+          'phases': [{'name': str(i)} for i in range(phase_count)],
+          'outcome': None,
+      },
+  }
+
+
+class _Client(station_server.StationPubSub):
+  """Client recording the messages sent to it, without a SockJS session."""
+
+  def __init__(self):  # pylint: disable=super-init-not-called
+    self.messages = []
+
+  def send(self, message):
+    self.messages.append(copy.deepcopy(message))
+
+
+class StateDeltaEncoderTest(unittest.TestCase):
+
+  def test_first_state_is_full(self):
+    encoder = station_server.StateDeltaEncoder(_EXECUTION_UID)
+    full_message, delta_message = encoder.encode(_test_state(1, 1, {}))
+    self.assertIsNone(delta_message)
+    self.assertEqual('update', full_message['type'])
+    self.assertEqual(1, full_message['version'])
+
+  def test_delta(self):
+    encoder = station_server.StateDeltaEncoder(_EXECUTION_UID)
+    encoder.encode(_test_state(1, 2, {'a': None, 'b': None}))
+    _, delta_message = encoder.encode(_test_state(2, 3, {'a': 1, 'b': None}))
+    self.assertEqual(1, delta_message['base_version'])
+    self.assertEqual(2, delta_message['version'])
+    delta = delta_message['delta']
+    self.assertEqual([{'name': '1'}], delta['new_phases'])
+    self.assertEqual([{'message': '2'}], delta['new_log_records'])
+    self.assertEqual({}, delta['test_record'])
+    self.assertNotIn('plugs', delta)
+    self.assertFalse(delta['new_running_phase'])
+    self.assertEqual({'a': _measurement('a', 1)},
+                     delta['running_phase_state']['measurements'])
+
+  def test_new_running_phase_is_sent_in_full(self):
+    encoder = station_server.StateDeltaEncoder(_EXECUTION_UID)
+    encoder.encode(_test_state(1, 0, {'a': 1}))
+    _, delta_message = encoder.encode(
+        _test_state(1, 0, {'a': 1}, running_start=200))
+    delta = delta_message['delta']
+    self.assertTrue(delta['new_running_phase'])
+    self.assertEqual({'a': _measurement('a', 1)},
+                     delta['running_phase_state']['measurements'])
+
+  def test_changed_record_fields(self):
+    encoder = station_server.StateDeltaEncoder(_EXECUTION_UID)
+    encoder.encode(_test_state(1, 0, {}))
+    state = _test_state(1, 0, {})
+    state['test_record']['dut_id'] = 'other'
+    _, delta_message = encoder.encode(state)
+    self.assertEqual({'dut_id': 'other'}, delta_message['delta']['test_record'])
+
+
+class StationPubSubTest(unittest.TestCase):
+
+  def setUp(self):
+    super(StationPubSubTest, self).setUp()
+    self.client = _Client()
+    station_server.StationPubSub.subscribers.add(self.client)
+    self._saved = (station_server.StationPubSub._last_messages,
+                   station_server.StationPubSub._encoders)
+    station_server.StationPubSub._last_messages = collections.OrderedDict()
+    station_server.StationPubSub._encoders = {}
+
+  def tearDown(self):
+    station_server.StationPubSub.subscribers.discard(self.client)
+    (station_server.StationPubSub._last_messages,
+     station_server.StationPubSub._encoders) = self._saved
+    super(StationPubSubTest, self).tearDown()
+
+  def test_publishes_deltas_and_resyncs(self):
+    station_server.StationPubSub.publish_update(_test_state(1, 0, {}))
+    station_server.StationPubSub.publish_update(_test_state(2, 0, {}))
+    self.assertEqual(['update', 'delta'],
+                     [message['type'] for message in self.client.messages])
+
+    resync_client = _Client()
+    resync_client.on_message(json.dumps({'type': 'resync'}))
+    (message,) = resync_client.messages
+    self.assertEqual('update', message['type'])
+    self.assertEqual(2, message['version'])
+    self.assertEqual(2, len(message['state']['test_record']['phases']))
+
+  def test_malformed_message_is_ignored(self):
+    resync_client = _Client()
+    resync_client.on_message('not json')
+    self.assertEqual([], resync_client.messages)
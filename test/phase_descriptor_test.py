@@ -92,6 +92,21 @@ class TestPhaseDescriptor(unittest.TestCase):
         if attr == 'func': continue
         self.assertIsNot(getattr(phase, attr), getattr(second_phase, attr))
 
+  def test_depends_on(self):
+      phase = openhtf.PhaseOptions(
+          depends_on=[plain_func, extra_arg_func, 'other_phase'])(
+              normal_test_phase)
+      self.assertEqual(
+          ('plain_func', 'func-name({input[0]})', 'other_phase'),
+          phase.options.depends_on)
+
+      single = openhtf.PhaseOptions(depends_on=plain_func)(normal_test_phase)
+      self.assertEqual(('plain_func',), single.options.depends_on)
+
+      formatted = openhtf.PhaseOptions(depends_on='setup_{port}')(
+          extra_arg_func).with_args(port=1)
+      self.assertEqual(('setup_1',), formatted.options.depends_on)
+
   def test_with_args(self):
       phase = openhtf.PhaseDescriptor.wrap_or_copy(extra_arg_func)
       phase = phase.with_args(input='input arg')
@@ -133,3 +148,22 @@ class TestPhaseDescriptor(unittest.TestCase):
   def test_with_plugs_auto_placeholder_non_subclass_error(self):
       with self.assertRaises(plugs.InvalidPlugError):
           placeholder_using_plug.with_plugs(placed=ExtraPlug)
+
+  def test_sweep(self):
+      sweep = openhtf.PhaseSweep.over(extra_arg_func, input=['ab', 'cd'])
+      points = list(sweep.iter_points())
+      self.assertEqual(2, sweep.point_count)
+      self.assertEqual(['func-name(a)', 'func-name(c)'],
+                       [point.name for point in points])
+      self.assertEqual('cd', points[1](self._phase_data))
+      self.assertEqual({}, sweep.extra_kwargs)
+
+  def test_sweep_shares_measurements(self):
+      phase = openhtf.measures('fixed', 'value_{channel}')(extra_arg_func)
+      sweep = openhtf.PhaseSweep.over(phase, channel=[1, 2], input=['x'])
+      first, second = sweep.iter_points()
+      self.assertIs(first.measurements[0], sweep.measurements[0])
+      self.assertIs(second.measurements[0], sweep.measurements[0])
+      self.assertEqual(['value_1', 'value_2'], [first.measurements[1].name,
+                                                second.measurements[1].name])
+      self.assertEqual({'channel': 2, 'input': 'x'}, second.extra_kwargs)
@@ -66,6 +66,18 @@ class TearDownRaisesPlug2(plugs.BasePlug):
     raise Exception()
 
 
+class SharedPlug(plugs.BasePlug):
+  share_across_tests = True
+  INSTANCE_COUNT = 0
+
+  def __init__(self):
+    type(self).INSTANCE_COUNT += 1
+    self.torn_down = False
+
+  def tearDown(self):
+    self.torn_down = True
+
+
 class PlugsTest(test.TestCase):
 
   def setUp(self):
@@ -150,6 +162,25 @@ class PlugsTest(test.TestCase):
     self.assertTrue(TearDownRaisesPlug1.TORN_DOWN)
     self.assertTrue(TearDownRaisesPlug2.TORN_DOWN)
 
+  def test_shared_plug(self):
+    other_plug_manager = plugs.PlugManager({SharedPlug})
+    self.plug_manager.initialize_plugs({SharedPlug})
+    other_plug_manager.initialize_plugs()
+    self.assertEqual(1, SharedPlug.INSTANCE_COUNT)
+    shared = self.plug_manager.provide_plugs(
+        (('shared', SharedPlug),))['shared']
+    self.assertIs(shared, other_plug_manager.provide_plugs(
+        (('shared', SharedPlug),))['shared'])
+
+    # Only the last user of a shared plug tears it down.
+    self.plug_manager.tear_down_plugs()
+    self.assertFalse(shared.torn_down)
+    other_plug_manager.tear_down_plugs()
+    self.assertTrue(shared.torn_down)
+
+    self.plug_manager.initialize_plugs({SharedPlug})
+    self.assertEqual(2, SharedPlug.INSTANCE_COUNT)
+
   def test_plug_updates(self):
     self.plug_manager.initialize_plugs({AdderPlug})
     adder_plug_name = AdderPlug.__module__ + '.AdderPlug'
@@ -14,6 +14,8 @@
 
 import copy
 import tempfile
+import threading
+import time
 import unittest
 
 import mock
@@ -57,6 +59,10 @@ PHASE_RECORD_BASE_TYPE.update({
     'end_time_millis': None,
     'outcome': None,
     'result': None,
+    'repeat_summary': None,
+    'timings': None,
+    'timeout_margin_s': None,
+    'fingerprint': None,
 })
 
 TEST_STATE_BASE_TYPE_INITIAL = {
@@ -96,6 +102,38 @@ class TestTestApi(unittest.TestCase):
     self.test_state.running_phase_state = self.running_phase_state
     self.test_api = self.test_state.test_api
 
+  def test_cancellation_token_defaults_to_none(self):
+    test_api = test_descriptor.TestApi(*self.test_api[:-1])
+    self.assertIsNone(test_api.cancellation_token)
+
+  def test_concurrent_running_phases(self):
+    self.test_state.running_phase_state = None
+    entered = []
+    release = threading.Event()
+
+    def run_branch():
+      with self.test_state.parallel_branch_context():
+        with self.test_state.running_phase_context(test_phase) as phase_state:
+          entered.append(phase_state)
+          release.wait(10)
+
+    branches = [threading.Thread(target=run_branch) for _ in range(20)]
+    for branch in branches:
+      branch.start()
+    deadline = time.time() + 10
+    while len(entered) < len(branches) and time.time() < deadline:
+      time.sleep(0.01)
+    try:
+      # pylint: disable=protected-access
+      running = self.test_state._running_phase_states
+      self.assertEqual(20, len(entered))
+      self.assertEqual(sorted(map(id, entered)), sorted(map(id, running)))
+    finally:
+      release.set()
+      for branch in branches:
+        branch.join()
+    self.assertIsNone(self.test_state.running_phase_state)
+
   def test_get_attachment(self):
     attachment_name = 'attachment.txt'
     input_contents = b'This is some attachment text!'
@@ -122,8 +160,37 @@ class TestTestApi(unittest.TestCase):
     self.assertEqual(measurement_val, measurement.value)
     self.assertEqual('test_measurement', measurement.name)
 
-    measurement.value.append(4)
-    self.assertNotEqual(measurement_val, measurement.value)
+    with self.assertRaises(AttributeError):
+      measurement.value.append(4)
+    with self.assertRaises(TypeError):
+      measurement.value[0] = 4
+    self.assertEqual([1, 2, 3], measurement_val)
+
+  def test_get_measurement_from_previous_phases(self):
+    self.test_api.measurements['test_measurement'] = 1
+    self.running_phase_state._finalize_measurements()
+    self.test_record.add_phase_record(self.running_phase_state.phase_record)
+    skipped_phase_state = test_state.PhaseState.from_descriptor(
+        test_phase, lambda *args: None)
+    skipped_phase_state.measurements['test_measurement'].measured_value.set(2)
+    skipped_phase_state.phase_record.outcome = (
+        test_state.test_record.PhaseOutcome.SKIP)
+    self.test_record.add_phase_record(skipped_phase_state.phase_record)
+    self.test_state.running_phase_state = None
+
+    measurement = self.test_api.get_measurement('test_measurement')
+    self.assertEqual(1, measurement.value)
+    self.assertIsNone(self.test_api.get_measurement('missing'))
+
+  def test_get_attachment_is_read_only_view(self):
+    self.test_api.attach('attachment.txt', b'contents')
+    self.test_record.add_phase_record(self.running_phase_state.phase_record)
+    self.test_state.running_phase_state = None
+
+    attachment = self.test_api.get_attachment('attachment.txt')
+    self.assertIsInstance(attachment.data, memoryview)
+    self.assertTrue(attachment.data.readonly)
+    self.assertEqual(b'contents', attachment.data)
 
   def test_infer_mime_type_from_file_name(self):
     with tempfile.NamedTemporaryFile(suffix='.txt') as f:
@@ -13,6 +13,8 @@
 # limitations under the License.
 
 import collections
+import json
+import pickle
 import unittest
 
 from builtins import int
@@ -83,3 +85,42 @@ class TestData(unittest.TestCase):
     self.assertEqual(converted['special'], {'safe_value': True})
     self.assertEqual(converted['none_dict'], None)
     self.assertIs(converted['not_copied'], not_copied.value)
+
+  def test_read_only_view(self):
+    value = {'list': [1, {'a': 2}], 'tuple': (1, 2), 'str': 'abc'}
+    view = data.read_only_view(value)
+    self.assertEqual(value, view)
+    self.assertIs(value['tuple'], view['tuple'])
+    self.assertEqual([1, {'a': 2}], view['list'])
+    self.assertEqual({'a': 2}, view['list'][1])
+    with self.assertRaises(TypeError):
+      view['str'] = 'def'
+    with self.assertRaises(TypeError):
+      view['list'][1]['a'] = 3
+    with self.assertRaises(AttributeError):
+      view['list'].append(3)
+    self.assertEqual(value, data.convert_to_base_types(view))
+
+  def test_read_only_view_behaves_like_its_value(self):
+    value = {'list': [1, {'a': [2]}], 'str': 'abc'}
+    view = data.read_only_view(value)
+    self.assertIsInstance(view, data.Mapping)
+    self.assertIsInstance(view, dict)
+    self.assertIsInstance(view['list'], data.Sequence)
+    self.assertEqual(json.dumps(value, sort_keys=True),
+                     json.dumps(view, sort_keys=True))
+    self.assertEqual([1, {'a': [2]}, 3], view['list'] + [3])
+    self.assertEqual([0, 1, {'a': [2]}], [0] + view['list'])
+    self.assertEqual([{'a': [2]}], view['list'][1:])
+    self.assertEqual(value, pickle.loads(pickle.dumps(view)))
+
+    # Copies are mutable, but still can't modify the viewed value.
+    copied = view.copy()
+    copied['str'] = 'def'
+    with self.assertRaises(AttributeError):
+      dict(view)['list'].append(3)
+    with self.assertRaises(TypeError):
+      view.update(str='def')
+    with self.assertRaises(TypeError):
+      view.pop('str')
+    self.assertEqual({'list': [1, {'a': [2]}], 'str': 'abc'}, value)
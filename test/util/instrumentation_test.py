@@ -0,0 +1,98 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import time
+import unittest
+
+import openhtf as htf
+from openhtf.util import conf
+from openhtf.util import data
+from openhtf.util import instrumentation
+from six.moves import cPickle as pickle
+
+
+@htf.measures('value')
+def measured_phase(test):
+  time.sleep(0.05)
+  test.measurements.value = 5
+  test.logger.info('Measured.')
+
+
+class InstrumentationTest(unittest.TestCase):
+
+  def test_nested_sections(self):
+    timings = instrumentation.Timings()
+    with instrumentation.bind(timings):
+      with instrumentation.section(instrumentation.PHASE):
+        time.sleep(0.02)
+        with instrumentation.section(instrumentation.LOGGING):
+          time.sleep(0.05)
+          # Nested sections of the same category are ignored.
+          with instrumentation.section(instrumentation.LOGGING):
+            pass
+    self.assertEqual([instrumentation.LOGGING, instrumentation.PHASE],
+                     timings.categories)
+    self.assertGreaterEqual(timings.wall_s(instrumentation.LOGGING), 0.05)
+    self.assertGreaterEqual(timings.wall_s(instrumentation.PHASE), 0.02)
+    self.assertLess(timings.wall_s(instrumentation.PHASE), 0.05)
+    self.assertEqual(timings.wall_s(instrumentation.LOGGING),
+                     timings.framework_wall_s)
+    self.assertEqual(1, timings.as_base_types()['logging']['count'])
+
+  def test_unbound_sections(self):
+    self.assertIsNone(instrumentation.current())
+    with instrumentation.section(instrumentation.PHASE):
+      pass
+    timings = instrumentation.Timings()
+    with instrumentation.bind(timings):
+      self.assertIs(timings, instrumentation.current())
+    self.assertIsNone(instrumentation.current())
+    self.assertFalse(timings.categories)
+
+  @conf.save_and_restore(instrument_overhead=True)
+  def test_phase_timings(self):
+    records = []
+    histograms = instrumentation.TimingHistograms()
+    test = htf.Test(measured_phase, measured_phase)
+    test.configure(default_dut_id='dut')
+    test.add_output_callbacks(records.append, histograms)
+    test.execute()
+
+    timings = records[0].phases[0].timings
+    for category in (instrumentation.PHASE, instrumentation.PHASE_STATE,
+                     instrumentation.NOTIFY_UPDATE, instrumentation.LOGGING,
+                     instrumentation.CONVERT_TO_BASE_TYPES,
+                     instrumentation.FINALIZE):
+      self.assertIn(category, timings.categories)
+    self.assertGreaterEqual(timings.wall_s(instrumentation.PHASE), 0.05)
+    self.assertLess(timings.framework_wall_s, 0.05)
+
+    # Timings are exported with the record.
+    record_dict = json.loads(json.dumps(data.convert_to_base_types(records[0])))
+    self.assertIn('phase', record_dict['phases'][0]['timings'])
+    unpickled = pickle.loads(pickle.dumps(timings))
+    self.assertEqual(timings.as_base_types(), unpickled.as_base_types())
+
+    histograms_dict = histograms.as_base_types()
+    self.assertEqual(2, histograms_dict['phase']['count'])
+    self.assertEqual(2, histograms_dict['framework']['count'])
+    self.assertIn('phase: 2 phases', histograms.format())
+
+  def test_disabled_by_default(self):
+    records = []
+    test = htf.Test(measured_phase)
+    test.add_output_callbacks(records.append)
+    test.execute()
+    self.assertIsNone(records[0].phases[0].timings)
@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import logging
 import unittest
 import mock
 
@@ -35,3 +36,29 @@ class TestLogs(unittest.TestCase):
 
     assert mock_log.call_count == 1
 
+
+  def test_record_handler_dispatch(self):
+    # configure_logging() sets this level, but only runs once a Test is built.
+    htf_logger = logging.getLogger(logs.LOGGER_PREFIX)
+    self.addCleanup(htf_logger.setLevel, htf_logger.level)
+    htf_logger.setLevel(logging.DEBUG)
+    records = {}
+    for uid in ('uid1', 'uid2'):
+      records[uid] = mock.Mock()
+      logs.initialize_record_handler(uid, records[uid], mock.Mock())
+    try:
+      logs.get_record_logger_for('uid1').info('Only for uid1.')
+      logging.getLogger('openhtf.test').info('For all tests.')
+    finally:
+      logs.remove_record_handler('uid1')
+      logs.remove_record_handler('uid2')
+    logs.get_record_logger_for('uid1').info('Not recorded.')
+
+    self.assertEqual(
+        ['Only for uid1.', 'For all tests.'],
+        [call[1][0].message
+         for call in records['uid1'].add_log_record.mock_calls])
+    self.assertEqual(
+        ['For all tests.'],
+        [call[1][0].message
+         for call in records['uid2'].add_log_record.mock_calls])
@@ -0,0 +1,155 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+import unittest
+
+from openhtf.util import threads
+
+
+class RecordingTask(threads.KillableTask):
+
+  def __init__(self, proc=None, **kwargs):
+    super(RecordingTask, self).__init__(**kwargs)
+    self._proc = proc
+    self.thread = None
+    self.finished = False
+    self.exception = None
+
+  def _thread_proc(self):
+    self.thread = threading.current_thread()
+    if self._proc:
+      self._proc()
+
+  def _thread_finished(self):
+    self.finished = True
+
+  def _thread_exception(self, exc_type, exc_val, exc_tb):
+    self.exception = exc_val
+    return True
+
+
+class KillableThreadPoolTest(unittest.TestCase):
+
+  def setUp(self):
+    self.pool = threads.KillableThreadPool(name='TestPool')
+
+  def test_reuses_workers(self):
+    first = RecordingTask(pool=self.pool)
+    first.start()
+    first.join(1)
+    second = RecordingTask(pool=self.pool)
+    second.start()
+    second.join(1)
+    self.assertTrue(first.finished)
+    self.assertTrue(second.finished)
+    self.assertIs(first.thread, second.thread)
+    self.assertEqual(1, self.pool.worker_count)
+
+  def test_concurrent_tasks(self):
+    started = [threading.Event(), threading.Event()]
+
+    def _make_proc(index):
+      def _proc():
+        started[index].set()
+        started[1 - index].wait(5)
+      return _proc
+
+    tasks = [RecordingTask(_make_proc(i), pool=self.pool) for i in range(2)]
+    for task in tasks:
+      task.start()
+    for task in tasks:
+      task.join(5)
+      self.assertFalse(task.is_alive())
+    self.assertIsNot(tasks[0].thread, tasks[1].thread)
+
+  def test_exception(self):
+    def _raise():
+      raise ValueError('proc failed')
+    task = RecordingTask(_raise, pool=self.pool)
+    task.start()
+    task.join(1)
+    self.assertIsInstance(task.exception, ValueError)
+    self.assertTrue(task.finished)
+
+  def test_kill(self):
+    def _loop():
+      while True:
+        time.sleep(0.01)
+    task = RecordingTask(_loop, pool=self.pool)
+    task.start()
+    task.join(0.1)
+    self.assertTrue(task.is_alive())
+    task.kill()
+    task.join(1)
+    self.assertFalse(task.is_alive())
+    self.assertTrue(task.finished)
+
+    # The worker that ran the killed task is retired, not reused.
+    task.thread.join(1)
+    self.assertEqual(0, self.pool.worker_count)
+    other = RecordingTask(pool=self.pool)
+    other.start()
+    other.join(1)
+    self.assertIsNot(task.thread, other.thread)
+
+  def test_kill_before_start(self):
+    task = RecordingTask(pool=self.pool)
+    task.kill()
+    task.start()
+    task.join(1)
+    self.assertIsNone(task.thread)
+    self.assertTrue(task.finished)
+
+  def test_base_exception_retires_worker(self):
+    def _exit():
+      raise SystemExit()
+    task = RecordingTask(_exit, pool=self.pool)
+    task.start()
+    task.join(1)
+    self.assertTrue(task.finished)
+
+    # The worker is not reused, and the next task still runs.
+    task.thread.join(1)
+    other = RecordingTask(pool=self.pool)
+    other.start()
+    other.join(1)
+    self.assertTrue(other.finished)
+    self.assertIsNot(task.thread, other.thread)
+
+
+class CancellationTokenTest(unittest.TestCase):
+
+  def test_cancel(self):
+    token = threads.CancellationToken()
+    self.assertFalse(token.observed)
+    self.assertFalse(token.wait(0))
+    self.assertTrue(token.observed)
+    calls = []
+    token.add_callback(lambda: calls.append('before'))
+    threading.Timer(0.05, token.cancel).start()
+    self.assertTrue(token.wait(5))
+    token.cancel()
+    token.add_callback(lambda: calls.append('after'))
+    self.assertEqual(['before', 'after'], calls)
+    with self.assertRaises(threads.ThreadTerminationError):
+      token.raise_if_cancelled()
+
+  def test_bind(self):
+    token = threads.CancellationToken()
+    self.assertIsNone(threads.current_cancellation_token())
+    with threads.bind_cancellation_token(token):
+      self.assertIs(token, threads.current_cancellation_token())
+    self.assertIsNone(threads.current_cancellation_token())
@@ -81,3 +81,41 @@ class TestUtil(unittest.TestCase):
     empty_string = ''
     self.assertEqual('', util.partial_format(empty_string))
     self.assertEqual('', util.partial_format(empty_string, foo='bar'))
+
+
+class _State(util.SubscribableStateMixin):
+
+  def __init__(self, notify_window_s=0):
+    super(_State, self).__init__()
+    self.notify_window_s = notify_window_s
+    self.value = 0
+
+  def _asdict(self):
+    return {'value': self.value}
+
+
+class TestSubscribableState(unittest.TestCase):
+
+  def test_versions(self):
+    state = _State()
+    state_dict, version = state.asdict_with_version()
+    self.assertEqual(({'value': 0}, 0), (state_dict, version))
+    self.assertIsNone(state.wait_for_update(version, timeout_s=0.01))
+    state.value = 1
+    state.notify_update()
+    self.assertEqual(1, state.version)
+    self.assertEqual(1, state.wait_for_update(version, timeout_s=0))
+
+  def test_coalesced_updates(self):
+    state = _State(notify_window_s=0.1)
+    _, event = state.asdict_with_event()
+    for value in range(1000):
+      state.value = value
+      state.notify_update()
+    # Watchers are only woken at the end of the window, once.
+    self.assertFalse(event.is_set())
+    self.assertEqual(0, state.version)
+    self.assertEqual(1000, state.wait_for_update(0, timeout_s=5))
+    self.assertTrue(event.is_set())
+    self.assertEqual(({'value': 999}, 1000), state.asdict_with_version())
+    self.assertIsNone(state.wait_for_update(1000, timeout_s=0.2))
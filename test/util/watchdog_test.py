@@ -0,0 +1,98 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+import unittest
+
+from openhtf.util import threads
+from openhtf.util import watchdog
+
+
+class _Task(threads.KillableTask):
+
+  def __init__(self, duration_s):
+    super(_Task, self).__init__(name='Sleep %s' % duration_s)
+    self._duration_s = duration_s
+
+  def _thread_proc(self):
+    end = time.time() + self._duration_s
+    while time.time() < end:
+      time.sleep(0.01)
+
+
+class WatchdogTest(unittest.TestCase):
+
+  def setUp(self):
+    super(WatchdogTest, self).setUp()
+    self.watchdog = watchdog.Watchdog(name='TestWatchdog')
+
+  def test_deadlines_expire_in_order(self):
+    expired = []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def _expire(name):
+      with lock:
+        expired.append(name)
+        if len(expired) == 3:
+          done.set()
+
+    for name, timeout_s in (('c', 0.15), ('a', 0.05), ('b', 0.1)):
+      self.watchdog.schedule(timeout_s, lambda name=name: _expire(name))
+    cancelled = self.watchdog.schedule(0.01, lambda: _expire('cancelled'))
+    self.assertTrue(cancelled.cancel())
+    self.assertTrue(done.wait(5))
+    self.assertEqual(['a', 'b', 'c'], expired)
+    self.assertFalse(cancelled.expired)
+    self.assertEqual(0, self.watchdog.pending_count)
+
+  def test_blocking_callback_does_not_delay_other_deadlines(self):
+    release = threading.Event()
+    expired = threading.Event()
+    token = threads.CancellationToken()
+    token.add_callback(lambda: release.wait(10))
+    self.addCleanup(release.set)
+
+    self.watchdog.schedule(0.01, token.cancel)
+    start = time.time()
+    self.watchdog.schedule(0.05, expired.set)
+    self.assertTrue(expired.wait(5))
+    self.assertLess(time.time() - start, 1)
+
+  def test_run_with_deadline(self):
+    deadline = self.watchdog.run_with_deadline(_Task(0), timeout_s=5)
+    self.assertFalse(deadline.expired)
+    self.assertGreater(deadline.margin_s, 4)
+
+    task = _Task(10)
+    start = time.time()
+    deadline = self.watchdog.run_with_deadline(task, timeout_s=0.1)
+    self.assertLess(time.time() - start, 5)
+    self.assertTrue(deadline.expired)
+    self.assertLessEqual(deadline.margin_s, 0)
+    task.join(5)
+    self.assertTrue(task.was_killed)
+
+  def test_no_timeout(self):
+    deadline = self.watchdog.run_with_deadline(_Task(0.05), timeout_s=None)
+    self.assertFalse(deadline.expired)
+    self.assertIsNone(deadline.margin_s)
+    self.assertGreaterEqual(deadline.elapsed_s, 0.05)
+
+  def test_compacts_cancelled_deadlines(self):
+    for _ in range(1000):
+      self.watchdog.schedule(60, lambda: None).cancel()
+    self.assertLess(len(self.watchdog._heap), 100)
+    self.assertEqual(0, self.watchdog.pending_count)